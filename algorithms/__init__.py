@@ -1 +1,2 @@
-
+# the Earth Engine backend is selected before the algorithms import ee
+import utils  # noqa: F401
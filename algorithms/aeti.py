@@ -1,20 +1,20 @@
 from marmee.marmee import Marmee
-from marmee.model import Input
 from marmee.model.filter import Filter
 from marmee.model.rule import Range, ExtentSchema, TemporalRule, Rule
-from marmee.utils.parser import Stac
 from ee import ImageCollection as EEImageCollection
 from ee import Image as EEImage
 from ee import Date as EEDate, EEException
 import os
 import ee
-import dask
 import click
 import json
 import daiquiri
 import datetime
-import pendulum
-from dask.delayed import delayed
+from utils.introspection import Introspector, Info, Dumps
+from utils.properties import DekadalExportProperties
+from utils.stac import parse_input
+from utils.export import ExportSpec, ExportSubmitter
+from utils.metrics import metrics
 from utils.helpers import ETI
 
 
@@ -24,6 +24,11 @@ class AETI(Marmee):
 
         logger = daiquiri.getLogger(__name__, subsystem="algorithms")
         self.logger = logger
+        self.introspect = Introspector(logger)
+        self.cache = kw.get("cache")
+        self.submitter = kw.get("submitter") or ExportSubmitter()
+        # sources and version recorded on the exported assets
+        self.lineage = kw.get("lineage")
         self._name = "AETI"
 
         # parallelize items computation for ETI inputs
@@ -32,9 +37,13 @@ class AETI(Marmee):
             self.logger.debug(
                 "Named arguments kw =====> {0}".format(kw)
             )
-            colls = [self._inputColl(
+            # E, T and I are parsed concurrently, each once per process,
+            # dask is only loaded by this parallel path
+            import dask
+            from dask import delayed
+            colls = list(dask.compute(*[delayed(self._inputColl)(
                 coll_id
-            ).compute() for coll_id in [kw["collE"], kw["collT"], kw["collI"]]]
+            ) for coll_id in [kw["collE"], kw["collT"], kw["collI"]]]))
             self._inputs = colls
         except (EEException, KeyError) as (eee, exc):
             if eee:
@@ -52,14 +61,18 @@ class AETI(Marmee):
         # temporal filter for AETI
         try:
             self.year = kw["year"]
+            self.export_properties = DekadalExportProperties()
             if kw["area_code"] and (not kw["area_code"] == "NA"):
                 self.area = kw["area_code"]
             else:
                 self.area = None
+            # destination asset ids by area, when running several L3 areas
+            self.areas = kw.get("areas") or {}
             self.config = dict(
                 export=kw["to_asset"],
                 intermediate=kw["intermediate_outputs"],
-                assetids=kw["dst_assets"]
+                assetids=kw["dst_assets"],
+                assetcoll=kw.get("dst_asset_coll")
             )
         except KeyError as exc:
             self.logger.error(
@@ -79,6 +92,7 @@ class AETI(Marmee):
         # Create a dict of EE ImageCollection for ETI
         flt_dict = {}
         inpt_dict = {}
+        ids_dict = {}
         config_dict = {}
 
         self.logger.debug(
@@ -98,31 +112,31 @@ class AETI(Marmee):
                         inpt_dict["cE"] = EEImageCollection(
                             inpt.stacobject.id
                         )
-                        self.logger.debug(
-                            "ImageCollection info for {0} is =====>\n{1}".format(
-                                inpt.stacobject.id,
-                                inpt_dict["cE"].getInfo()
-                            )
+                        ids_dict["cE"] = inpt.stacobject.id
+                        self.introspect.debug(
+                            "ImageCollection info for {0} is =====>\n{1}",
+                            inpt.stacobject.id,
+                            Info(inpt_dict["cE"])
                         )
                     elif "T_D" in inpt.stacobject.id:
                         inpt_dict["cT"] = EEImageCollection(
                             inpt.stacobject.id
                         )
-                        self.logger.debug(
-                            "ImageCollection info for {0} is =====>\n{1}".format(
-                                inpt.stacobject.id,
-                                inpt_dict["cT"].getInfo()
-                            )
+                        ids_dict["cT"] = inpt.stacobject.id
+                        self.introspect.debug(
+                            "ImageCollection info for {0} is =====>\n{1}",
+                            inpt.stacobject.id,
+                            Info(inpt_dict["cT"])
                         )
                     elif "I_D" in inpt.stacobject.id:
                         inpt_dict["cI"] = EEImageCollection(
                             inpt.stacobject.id
                         )
-                        self.logger.debug(
-                            "ImageCollection info for {0} is =====>\n{1}".format(
-                                inpt.stacobject.id,
-                                inpt_dict["cI"].getInfo()
-                            )
+                        ids_dict["cI"] = inpt.stacobject.id
+                        self.introspect.debug(
+                            "ImageCollection info for {0} is =====>\n{1}",
+                            inpt.stacobject.id,
+                            Info(inpt_dict["cI"])
                         )
                 except EEException as eee:
                     self.logger.error(
@@ -147,6 +161,7 @@ class AETI(Marmee):
 
         self.coll = inpt_dict
         self.filter = flt_dict
+        self.coll_ids = ids_dict
         self.config.update(config_dict)
 
     def process_dekadal(self):
@@ -156,144 +171,179 @@ class AETI(Marmee):
         if self.area:
             self.filter.update(dict(area=self.area))
         kwargs.update(self.filter)
+        kwargs.update(ids=self.coll_ids, cache=self.cache)
         collETI = ETI(**kwargs).getCollETI()
+        self._tasks = {}
 
         if isinstance(collETI, dict):
             self.errors.update(collETI["errors"])
         else:
-            self.logger.debug(
-                "Config dictionary =====> {0}".format(
-                    json.dumps(self.config)
-                )
+            self.introspect.debug(
+                "Config dictionary =====> {0}", Dumps(self.config)
             )
 
             assetids = self.config["assetids"]
-            self._tasks = {}
 
-            for i in range(len(assetids)):
-                # Case of just one dekad asked from cli
-                if len(assetids) == 1:
-                    assetid = assetids[0]
-                    y = os.path.basename(assetid)[8:][:2]
-                    idx = os.path.basename(assetid)[8:][2:][:2]
-                    if y == self.year[2:]:
-                        asset_idx = int(idx) - 1
-                    else:
-                        self.logger.debug(
-                            "Retrieved year {} from asset while requested is \
-{}".format(y, self.year[2:])
-                        )
-                        raise click.Abort()
-                    colleti_sorted_list = collETI.sort(
-                        'system:index', True
-                    ).toList(1, asset_idx)
-                    self.logger.debug(
-                        "Retrieved list has size {}".format(
-                            json.dumps(colleti_sorted_list.size().getInfo())
-                        )
-                    )
-                    if colleti_sorted_list.getInfo():
-                        export_img = EEImage(colleti_sorted_list.get(0))
-                    else:
-                        click.echo("This asset cannot be generated!")
-                        raise click.Abort()
+            # Case of just one dekad asked from cli
+            if len(assetids) == 1:
+                y = os.path.basename(assetids[0])[8:][:2]
+                idx = os.path.basename(assetids[0])[8:][2:][:2]
+                if y == self.year[2:]:
+                    offset = int(idx) - 1
                 else:
-                    export_img = EEImage(collETI.sort(
-                        'system:index', True).toList(1, i).get(0)
+                    self.logger.debug(
+                        "Retrieved year {} from asset while requested is \
+{}".format(y, self.year[2:])
                     )
-                    assetid = assetids[i]
+                    raise click.Abort()
+            else:
+                offset = 0
+            colleti_sorted_list = collETI.sort(
+                'system:index', True
+            ).toList(len(assetids), offset)
+            # bands and properties of every dekad in a single round trip
+            infos = metrics.call(
+                "getInfo", "AETI.process_dekadal", colleti_sorted_list.getInfo
+            ) or []
+            self.logger.debug(
+                "Retrieved list has size {0}".format(len(infos))
+            )
+            if not infos and len(assetids) == 1:
+                click.echo("This asset cannot be generated!")
+                raise click.Abort()
 
-                self.logger.debug(
-                    "Information for exported image =====> {0}".format(
-                        json.dumps(export_img.getInfo())
-                    )
-                )
-                asset_name = os.path.basename(assetid)
+            specs = self._dekadal_specs(
+                colleti_sorted_list, infos, assetids, offset
+            )
 
-                bands = export_img.getInfo()["bands"][0]
-                dimensions = (bands["dimensions"][0], bands["dimensions"][1],)
-                dekad_properties = export_img.getInfo()["properties"]
+            # launch the tasks concurrently and return taskids
+            tasks, errors = self.submitter.submit(
+                specs, collection=self.config["assetcoll"],
+                lineage=self.lineage,
+                site="AETI.process_dekadal"
+            )
+            self._tasks.update(tasks)
+            self.errors.update(errors)
 
-                # Set dekadal_props for export
-                dekadal_props = self._setExportProperties(
-                    asset_name, **dekad_properties
-                )
-                export_img_props = ee.Image.setMulti(
-                    export_img.unmask(
-                        -9999
-                    ).int16(), dekadal_props
-                )
-                properties = export_img_props.getInfo()
-                self.logger.debug(
-                    "New properties are =====>\n{0}".format(
-                        json.dumps(properties)
-                    )
-                )
-                pyramid_policy = json.dumps({"{0}".format(
-                    properties["bands"][0]["id"]
-                ): "mode"})
-                self.logger.debug(
-                    "PyramidingPolicy is =====>\n{0}".format(
-                        pyramid_policy
-                    )
-                )
-                # check if the asset already exists and eventually delete it
-                if ee.data.getInfo(assetid):
-                    try:
-                        ee.data.deleteAsset(assetid)
-                    except EEException as eee:
-                        self.logger.debug(
-                            "Trying to delete an assetId {0} \
-which doesn't exist.".format(assetid)
-                        )
-                        raise
-                # launch the task and return taskid
-                try:
-                    task = ee.batch.Export.image.toAsset(
-                        image=export_img_props,
-                        description=asset_name,
-                        assetId=assetid,
-                        crs=bands["crs"],
-                        dimensions="{0}x{1}".format(
-                            dimensions[0],
-                            dimensions[1]
-                        ),
-                        maxPixels=dimensions[0] * dimensions[1],
-                        crsTransform=str(bands["crs_transform"]),
-                        pyramidingPolicy=pyramid_policy
-                    )
-                    task.start()
-                    self._tasks.update(
-                        {
-                            "{0}".format(assetid): {
-                                "taskid": task.id
-                            }
-                        }
-                    )
+        self.introspect.report()
+        return dict(
+            tasks=self._tasks,
+            outputs=self.outputs,
+            errors=self.errors,
+            metrics=metrics.summary()
+        )
 
-                except (EEException, AttributeError) as e:
-                    self.logger.error(
-                        "Task export definition has failed!",
-                        exc_info=True
-                    )
-                    raise
+    def process_dekadal_areas(self):
+        """Calculate Dekadal AETI of every L3 area.
+
+        E, T and I are partitioned once by area_code and checked for every
+        area with one histogram each, the dekads of all the areas are then
+        fetched in a single round trip and exported together.
+        """
+        kwargs = self.coll
+        kwargs.update(self.filter)
+        kwargs.update(ids=self.coll_ids, cache=self.cache)
+        colls, errors = ETI(**kwargs).getCollETIAreas(sorted(self.areas))
+        self._tasks = {}
+        self.errors.update(errors)
+
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
+        )
+        lists = dict([
+            (area, coll.sort('system:index', True).toList(
+                len(self.areas[area])
+            )) for area, coll in colls.items()
+        ])
+        # bands and properties of every dekad of every area in one round trip
+        infos = {}
+        if lists:
+            infos = metrics.call(
+                "getInfo", "AETI.process_dekadal_areas",
+                ee.Dictionary(lists).getInfo
+            ) or {}
+        specs = []
+        for area in sorted(lists):
+            specs.extend(self._dekadal_specs(
+                lists[area], infos.get(area) or [], self.areas[area], 0
+            ))
+
+        # launch the tasks of every area together and return taskids
+        tasks, errors = self.submitter.submit(
+            specs, collection=self.config["assetcoll"],
+            lineage=self.lineage,
+            site="AETI.process_dekadal_areas"
+        )
+        self._tasks.update(tasks)
+        self.errors.update(errors)
 
+        self.introspect.report()
         return dict(
             tasks=self._tasks,
             outputs=self.outputs,
-            errors=self.errors
+            errors=self.errors,
+            metrics=metrics.summary()
         )
 
-    @delayed
+    def _dekadal_specs(self, colleti_sorted_list, infos, assetids, offset):
+        specs = []
+        for i in range(len(assetids)):
+            assetid = assetids[i]
+            if i >= len(infos):
+                err_mesg = "Dekad {0} is missing for asset {1}".format(
+                    i + offset + 1, assetid
+                )
+                self.logger.error(err_mesg)
+                n_errkey = str(len(self.errors) + 1)
+                self.errors.update(
+                    {"{0}".format(n_errkey): "{0}".format(err_mesg)}
+                )
+                continue
+            info = infos[i]
+            export_img = EEImage(colleti_sorted_list.get(i))
+
+            self.introspect.debug(
+                "Information for exported image =====> {0}",
+                Dumps(info)
+            )
+            asset_name = os.path.basename(assetid)
+
+            bands = info["bands"][0]
+            dekad_properties = info["properties"]
+
+            # Set dekadal_props for export
+            dekadal_props = self.export_properties.build(
+                asset_name, **dekad_properties
+            )
+            export_img_props = ee.Image.setMulti(
+                export_img.unmask(
+                    -9999
+                ).int16(), dekadal_props
+            )
+            self.introspect.debug(
+                "New properties are =====>\n{0}", Info(export_img_props)
+            )
+            # unmask, int16 and setMulti keep the source band name
+            spec = ExportSpec(
+                export_img_props, assetid, bands, bands["id"]
+            )
+            self.logger.debug(
+                "PyramidingPolicy is =====>\n{0}".format(
+                    spec.pyramid_policy
+                )
+            )
+            specs.append(spec)
+        return specs
+
     def _inputColl(self, collection_id):
         self.logger.debug("collection_id is =====> {0}".format(collection_id))
         try:
-            gee_stac_obj = Stac(collection_id).parse()
-            return Input(stacobject=gee_stac_obj, reducers=[])
+            # parsed once per process, and across runs through the cache
+            return parse_input(collection_id, cache=self.cache)
         except EEException as eee:
             self.logger.error(
                 "Exception creating Marmee object {0}".format(
-                    gee_stac_obj.id
+                    collection_id
                 ),
                 exc_info=True
             )
@@ -326,32 +376,3 @@ which doesn't exist.".format(assetid)
             }
         except (KeyError, EEException) as (err, exc):
             raise
-
-    def _setExportProperties(self, asset, **properties):
-        try:
-            res_props = {}
-            self.logger.debug("Input properties are =====>\n{0}".format(
-                json.dumps(properties)
-            )
-            )
-            for key, value in properties.items():
-                if key == "code":
-                    res_props[key] = asset
-                elif key == "system:index":
-                    res_props[key] = asset
-                elif key == "id":
-                    res_props[key] = asset
-                elif key == "no_data_value":
-                    res_props[key] = "-9999"
-                elif key == "data_type":
-                    res_props[key] = "{0}bit Unsigned Integer".format(
-                        "16"
-                    )
-                elif key == "system:asset_size":
-                    pass
-                else:
-                    res_props[key] = value
-
-            return res_props
-        except KeyError as e:
-            raise
@@ -1,19 +1,20 @@
 from marmee.marmee import Marmee
-from marmee.model.input import Input
 from marmee.model.filter import Filter
 from marmee.model.rule import Range, ExtentSchema, TemporalRule, Rule
-from marmee.utils.parser import Stac
 from ee import ImageCollection as EEImageCollection
 from ee import Image as EEImage
 from ee import Date as EEDate, EEException
 import ee
 import os
-import dask
 import json
 import daiquiri
 import datetime
-import pendulum
-from dask.delayed import delayed
+from utils.introspection import Introspector, Info, Dumps
+from utils.properties import ExportProperties
+from utils.stac import parse_input
+from utils.export import ExportSpec, ExportSubmitter
+from utils.metrics import metrics
+from utils.probe import Probe
 
 
 class AGBP(Marmee):
@@ -22,6 +23,12 @@ class AGBP(Marmee):
 
         logger = daiquiri.getLogger(__name__, subsystem="algorithms")
         self.logger = logger
+        self.introspect = Introspector(logger)
+        self.cache = kw.get("cache")
+        self.submitter = kw.get("submitter") or ExportSubmitter()
+        # sources and version recorded on the exported assets
+        self.lineage = kw.get("lineage")
+        self._name = "AGBP"
 
         # parallelize items computation for input component
         try:
@@ -58,10 +65,13 @@ class AGBP(Marmee):
         # temporal filter for input component
         try:
             self.year = kw["year"]
+            self.export_properties = ExportProperties(self.year)
+            self.sources = [kw["src_coll"]]
             self.config = dict(
                 export=kw["to_asset"],
                 intermediate=kw["intermediate_outputs"],
                 assetid=kw["dst_asset"],
+                assetcoll=kw.get("dst_asset_coll"),
                 ndvalue=kw["nodatavalue"]
             )
         except KeyError as exc:
@@ -97,11 +107,10 @@ class AGBP(Marmee):
                     inpt_dict["collection"] = EEImageCollection(
                         inpt.stacobject.id
                     )
-                    self.logger.debug(
-                        "ImageCollection info for {0} is =====>\n{1}".format(
-                            inpt.stacobject.id,
-                            inpt_dict["collection"].getInfo()
-                        )
+                    self.introspect.debug(
+                        "ImageCollection info for {0} is =====>\n{1}",
+                        inpt.stacobject.id,
+                        Info(inpt_dict["collection"])
                     )
                 except EEException as eee:
                     self.logger.error(
@@ -133,10 +142,8 @@ class AGBP(Marmee):
         """Calculate Annual AGBP image.
         """
 
-        self.logger.debug(
-            "Config dictionary =====> {0}".format(
-                json.dumps(self.config)
-            )
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
         )
 
         self._tasks = {}
@@ -166,137 +173,104 @@ class AGBP(Marmee):
                 )
             )
 
-        # properties
-        size = collNPPFiltered.size().getInfo()
-        if size is 36:
-            first_info = EEImage(collNPPFiltered.first()).getInfo()
-            bands = first_info["bands"][0]
-            dimensions = (bands["dimensions"][0], bands["dimensions"][1],)
-            dekad_properties = first_info["properties"]
-
-            self.logger.debug(
-                "First image has following properties =====> \n{0}".format(
-                    json.dumps(dekad_properties)
-                )
-            )
+        componentAGBPColl = collNPPFiltered.map(
+            lambda img: img.multiply(0.01444).addBands(
+                img.metadata('n_days_extent'))
+        )
+        self.introspect.debug(
+            "componentAGBPColl info is =====> \n{0}",
+            Info(componentAGBPColl)
+        )
 
-            componentAGBPColl = collNPPFiltered.map(
-                lambda img: img.multiply(0.01444).addBands(
-                    img.metadata('n_days_extent'))
-            )
-            self.logger.debug(
-                "componentAGBPColl info is =====> \n{0}".format(
-                    componentAGBPColl.getInfo()
-                )
+        # multiply for number of days for dekad
+        componentAGBP_annual = componentAGBPColl.map(
+            lambda img_a: img_a.select('b1').multiply(
+                img_a.select('n_days_extent')
             )
+        )
+        self.introspect.debug(
+            "componentAGBP_annual info is =====> \n{0}",
+            Info(componentAGBP_annual)
+        )
 
-            # multiply for number of days for dekad
-            componentAGBP_annual = componentAGBPColl.map(
-                lambda img_a: img_a.select('b1').multiply(
-                    img_a.select('n_days_extent')
-                )
-            )
-            self.logger.debug(
-                "componentAGBP_annual info is =====> \n{0}".format(
-                    componentAGBP_annual.getInfo()
-                )
-            )
+        sum_componentAGBP_annual = componentAGBP_annual.reduce(
+            ee.Reducer.sum()
+        )
+        self.introspect.debug(
+            "sum_componentAGBP_annual info is =====> \n{0}",
+            Info(sum_componentAGBP_annual)
+        )
 
-            sum_componentAGBP_annual = componentAGBP_annual.reduce(
-                ee.Reducer.sum()
-            )
-            self.logger.debug(
-                "sum_componentAGBP_annual info is =====> \n{0}".format(
-                    sum_componentAGBP_annual.getInfo()
-                )
+        # it doesn't multiply cause above doesn't divide
+        sum_componentAGBP_annual_int = sum_componentAGBP_annual.unmask(
+            -9999
+        ).int32()
+
+        # properties, first image and band names in one round trip
+        probe = Probe(
+            collNPPFiltered, image=sum_componentAGBP_annual_int
+        ).fetch(
+            cache=self.cache,
+            site="AGBP.process_annual",
+            assets=self.sources,
+            parts=(self._name, self.year, self.config["ndvalue"])
+        )
+        size = probe.size
+        if size == 36:
+            bands = probe.bands
+            dekad_properties = probe.properties
+
+            self.introspect.debug(
+                "First image has following properties =====> \n{0}",
+                Dumps(dekad_properties)
             )
-
-            # it doesn't multiply cause above doesn't divide
-            sum_componentAGBP_annual_int = sum_componentAGBP_annual.unmask(
-                -9999
-            ).int32()
-
-            bandNames = sum_componentAGBP_annual_int.bandNames().getInfo()
             self.logger.debug(
                 "bandNames info is =====> \n{0}".format(
-                    bandNames
+                    probe.band_names
                 )
             )
 
-            self.logger.debug(
-                "Config dictionary =====> {0}".format(
-                    json.dumps(self.config)
-                )
+            self.introspect.debug(
+                "Config dictionary =====> {0}", Dumps(self.config)
             )
 
             assetid = self.config["assetid"]
             asset_name = os.path.basename(assetid)
 
             # annual_props for export
-            annual_props = self._setExportProperties(
-                self.year, asset_name, **dekad_properties
+            annual_props = self.export_properties.build(
+                asset_name, **dekad_properties
             )
             sum_componentAGBP_annual_props = ee.Image.setMulti(
                 sum_componentAGBP_annual_int, annual_props
             )
-            properties = sum_componentAGBP_annual_props.getInfo()
-            self.logger.debug(
-                "New properties are =====>\n{0}".format(
-                    json.dumps(properties)
-                )
+            self.introspect.debug(
+                "New properties are =====>\n{0}",
+                Info(sum_componentAGBP_annual_props)
+            )
+            spec = ExportSpec(
+                sum_componentAGBP_annual_props, assetid, bands, probe.band_names[0]
             )
-            pyramid_policy = json.dumps({"{0}".format(
-                properties["bands"][0]["id"]
-            ): "mode"})
             self.logger.debug(
                 "PyramidingPolicy is =====>\n{0}".format(
-                    pyramid_policy
+                    spec.pyramid_policy
                 )
             )
-            # check if the asset already exists and eventually delete it
-            if ee.data.getInfo(assetid):
-                try:
-                    ee.data.deleteAsset(assetid)
-                except EEException as eee:
-                    self.logger.debug(
-                        "Trying to delete an assetId {0} \
-which doesn't exist.".format(assetid)
-                    )
-                    raise
             # launch the task and return taskid
-            try:
-                task = ee.batch.Export.image.toAsset(
-                    image=sum_componentAGBP_annual_props,
-                    description=asset_name,
-                    assetId=assetid,
-                    crs=bands["crs"],
-                    dimensions="{0}x{1}".format(
-                        dimensions[0],
-                        dimensions[1]
-                    ),
-                    maxPixels=dimensions[0] * dimensions[1],
-                    crsTransform=str(bands["crs_transform"]),
-                    pyramidingPolicy=pyramid_policy
-                )
-                task.start()
-                self._tasks.update(
-                    {
-                        "{0}".format(assetid): {
-                            "taskid": task.id
-                        }
-                    }
-                )
-                return dict(
-                    tasks=self._tasks,
-                    outputs=self.outputs,
-                    errors=self.errors
-                )
-            except (EEException, AttributeError) as e:
-                self.logger.debug(
-                    "Task export definition has failed with =====>\
-\n{0}".format(e)
-                )
-                raise
+            tasks, errors = self.submitter.submit(
+                [spec], collection=self.config["assetcoll"],
+                lineage=self.lineage,
+                site="AGBP.process_annual"
+            )
+            self._tasks.update(tasks)
+            self.errors.update(errors)
+            self.introspect.report()
+            return dict(
+                tasks=self._tasks,
+                outputs=self.outputs,
+                errors=self.errors,
+                metrics=metrics.summary()
+            )
 
         else:
             # @TODO 36(dekad_days) should be a configuration from config file
@@ -308,22 +282,24 @@ which doesn't exist.".format(assetid)
             self.errors.update(
                 {"{0}".format(n_errkey): "{0}".format(err_mesg)}
             )
+            self.introspect.report()
             return dict(
                 tasks={},
                 outputs=self.outputs,
-                errors=self.errors
+                errors=self.errors,
+                metrics=metrics.summary()
             )
 
     # @delayed
     def _inputColl(self, collection_id):
         self.logger.debug("collection_id is =====> {0}".format(collection_id))
         try:
-            gee_stac_obj = Stac(collection_id).parse()
-            return Input(stacobject=gee_stac_obj, reducers=[])
+            # parsed once per process, and across runs through the cache
+            return parse_input(collection_id, cache=self.cache)
         except EEException as eee:
             self.logger.error(
                 "Exception creating Marmee object {0}".format(
-                    gee_stac_obj.id
+                    collection_id
                 ),
                 exc_info=True
             )
@@ -356,54 +332,3 @@ which doesn't exist.".format(assetid)
             }
         except (KeyError, EEException) as (err, exc):
             raise
-
-    def _setExportProperties(self, year, asset, **properties):
-        try:
-            res_props = {}
-            self.logger.debug("Input properties are =====>\n{0}".format(
-                json.dumps(properties)
-            )
-            )
-            for key, value in properties.items():
-                if key == "code":
-                    res_props[key] = asset
-                elif key == "time_extent":
-                    res_props[key] = "from {0}-01-01 to {0}-12-31".format(
-                        year
-                    )
-                elif key == "time_resolution":
-                    res_props[key] = "YEAR".format(
-                        str(self._days_in_year(year))
-                    )
-                elif key == "n_days_extent":
-                    res_props[key] = "{0}.0".format(
-                        str(self._days_in_year(year))
-                    )
-                elif key == "no_data_value":
-                    res_props[key] = "-9999"
-                elif key == "data_type":
-                    res_props[key] = "{0}bit Unsigned Integer".format(
-                        "32"
-                    )
-                elif key == "system:asset_size":
-                    pass
-                elif key == "system:time_start":
-                    res_props[key] = ee.Date.fromYMD(
-                        int(year), 1, 1
-                    ).millis().getInfo()
-                elif key == "system:time_end":
-                    res_props[key] = ee.Date.fromYMD(
-                        int(year), 12, 31
-                    ).millis().getInfo()
-                else:
-                    res_props[key] = properties[key]
-
-            return res_props
-        except KeyError as e:
-            raise
-
-    def _days_in_year(self, y):
-        if pendulum.datetime(int(y), 1, 1).is_leap_year():
-            return 366
-        else:
-            return 365
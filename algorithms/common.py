@@ -1,19 +1,20 @@
 from marmee.marmee import Marmee
-from marmee.model.input import Input
 from marmee.model.filter import Filter
 from marmee.model.rule import Range, ExtentSchema, TemporalRule, Rule
-from marmee.utils.parser import Stac
 from ee import ImageCollection as EEImageCollection
 from ee import Image as EEImage
 from ee import Date as EEDate, EEException
 import ee
 import os
-import dask
 import json
 import daiquiri
 import datetime
-import pendulum
-from dask.delayed import delayed
+from utils.introspection import Introspector, Info, Dumps
+from utils.properties import ExportProperties
+from utils.stac import parse_input
+from utils.export import ExportSpec, ExportSubmitter
+from utils.metrics import metrics
+from utils.probe import Probe, fetch_all
 
 
 class Common(Marmee):
@@ -22,6 +23,11 @@ class Common(Marmee):
 
         logger = daiquiri.getLogger(__name__, subsystem="algorithms")
         self.logger = logger
+        self.introspect = Introspector(logger)
+        self.cache = kw.get("cache")
+        self.submitter = kw.get("submitter") or ExportSubmitter()
+        # sources and version recorded on the exported assets
+        self.lineage = kw.get("lineage")
         self._name = "COMMON"
 
         # parallelize items computation for input component
@@ -59,12 +65,19 @@ class Common(Marmee):
         # temporal filter for input component
         try:
             self.year = kw["year"]
+            self.export_properties = ExportProperties(self.year)
             if kw["area_code"] and (not kw["area_code"] == "NA"):
                 self.area = kw["area_code"]
+            else:
+                self.area = None
+            # destination asset by area, when running several L3 areas
+            self.areas = kw.get("areas") or {}
+            self.sources = [kw["src_coll"]]
             self.config = dict(
                 export=kw["to_asset"],
                 intermediate=kw["intermediate_outputs"],
-                assetid=kw["dst_asset"],
+                assetid=kw.get("dst_asset"),
+                assetcoll=kw.get("dst_asset_coll"),
                 ndvalue=kw["nodatavalue"]
             )
         except KeyError as exc:
@@ -100,11 +113,10 @@ class Common(Marmee):
                     inpt_dict["collection"] = EEImageCollection(
                         inpt.stacobject.id
                     )
-                    self.logger.debug(
-                        "ImageCollection info for {0} is =====>\n{1}".format(
-                            inpt.stacobject.id,
-                            inpt_dict["collection"].getInfo()
-                        )
+                    self.introspect.debug(
+                        "ImageCollection info for {0} is =====>\n{1}",
+                        inpt.stacobject.id,
+                        Info(inpt_dict["collection"])
                     )
                 except EEException as eee:
                     self.logger.error(
@@ -136,10 +148,8 @@ class Common(Marmee):
         """Calculate Annual image.
         """
 
-        self.logger.debug(
-            "Config dictionary =====> {0}".format(
-                json.dumps(self.config)
-            )
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
         )
 
         self._tasks = {}
@@ -148,6 +158,129 @@ class Common(Marmee):
         if self.area:
             self.filter.update(dict(area=self.area))
 
+        collFiltered = self._annual_collection()
+
+        # Additional filter area for L3
+        if self.filter.has_key("area"):
+            farea = ee.Filter.eq('area_code', self.filter["area"])
+            collFiltered = collFiltered.filter(farea)
+
+        sum_component_annual_int = self._annual_image(collFiltered)
+
+        # properties, first image and band names in one round trip
+        probe = Probe(collFiltered, image=sum_component_annual_int).fetch(
+            cache=self.cache,
+            site="COMMON.process_annual",
+            assets=self.sources,
+            parts=(self._name, self.year, self.area, self.config["ndvalue"])
+        )
+        size = probe.size
+        if size == 36:
+            spec = self._annual_spec(
+                probe, sum_component_annual_int, self.config["assetid"]
+            )
+            # launch the task and return taskid
+            tasks, errors = self.submitter.submit(
+                [spec], collection=self.config["assetcoll"],
+                lineage=self.lineage,
+                site="COMMON.process_annual"
+            )
+            self._tasks.update(tasks)
+            self.errors.update(errors)
+            self.introspect.report()
+            return dict(
+                tasks=self._tasks,
+                outputs=self.outputs,
+                errors=self.errors,
+                metrics=metrics.summary()
+            )
+
+        else:
+            # @TODO 36(dekad_days) should be a configuration from config file
+            err_mesg = "Collection has size {0} while it should be 36".format(
+                size
+            )
+            self.logger.error(err_mesg)
+            n_errkey = str(len(self.errors) + 1)
+            self.errors.update(
+                {"{0}".format(n_errkey): "{0}".format(err_mesg)}
+            )
+            self.introspect.report()
+            return dict(
+                tasks={},
+                outputs=self.outputs,
+                errors=self.errors,
+                metrics=metrics.summary()
+            )
+
+    def process_annual_areas(self):
+        """Calculate Annual image of every L3 area.
+
+        The collection is filtered once and partitioned by area_code, the
+        dekads of every area are counted in the same round trip fetching
+        the properties of the area images, then the exports of the
+        complete areas are submitted together.
+        """
+
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
+        )
+
+        self._tasks = {}
+        areas = sorted(self.areas)
+        collFiltered = self._annual_collection()
+
+        images = {}
+        probes = dict(partition=Probe(collFiltered, histogram="area_code"))
+        for area in areas:
+            collArea = collFiltered.filter(ee.Filter.eq('area_code', area))
+            images[area] = self._annual_image(collArea)
+            probes[area] = Probe(collArea, image=images[area])
+
+        # dekads by area, properties and band names in one round trip
+        probes = fetch_all(
+            probes,
+            cache=self.cache,
+            site="COMMON.process_annual_areas",
+            assets=self.sources,
+            parts=(
+                self._name, self.year, tuple(areas), self.config["ndvalue"]
+            )
+        )
+        sizes = probes["partition"].histogram
+        specs = []
+        for area in areas:
+            size = sizes.get(area, 0)
+            if size == 36:
+                specs.append(self._annual_spec(
+                    probes[area], images[area], self.areas[area]
+                ))
+            else:
+                err_mesg = "Collection has size {0} for area {1} while it \
+should be 36".format(size, area)
+                self.logger.error(err_mesg)
+                n_errkey = str(len(self.errors) + 1)
+                self.errors.update(
+                    {"{0}".format(n_errkey): "{0}".format(err_mesg)}
+                )
+
+        # launch the tasks of every area together and return taskids
+        tasks, errors = self.submitter.submit(
+            specs, collection=self.config["assetcoll"],
+            lineage=self.lineage,
+            site="COMMON.process_annual_areas"
+        )
+        self._tasks.update(tasks)
+        self.errors.update(errors)
+        self.introspect.report()
+        return dict(
+            tasks=self._tasks,
+            outputs=self.outputs,
+            errors=self.errors,
+            metrics=metrics.summary()
+        )
+
+    def _annual_collection(self):
         self.logger.debug(
             "temporal_filter GEE object value is ======> {0}".format(
                 self.filter["temporal_filter"]
@@ -171,169 +304,87 @@ class Common(Marmee):
                     image.select('b1').gte(0)
                 )
             )
+        return collFiltered
 
-        # Additional filter area for L3
-        if self.filter.has_key("area"):
-            farea = ee.Filter.eq('area_code', self.filter["area"])
-            collFiltered = collFiltered.filter(farea)
-
-        # properties
-        size = collFiltered.size().getInfo()
-        if size is 36:
-            first_info = EEImage(collFiltered.first()).getInfo()
-            bands = first_info["bands"][0]
-            dimensions = (bands["dimensions"][0], bands["dimensions"][1],)
-            dekad_properties = first_info["properties"]
-
-            self.logger.debug(
-                "First image has following properties =====> \n{0}".format(
-                    json.dumps(dekad_properties)
-                )
-            )
-
-            componentColl = collFiltered.map(
-                lambda img: img.addBands(img.metadata('n_days_extent'))
-            )
-            self.logger.debug(
-                "componentColl info is =====> \n{0}".format(
-                    componentColl.getInfo()
-                )
-            )
+    def _annual_image(self, collFiltered):
+        componentColl = collFiltered.map(
+            lambda img: img.addBands(img.metadata('n_days_extent'))
+        )
+        self.introspect.debug(
+            "componentColl info is =====> \n{0}", Info(componentColl)
+        )
 
-            # multiply for number of days for dekad
-            component_annual = componentColl.map(
-                lambda img_a: img_a.select('b1').multiply(
-                    img_a.select('n_days_extent')
-                )
-            )
-            self.logger.debug(
-                "component_annual info is =====> \n{0}".format(
-                    component_annual.getInfo()
-                )
+        # multiply for number of days for dekad
+        component_annual = componentColl.map(
+            lambda img_a: img_a.select('b1').multiply(
+                img_a.select('n_days_extent')
             )
+        )
+        self.introspect.debug(
+            "component_annual info is =====> \n{0}",
+            Info(component_annual)
+        )
 
-            sum_component_annual = component_annual.reduce(
-                ee.Reducer.sum()
-            )
-            self.logger.debug(
-                "sum_component_annual info is =====> \n{0}".format(
-                    sum_component_annual.getInfo()
-                )
-            )
+        sum_component_annual = component_annual.reduce(
+            ee.Reducer.sum()
+        )
+        self.introspect.debug(
+            "sum_component_annual info is =====> \n{0}",
+            Info(sum_component_annual)
+        )
 
-            # it doesn't multiply cause above doesn't divide
-            sum_component_annual_int = sum_component_annual.unmask(
-                -9999
-            ).int32()
+        # it doesn't multiply cause above doesn't divide
+        return sum_component_annual.unmask(
+            -9999
+        ).int32()
 
-            bandNames = sum_component_annual_int.bandNames().getInfo()
-            self.logger.debug(
-                "bandNames info is =====> \n{0}".format(
-                    bandNames
-                )
-            )
+    def _annual_spec(self, probe, sum_component_annual_int, assetid):
+        bands = probe.bands
+        dekad_properties = probe.properties
 
-            self.logger.debug(
-                "Config dictionary =====> {0}".format(
-                    json.dumps(self.config)
-                )
+        self.introspect.debug(
+            "First image has following properties =====> \n{0}",
+            Dumps(dekad_properties)
+        )
+        self.logger.debug(
+            "bandNames info is =====> \n{0}".format(
+                probe.band_names
             )
+        )
 
-            assetid = self.config["assetid"]
-            asset_name = os.path.basename(assetid)
-
-            # annual_props for export
-            annual_props = self._setExportProperties(
-                self.year, asset_name, **dekad_properties
-            )
-            sum_component_annual_props = ee.Image.setMulti(
-                sum_component_annual_int, annual_props
-            )
-            properties = sum_component_annual_props.getInfo()
-            self.logger.debug(
-                "New properties are =====>\n{0}".format(
-                    json.dumps(properties)
-                )
-            )
-            pyramid_policy = json.dumps({"{0}".format(
-                properties["bands"][0]["id"]
-            ): "mode"})
-            self.logger.debug(
-                "PyramidingPolicy is =====>\n{0}".format(
-                    pyramid_policy
-                )
-            )
-            # check if the asset already exists and eventually delete it
-            if ee.data.getInfo(assetid):
-                try:
-                    ee.data.deleteAsset(assetid)
-                except EEException as eee:
-                    self.logger.debug(
-                        "Trying to delete an assetId {0} \
-which doesn't exist.".format(assetid)
-                    )
-                    raise
-            # launch the task and return taskid
-            try:
-                task = ee.batch.Export.image.toAsset(
-                    image=sum_component_annual_props,
-                    description=asset_name,
-                    assetId=assetid,
-                    crs=bands["crs"],
-                    dimensions="{0}x{1}".format(
-                        dimensions[0],
-                        dimensions[1]
-                    ),
-                    maxPixels=dimensions[0] * dimensions[1],
-                    crsTransform=str(bands["crs_transform"]),
-                    pyramidingPolicy=pyramid_policy
-                )
-                task.start()
-                self._tasks.update(
-                    {
-                        "{0}".format(assetid): {
-                            "taskid": task.id
-                        }
-                    }
-                )
-                return dict(
-                    tasks=self._tasks,
-                    outputs=self.outputs,
-                    errors=self.errors
-                )
-            except (EEException, AttributeError) as e:
-                self.logger.debug(
-                    "Task export definition has failed with =====>\
-\n{0}".format(e)
-                )
-                raise
+        asset_name = os.path.basename(assetid)
 
-        else:
-            # @TODO 36(dekad_days) should be a configuration from config file
-            err_mesg = "Collection has size {0} while it should be 36".format(
-                size
-            )
-            self.logger.error(err_mesg)
-            n_errkey = str(len(self.errors) + 1)
-            self.errors.update(
-                {"{0}".format(n_errkey): "{0}".format(err_mesg)}
-            )
-            return dict(
-                tasks={},
-                outputs=self.outputs,
-                errors=self.errors
+        # annual_props for export
+        annual_props = self.export_properties.build(
+            asset_name, **dekad_properties
+        )
+        sum_component_annual_props = ee.Image.setMulti(
+            sum_component_annual_int, annual_props
+        )
+        self.introspect.debug(
+            "New properties are =====>\n{0}",
+            Info(sum_component_annual_props)
+        )
+        spec = ExportSpec(
+            sum_component_annual_props, assetid, bands, probe.band_names[0]
+        )
+        self.logger.debug(
+            "PyramidingPolicy is =====>\n{0}".format(
+                spec.pyramid_policy
             )
+        )
+        return spec
 
     # @delayed
     def _inputColl(self, collection_id):
         self.logger.debug("collection_id is =====> {0}".format(collection_id))
         try:
-            gee_stac_obj = Stac(collection_id).parse()
-            return Input(stacobject=gee_stac_obj, reducers=[])
+            # parsed once per process, and across runs through the cache
+            return parse_input(collection_id, cache=self.cache)
         except EEException as eee:
             self.logger.error(
                 "Exception creating Marmee object {0}".format(
-                    gee_stac_obj.id
+                    collection_id
                 ),
                 exc_info=True
             )
@@ -366,54 +417,3 @@ which doesn't exist.".format(assetid)
             }
         except (KeyError, EEException) as (err, exc):
             raise
-
-    def _setExportProperties(self, year, asset, **properties):
-        try:
-            res_props = {}
-            self.logger.debug("Input properties are =====>\n{0}".format(
-                    json.dumps(properties)
-                )
-            )
-            for key,value in properties.items():
-                if key == "code":
-                    res_props[key] = asset
-                elif key == "time_extent":
-                    res_props[key] = "from {0}-01-01 to {0}-12-31".format(
-                        year
-                    )
-                elif key == "time_resolution":
-                    res_props[key] = "YEAR".format(
-                        str(self._days_in_year(year))
-                    )
-                elif key == "n_days_extent":
-                    res_props[key] = "{0}.0".format(
-                        str(self._days_in_year(year))
-                    )
-                elif key == "no_data_value":
-                    res_props[key] = "-9999"
-                elif key == "data_type":
-                    res_props[key] = "{0}bit Unsigned Integer".format(
-                        "32"
-                    )
-                elif key == "system:asset_size":
-                    pass
-                elif key == "system:time_start":
-                    res_props[key] = ee.Date.fromYMD(
-                        int(year),1,1
-                    ).millis().getInfo()
-                elif key == "system:time_end":
-                    res_props[key] = ee.Date.fromYMD(
-                        int(year),12,31
-                    ).millis().getInfo()
-                else:
-                    res_props[key] = properties[key]
-
-            return res_props
-        except KeyError as e:
-            raise
-        
-    def _days_in_year(self, y):
-        if pendulum.datetime(int(y), 1, 1).is_leap_year():
-            return 366
-        else:
-            return 365
@@ -1,21 +1,21 @@
 from marmee.marmee import Marmee
-from marmee.model.input import Input
 from marmee.model.filter import Filter
 from marmee.model.rule import Range, ExtentSchema, TemporalRule, Rule
-from marmee.utils.parser import Stac
 from ee import ImageCollection as EEImageCollection
 from ee import Image as EEImage
 from ee import Filter as EEFilter
 from ee import Date as EEDate, EEException
-from gee_pheno.gee_pheno import Phenology
 import ee
 import os
-import dask
 import json
 import daiquiri
 import datetime
-import pendulum
-from dask.delayed import delayed
+from utils.introspection import Introspector, Info, Dumps
+from utils.properties import ExportProperties
+from utils.stac import parse_input
+from utils.export import ExportSpec, ExportSubmitter
+from utils.metrics import metrics
+from utils.probe import Probe, fetch_all
 
 
 class GBWP(Marmee):
@@ -24,22 +24,25 @@ class GBWP(Marmee):
 
         logger = daiquiri.getLogger(__name__, subsystem="algorithms")
         self.logger = logger
+        self.introspect = Introspector(logger)
+        self.cache = kw.get("cache")
+        self.submitter = kw.get("submitter") or ExportSubmitter()
+        # sources and version recorded on the exported assets
+        self.lineage = kw.get("lineage")
         self._name = "GBWP"
 
         try:
             if "season" not in kw:
-                self.coll_aeti_y = EEImageCollection(
-                    kw["src_coll"].replace("AGBP", "AETI")
-                )
+                aeti_coll = kw["src_coll"].replace("AGBP", "AETI")
                 self.season = None
             else:
                 self.season = kw["season"]
-                self.coll_aeti_y = EEImageCollection(
-                    kw["src_coll"].replace("AGBP_S", "AETI_D")
-                )
+                aeti_coll = kw["src_coll"].replace("AGBP_S", "AETI_D")
                 self.coll_agbp_s = EEImageCollection(
                     kw["src_coll"]
                 )
+            self.coll_aeti_y = EEImageCollection(aeti_coll)
+            self.sources = [kw["src_coll"], aeti_coll]
             if "level" in kw:
                 self.level = kw["level"]
         except EEException as e:
@@ -83,16 +86,24 @@ class GBWP(Marmee):
         # temporal filter for input component
         try:
             self.year = kw["year"]
+            self.export_properties = ExportProperties(
+                self.year, multiplier=0.001, unit=u"kgDM/m\u00b3"
+            )
             self.config = dict(
                 export=kw["to_asset"],
                 intermediate=kw["intermediate_outputs"],
-                assetid=kw["dst_asset"],
+                assetid=kw.get("dst_asset"),
+                assetcoll=kw.get("dst_asset_coll"),
                 ndvalue=kw["nodatavalue"]
             )
             if self.season:
                 self.config.update(season=self.season)
             if self.level:
                 self.config.update(level=self.level)
+            # destination asset by area, when running several L3 areas
+            self.areas = kw.get("areas") or {}
+            # destination asset by season, when running both seasons
+            self.seasons = kw.get("seasons") or {}
             if self.level in ["L2", "L3"]:
                 try:
                     if kw["area_code"] and (not kw["area_code"] == "NA"):
@@ -135,11 +146,10 @@ class GBWP(Marmee):
                     inpt_dict["collection"] = EEImageCollection(
                         inpt.stacobject.id
                     )
-                    self.logger.debug(
-                        "ImageCollection info for {0} is =====>\n{1}".format(
-                            inpt.stacobject.id,
-                            inpt_dict["collection"].getInfo()
-                        )
+                    self.introspect.debug(
+                        "ImageCollection info for {0} is =====>\n{1}",
+                        inpt.stacobject.id,
+                        Info(inpt_dict["collection"])
                     )
                 except EEException as eee:
                     self.logger.error(
@@ -171,10 +181,8 @@ class GBWP(Marmee):
         """Calculate Annual GBWP image.
         """
 
-        self.logger.debug(
-            "Config dictionary =====> {0}".format(
-                json.dumps(self.config)
-            )
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
         )
 
         self._tasks = {}
@@ -209,123 +217,94 @@ class GBWP(Marmee):
             )
         )
 
-        # properties
-        size_agbp = collAGBPFiltered.size().getInfo()
-        size_aeti = collAETIFiltered.size().getInfo()
-        if size_agbp and size_aeti is 1:
-            first_aeti = EEImage(collAETIFiltered.first())
-            first_aeti_info = first_aeti.getInfo()
-            bands = first_aeti_info["bands"][0]
-            dimensions = (bands["dimensions"][0], bands["dimensions"][1],)
-            annual_properties = first_aeti_info["properties"]
+        first_aeti = EEImage(collAETIFiltered.first())
+        first_agbp = EEImage(collAGBPFiltered.first())
+        self.introspect.debug(
+            "first_agbp info is =====> \n{0}", Info(first_agbp)
+        )
 
-            self.logger.debug(
-                "First image T has following properties =====> \n{0}".format(
-                    json.dumps(annual_properties)
-                )
-            )
+        # no need to multiply AETI by 10 (to get metercubes)
+        # because we should also divide by 10 to apply multiplier
+        GBWP_annual = first_agbp.divide(first_aeti).multiply(1000)
+        self.introspect.debug(
+            "GBWP_annual info is =====> \n{0}", Info(GBWP_annual)
+        )
 
-            first_agbp = EEImage(collAGBPFiltered.first())
-            self.logger.debug(
-                "first_agbp info is =====> \n{0}".format(
-                    first_agbp.getInfo()
-                )
-            )
+        GBWP_annual_int = GBWP_annual.unmask(
+            -9999
+        ).int32()
 
-            # no need to multiply AETI by 10 (to get metercubes)
-            # because we should also divide by 10 to apply multiplier
-            GBWP_annual = first_agbp.divide(first_aeti).multiply(1000)
-            self.logger.debug(
-                "GBWP_annual info is =====> \n{0}".format(
-                    GBWP_annual.getInfo()
+        # properties of both collections in one round trip
+        probes = fetch_all(
+            dict(
+                agbp=Probe(collAGBPFiltered),
+                aeti=Probe(
+                    collAETIFiltered, image=GBWP_annual_int,
+                    requires=[collAGBPFiltered]
                 )
-            )
-
-            GBWP_annual_int = GBWP_annual.unmask(
-                -9999
-            ).int32()
+            ),
+            cache=self.cache,
+            site="GBWP.process_annual",
+            assets=self.sources,
+            parts=(self._name, self.year, self.config["ndvalue"])
+        )
+        size_agbp = probes["agbp"].size
+        size_aeti = probes["aeti"].size
+        if size_agbp and size_aeti == 1:
+            bands = probes["aeti"].bands
+            annual_properties = probes["aeti"].properties
 
-            bandNames = GBWP_annual_int.bandNames().getInfo()
+            self.introspect.debug(
+                "First image T has following properties =====> \n{0}",
+                Dumps(annual_properties)
+            )
             self.logger.debug(
                 "bandNames info is =====> \n{0}".format(
-                    bandNames
+                    probes["aeti"].band_names
                 )
             )
 
-            self.logger.debug(
-                "Config dictionary =====> {0}".format(
-                    json.dumps(self.config)
-                )
+            self.introspect.debug(
+                "Config dictionary =====> {0}", Dumps(self.config)
             )
 
             assetid = self.config["assetid"]
             asset_name = os.path.basename(assetid)
 
             # annual_props for export
-            annual_props = self._setExportProperties(
-                self.year, asset_name, **annual_properties
+            annual_props = self.export_properties.build(
+                asset_name, **annual_properties
             )
             GBWP_annual_props = ee.Image.setMulti(
                 GBWP_annual_int, annual_props
             )
-            properties = GBWP_annual_props.getInfo()
-            self.logger.debug(
-                "New properties are =====>\n{0}".format(
-                    json.dumps(properties)
-                )
+            self.introspect.debug(
+                "New properties are =====>\n{0}",
+                Info(GBWP_annual_props)
+            )
+            spec = ExportSpec(
+                GBWP_annual_props, assetid, bands, probes["aeti"].band_names[0]
             )
-            pyramid_policy = json.dumps({"{0}".format(
-                properties["bands"][0]["id"]
-            ): "mode"})
             self.logger.debug(
                 "PyramidingPolicy is =====>\n{0}".format(
-                    pyramid_policy
+                    spec.pyramid_policy
                 )
             )
-            # check if the asset already exists and eventually delete it
-            if ee.data.getInfo(assetid):
-                try:
-                    ee.data.deleteAsset(assetid)
-                except EEException as eee:
-                    self.logger.debug(
-                        "Trying to delete an assetId {0} \
-which doesn't exist.".format(assetid)
-                    )
-                    raise
             # launch the task and return taskid
-            try:
-                task = ee.batch.Export.image.toAsset(
-                    image=GBWP_annual_props,
-                    description=asset_name,
-                    assetId=assetid,
-                    crs=bands["crs"],
-                    dimensions="{0}x{1}".format(
-                        dimensions[0],
-                        dimensions[1]
-                    ),
-                    maxPixels=dimensions[0] * dimensions[1],
-                    crsTransform=str(bands["crs_transform"]),
-                    pyramidingPolicy=pyramid_policy
-                )
-                task.start()
-                self._tasks.update(
-                    {
-                        "{0}".format(assetid): {
-                            "taskid": task.id
-                        }
-                    }
-                )
-                return dict(
-                    tasks=self._tasks,
-                    outputs=self.outputs,
-                    errors=self.errors
-                )
-            except (EEException, AttributeError) as e:
-                self.logger.debug(
-                    "Task export definition has failed with =====>\
-\n{0}".format(e)
-                )
-                raise
+            tasks, errors = self.submitter.submit(
+                [spec], collection=self.config["assetcoll"],
+                lineage=self.lineage,
+                site="GBWP.process_annual"
+            )
+            self._tasks.update(tasks)
+            self.errors.update(errors)
+            self.introspect.report()
+            return dict(
+                tasks=self._tasks,
+                outputs=self.outputs,
+                errors=self.errors,
+                metrics=metrics.summary()
+            )
 
         else:
             err_mesg = "Collection AGBP has size {0} while it should be 1".format(
@@ -336,23 +315,213 @@ which doesn't exist.".format(assetid)
             self.errors.update(
                 {"{0}".format(n_errkey): "{0}".format(err_mesg)}
             )
+            self.introspect.report()
             return dict(
                 tasks={},
                 outputs=self.outputs,
-                errors=self.errors
+                errors=self.errors,
+                metrics=metrics.summary()
             )
 
     def process_seasonal(self):
         """Calculate Seasonal GBWP image.
         """
 
-        self.logger.debug(
-            "Config dictionary =====> {0}".format(
-                json.dumps(self.config)
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
+        )
+
+        self._tasks = {}
+        AETIColl_date = self._seasonal_aeti(self.area)
+        AGBPs_Im = self._seasonal_agbp(self.area, self.season)
+        GBWP_seasonal_int, phe_coll = self._seasonal_image(
+            AETIColl_date, AGBPs_Im, self.area, self.season
+        )
+
+        # properties and output band names in one round trip
+        probe = Probe(AGBPs_Im, image=GBWP_seasonal_int).fetch(
+            cache=self.cache,
+            site="GBWP.process_seasonal",
+            assets=self.sources + [phe_coll],
+            parts=(
+                self._name, self.year, self.season,
+                getattr(self, "area", None), self.config["ndvalue"]
+            )
+        )
+        spec = self._seasonal_spec(
+            probe, GBWP_seasonal_int, self.config["assetid"]
+        )
+        # launch the task and return taskid
+        tasks, errors = self.submitter.submit(
+            [spec], collection=self.config["assetcoll"],
+            lineage=self.lineage,
+            site="GBWP.process_seasonal"
+        )
+        self._tasks.update(tasks)
+        self.errors.update(errors)
+        self.introspect.report()
+        return dict(
+            tasks=self._tasks,
+            outputs=self.outputs,
+            errors=self.errors,
+            metrics=metrics.summary()
+        )
+
+    def process_seasonal_areas(self):
+        """Calculate Seasonal GBWP image of every L3 area.
+
+        AGBP and the AETI window are filtered once and partitioned by
+        area_code. The seasonal AGBP and AETI dekads of every area are
+        counted in the round trip fetching the properties of the area
+        images, then the exports of the complete areas are submitted
+        together.
+        """
+
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
+        )
+
+        self._tasks = {}
+        areas = sorted(self.areas)
+        AETIColl_date = self._seasonal_aeti(None)
+        AGBPs_Im = self._seasonal_agbp(None, self.season)
+
+        images = {}
+        phe_colls = set()
+        probes = dict(
+            AETI=Probe(AETIColl_date, histogram="area_code"),
+            AGBP=Probe(AGBPs_Im, histogram="area_code")
+        )
+        for area in areas:
+            farea = ee.Filter.eq('area_code', area)
+            AGBPs_area = AGBPs_Im.filter(farea)
+            AETI_area = AETIColl_date.filter(farea)
+            images[area], phe_coll = self._seasonal_image(
+                AETI_area, AGBPs_area, area, self.season
+            )
+            phe_colls.add(phe_coll)
+            probes[area] = Probe(
+                AGBPs_area, image=images[area], requires=[AETI_area]
+            )
+
+        # images by area, properties and band names in one round trip
+        probes = fetch_all(
+            probes,
+            cache=self.cache,
+            site="GBWP.process_seasonal_areas",
+            assets=self.sources + sorted(phe_colls),
+            parts=(
+                self._name, self.year, self.season, tuple(areas),
+                self.config["ndvalue"]
             )
         )
+        specs = []
+        for area in areas:
+            size_agbp = probes["AGBP"].histogram.get(area, 0)
+            size_aeti = probes["AETI"].histogram.get(area, 0)
+            if size_agbp == 1 and size_aeti > 0:
+                specs.append(self._seasonal_spec(
+                    probes[area], images[area], self.areas[area]
+                ))
+            else:
+                err_mesg = "Collections AGBP and AETI have size {0} and \
+{1} for area {2} while they should be 1 and greater than 0".format(
+                    size_agbp, size_aeti, area
+                )
+                self.logger.error(err_mesg)
+                n_errkey = str(len(self.errors) + 1)
+                self.errors.update(
+                    {"{0}".format(n_errkey): "{0}".format(err_mesg)}
+                )
+
+        # launch the tasks of every area together and return taskids
+        tasks, errors = self.submitter.submit(
+            specs, collection=self.config["assetcoll"],
+            lineage=self.lineage,
+            site="GBWP.process_seasonal_areas"
+        )
+        self._tasks.update(tasks)
+        self.errors.update(errors)
+        self.introspect.report()
+        return dict(
+            tasks=self._tasks,
+            outputs=self.outputs,
+            errors=self.errors,
+            metrics=metrics.summary()
+        )
+
+    def process_seasons(self):
+        """Calculate Seasonal GBWP image of every season in one pass.
+
+        The windowed AETI collection with its timestamp band is built once
+        and shared by the seasons, the AGBP image and properties of every
+        season are fetched in a single round trip and there is one export
+        per season.
+        """
+
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
+        )
 
         self._tasks = {}
+        seasons = sorted(self.seasons)
+        AETIColl_date = self._seasonal_aeti(self.area)
+
+        images = {}
+        phe_colls = set()
+        probes = {}
+        for season in seasons:
+            AGBPs_Im = self._seasonal_agbp(self.area, season)
+            images[season], phe_coll = self._seasonal_image(
+                AETIColl_date, AGBPs_Im, self.area, season
+            )
+            phe_colls.add(phe_coll)
+            probes[season] = Probe(AGBPs_Im, image=images[season])
+
+        # properties and output band names of every season in one round trip
+        probes = fetch_all(
+            probes,
+            cache=self.cache,
+            site="GBWP.process_seasons",
+            assets=self.sources + sorted(phe_colls),
+            parts=(
+                self._name, self.year, tuple(seasons),
+                getattr(self, "area", None), self.config["ndvalue"]
+            )
+        )
+        specs = []
+        for season in seasons:
+            size_agbp = probes[season].size
+            if size_agbp == 1:
+                specs.append(self._seasonal_spec(
+                    probes[season], images[season], self.seasons[season]
+                ))
+            else:
+                err_mesg = "Collection AGBP has size {0} for season {1} \
+while it should be 1".format(size_agbp, season)
+                self.logger.error(err_mesg)
+                n_errkey = str(len(self.errors) + 1)
+                self.errors.update(
+                    {"{0}".format(n_errkey): "{0}".format(err_mesg)}
+                )
+
+        # launch the tasks of every season together and return taskids
+        tasks, errors = self.submitter.submit(
+            specs, collection=self.config["assetcoll"],
+            lineage=self.lineage,
+            site="GBWP.process_seasons"
+        )
+        self._tasks.update(tasks)
+        self.errors.update(errors)
+        self.introspect.report()
+        return dict(
+            tasks=self._tasks,
+            outputs=self.outputs,
+            errors=self.errors,
+            metrics=metrics.summary()
+        )
+
+    def _seasonal_aeti(self, area):
         # Filtered collection
         self.logger.debug(
             "temporal_filter GEE object value is ======> {0}".format(
@@ -360,12 +529,6 @@ which doesn't exist.".format(assetid)
             )
         )
 
-        f = list()
-        if self.season:
-            f.append(ee.Filter.eq('season', float(self.season)))
-        if self.area:
-            f.append(ee.Filter.eq('area_code', self.area))
-
         # AETI collection
         start_time = str(json.loads(
             self.filter["temporal_filter"]['start'].serialize()
@@ -375,11 +538,12 @@ which doesn't exist.".format(assetid)
         )["arguments"]["value"])
         start_dt = datetime.datetime.strptime(start_time, '%Y-%m-%d')
         end_dt = datetime.datetime.strptime(end_time, '%Y-%m-%d')
-        if self.area:
-            self.coll_aeti_y = self.coll_aeti_y.filter(
-                [ee.Filter.eq('area_code', self.area)]
+        coll_aeti_y = self.coll_aeti_y
+        if area:
+            coll_aeti_y = coll_aeti_y.filter(
+                [ee.Filter.eq('area_code', area)]
             )
-        collAETIFiltered = self.coll_aeti_y.filterDate(
+        collAETIFiltered = coll_aeti_y.filterDate(
             ee.Date.fromYMD(start_dt.year - 1, start_dt.month, start_dt.day),
             ee.Date.fromYMD(end_dt.year + 1, end_dt.month, end_dt.day)
         ).sort('system:time_start', True)
@@ -396,10 +560,25 @@ which doesn't exist.".format(assetid)
             )
         )
 
+        # adds band with own date to AETI Collection
+        return collAETIFiltered.map(
+            lambda image, prop='system:time_start': image.addBands(
+                image.metadata(prop)
+            )
+        )
+
+    def _seasonal_agbp(self, area, season):
+        f = list()
+        if season:
+            f.append(ee.Filter.eq('season', float(season)))
+        if area:
+            f.append(ee.Filter.eq('area_code', area))
+
         # AGBP collection
+        coll_agbp_s = self.coll_agbp_s
         if f:
-            self.coll_agbp_s = self.coll_agbp_s.filter(f)
-        collAGBP = self.coll_agbp_s.sort(
+            coll_agbp_s = coll_agbp_s.filter(f)
+        collAGBP = coll_agbp_s.sort(
             'system:time_start', True
         )
         # nodatavalue -9999: consider only gte 0
@@ -419,37 +598,31 @@ which doesn't exist.".format(assetid)
             )
         )
         # same annual plus season, be careful of gee number type
-        AGBPs_Im = AGBPf.filterDate(
+        return AGBPf.filterDate(
             self.filter["temporal_filter"]['start'],
             self.filter["temporal_filter"]['end']
         )
+
+    def _seasonal_image(self, AETIColl_date, AGBPs_Im, area, season):
+        # phenology is only loaded by the seasonal runs
+        from gee_pheno.gee_pheno import Phenology
+
         # first element
         first_agbpsim = AGBPs_Im.first()
 
-        # properties
-        first_agbpsim_info = first_agbpsim.getInfo()
-        bands = first_agbpsim_info["bands"][0]
-        dimensions = (bands["dimensions"][0], bands["dimensions"][1],)
-        seasonal_properties = first_agbpsim_info["properties"]
-
         # Set an instance of phenology collection
         # TODO: handle collection ids for phenology from configuration
         if self.level and self.level == "L3":
-            phen = Phenology(
-                # static configuration from file
-                phe_coll="projects/fao-wapor/L3/L3_PHE_S",
-                year=self.year,
-                season=int(self.season),
-                area_code=self.area
-            )
+            phe_coll = "projects/fao-wapor/L3/L3_PHE_S"
         else:
-            phen = Phenology(
-                # static configuration from file
-                phe_coll="projects/fao-wapor/L2/L2_PHE_S",
-                year=self.year,
-                season=int(self.season),
-                area_code=self.area
-            )
+            phe_coll = "projects/fao-wapor/L2/L2_PHE_S"
+        phen = Phenology(
+            # static configuration from file
+            phe_coll=phe_coll,
+            year=self.year,
+            season=int(season),
+            area_code=area
+        )
         # get phes_s image
         phes_s = phen.PHEsos_img
         # get phes_e image
@@ -466,13 +639,6 @@ which doesn't exist.".format(assetid)
         # calculate lenght of season in days
         season_days = season_e.subtract(season_s).divide(86400000)
 
-        # adds band with own date to AETI Collection
-        AETIColl_date = collAETIFiltered.map(
-            lambda image, prop='system:time_start': image.addBands(
-                image.metadata(prop)
-            )
-        )
-
         # filter AETI between PHEs and PHEe dates
         AETI_season = AETIColl_date.map(
             lambda image, seas=season_s, seae=season_e: image.updateMask(
@@ -489,90 +655,41 @@ which doesn't exist.".format(assetid)
 
         # multiplier
         GBWP_seasonal = GBWPSeason.multiply(1000)
-        self.logger.debug(
-            "GBWP_seasonal info is =====> \n{0}".format(
-                GBWP_seasonal.getInfo()
-            )
+        self.introspect.debug(
+            "GBWP_seasonal info is =====> \n{0}", Info(GBWP_seasonal)
         )
 
         GBWP_seasonal_int = GBWP_seasonal.select("b1").unmask(
             -9999
         ).int32()
+        return GBWP_seasonal_int, phe_coll
 
-        self.logger.debug(
-            "Config dictionary =====> {0}".format(
-                json.dumps(self.config)
-            )
-        )
+    def _seasonal_spec(self, probe, GBWP_seasonal_int, assetid):
+        bands = probe.bands
+        seasonal_properties = probe.properties
 
-        assetid = self.config["assetid"]
         asset_name = os.path.basename(assetid)
 
         # seasonal_props for export
-        seasonal_props = self._setExportProperties(
-            self.year, asset_name, **seasonal_properties
+        seasonal_props = self.export_properties.build(
+            asset_name, **seasonal_properties
         )
         GBWP_seasonal_props = ee.Image.setMulti(
             GBWP_seasonal_int, seasonal_props
         )
-        properties = GBWP_seasonal_props.getInfo()
-        self.logger.debug(
-            "New properties are =====>\n{0}".format(
-                json.dumps(properties)
-            )
+        self.introspect.debug(
+            "New properties are =====>\n{0}",
+            Info(GBWP_seasonal_props)
+        )
+        spec = ExportSpec(
+            GBWP_seasonal_props, assetid, bands, probe.band_names[0]
         )
-        pyramid_policy = json.dumps({"{0}".format(
-            properties["bands"][0]["id"]
-        ): "mode"})
         self.logger.debug(
             "PyramidingPolicy is =====>\n{0}".format(
-                pyramid_policy
+                spec.pyramid_policy
             )
         )
-        # check if the asset already exists and eventually delete it
-        if ee.data.getInfo(assetid):
-            try:
-                ee.data.deleteAsset(assetid)
-            except EEException as eee:
-                self.logger.debug(
-                    "Trying to delete an assetId {0} \
-which doesn't exist.".format(assetid)
-                )
-                raise
-        # launch the task and return taskid
-        try:
-            task = ee.batch.Export.image.toAsset(
-                image=GBWP_seasonal_props,
-                description=asset_name,
-                assetId=assetid,
-                crs=bands["crs"],
-                dimensions="{0}x{1}".format(
-                    dimensions[0],
-                    dimensions[1]
-                ),
-                maxPixels=dimensions[0] * dimensions[1],
-                crsTransform=str(bands["crs_transform"]),
-                pyramidingPolicy=pyramid_policy
-            )
-            task.start()
-            self._tasks.update(
-                {
-                    "{0}".format(assetid): {
-                        "taskid": task.id
-                    }
-                }
-            )
-            return dict(
-                tasks=self._tasks,
-                outputs=self.outputs,
-                errors=self.errors
-            )
-        except (EEException, AttributeError) as e:
-            self.logger.debug(
-                "Task export definition has failed with =====>\
-\n{0}".format(e)
-            )
-            raise
+        return spec
 
 #         else:
 #             err_mesg = "Collection AGBP has size {0} while it should be 1".format(
@@ -593,12 +710,12 @@ which doesn't exist.".format(assetid)
     def _inputColl(self, collection_id):
         self.logger.debug("collection_id is =====> {0}".format(collection_id))
         try:
-            gee_stac_obj = Stac(collection_id).parse()
-            return Input(stacobject=gee_stac_obj, reducers=[])
+            # parsed once per process, and across runs through the cache
+            return parse_input(collection_id, cache=self.cache)
         except EEException as eee:
             self.logger.error(
                 "Exception creating Marmee object {0}".format(
-                    gee_stac_obj.id
+                    collection_id
                 ),
                 exc_info=True
             )
@@ -631,58 +748,3 @@ which doesn't exist.".format(assetid)
             }
         except (KeyError, EEException) as (err, exc):
             raise
-
-    def _setExportProperties(self, year, asset, **properties):
-        try:
-            res_props = {}
-            self.logger.debug("Input properties are =====>\n{0}".format(
-                json.dumps(properties)
-            )
-            )
-            for key, value in properties.items():
-                if key == "code":
-                    res_props[key] = asset
-                elif key == "time_extent":
-                    res_props[key] = "from {0}-01-01 to {0}-12-31".format(
-                        year
-                    )
-                elif key == "time_resolution":
-                    res_props[key] = "YEAR".format(
-                        str(self._days_in_year(year))
-                    )
-                elif key == "n_days_extent":
-                    res_props[key] = "{0}.0".format(
-                        str(self._days_in_year(year))
-                    )
-                elif key == "multiplier":
-                    res_props[key] = 0.001
-                elif key == "no_data_value":
-                    res_props[key] = "-9999"
-                elif key == "data_type":
-                    res_props[key] = "{0}bit Unsigned Integer".format(
-                        "32"
-                    )
-                elif key == "unit":
-                    res_props[key] = "kgDM/" + u"m\u00b3"
-                elif key == "system:asset_size":
-                    pass
-                elif key == "system:time_start":
-                    res_props[key] = ee.Date.fromYMD(
-                        int(year), 1, 1
-                    ).millis().getInfo()
-                elif key == "system:time_end":
-                    res_props[key] = ee.Date.fromYMD(
-                        int(year), 12, 31
-                    ).millis().getInfo()
-                else:
-                    res_props[key] = properties[key]
-
-            return res_props
-        except KeyError as e:
-            raise
-
-    def _days_in_year(self, y):
-        if pendulum.datetime(int(y), 1, 1).is_leap_year():
-            return 366
-        else:
-            return 365
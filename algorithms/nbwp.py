@@ -1,21 +1,21 @@
 from marmee.marmee import Marmee
-from marmee.model.input import Input
 from marmee.model.filter import Filter
 from marmee.model.rule import Range, ExtentSchema, TemporalRule, Rule
-from marmee.utils.parser import Stac
 from ee import ImageCollection as EEImageCollection
 from ee import Image as EEImage
 from ee import Filter as EEFilter
 from ee import Date as EEDate, EEException
-from gee_pheno.gee_pheno import Phenology
 import ee
 import os
-import dask
 import json
 import daiquiri
 import datetime
-import pendulum
-from dask.delayed import delayed
+from utils.introspection import Introspector, Info, Dumps
+from utils.properties import ExportProperties
+from utils.stac import parse_input
+from utils.export import ExportSpec, ExportSubmitter
+from utils.metrics import metrics
+from utils.probe import Probe, fetch_all
 
 
 class NBWP(Marmee):
@@ -24,21 +24,25 @@ class NBWP(Marmee):
 
         logger = daiquiri.getLogger(__name__, subsystem="algorithms")
         self.logger = logger
+        self.introspect = Introspector(logger)
+        self.cache = kw.get("cache")
+        self.submitter = kw.get("submitter") or ExportSubmitter()
+        # sources and version recorded on the exported assets
+        self.lineage = kw.get("lineage")
         self._name = "NBWP"
 
         try:
-            if not kw.has_key("season"):
-                self.coll_t_y = EEImageCollection(
-                    kw["src_coll"].replace("AGBP", "T")
-                )
+            if "season" not in kw:
+                t_coll = kw["src_coll"].replace("AGBP", "T")
+                self.season = None
             else:
                 self.season = kw["season"]
-                self.coll_t_y = EEImageCollection(
-                    kw["src_coll"].replace("AGBP_S", "T_D")
-                )
+                t_coll = kw["src_coll"].replace("AGBP_S", "T_D")
                 self.coll_agbp_s = EEImageCollection(
                     kw["src_coll"]
                 )
+            self.coll_t_y = EEImageCollection(t_coll)
+            self.sources = [kw["src_coll"], t_coll]
         except EEException as e:
             self.logger.error(
                 "Failed to handle Google Earth Engine object",
@@ -81,14 +85,20 @@ class NBWP(Marmee):
         # temporal filter for input component
         try:
             self.year = kw["year"]
+            self.export_properties = ExportProperties(
+                self.year, multiplier=0.001, unit=u"kgDM/m\u00b3"
+            )
             self.config = dict(
                 export=kw["to_asset"],
                 intermediate=kw["intermediate_outputs"],
-                assetid=kw["dst_asset"],
+                assetid=kw.get("dst_asset"),
+                assetcoll=kw.get("dst_asset_coll"),
                 ndvalue=kw["nodatavalue"]
             )
             if self.season:
                 self.config.update(season=self.season)
+            # destination asset by season, when running both seasons
+            self.seasons = kw.get("seasons") or {}
         except KeyError as exc:
             self.logger.error("Error with dictionary key", exc_info=True)
             raise
@@ -122,11 +132,10 @@ class NBWP(Marmee):
                     inpt_dict["collection"] = EEImageCollection(
                         inpt.stacobject.id
                     )
-                    self.logger.debug(
-                        "ImageCollection info for {0} is =====>\n{1}".format(
-                            inpt.stacobject.id,
-                            inpt_dict["collection"].getInfo()
-                        )
+                    self.introspect.debug(
+                        "ImageCollection info for {0} is =====>\n{1}",
+                        inpt.stacobject.id,
+                        Info(inpt_dict["collection"])
                     )
                 except EEException as eee:
                     self.logger.error(
@@ -158,10 +167,8 @@ class NBWP(Marmee):
         """Calculate Annual NBWP image.
         """
 
-        self.logger.debug(
-            "Config dictionary =====> {0}".format(
-                json.dumps(self.config)
-            )
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
         )
 
         self._tasks = {}
@@ -196,123 +203,94 @@ class NBWP(Marmee):
             )
         )
 
-        # properties
-        size_agbp = collAGBPFiltered.size().getInfo()
-        size_t = collTFiltered.size().getInfo()
-        if size_agbp and size_t is 1:
-            first_t = EEImage(collTFiltered.first())
-            first_t_info = first_t.getInfo()
-            bands = first_t_info["bands"][0]
-            dimensions = (bands["dimensions"][0], bands["dimensions"][1],)
-            annual_properties = first_t_info["properties"]
+        first_t = EEImage(collTFiltered.first())
+        first_agbp = EEImage(collAGBPFiltered.first())
+        self.introspect.debug(
+            "first_agbp info is =====> \n{0}", Info(first_agbp)
+        )
 
-            self.logger.debug(
-                "First image T has following properties =====> \n{0}".format(
-                    json.dumps(annual_properties)
-                )
-            )
+        # no need to multiply T by 10 (to get metercubes)
+        # because we should also divide by 10 to apply multiplier
+        WPnb_annual = first_agbp.divide(first_t).multiply(1000)
+        self.introspect.debug(
+            "WPnb_annual info is =====> \n{0}", Info(WPnb_annual)
+        )
 
-            first_agbp = EEImage(collAGBPFiltered.first())
-            self.logger.debug(
-                "first_agbp info is =====> \n{0}".format(
-                    first_agbp.getInfo()
-                )
-            )
+        WPnb_annual_int = WPnb_annual.unmask(
+            -9999
+        ).int32()
 
-            # no need to multiply T by 10 (to get metercubes)
-            # because we should also divide by 10 to apply multiplier
-            WPnb_annual = first_agbp.divide(first_t).multiply(1000)
-            self.logger.debug(
-                "WPnb_annual info is =====> \n{0}".format(
-                    WPnb_annual.getInfo()
+        # properties of both collections in one round trip
+        probes = fetch_all(
+            dict(
+                agbp=Probe(collAGBPFiltered),
+                t=Probe(
+                    collTFiltered, image=WPnb_annual_int,
+                    requires=[collAGBPFiltered]
                 )
-            )
-
-            WPnb_annual_int = WPnb_annual.unmask(
-                -9999
-            ).int32()
+            ),
+            cache=self.cache,
+            site="NBWP.process_annual",
+            assets=self.sources,
+            parts=(self._name, self.year, self.config["ndvalue"])
+        )
+        size_agbp = probes["agbp"].size
+        size_t = probes["t"].size
+        if size_agbp and size_t == 1:
+            bands = probes["t"].bands
+            annual_properties = probes["t"].properties
 
-            bandNames = WPnb_annual_int.bandNames().getInfo()
+            self.introspect.debug(
+                "First image T has following properties =====> \n{0}",
+                Dumps(annual_properties)
+            )
             self.logger.debug(
                 "bandNames info is =====> \n{0}".format(
-                    bandNames
+                    probes["t"].band_names
                 )
             )
 
-            self.logger.debug(
-                "Config dictionary =====> {0}".format(
-                    json.dumps(self.config)
-                )
+            self.introspect.debug(
+                "Config dictionary =====> {0}", Dumps(self.config)
             )
 
             assetid = self.config["assetid"]
             asset_name = os.path.basename(assetid)
 
             # annual_props for export
-            annual_props = self._setExportProperties(
-                self.year, asset_name, **annual_properties
+            annual_props = self.export_properties.build(
+                asset_name, **annual_properties
             )
             WPnb_annual_props = ee.Image.setMulti(
                 WPnb_annual_int, annual_props
             )
-            properties = WPnb_annual_props.getInfo()
-            self.logger.debug(
-                "New properties are =====>\n{0}".format(
-                    json.dumps(properties)
-                )
+            self.introspect.debug(
+                "New properties are =====>\n{0}",
+                Info(WPnb_annual_props)
+            )
+            spec = ExportSpec(
+                WPnb_annual_props, assetid, bands, probes["t"].band_names[0]
             )
-            pyramid_policy = json.dumps({"{0}".format(
-                properties["bands"][0]["id"]
-            ): "mode"})
             self.logger.debug(
                 "PyramidingPolicy is =====>\n{0}".format(
-                    pyramid_policy
+                    spec.pyramid_policy
                 )
             )
-            # check if the asset already exists and eventually delete it
-            if ee.data.getInfo(assetid):
-                try:
-                    ee.data.deleteAsset(assetid)
-                except EEException as eee:
-                    self.logger.debug(
-                        "Trying to delete an assetId {0} \
-which doesn't exist.".format(assetid)
-                    )
-                    raise
             # launch the task and return taskid
-            try:
-                task = ee.batch.Export.image.toAsset(
-                    image=WPnb_annual_props,
-                    description=asset_name,
-                    assetId=assetid,
-                    crs=bands["crs"],
-                    dimensions="{0}x{1}".format(
-                        dimensions[0],
-                        dimensions[1]
-                    ),
-                    maxPixels=dimensions[0] * dimensions[1],
-                    crsTransform=str(bands["crs_transform"]),
-                    pyramidingPolicy=pyramid_policy
-                )
-                task.start()
-                self._tasks.update(
-                    {
-                        "{0}".format(assetid): {
-                            "taskid": task.id
-                        }
-                    }
-                )
-                return dict(
-                    tasks=self._tasks,
-                    outputs=self.outputs,
-                    errors=self.errors
-                )
-            except (EEException, AttributeError) as e:
-                self.logger.debug(
-                    "Task export definition has failed with =====>\
-\n{0}".format(e)
-                )
-                raise
+            tasks, errors = self.submitter.submit(
+                [spec], collection=self.config["assetcoll"],
+                lineage=self.lineage,
+                site="NBWP.process_annual"
+            )
+            self._tasks.update(tasks)
+            self.errors.update(errors)
+            self.introspect.report()
+            return dict(
+                tasks=self._tasks,
+                outputs=self.outputs,
+                errors=self.errors,
+                metrics=metrics.summary()
+            )
 
         else:
             err_mesg = "Collection AGBP has size {0} while it should be 1".format(
@@ -323,29 +301,148 @@ which doesn't exist.".format(assetid)
             self.errors.update(
                 {"{0}".format(n_errkey): "{0}".format(err_mesg)}
             )
+            self.introspect.report()
             return dict(
                 tasks={},
                 outputs=self.outputs,
-                errors=self.errors
+                errors=self.errors,
+                metrics=metrics.summary()
             )
 
     def process_seasonal(self):
         """Calculate Seasonal NBWP image.
         """
 
-        self.logger.debug(
-            "Config dictionary =====> {0}".format(
-                json.dumps(self.config)
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
+        )
+
+        self._tasks = {}
+        TColl_date = self._seasonal_t()
+        AGBPs_Im = self._seasonal_agbp(self.season)
+        NBWP_seasonal_int, phe_coll = self._seasonal_image(
+            TColl_date, AGBPs_Im, self.season
+        )
+
+        # properties and output band names in one round trip
+        probe = Probe(AGBPs_Im, image=NBWP_seasonal_int).fetch(
+            cache=self.cache,
+            site="NBWP.process_seasonal",
+            assets=self.sources + [phe_coll],
+            parts=(
+                self._name, self.year, self.season,
+                getattr(self, "area", None), self.config["ndvalue"]
             )
         )
+        spec = self._seasonal_spec(
+            probe, NBWP_seasonal_int, self.config["assetid"]
+        )
+        # launch the task and return taskid
+        tasks, errors = self.submitter.submit(
+            [spec], collection=self.config["assetcoll"],
+            lineage=self.lineage,
+            site="NBWP.process_seasonal"
+        )
+        self._tasks.update(tasks)
+        self.errors.update(errors)
+        self.introspect.report()
+        return dict(
+            tasks=self._tasks,
+            outputs=self.outputs,
+            errors=self.errors,
+            metrics=metrics.summary()
+        )
+
+    def process_seasons(self):
+        """Calculate Seasonal NBWP image of every season in one pass.
+
+        The T collection with its timestamp band is built once and shared
+        by the seasons, the AGBP image and properties of every season are
+        fetched in a single round trip and there is one export per season.
+        """
+
+        self.introspect.debug(
+            "Config dictionary =====> {0}", Dumps(self.config)
+        )
 
         self._tasks = {}
+        seasons = sorted(self.seasons)
+        TColl_date = self._seasonal_t()
+
+        images = {}
+        phe_colls = set()
+        probes = {}
+        for season in seasons:
+            AGBPs_Im = self._seasonal_agbp(season)
+            images[season], phe_coll = self._seasonal_image(
+                TColl_date, AGBPs_Im, season
+            )
+            phe_colls.add(phe_coll)
+            probes[season] = Probe(AGBPs_Im, image=images[season])
+
+        # properties and output band names of every season in one round trip
+        probes = fetch_all(
+            probes,
+            cache=self.cache,
+            site="NBWP.process_seasons",
+            assets=self.sources + sorted(phe_colls),
+            parts=(
+                self._name, self.year, tuple(seasons),
+                getattr(self, "area", None), self.config["ndvalue"]
+            )
+        )
+        specs = []
+        for season in seasons:
+            size_agbp = probes[season].size
+            if size_agbp == 1:
+                specs.append(self._seasonal_spec(
+                    probes[season], images[season], self.seasons[season]
+                ))
+            else:
+                err_mesg = "Collection AGBP has size {0} for season {1} \
+while it should be 1".format(size_agbp, season)
+                self.logger.error(err_mesg)
+                n_errkey = str(len(self.errors) + 1)
+                self.errors.update(
+                    {"{0}".format(n_errkey): "{0}".format(err_mesg)}
+                )
+
+        # launch the tasks of every season together and return taskids
+        tasks, errors = self.submitter.submit(
+            specs, collection=self.config["assetcoll"],
+            lineage=self.lineage,
+            site="NBWP.process_seasons"
+        )
+        self._tasks.update(tasks)
+        self.errors.update(errors)
+        self.introspect.report()
+        return dict(
+            tasks=self._tasks,
+            outputs=self.outputs,
+            errors=self.errors,
+            metrics=metrics.summary()
+        )
+
+    def _seasonal_t(self):
         # Filtered collection
         self.logger.debug(
             "temporal_filter GEE object value is ======> {0}".format(
                 self.filter["temporal_filter"]
             )
         )
+        collTFiltered = self.coll_t_y.filterDate(
+            self.filter["temporal_filter"]['start'],
+            self.filter["temporal_filter"]['end']
+        ).sort('system:time_start', True)
+
+        # adds band with own date to T Collection
+        return collTFiltered.map(
+            lambda image: image.addBands(
+                image.metadata('system:time_start')
+            )
+        )
+
+    def _seasonal_agbp(self, season):
         # AGBP collection
         collAGBP = self.coll["collection"].sort(
             'system:time_start', True
@@ -360,11 +457,6 @@ which doesn't exist.".format(assetid)
         else:
             pass
 
-        collTFiltered = self.coll_t_y.filterDate(
-            self.filter["temporal_filter"]['start'],
-            self.filter["temporal_filter"]['end']
-        ).sort('system:time_start', True)
-
         # lambda to filter: pixel >=0 over the AGBP collection
         AGBPf = collAGBP.map(
             lambda image: image.updateMask(
@@ -372,27 +464,27 @@ which doesn't exist.".format(assetid)
             )
         )
         # same annual plus season, be careful of gee number type
-        AGBPs_Im = AGBPf.filter(
-            EEFilter.eq('season', float(self.season))
+        return AGBPf.filter(
+            EEFilter.eq('season', float(season))
         ).filterDate(
             self.filter["temporal_filter"]['start'],
             self.filter["temporal_filter"]['end']
         )
+
+    def _seasonal_image(self, TColl_date, AGBPs_Im, season):
+        # phenology is only loaded by the seasonal runs
+        from gee_pheno.gee_pheno import Phenology
+
         # first element
         first_agbpsim = AGBPs_Im.first()
 
-        # properties
-        first_agbpsim_info = first_agbpsim.getInfo()
-        bands = first_agbpsim_info["bands"][0]
-        dimensions = (bands["dimensions"][0], bands["dimensions"][1],)
-        seasonal_properties = first_agbpsim_info["properties"]
-
         # Set an instance of phenology collection
+        phe_coll = "projects/fao-wapor/L2/L2_PHE_S"
         phen = Phenology(
             # static configuration from file
-            phe_coll="projects/fao-wapor/L2/L2_PHE_S",
+            phe_coll=phe_coll,
             year=self.year,
-            season=int(self.season)
+            season=int(season)
         )
         # get phes_s image
         phes_s = phen.PHEsos_img
@@ -410,13 +502,6 @@ which doesn't exist.".format(assetid)
         # calculate lenght of season in days
         season_days = season_e.subtract(season_s).divide(86400000)
 
-        # adds band with own date to T Collection
-        TColl_date = collTFiltered.map(
-            lambda image: image.addBands(
-                image.metadata('system:time_start')
-            )
-        )
-
         # filter T between PHEs and PHEe dates
         T_season = TColl_date.map(
             lambda image, seas=season_s, seae=season_e: image.updateMask(
@@ -433,90 +518,41 @@ which doesn't exist.".format(assetid)
 
         # multiplier
         NBWP_seasonal = NBWPSeason.multiply(1000)
-        self.logger.debug(
-            "NBWP_seasonal info is =====> \n{0}".format(
-                NBWP_seasonal.getInfo()
-            )
+        self.introspect.debug(
+            "NBWP_seasonal info is =====> \n{0}", Info(NBWP_seasonal)
         )
 
         NBWP_seasonal_int = NBWP_seasonal.select("b1").unmask(
             -9999
         ).int32()
+        return NBWP_seasonal_int, phe_coll
 
-        self.logger.debug(
-            "Config dictionary =====> {0}".format(
-                json.dumps(self.config)
-            )
-        )
+    def _seasonal_spec(self, probe, NBWP_seasonal_int, assetid):
+        bands = probe.bands
+        seasonal_properties = probe.properties
 
-        assetid = self.config["assetid"]
         asset_name = os.path.basename(assetid)
 
         # seasonal_props for export
-        seasonal_props = self._setExportProperties(
-            self.year, asset_name, **seasonal_properties
+        seasonal_props = self.export_properties.build(
+            asset_name, **seasonal_properties
         )
         NBWP_seasonal_props = ee.Image.setMulti(
             NBWP_seasonal_int, seasonal_props
         )
-        properties = NBWP_seasonal_props.getInfo()
-        self.logger.debug(
-            "New properties are =====>\n{0}".format(
-                json.dumps(properties)
-            )
+        self.introspect.debug(
+            "New properties are =====>\n{0}",
+            Info(NBWP_seasonal_props)
+        )
+        spec = ExportSpec(
+            NBWP_seasonal_props, assetid, bands, probe.band_names[0]
         )
-        pyramid_policy = json.dumps({"{0}".format(
-            properties["bands"][0]["id"]
-        ): "mode"})
         self.logger.debug(
             "PyramidingPolicy is =====>\n{0}".format(
-                pyramid_policy
+                spec.pyramid_policy
             )
         )
-        # check if the asset already exists and eventually delete it
-        if ee.data.getInfo(assetid):
-            try:
-                ee.data.deleteAsset(assetid)
-            except EEException as eee:
-                self.logger.debug(
-                    "Trying to delete an assetId {0} \
-which doesn't exist.".format(assetid)
-                )
-                raise
-        # launch the task and return taskid
-        try:
-            task = ee.batch.Export.image.toAsset(
-                image=NBWP_seasonal_props,
-                description=asset_name,
-                assetId=assetid,
-                crs=bands["crs"],
-                dimensions="{0}x{1}".format(
-                    dimensions[0],
-                    dimensions[1]
-                ),
-                maxPixels=dimensions[0] * dimensions[1],
-                crsTransform=str(bands["crs_transform"]),
-                pyramidingPolicy=pyramid_policy
-            )
-            task.start()
-            self._tasks.update(
-                {
-                    "{0}".format(assetid): {
-                        "taskid": task.id
-                    }
-                }
-            )
-            return dict(
-                tasks=self._tasks,
-                outputs=self.outputs,
-                errors=self.errors
-            )
-        except (EEException, AttributeError) as e:
-            self.logger.debug(
-                "Task export definition has failed with =====>\
-\n{0}".format(e)
-            )
-            raise
+        return spec
 
 #         else:
 #             err_mesg = "Collection AGBP has size {0} while it should be 1".format(
@@ -537,12 +573,12 @@ which doesn't exist.".format(assetid)
     def _inputColl(self, collection_id):
         self.logger.debug("collection_id is =====> {0}".format(collection_id))
         try:
-            gee_stac_obj = Stac(collection_id).parse()
-            return Input(stacobject=gee_stac_obj, reducers=[])
+            # parsed once per process, and across runs through the cache
+            return parse_input(collection_id, cache=self.cache)
         except EEException as eee:
             self.logger.error(
                 "Exception creating Marmee object {0}".format(
-                    gee_stac_obj.id
+                    collection_id
                 ),
                 exc_info=True
             )
@@ -575,58 +611,3 @@ which doesn't exist.".format(assetid)
             }
         except (KeyError, EEException) as (err, exc):
             raise
-
-    def _setExportProperties(self, year, asset, **properties):
-        try:
-            res_props = {}
-            self.logger.debug("Input properties are =====>\n{0}".format(
-                json.dumps(properties)
-            )
-            )
-            for key, value in properties.items():
-                if key == "code":
-                    res_props[key] = asset
-                elif key == "time_extent":
-                    res_props[key] = "from {0}-01-01 to {0}-12-31".format(
-                        year
-                    )
-                elif key == "time_resolution":
-                    res_props[key] = "YEAR".format(
-                        str(self._days_in_year(year))
-                    )
-                elif key == "n_days_extent":
-                    res_props[key] = "{0}.0".format(
-                        str(self._days_in_year(year))
-                    )
-                elif key == "multiplier":
-                    res_props[key] = 0.001
-                elif key == "no_data_value":
-                    res_props[key] = "-9999"
-                elif key == "data_type":
-                    res_props[key] = "{0}bit Unsigned Integer".format(
-                        "32"
-                    )
-                elif key == "unit":
-                    res_props[key] = "kgDM/" + u"m\u00b3"
-                elif key == "system:asset_size":
-                    pass
-                elif key == "system:time_start":
-                    res_props[key] = ee.Date.fromYMD(
-                        int(year), 1, 1
-                    ).millis().getInfo()
-                elif key == "system:time_end":
-                    res_props[key] = ee.Date.fromYMD(
-                        int(year), 12, 31
-                    ).millis().getInfo()
-                else:
-                    res_props[key] = properties[key]
-
-            return res_props
-        except KeyError as e:
-            raise
-
-    def _days_in_year(self, y):
-        if pendulum.datetime(int(y), 1, 1).is_leap_year():
-            return 366
-        else:
-            return 365
@@ -1,90 +1,29 @@
-from click_configfile import ConfigFileReader, Param, SectionSchema
-from click_configfile import matches_section
+from __future__ import absolute_import
 from click import BOOL
 import click
 import os
 import json
 import daiquiri
-import oauth2client
-from ee import EEException, Initialize, ServiceAccountCredentials
-from ee.oauth import CLIENT_ID, CLIENT_SECRET
+import shlex
 from utils.logging import Log
-from utils.helpers import (
-    CommonName, AETIName,
-    AGBPName, NBWPName, GBWPName,
-    TIME_RESOLUTION as tr
+from utils.cache import MetadataCache, DEFAULT_DIRECTORY
+from utils.export import ExportSpec, ExportSubmitter, DEFAULT_WORKERS
+from utils.admission import (
+    AdmissionController, QueueStore, parse_priorities, DEFAULT_QUEUE_FILE
+)
+from utils.engine import Engine
+from utils.checkpoint import Checkpoint, DEFAULT_CHECKPOINT_FILE
+from utils.jobqueue import JobQueue, Worker, DEFAULT_DATABASE, STATES
+from utils.tasks import TaskWatcher, EETaskService, parse_tasks
+from utils.metrics import metrics
+from utils.retry import (
+    RetryPolicy, Budget, DEFAULT_RATE, DEFAULT_BATCH_RATE, DEFAULT_RETRIES
+)
+from utils.batch import Batch, load_manifest, expand
+from utils.jobs import (
+    common_job, aeti_job, agbp_job, nbwp_job, gbwp_job,
+    run_all, by_year, parse_years, YEARS, AREAS
 )
-
-
-class ConfigSectionSchema(object):
-    """ Describes all config sections of this configuration file.
-
-        Example:
-        # -- FILE: config.cfg
-        [wapor]
-        gee_workspace_base = projects
-        gee_workspace_project = fao_wapor
-        [google.fusiontables]
-        scope = https://www.googleapis.com/auth/fusiontables
-        [google.earthengine]
-        scope = https://www.googleapis.com/auth/earthengine
-
-    """
-
-    @matches_section("wapor")
-    class Wapor(SectionSchema):
-        gee_workspace_base = Param(type=str)
-        gee_workspace_project = Param(type=str)
-
-    @matches_section("google.*")
-    class Google(SectionSchema):
-        scope = Param(type=str)
-
-
-class ConfigFileProcessor(ConfigFileReader):
-    # @TODO customise filename and searchpath from command option
-    config_files = ["config.ini", "config.cfg"]
-    config_searchpath = [".", os.path.expanduser("~/.wapor")]
-    config_section_schemas = [
-        ConfigSectionSchema.Wapor,     # PRIMARY SCHEMA
-        ConfigSectionSchema.Google,
-    ]
-
-
-class CredentialConfigFile(dict):
-    def __init__(self, credential_file):
-        self.credential_file = credential_file
-
-    def load(self):
-        """load a JSON Service Account file from disk"""
-        with open(self.credential_file) as cf:
-            try:
-                return json.loads(
-                    cf.read()
-                )
-            except Exception as e:
-                raise click.Abort()
-
-    def get_sa_credentials(self, scopes):
-        """Authenticate with a Service account.
-        """
-        try:
-            account = self.load()["client_email"]
-            return ServiceAccountCredentials(
-                account,
-                self.credential_file,
-                scopes
-            )
-        except EEException as eee:
-            logger.debug(
-                "Error with GEE authentication ======> {0}".format(
-                    eee.message
-                )
-            )
-            raise click.Abort()
-        except KeyError as e:
-            logger.debug("Service account file doesn't have the key 'client_email'!")
-            raise click.Abort()
 
 
 class CredentialFile(click.ParamType):
@@ -107,11 +46,60 @@ class Level(click.ParamType):
             )
 
 
+class YearRange(click.ParamType):
+    name = 'year'
+
+    def convert(self, value, param, ctx):
+        try:
+            years = parse_years(value.split(","))
+        except ValueError:
+            years = None
+        if years and not [year for year in years if year not in YEARS]:
+            return years
+        self.fail(
+            "Year must be between {0} and {1}, as one year, a range like \
+2009-2019 or a comma separated list".format(YEARS[0], YEARS[-1])
+        )
+
+
+class Areas(click.ParamType):
+    name = 'areas'
+
+    def convert(self, value, param, ctx):
+        if value == "all":
+            return list(AREAS)
+        areas = [area.strip() for area in value.split(",") if area.strip()]
+        if areas and not [area for area in areas if area not in AREAS]:
+            return sorted(set(areas))
+        self.fail(
+            "Areas must be all or a comma separated list of {0}".format(
+                ", ".join(AREAS)
+            )
+        )
+
+
+def check_areas(ctx, areas, area_code):
+    """Areas of a multi-area run, which is allowed at L3 only.
+    """
+    if not areas:
+        return None
+    if ctx.obj["level"] != "L3":
+        raise click.BadParameter("Many areas are allowed for L3 only")
+    if area_code and not area_code == "NA":
+        raise click.BadParameter(
+            "AREA_CODE must be NA or missing with --areas"
+        )
+    return areas
+
+
 class ApiKey(click.ParamType):
     name = 'api-key'
 
     def convert(self, value, param, ctx):
         if value:
+            import oauth2client.client
+            from ee import EEException
+            from ee.oauth import CLIENT_ID, CLIENT_SECRET
             try:
                 creds = oauth2client.client.OAuth2Credentials(
                     None, CLIENT_ID, CLIENT_SECRET,
@@ -147,9 +135,58 @@ class Logging(click.ParamType):
             )
 
 
-CONTEXT_SETTINGS = dict(default_map=ConfigFileProcessor.read_config())
+# the configuration files are read once a command runs, see read_config
+CONTEXT_SETTINGS = dict(default_map=None)
 
-@click.group()
+
+def read_config():
+    """Settings of the configuration files, read once per process.
+    """
+    if CONTEXT_SETTINGS['default_map'] is None:
+        from cli.config import ConfigFileProcessor
+        CONTEXT_SETTINGS['default_map'] = ConfigFileProcessor.read_config()
+    return CONTEXT_SETTINGS['default_map']
+
+
+def unparsed_args(ctx):
+    """Command line left to the command of a group, its name first.
+    """
+    # click 8.2 deprecates protected_args and keeps them private
+    protected = getattr(ctx, "_protected_args", None)
+    if protected is None:
+        protected = ctx.protected_args
+    return list(protected) + list(ctx.args)
+
+
+def check_arguments(group, ctx, args):
+    """Parse the command line of a group command without running it.
+
+    Help is printed and wrong arguments are reported from here, down to
+    the last command of nested groups.
+    """
+    cmd_name, cmd, args = group.resolve_command(ctx, list(args))
+    with cmd.make_context(cmd_name, args, parent=ctx) as sub_ctx:
+        rest = unparsed_args(sub_ctx)
+        if isinstance(cmd, click.Group) and rest:
+            check_arguments(cmd, sub_ctx, rest)
+
+
+class Wapor(click.Group):
+    """ Group parsing the command line of its command before running.
+
+        The main callback reads the configuration, authenticates and
+        loads Earth Engine, a command line asking for help or with wrong
+        arguments stops before that.
+    """
+
+    def invoke(self, ctx):
+        args = unparsed_args(ctx)
+        if args:
+            check_arguments(self, ctx, args)
+        return super(Wapor, self).invoke(ctx)
+
+
+@click.group(cls=Wapor)
 @click.option(
     '--verbose', '-v',
     type=Logging(),
@@ -188,10 +225,127 @@ CONTEXT_SETTINGS = dict(default_map=ConfigFileProcessor.read_config())
     default=False,
     help='Return intermediate outputs for inputs components (default=False)',
 )
+@click.option(
+    '--no-cache',
+    is_flag=True,
+    default=False,
+    help='Always fetch collection metadata from Earth Engine',
+)
+@click.option(
+    '--cache-dir',
+    type=click.Path(),
+    default=DEFAULT_DIRECTORY,
+    help='Directory of the metadata cache (default=~/.wapor/cache)',
+)
+@click.option(
+    '--workers', '-w',
+    type=click.IntRange(1, None),
+    default=DEFAULT_WORKERS,
+    help='Number of exports submitted concurrently (default={0})'.format(
+        DEFAULT_WORKERS
+    ),
+)
+@click.option(
+    '--timeout',
+    type=click.FloatRange(0, None),
+    default=None,
+    help='Seconds to wait for concurrent Earth Engine calls, a call '
+         'already started is not cancelled and may still complete, its '
+         'asset is reported as failed (default=none)',
+)
+@click.option(
+    '--rate',
+    type=click.FloatRange(0, None),
+    default=DEFAULT_RATE,
+    help='Interactive Earth Engine requests per second, 0 is no limit '
+         '(default={0})'.format(DEFAULT_RATE),
+)
+@click.option(
+    '--batch-rate',
+    type=click.FloatRange(0, None),
+    default=DEFAULT_BATCH_RATE,
+    help='Exports started per second, 0 is no limit (default={0})'.format(
+        DEFAULT_BATCH_RATE
+    ),
+)
+@click.option(
+    '--retries',
+    type=click.IntRange(0, None),
+    default=DEFAULT_RETRIES,
+    help='Attempts after a transient Earth Engine error (default={0})'.format(
+        DEFAULT_RETRIES
+    ),
+)
+@click.option(
+    '--max-tasks',
+    type=click.IntRange(1, None),
+    default=None,
+    help='Start exports only while fewer tasks of the account are running',
+)
+@click.option(
+    '--priority',
+    multiple=True,
+    help='Admission priority of a level, product or area, like AETI=10',
+)
+@click.option(
+    '--queue-file',
+    type=click.Path(dir_okay=False),
+    default=DEFAULT_QUEUE_FILE,
+    help='File keeping the exports waiting for a task slot',
+)
+@click.option(
+    '--checkpoint-file',
+    type=click.Path(dir_okay=False),
+    default=None,
+    help='File the export tasks started are added to, '
+    '~/.wapor/checkpoint.jsonl with --resume, none by default',
+)
+@click.option(
+    '--resume',
+    is_flag=True,
+    default=False,
+    help='Keep the exports of the checkpoint file which did not fail',
+)
+@click.option(
+    '--skip-fresh',
+    is_flag=True,
+    default=False,
+    help='Keep the assets whose sources and version did not change',
+)
+@click.option(
+    '--trace', '-t',
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help='Write every Earth Engine call of the run to this JSON file',
+)
+@click.option(
+    '--cassette',
+    type=click.Path(dir_okay=False),
+    default=None,
+    help='Record the Earth Engine responses of the run to this file, \
+or replay them from it',
+)
+@click.option(
+    '--cassette-mode',
+    type=click.Choice(["record", "replay"]),
+    default="replay",
+    show_default=True,
+    help='Record the responses live or replay them offline',
+)
+@click.option(
+    '--cassette-latency',
+    type=click.FloatRange(0, None),
+    default=1.0,
+    show_default=True,
+    help='Factor of the recorded durations waited on replay, 0 to not wait',
+)
 @click.pass_context
 def main(
     ctx, verbose, api_key, service_account,
-    config_file, level, export, outputs
+    config_file, level, export, outputs, no_cache, cache_dir, workers,
+    timeout, rate, batch_rate, retries, max_tasks, priority, queue_file,
+    checkpoint_file, resume, skip_fresh, trace, cassette, cassette_mode,
+    cassette_latency
 ):
     """
     """
@@ -209,7 +363,7 @@ def main(
         "Configuration file =====> {0}".format(fn_config)
     )
     if os.path.exists(fn_config):
-        ctx.default_map = CONTEXT_SETTINGS['default_map']
+        ctx.default_map = read_config()
         logger.debug(
             "Context with default map =====> {0}".format(
                 json.dumps(ctx.default_map)
@@ -240,12 +394,53 @@ def main(
         if wapor_data_key == "gee_workspace_project":
             ee_workspace_wapor = ctx.default_map[wapor_data_key]
     logger.debug("Scopes =====> {0}".format(scopes))
+    ctx.obj = {
+        'EE_WORKSPACE_BASE': ee_workspace_base,
+        'EE_WORKSPACE_WAPOR': os.path.join(
+            ee_workspace_base,
+            ee_workspace_wapor
+        ),
+        'level': level,
+        'verbose': verbose,
+        'export': export,
+        'outputs': outputs
+    }
+    if ctx.invoked_subcommand in LOCAL_COMMANDS:
+        return
+
+    from ee import Initialize
+    from cli.config import CredentialConfigFile
+    from utils.cassette import Cassette
+
+    metrics.reset()
+    metrics.policy = RetryPolicy(
+        interactive=Budget(rate=rate, retries=retries),
+        batch=Budget(rate=batch_rate, retries=retries)
+    )
+    metrics.cassette = None
+    if cassette:
+        try:
+            metrics.cassette = Cassette(
+                cassette, cassette_mode, latency=cassette_latency
+            )
+        except (IOError, OSError, ValueError) as e:
+            raise click.BadParameter(
+                "{0}".format(e), param_hint="--cassette"
+            )
+        ctx.call_on_close(metrics.cassette.save)
+    if trace:
+        ctx.call_on_close(
+            lambda: metrics.write_trace(os.path.expanduser(trace))
+        )
     # --credential-file
     credentials = os.path.expanduser(service_account)
     logger.debug(
         "Credential file =====> {0}".format(credentials)
     )
-    if os.path.exists(credentials):
+    if metrics.cassette is not None and metrics.cassette.mode == "replay":
+        logger.warning("Replaying the cassette {0}".format(cassette))
+        auth = metrics.cassette.initialize(Initialize)
+    elif os.path.exists(credentials):
         logger.info(
             "Authenticate with Service Account {0}".format(credentials)
         )
@@ -265,37 +460,47 @@ Please check the default Service Account file {0}".format(
             )
         )
         raise click.Abort()
-
-    ctx.obj = {
+    if metrics.cassette is not None:
+        metrics.cassette.capture_api()
+
+    # a single bounded pool runs the concurrent Earth Engine calls
+    engine = Engine(workers=workers)
+    ctx.call_on_close(engine.close)
+    queue = QueueStore(queue_file)
+    admission = None
+    if max_tasks:
+        try:
+            priorities = parse_priorities(priority)
+        except ValueError as e:
+            raise click.BadParameter("{0}".format(e), param_hint="--priority")
+        admission = AdmissionController(
+            EETaskService(),
+            max_running=max_tasks,
+            priorities=priorities,
+            store=queue,
+            engine=engine
+        )
+    checkpoint = None
+    if checkpoint_file or resume:
+        checkpoint = Checkpoint(
+            checkpoint_file or DEFAULT_CHECKPOINT_FILE, EETaskService(),
+            resume=resume
+        )
+    ctx.obj.update({
         'auth': auth,
-        'EE_WORKSPACE_BASE': ee_workspace_base,
-        'EE_WORKSPACE_WAPOR': os.path.join(
-            ee_workspace_base,
-            ee_workspace_wapor
+        'cache': MetadataCache(
+            directory=cache_dir, enabled=not no_cache, engine=engine
         ),
-        'level': level,
-        'verbose': verbose,
-        'export': export,
-        'outputs': outputs
-    }
+        'queue': queue,
+        'submitter': ExportSubmitter(
+            workers=workers, skip_fresh=skip_fresh, engine=engine,
+            timeout=timeout, admission=admission, checkpoint=checkpoint
+        )
+    })
 
 
 @main.command()
-@click.argument('year', type=click.Choice(
-    [
-        "2009",
-        "2010",
-        "2011",
-        "2012",
-        "2013",
-        "2014",
-        "2015",
-        "2016",
-        "2017",
-        "2018",
-        "2019"
-    ]
-))
+@click.argument('year', type=YearRange())
 @click.argument('temporal_resolution', type=click.Choice(["A"]))
 @click.argument('input_component', type=click.Choice(
     ["E", "T", "I", "AETI", "NPP"]
@@ -308,19 +513,29 @@ Please check the default Service Account file {0}".format(
 @click.argument('nodatavalue', type=click.Choice(
     ["255", "-9999"]
 ), required=0)
+@click.option(
+    '--areas',
+    type=Areas(),
+    help='L3 areas processed together - all or a list like BKA,AWA',
+)
 @click.pass_context
-def common(ctx, year, temporal_resolution, input_component, area_code, nodatavalue):
+def common(ctx, year, temporal_resolution, input_component, area_code,
+           nodatavalue, areas):
     """
-        YEAR 2009|2010|...|2018|2019\n
+        YEAR 2009|2010|...|2018|2019 or a range 2009-2019\n
         TEMPORAL_RESOLUTION A\n
         INPUT_COMPONENT E|T|I|AETI|NPP\n
         AREA_CODE: NA|BKA|AWA|KOG|ODN|ZAN\n
         NODATAVALUE: 255|-9999\n
 
         example general annual: wapor -l L1 common -- 2016 A E (255)\n
-        example area code general annual: wapor -l L3 common -- 2016 A E BKA (255)\n
+        example area code general annual:\n
+        wapor -l L3 common -- 2016 A E BKA (255)\n
         example AETI annual: wapor -l L1 common -- 2016 A AETI (-9999)\n
-        example area code AETI annual: wapor -l L3 common -- 2016 A AETI BKA (-9999)\n
+        example area code AETI annual:\n
+        wapor -l L3 common -- 2016 A AETI BKA (-9999)\n
+        example every area AETI annual:\n
+        wapor -l L3 common --areas all -- 2016 A AETI NA (-9999)\n
     """
 
     Log(ctx.obj["verbose"]).initialize()
@@ -332,78 +547,19 @@ def common(ctx, year, temporal_resolution, input_component, area_code, nodataval
         )
     )
 
-    from algorithms.common import Common
-
-    kwargs = {
-        "year": year,
-        "temporal_resolution": temporal_resolution,
-        "component": input_component,
-        "area_code": area_code,
-        "nodatavalue": nodatavalue
-    }
     context = ctx.obj.copy()
-    context.update(kwargs)
-
     # Use class Name to express wapor name convention over GEE
-    src_image_coll = CommonName(**context).src_collection()
-    # L1_E_D, L1_T_D, L1_I_D
-    # L3_E_D, L3_T_D, L3_I_D
-    logger.debug(
-        "src_image_coll variable =====> {0}".format(src_image_coll)
-    )
-    dst_image_coll = CommonName(**context).dst_collection()
-    # L1_E_A, L1_T_A, L1_I_A
-    # L3_E_A, L3_T_A, L3_I_A
-    logger.debug(
-        "dst_image_coll variable =====> {0}".format(dst_image_coll)
-    )
-    dst_asset_coll = CommonName(**context).dst_assetcollection_id()
-    # projects/fao_wapor/L1_E_A
-    # projects/fao_wapor/L3_E_A
-    logger.debug(
-        "dst_asset_coll variable =====> {0}".format(dst_asset_coll)
-    )
-    dst_asset_image = CommonName(**context).dst_image()
-    # L1_E_16
-    # L3_E_16_BKA
-    logger.debug(
-        "dst_asset_image variable =====> {0}".format(dst_asset_image)
-    )
-    dst_asset_id = CommonName(**context).dst_asset_id()
-    # projects/fao_wapor/L1_E_A/L1_E_16
-    # projects/fao_wapor/L3_E_A/L3_E_16_BKA
-    logger.debug(
-        "dst_asset_id variable =====> {0}".format(dst_asset_id)
+    jobs = command_jobs(ctx)
+    # run the processes, one per year, and return the task ids
+    results = run_all(
+        jobs,
+        cache=context["cache"],
+        submitter=context["submitter"],
+        workers=context["submitter"].workers
     )
+    result = by_year(year, results)
 
-    kwargs.update(
-        {
-            "src_coll": os.path.join(
-                os.path.join(
-                    context["EE_WORKSPACE_WAPOR"],
-                    context["level"]
-                ),
-                src_image_coll
-            ),
-            "dst_coll": dst_image_coll,
-            "dst_asset_coll": dst_asset_coll,
-            "dst_asset": dst_asset_id,
-            "to_asset": context["export"],
-            "intermediate_outputs": context["outputs"]
-        }
-    )
-    logger.debug(
-        "Input kwargs dictionary for Common process is =====> \n{0}".format(
-            json.dumps(kwargs)
-        )
-    )
-
-    # create the instance of the common script class
-    proc = Common(**kwargs)
-    # run the process and return the task id
-    result = proc.process_annual()
-
-    if result["errors"]:
+    if [res for res in results if res["errors"]]:
         raise click.ClickException(
             "Commad execution has produced:\n{0}".format(
                 json.dumps(result)
@@ -414,6 +570,7 @@ def common(ctx, year, temporal_resolution, input_component, area_code, nodataval
             json.dumps(result)
         )
 
+
 @main.command()
 @click.argument('year', type=click.Choice(
     [
@@ -445,8 +602,14 @@ def common(ctx, year, temporal_resolution, input_component, area_code, nodataval
         "31", "32", "33", "34", "35", "36"
     ]
 ), required=0)
+@click.option(
+    '--areas',
+    type=Areas(),
+    help='L3 areas processed together - all or a list like BKA,AWA',
+)
 @click.pass_context
-def aeti(ctx, year, temporal_resolution, input_component, area_code, dekad):
+def aeti(ctx, year, temporal_resolution, input_component, area_code, dekad,
+         areas):
     """
         YEAR 2009|2010|...|2018|2019\n
         TEMPORAL_RESOLUTION D (DEKADAL)\n
@@ -457,7 +620,10 @@ def aeti(ctx, year, temporal_resolution, input_component, area_code, dekad):
         example whole dekads: wapor -l L1 aeti -- 2016 D AETI\n
         example single dekad: wapor -l L1 aeti -- 2016 D AETI NA 01\n
         example area code whole dekads: wapor -l L3 aeti -- 2016 D AETI BKA\n
-        example area code single dekad: wapor -l L3 aeti -- 2016 D AETI BKA 01\n
+        example area code single dekad:\n
+        wapor -l L3 aeti -- 2016 D AETI BKA 01\n
+        example every area whole dekads:\n
+        wapor -l L3 aeti --areas all -- 2016 D AETI\n
     """
 
     Log(ctx.obj["verbose"]).initialize()
@@ -469,150 +635,26 @@ def aeti(ctx, year, temporal_resolution, input_component, area_code, dekad):
         )
     )
 
-    from algorithms.aeti import AETI
-
-    kwargs = {
-        "year": year,
-        "temporal_resolution": temporal_resolution,
-        "component": input_component, #  AETI
-        "area_code": area_code,
-        "dekad": dekad
-    }
     context = ctx.obj.copy()
-    context.update(kwargs)
-
     # Use class AETIName to express wapor name convention over GEE
-    src_image_coll = AETIName(**context).src_collection()
-    # L1_E_D, L1_T_D, L1_I_D
-    logger.debug(
-        "src_image_coll variable =====> {0}".format(src_image_coll)
-    )
-    dst_image_coll = AETIName(**context).dst_collection()
-    # L1_AETI_D
-    logger.debug(
-        "dst_image_coll variable =====> {0}".format(dst_image_coll)
-    )
-    dst_asset_coll = AETIName(**context).dst_assetcollection_id()
-    # projects/fao_wapor/L1_AETI_D
-    logger.debug(
-        "dst_asset_coll variable =====> {0}".format(dst_asset_coll)
-    )
-    dst_asset_images = AETIName(**context).dst_images()
-    # [L1_AETI_1601,...,L1_AETI_1636]
-    # [L3_AETI_1601_BKA,...,L3_AETI_1636_BKA]
-    logger.debug(
-        "dst_asset_images variable =====> {0}".format(dst_asset_images)
-    )
-    dst_asset_ids = AETIName(**context).dst_asset_ids()
-    # [projects/fao_wapor/L1_AETI_D/L1_AETI_1601,...,
-    # ,...,projects/fao_wapor/L1_AETI_D/L1_AETI_1636]
-    # [projects/fao_wapor/L3_AETI_D/L3_AETI_1601_BKA,...,
-    # ,...,projects/fao_wapor/L3_AETI_D/L3_AETI_1636_BKA]
-    logger.debug(
-        "dst_asset_ids variable =====> {0}".format(dst_asset_ids)
-    )
-    if "AETI" in dst_image_coll:
-        if context["temporal_resolution"] in [
-            tr.dekadal.value,
-            tr.short_dekadal.value
-        ]:
-            # projects/fao_wapor/L1_E_D
-            e = os.path.join(
-                os.path.join(
-                    context["EE_WORKSPACE_WAPOR"],
-                    context["level"]
-                ),
-                src_image_coll[0]
-            )
-            # projects/fao_wapor/L1_T_D
-            t = os.path.join(
-                os.path.join(
-                    context["EE_WORKSPACE_WAPOR"],
-                    context["level"]
-                ),
-                src_image_coll[1]
-            )
-            # projects/fao_wapor/L1_I_D
-            i = os.path.join(
-                os.path.join(
-                    context["EE_WORKSPACE_WAPOR"],
-                    context["level"]
-                ),
-                src_image_coll[2]
-            )
+    job = command_jobs(ctx)[0]
+    # run the process and return the task id
+    result = job.run(cache=context["cache"], submitter=context["submitter"])
 
-            colls = {"collI": i, "collE": e, "collT": t}
-            kwargs.update(colls)
-
-            kwargs.update(
-                {
-                    "dst_coll": dst_image_coll,
-                    "dst_asset_coll": dst_asset_coll,
-                    "dst_assets": dst_asset_ids,
-                    "to_asset": context["export"],
-                    "intermediate_outputs": context["outputs"]
-                }
-            )
-            logger.debug(
-                "Input kwargs dictionary for AETI process is =====> \n{0}".format(
-                    json.dumps(kwargs)
-                )
+    if result["errors"]:
+        raise click.ClickException(
+            "Commad execution has produced:\n{0}".format(
+                json.dumps(result)
             )
-
-            # Create Marmee object instance with specific inputs for AETI and filter
-            aeti = AETI(**kwargs)
-
-            # Run the process for dekadal
-            try:
-                # run the process and return the task id
-                result = aeti.process_dekadal()
-
-                if result["errors"]:
-                    raise click.ClickException(
-                        "Commad execution has produced:\n{0}".format(
-                            json.dumps(result)
-                        )
-                    )
-                else:
-                    click.echo(
-                        json.dumps(result)
-                    )
-            except Exception as e:
-                raise
-
-        elif context["temporal_resolution"] in [
-            tr.annual.value,
-            tr.short_annual.value
-        ]:
-            pass
-            # Run the process for annual
-            try:
-                pass
-                aeti.process_annual()
-            except Exception as e:
-                raise
-        else:
-            raise ValueError("Not allowed for wapor annual or dekadal.")
+        )
     else:
-        raise ValueError("Wrong value for algorithm not being AETI")
+        click.echo(
+            json.dumps(result)
+        )
 
 
 @main.command()
-@click.argument('year', type=click.Choice(
-    [
-        "2009",
-        "2010",
-        "2011",
-        "2012",
-        "2013",
-        "2014",
-        "2015",
-        "2016",
-        "2017",
-        "2018",
-        "2019"
-    ]
-))
+@click.argument('year', type=YearRange())
 @click.argument('temporal_resolution', type=click.Choice(["A"]))
 @click.argument('input_component', type=click.Choice(["NPP"]), required=0)
 @click.argument('nodatavalue', type=click.Choice(
@@ -621,7 +663,7 @@ def aeti(ctx, year, temporal_resolution, input_component, area_code, dekad):
 @click.pass_context
 def AGBP(ctx, year, temporal_resolution, input_component, nodatavalue):
     """
-        YEAR 2009|2010|...|2018|2019\n
+        YEAR 2009|2010|...|2018|2019 or a range 2009-2019\n
         TEMPORAL_RESOLUTION A (ANNUAL)\n
         INPUT_COMPONENT NPP\n
         NODATAVALUE -9999\n
@@ -638,72 +680,19 @@ def AGBP(ctx, year, temporal_resolution, input_component, nodatavalue):
         )
     )
 
-    from algorithms.agbp import AGBP
-
-    kwargs = {
-        "year": year,
-        "temporal_resolution": temporal_resolution,
-        "component": input_component,
-        "nodatavalue": nodatavalue
-    }
     context = ctx.obj.copy()
-    context.update(kwargs)
-
     # Use class Name to express wapor name convention over GEE
-    src_image_coll = AGBPName(**context).src_collection()
-    # L1_NPP_D
-    logger.debug(
-        "AGBP src_image_coll variable =====> {0}".format(src_image_coll)
-    )
-    dst_image_coll = AGBPName(**context).dst_collection()
-    # L1_AGBP_A
-    logger.debug(
-        "AGBP dst_image_coll variable =====> {0}".format(dst_image_coll)
-    )
-    dst_asset_coll = AGBPName(**context).dst_assetcollection_id()
-    # projects/fao_wapor/L1_AGBP_A
-    logger.debug(
-        "AGBP dst_asset_coll variable =====> {0}".format(dst_asset_coll)
-    )
-    dst_asset_image = AGBPName(**context).dst_image()
-    # L1_AGBP_16
-    logger.debug(
-        "AGBP dst_asset_image variable =====> {0}".format(dst_asset_image)
-    )
-    dst_asset_id = AGBPName(**context).dst_asset_id()
-    # projects/fao_wapor/L1_AGBP_A/L1_AGBP_16
-    logger.debug(
-        "AGBP dst_asset_id variable =====> {0}".format(dst_asset_id)
+    jobs = command_jobs(ctx)
+    # run the processes, one per year, and return the task ids
+    results = run_all(
+        jobs,
+        cache=context["cache"],
+        submitter=context["submitter"],
+        workers=context["submitter"].workers
     )
+    result = by_year(year, results)
 
-    kwargs.update(
-        {
-            "src_coll": os.path.join(
-                os.path.join(
-                    context["EE_WORKSPACE_WAPOR"],
-                    context["level"]
-                ),
-                src_image_coll
-            ),
-            "dst_coll": dst_image_coll,
-            "dst_asset_coll": dst_asset_coll,
-            "dst_asset": dst_asset_id,
-            "to_asset": context["export"],
-            "intermediate_outputs": context["outputs"]
-        }
-    )
-    logger.debug(
-        "Input kwargs dictionary for AGBP process is =====> \n{0}".format(
-            json.dumps(kwargs)
-        )
-    )
-
-    # create the instance of the agbp script class
-    proc = AGBP(**kwargs)
-    # run the process and return the task id
-    result = proc.process_annual()
-
-    if result["errors"]:
+    if [res for res in results if res["errors"]]:
         raise click.ClickException(
             "Commad execution has produced:\n{0}".format(
                 json.dumps(result)
@@ -716,38 +705,26 @@ def AGBP(ctx, year, temporal_resolution, input_component, nodatavalue):
 
 
 @main.command()
-@click.argument('year', type=click.Choice(
-    [
-        "2009",
-        "2010",
-        "2011",
-        "2012",
-        "2013",
-        "2014",
-        "2015",
-        "2016",
-        "2017",
-        "2018",
-        "2019"
-    ]
-))
+@click.argument('year', type=YearRange())
 @click.argument('temporal_resolution', type=click.Choice(["A", "S"]))
-@click.argument('season', type=click.Choice(["1", "2"]), required=0)
-@click.argument('input_component', type=click.Choice(["AGBP", "AGBP-AETI"]), required=0)
+@click.argument('season', type=click.Choice(["1", "2", "all"]), required=0)
+@click.argument('input_component', type=click.Choice(
+    ["AGBP", "AGBP-AETI"]), required=0)
 @click.argument('nodatavalue', type=click.Choice(
     ["-9999"]
 ), required=0)
 @click.pass_context
 def NBWP(ctx, year, temporal_resolution, season, input_component, nodatavalue):
     """
-        YEAR 2009|2010|...|2018|2019\n
+        YEAR 2009|2010|...|2018|2019 or a range 2009-2019\n
         TEMPORAL_RESOLUTION A (ANNUAL) S (SEASONAL)\n
-        SEASON 1|2\n
+        SEASON 1|2|all\n
         INPUT_COMPONENT AGBP\n
         NODATAVALUE -9999\n
 
         example annual: wapor -l L1 nbwp -- 2016 A AGBP (-9999)\n
         example seasonal: wapor -l L2 nbwp -- 2016 S 1 AGBP (-9999)\n
+        example both seasons: wapor -l L2 nbwp -- 2016 S all AGBP (-9999)\n
     """
 
     Log(ctx.obj["verbose"]).initialize()
@@ -759,78 +736,19 @@ def NBWP(ctx, year, temporal_resolution, season, input_component, nodatavalue):
         )
     )
 
-    from algorithms.nbwp import NBWP
-
-    kwargs = {
-        "year": year,
-        "temporal_resolution": temporal_resolution,
-        "season": season,
-        "component": input_component,
-        "nodatavalue": nodatavalue
-    }
     context = ctx.obj.copy()
-    context.update(kwargs)
-
     # Use class Name to express wapor name convention over GEE
-    src_image_coll = NBWPName(**context).src_collection()
-    # L1_AGBP_A | L2_AGBP_S
-    logger.debug(
-        "NBWP src_image_coll variable =====> {0}".format(src_image_coll)
-    )
-    dst_image_coll = NBWPName(**context).dst_collection()
-    # L1_NBWP_A | L2_NBWP_S
-    logger.debug(
-        "NBWP dst_image_coll variable =====> {0}".format(dst_image_coll)
-    )
-    dst_asset_coll = NBWPName(**context).dst_assetcollection_id()
-    # projects/fao-wapor/L1/L1_NBWP_A | projects/fao-wapor/L2/L2_NBWP_S
-    logger.debug(
-        "NBWP dst_asset_coll variable =====> {0}".format(dst_asset_coll)
-    )
-    dst_asset_image = NBWPName(**context).dst_image()
-    # L1_NBWP_16 | L2_NBWP_16s1
-    logger.debug(
-        "NBWP dst_asset_image variable =====> {0}".format(dst_asset_image)
-    )
-    dst_asset_id = NBWPName(**context).dst_asset_id()
-    # projects/fao-wapor/L1/L1_NBWP_A/L1_NBWP_16 |
-    # projects/fao-wapor/L2/L2_NBWP_S/L2_NBWP_16s1
-    logger.debug(
-        "NBWP dst_asset_id variable =====> {0}".format(dst_asset_id)
+    jobs = command_jobs(ctx)
+    # run the processes, one per year, and return the task ids
+    results = run_all(
+        jobs,
+        cache=context["cache"],
+        submitter=context["submitter"],
+        workers=context["submitter"].workers
     )
+    result = by_year(year, results)
 
-    kwargs.update(
-        {
-            "src_coll": os.path.join(
-                os.path.join(
-                    context["EE_WORKSPACE_WAPOR"],
-                    context["level"]
-                ),
-                src_image_coll
-            ),
-            "dst_coll": dst_image_coll,
-            "dst_asset_coll": dst_asset_coll,
-            "dst_asset": dst_asset_id,
-            "to_asset": context["export"],
-            "intermediate_outputs": context["outputs"],
-            "level": context["level"]
-        }
-    )
-    logger.debug(
-        "Input kwargs dictionary for NBWP process is =====> \n{0}".format(
-            json.dumps(kwargs)
-        )
-    )
-
-    # create the instance of the nbwp script class
-    proc = NBWP(**kwargs)
-    # run the process and return the task id
-    if proc.config.has_key("season"):
-        result = proc.process_seasonal()
-    else:
-        result = proc.process_annual()
-
-    if result["errors"]:
+    if [res for res in results if res["errors"]]:
         raise click.ClickException(
             "Commad execution has produced:\n{0}".format(
                 json.dumps(result)
@@ -843,23 +761,11 @@ def NBWP(ctx, year, temporal_resolution, season, input_component, nodatavalue):
 
 
 @main.command()
-@click.argument('year', type=click.Choice(
-    [
-        "2009",
-        "2010",
-        "2011",
-        "2012",
-        "2013",
-        "2014",
-        "2015",
-        "2016",
-        "2017",
-        "2018",
-        "2019"
-    ]
-))
+@click.argument('year', type=YearRange())
 @click.argument('temporal_resolution', type=click.Choice(["A", "S"]))
-@click.argument('season', type=click.Choice(["1", "2", "-1"]), required=0)
+@click.argument(
+    'season', type=click.Choice(["1", "2", "-1", "all"]), required=0
+)
 @click.argument('input_component', type=click.Choice(
     ["AGBP", "AGBP-AETI"]), required=0)
 @click.argument(
@@ -869,12 +775,18 @@ def NBWP(ctx, year, temporal_resolution, season, input_component, nodatavalue):
 @click.argument('nodatavalue', type=click.Choice(
     ["-9999"]
 ), required=0)
+@click.option(
+    '--areas',
+    type=Areas(),
+    help='L3 areas processed together - all or a list like BKA,AWA',
+)
 @click.pass_context
-def GBWP(ctx, year, temporal_resolution, season, input_component, area_code, nodatavalue):
+def GBWP(ctx, year, temporal_resolution, season, input_component, area_code,
+         nodatavalue, areas):
     """
-        YEAR 2009|2010|...|2018|2019\n
+        YEAR 2009|2010|...|2018|2019 or a range 2009-2019\n
         TEMPORAL_RESOLUTION A (ANNUAL) S (SEASONAL)\n
-        SEASON 1|2\n
+        SEASON 1|2|all\n
         INPUT_COMPONENT AGBP\n
         AREA_CODE: NA|BKA|AWA|KOG|ODN|ZAN\n
         NODATAVALUE -9999\n
@@ -882,6 +794,10 @@ def GBWP(ctx, year, temporal_resolution, season, input_component, area_code, nod
         example L1 annual: wapor -l L1 gbwp -- 2016 A -1 AGBP NA (-9999)\n
         example L2 seasonal: wapor -l L2 gbwp -- 2016 S 1 AGBP NA (-9999)\n
         example L3 seasonal: wapor -l L3 gbwp -- 2016 S 1 AGBP AWA (-9999)\n
+        example L3 both seasons:\n
+        wapor -l L3 gbwp -- 2016 S all AGBP AWA (-9999)\n
+        example L3 seasonal every area:\n
+        wapor -l L3 gbwp --areas all -- 2016 S 1 AGBP NA (-9999)\n
     """
 
     Log(ctx.obj["verbose"]).initialize()
@@ -892,79 +808,215 @@ def GBWP(ctx, year, temporal_resolution, season, input_component, area_code, nod
             temporal_resolution
         )
     )
-    from algorithms.gbwp import GBWP
-
-    kwargs = {
-        "year": year,
-        "temporal_resolution": temporal_resolution,
-        "season": season,
-        "component": input_component,
-        "area_code": area_code,
-        "nodatavalue": nodatavalue
-    }
     context = ctx.obj.copy()
-    context.update(kwargs)
-
     # Use class Name to express wapor name convention over GEE
-    src_image_coll = GBWPName(**context).src_collection()
-    # L1_AGBP_A | L2_AGBP_S | L3_AGBP_S
-    logger.debug(
-        "GBWP src_image_coll variable =====> {0}".format(src_image_coll)
+    jobs = command_jobs(ctx)
+    # run the processes, one per year, and return the task ids
+    results = run_all(
+        jobs,
+        cache=context["cache"],
+        submitter=context["submitter"],
+        workers=context["submitter"].workers
     )
-    dst_image_coll = GBWPName(**context).dst_collection()
-    # L1_GBWP_A | L2_GBWP_S | L3_GBWP_S
-    logger.debug(
-        "GBWP dst_image_coll variable =====> {0}".format(dst_image_coll)
+    result = by_year(year, results)
+
+    if [res for res in results if res["errors"]]:
+        raise click.ClickException(
+            "Commad execution has produced:\n{0}".format(
+                json.dumps(result)
+            )
+        )
+    else:
+        click.echo(
+            json.dumps(result)
+        )
+
+
+@main.command()
+@click.argument('manifest', type=click.File('r'))
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(1, None),
+    default=4,
+    help='Number of jobs run concurrently (default=4)',
+)
+@click.option(
+    '--dry-run', '-n',
+    is_flag=True,
+    default=False,
+    help='Print the jobs and their dependencies without running them',
+)
+@click.pass_context
+def batch(ctx, manifest, jobs, dry_run):
+    """
+        MANIFEST yaml file with years, levels, areas, seasons and products\n
+
+        example: wapor batch manifest.yaml\n
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    logger = daiquiri.getLogger(ctx.command.name, subsystem="BATCH")
+
+    import yaml
+
+    context = ctx.obj.copy()
+    try:
+        job_list = expand(load_manifest(manifest), context)
+    except (ValueError, yaml.YAMLError) as e:
+        raise click.ClickException(
+            "Invalid manifest {0}: {1}".format(manifest.name, e)
+        )
+    logger.info("Batch of {0} jobs".format(len(job_list)))
+
+    # one session, one metadata cache and one submitter for every job
+    proc = Batch(
+        job_list,
+        run=lambda job: job.run(
+            cache=context["cache"], submitter=context["submitter"]
+        ),
+        watch=lambda task_ids: TaskWatcher(EETaskService()).watch(task_ids),
+        workers=jobs
     )
-    dst_asset_coll = GBWPName(**context).dst_assetcollection_id()
-    # projects/fao-wapor/L1/L1_GBWP_A | projects/fao-wapor/L2/L2_GBWP_S
-    # | projects/fao-wapor/L3/L3_GBWP_S
-    logger.debug(
-        "GBWP dst_asset_coll variable =====> {0}".format(dst_asset_coll)
+    if dry_run:
+        click.echo(json.dumps(proc.plan()))
+        return
+
+    report = proc.execute(
+        on_event=lambda event: click.echo(json.dumps(event))
     )
-    dst_asset_image = GBWPName(**context).dst_image()
-    # L1_GBWP_16 | L2_GBWP_16s1 | L3_GBWP_16s1_AWA
-    logger.debug(
-        "GBWP dst_asset_image variable =====> {0}".format(dst_asset_image)
+    result = dict(jobs=report, metrics=metrics.summary())
+
+    if [key for key in report if not report[key]["status"] == "done"]:
+        raise click.ClickException(
+            "Batch execution has produced:\n{0}".format(
+                json.dumps(result)
+            )
+        )
+    else:
+        click.echo(
+            json.dumps(result)
+        )
+
+
+@main.group()
+@click.pass_context
+def tasks(ctx):
+    """
+        Follow the export tasks started by the other commands
+    """
+
+
+@tasks.command()
+@click.argument('source', type=click.File('r'), default='-')
+@click.option(
+    '--interval', '-i',
+    type=click.FloatRange(0.1, None),
+    default=5,
+    help='Initial seconds between two polls (default=5)',
+)
+@click.option(
+    '--max-interval', '-m',
+    type=click.FloatRange(0.1, None),
+    default=60,
+    help='Maximum seconds between two polls (default=60)',
+)
+@click.option(
+    '--timeout', '-t',
+    type=click.FloatRange(0, None),
+    default=None,
+    help='Stop watching after these seconds',
+)
+@click.pass_context
+def watch(ctx, source, interval, max_interval, timeout):
+    """
+        SOURCE file with the JSON output of the commands (default=stdin)\n
+        wapor common 2016 A E | wapor tasks watch
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    logger = daiquiri.getLogger(ctx.command.name, subsystem="TASKS")
+
+    task_ids = parse_tasks(source.read())
+    logger.info("Watching {0} tasks".format(len(task_ids)))
+    if not task_ids:
+        raise click.ClickException("No task has been found in the input")
+
+    watcher = TaskWatcher(
+        EETaskService(),
+        interval=interval,
+        max_interval=max(interval, max_interval)
     )
-    dst_asset_id = GBWPName(**context).dst_asset_id()
-    # projects/fao-wapor/L1/L1_GBWP_A/L1_GBWP_16 |
-    # projects/fao-wapor/L2/L2_GBWP_S/L2_GBWP_16s1 |
-    # projects/fao-wapor/L3/L3_GBWP_S/L3_GBWP_16s1_AWA
-    logger.debug(
-        "GBWP dst_asset_id variable =====> {0}".format(dst_asset_id)
+    summary = watcher.watch(
+        task_ids,
+        on_change=lambda change: click.echo(json.dumps(change)),
+        timeout=timeout
     )
 
-    kwargs.update(
-        {
-            "src_coll": os.path.join(
-                os.path.join(
-                    context["EE_WORKSPACE_WAPOR"],
-                    context["level"]
-                ),
-                src_image_coll
-            ),
-            "dst_coll": dst_image_coll,
-            "dst_asset_coll": dst_asset_coll,
-            "dst_asset": dst_asset_id,
-            "to_asset": context["export"],
-            "intermediate_outputs": context["outputs"],
-            "level": context["level"]
-        }
-    )
-    logger.debug(
-        "Input kwargs dictionary for GBWP process is =====> \n{0}".format(
-            json.dumps(kwargs)
+    if set(summary["states"]) - set(["COMPLETED"]):
+        raise click.ClickException(
+            "Tasks have not all completed:\n{0}".format(
+                json.dumps(summary)
+            )
+        )
+    else:
+        click.echo(
+            json.dumps(summary)
         )
-    )
 
-    # create the instance of the gbwp script class
-    proc = GBWP(**kwargs)
-    # run the process and return the task id
-    if proc.config["season"] == '-1':
-        result = proc.process_annual()
+
+@main.group()
+@click.pass_context
+def queue(ctx):
+    """
+        Exports left waiting for a task slot by an interrupted run
+    """
+
+
+@queue.command(name="list")
+@click.pass_context
+def list_queue(ctx):
+    """
+        wapor queue list
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    click.echo(json.dumps([
+        dict(
+            assetid=entry["spec"]["assetid"], priority=entry["priority"],
+            owner=entry.get("owner")
+        )
+        for entry in ctx.obj["queue"].load()
+    ]))
+
+
+@queue.command()
+@click.pass_context
+def resume(ctx):
+    """
+        Submit again the exports left by runs which are over\n
+        wapor --max-tasks 10 queue resume | wapor tasks watch
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    logger = daiquiri.getLogger(ctx.command.name, subsystem="QUEUE")
+
+    submitter = ctx.obj["submitter"]
+    if submitter.admission is not None:
+        data = submitter.admission.restore()
     else:
-        result = proc.process_seasonal()
+        data = [entry["spec"] for entry in ctx.obj["queue"].adopt()]
+    logger.info("Resuming {0} exports".format(len(data)))
+
+    collections = {}
+    for item in data:
+        spec = ExportSpec.from_dict(item)
+        collections.setdefault(
+            os.path.dirname(spec.assetid), []
+        ).append(spec)
+    result = dict(tasks={}, errors={})
+    for collection, specs in sorted(collections.items()):
+        tasks, errors = submitter.submit(
+            specs, collection=collection, site="queue.resume"
+        )
+        result["tasks"].update(tasks)
+        result["errors"].update(errors)
+    result.update(metrics=metrics.summary())
 
     if result["errors"]:
         raise click.ClickException(
@@ -977,5 +1029,252 @@ def GBWP(ctx, year, temporal_resolution, season, input_component, area_code, nod
             json.dumps(result)
         )
 
+
+# commands only using the local job queue, without Earth Engine
+LOCAL_COMMANDS = ("jobs",)
+# commands a worker runs from the job queue
+WORKER_COMMANDS = ("common", "aeti", "agbp", "nbwp", "gbwp")
+
+
+def split_command_line(words):
+    """Level, command and arguments of a command line like the CLI ones.
+
+    Example:
+        split_command_line(["-l", "L3", "common", "2016", "A", "E", "BKA"])
+        -> ("L3", "common", ["2016", "A", "E", "BKA"])
+    """
+    words = list(words)
+    if words and words[0] == "wapor":
+        words = words[1:]
+    level = None
+    while words and words[0].startswith("-"):
+        option = words.pop(0)
+        if option in ("-l", "--level") and words:
+            level = words.pop(0)
+        elif option.startswith("--level="):
+            level = option.split("=", 1)[1]
+        else:
+            raise click.UsageError(
+                "Only --level can be given before the command, not {0}".format(
+                    option
+                )
+            )
+    if not words:
+        raise click.UsageError("The command is missing")
+    return level, words[0], words[1:]
+
+
+def command_jobs(ctx, command=None, args=None, level=None):
+    """Jobs a command would run with the given arguments and level.
+
+    The arguments are checked by the command itself, the jobs run the
+    algorithms in this process. Without a command, the jobs of the
+    command being invoked with its own arguments.
+
+    Example:
+        command_jobs(ctx, "common", ["2016", "A", "E", "BKA"], "L3")
+    """
+    if command is None:
+        command = ctx.command.name
+    if command not in WORKER_COMMANDS:
+        raise click.UsageError("Command {0} is not one of {1}".format(
+            command, ", ".join(WORKER_COMMANDS)
+        ))
+    context = dict(ctx.obj, level=Level().convert(
+        level or ctx.obj["level"], None, ctx
+    ))
+    if args is None:
+        sub = ctx
+    else:
+        cmd = main.get_command(ctx, command)
+        sub = cmd.make_context(command, list(args), parent=ctx, obj=context)
+    params = sub.params
+    if command == "common":
+        return [common_job(
+            context, year, params["temporal_resolution"],
+            params["input_component"], params["area_code"],
+            params["nodatavalue"],
+            check_areas(sub, params["areas"], params["area_code"])
+        ) for year in params["year"]]
+    if command == "aeti":
+        return [aeti_job(
+            context, params["year"], params["temporal_resolution"],
+            params["input_component"], params["area_code"], params["dekad"],
+            check_areas(sub, params["areas"], params["area_code"])
+        )]
+    if command == "agbp":
+        return [agbp_job(
+            context, year, params["temporal_resolution"],
+            params["input_component"], params["nodatavalue"]
+        ) for year in params["year"]]
+    if command == "nbwp":
+        return [nbwp_job(
+            context, year, params["temporal_resolution"], params["season"],
+            params["input_component"], params["nodatavalue"]
+        ) for year in params["year"]]
+    return [gbwp_job(
+        context, year, params["temporal_resolution"], params["season"],
+        params["input_component"], params["area_code"],
+        params["nodatavalue"],
+        check_areas(sub, params["areas"], params["area_code"])
+    ) for year in params["year"]]
+
+
+@main.group(name="jobs")
+@click.option(
+    '--database', '-d',
+    type=click.Path(dir_okay=False),
+    default=DEFAULT_DATABASE,
+    help='SQLite database of the job queue (default=~/.wapor/jobs.db)',
+)
+@click.pass_context
+def job_queue(ctx, database):
+    """
+        Command lines queued for the workers
+    """
+    ctx.obj["job_queue"] = JobQueue(database)
+
+
+@job_queue.command(
+    name="add", context_settings=dict(ignore_unknown_options=True)
+)
+@click.argument('command_line', nargs=-1, type=click.UNPROCESSED)
+@click.option(
+    '--file', '-f', 'source',
+    type=click.File('r'),
+    default=None,
+    help='File with a command line per line',
+)
+@click.pass_context
+def add_jobs(ctx, command_line, source):
+    """
+        COMMAND_LINE a command with its arguments, the level first\n
+
+        example: wapor jobs add -- -l L3 common 2016 A E BKA 255\n
+        example many: wapor jobs add --file jobs.txt\n
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    lines = [list(command_line)] if command_line else []
+    if source is not None:
+        lines.extend([
+            shlex.split(line) for line in source
+            if line.strip() and not line.strip().startswith("#")
+        ])
+    if not lines:
+        raise click.UsageError("Nothing to add")
+    jobs = []
+    for words in lines:
+        level, command, args = split_command_line(words)
+        # fail before queueing anything
+        command_jobs(ctx, command, args, level)
+        jobs.append((command, args, level or ctx.obj["level"]))
+    click.echo(json.dumps(dict(
+        jobs=ctx.obj["job_queue"].put_many(jobs)
+    )))
+
+
+@job_queue.command(name="list")
+@click.option(
+    '--status',
+    type=click.Choice(STATES),
+    default=None,
+    help='Jobs of this status only',
+)
+@click.pass_context
+def list_jobs(ctx, status):
+    """
+        wapor jobs list --status failed
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    queue = ctx.obj["job_queue"]
+    click.echo(json.dumps(dict(
+        counts=queue.counts(), jobs=queue.jobs(status)
+    )))
+
+
+@job_queue.command(name="requeue")
+@click.option(
+    '--failed',
+    is_flag=True,
+    default=False,
+    help='Queue again the failed jobs too',
+)
+@click.pass_context
+def requeue_jobs(ctx, failed):
+    """
+        Queue again the jobs left running by a worker which has crashed
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    statuses = ["running", "failed"] if failed else ["running"]
+    click.echo(json.dumps(dict(
+        requeued=ctx.obj["job_queue"].requeue(statuses)
+    )))
+
+
+@main.command()
+@click.option(
+    '--database', '-d',
+    type=click.Path(dir_okay=False),
+    default=DEFAULT_DATABASE,
+    help='SQLite database of the job queue (default=~/.wapor/jobs.db)',
+)
+@click.option(
+    '--threads',
+    type=click.IntRange(1, None),
+    default=4,
+    help='Number of jobs run concurrently (default=4)',
+)
+@click.option(
+    '--poll',
+    type=click.FloatRange(0, None),
+    default=5,
+    help='Seconds to wait when the queue is empty (default=5)',
+)
+@click.option(
+    '--until-empty',
+    is_flag=True,
+    default=False,
+    help='Stop once the queue is empty',
+)
+@click.pass_context
+def worker(ctx, database, threads, poll, until_empty):
+    """
+        Run the queued jobs\n
+
+        example: wapor worker --threads 8\n
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    logger = daiquiri.getLogger(ctx.command.name, subsystem="WORKER")
+    context = ctx.obj.copy()
+
+    def execute(job):
+        # assets and sources may have changed since the previous job, the
+        # jobs running on the other threads keep their own listings
+        jobs = command_jobs(ctx, job["command"], job["args"], job["level"])
+        results = run_all(
+            jobs,
+            cache=context["cache"].view(),
+            submitter=context["submitter"].view(),
+            workers=1
+        )
+        errors = dict([
+            (one_job.key, result["errors"])
+            for one_job, result in zip(jobs, results) if result["errors"]
+        ])
+        return dict(
+            jobs=dict(zip([one_job.key for one_job in jobs], results)),
+            errors=errors
+        )
+
+    proc = Worker(
+        JobQueue(database), execute, threads=threads, poll=poll
+    )
+    logger.info("Worker {0} with {1} threads".format(proc.name, threads))
+    processed = proc.run(until_empty=until_empty)
+    click.echo(json.dumps(dict(
+        processed=processed, metrics=metrics.summary()
+    )))
+
+
 if __name__ == "__main__":
     main()
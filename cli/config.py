@@ -0,0 +1,81 @@
+from __future__ import absolute_import
+import os
+import json
+import click
+import daiquiri
+from click_configfile import ConfigFileReader, Param, SectionSchema
+from click_configfile import matches_section
+
+logger = daiquiri.getLogger(__name__, subsystem="MAIN")
+
+
+class ConfigSectionSchema(object):
+    """ Describes all config sections of this configuration file.
+
+        Example:
+        # -- FILE: config.cfg
+        [wapor]
+        gee_workspace_base = projects
+        gee_workspace_project = fao_wapor
+        [google.fusiontables]
+        scope = https://www.googleapis.com/auth/fusiontables
+        [google.earthengine]
+        scope = https://www.googleapis.com/auth/earthengine
+
+    """
+
+    @matches_section("wapor")
+    class Wapor(SectionSchema):
+        gee_workspace_base = Param(type=str)
+        gee_workspace_project = Param(type=str)
+
+    @matches_section("google.*")
+    class Google(SectionSchema):
+        scope = Param(type=str)
+
+
+class ConfigFileProcessor(ConfigFileReader):
+    # @TODO customise filename and searchpath from command option
+    config_files = ["config.ini", "config.cfg"]
+    config_searchpath = [".", os.path.expanduser("~/.wapor")]
+    config_section_schemas = [
+        ConfigSectionSchema.Wapor,     # PRIMARY SCHEMA
+        ConfigSectionSchema.Google,
+    ]
+
+
+class CredentialConfigFile(dict):
+    def __init__(self, credential_file):
+        self.credential_file = credential_file
+
+    def load(self):
+        """load a JSON Service Account file from disk"""
+        with open(self.credential_file) as cf:
+            try:
+                return json.loads(
+                    cf.read()
+                )
+            except Exception as e:
+                raise click.Abort()
+
+    def get_sa_credentials(self, scopes):
+        """Authenticate with a Service account.
+        """
+        from ee import EEException, ServiceAccountCredentials
+        try:
+            account = self.load()["client_email"]
+            return ServiceAccountCredentials(
+                account,
+                self.credential_file,
+                scopes
+            )
+        except EEException as eee:
+            logger.debug(
+                "Error with GEE authentication ======> {0}".format(
+                    eee.message
+                )
+            )
+            raise click.Abort()
+        except KeyError as e:
+            logger.debug("Service account file doesn't have the key 'client_email'!")
+            raise click.Abort()
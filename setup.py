@@ -26,7 +26,8 @@ requirements = [
     'gee-pheno',
     'marmee',
     'oauth2client',
-    'toolz'
+    'toolz',
+    'pyyaml'
 ]
 
 dependency_links=[]
@@ -34,7 +35,7 @@ dependency_links=[]
 setup_requirements = [
     'pytest-runner', 'earthengine-api', 'daiquiri', 'requests-oauthlib',
     'google-auth-oauthlib', 'click', 'dask[complete]', 'click-configfile',
-    'pendulum', 'gee-pheno', 'marmee', 'oauth2client', 'toolz'
+    'pendulum', 'gee-pheno', 'marmee', 'oauth2client', 'toolz', 'pyyaml'
 ]
 
 test_requirements = [
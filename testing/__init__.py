@@ -0,0 +1,5 @@
+"""Offline stand-ins of Earth Engine to test and benchmark the package.
+
+``python -m testing`` runs the wapor command line on the fake backend,
+with the ``loadtest`` command on top of the usual ones.
+"""
@@ -0,0 +1,31 @@
+"""Run the wapor command line on the fake Earth Engine.
+
+The latency of the round trips is read from WAPOR_EE_LATENCY and their
+report written to WAPOR_EE_REPORT, see testing.fakeee.
+
+Example:
+    python -m testing --rate 1000 --batch-rate 1000 loadtest \
+        --exports 10000 --jobs 32 --latency 0.05
+"""
+import os
+import sys
+from testing.fakeee import install_from_environment, stac
+
+# before any module of the package imports ee
+install_from_environment()
+
+import utils.stac  # noqa: E402
+from cli.cli import main  # noqa: E402
+from testing.commands import loadtest  # noqa: E402
+
+# the fake backend accepts any service account, a later one wins
+SERVICE_ACCOUNT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "serviceaccount.json"
+)
+
+utils.stac.parser = stac
+main.add_command(loadtest)
+main(
+    args=["--service-account", SERVICE_ACCOUNT] + sys.argv[1:],
+    prog_name="wapor"
+)
@@ -0,0 +1,143 @@
+import json
+import click
+import daiquiri
+from cli import __version__
+from cli.cli import Areas, YearRange
+from testing import fakeee
+from utils.logging import Log
+from utils.batch import LEVELS, PRODUCTS
+from utils.jobs import YEARS, SEASONS
+from utils.loadtest import LoadTest, job_mix
+from utils.metrics import metrics
+from utils.tasks import TaskWatcher, EETaskService
+
+
+def split_choices(ctx, param, value):
+    """Comma separated values of an option, each one of its choices.
+    """
+    values = [item.strip() for item in value.split(",") if item.strip()]
+    choices = dict(
+        levels=LEVELS, seasons=SEASONS, products=PRODUCTS
+    )[param.name]
+    for item in values:
+        if item not in choices:
+            raise click.BadParameter("{0} is not one of {1}".format(
+                item, ", ".join(choices)
+            ))
+    return values
+
+
+@click.command()
+@click.option(
+    '--exports', '-e',
+    type=click.IntRange(1, None),
+    default=1000,
+    help='Number of exports the job mix queues (default=1000)',
+)
+@click.option(
+    '--jobs', '-j',
+    type=click.IntRange(1, None),
+    default=8,
+    help='Number of jobs run concurrently (default=8)',
+)
+@click.option(
+    '--years',
+    type=YearRange(),
+    default="{0}-{1}".format(YEARS[0], YEARS[-1]),
+    help='Years of the jobs, like 2015-2017 (default=2009-2019)',
+)
+@click.option(
+    '--levels',
+    default=",".join(LEVELS),
+    callback=split_choices,
+    help='Comma separated levels of the jobs (default=L1,L2,L3)',
+)
+@click.option(
+    '--areas',
+    type=Areas(),
+    default="all",
+    help='Comma separated areas of the L3 jobs (default=all)',
+)
+@click.option(
+    '--seasons',
+    default="",
+    callback=split_choices,
+    help='Comma separated seasons of the seasonal jobs (default=none)',
+)
+@click.option(
+    '--products',
+    default=",".join(PRODUCTS),
+    callback=split_choices,
+    help='Comma separated products of the jobs (default=all)',
+)
+@click.option(
+    '--latency',
+    default=None,
+    help='Seconds added to every round trip, or by operation like '
+    'getInfo=0.2,default=0.05 (default=WAPOR_EE_LATENCY)',
+)
+@click.option(
+    '--seed',
+    type=int,
+    default=0,
+    help='Seed of the job mix (default=0)',
+)
+@click.option(
+    '--output', '-o',
+    type=click.File('w'),
+    default=None,
+    help='JSON file receiving the report as well',
+)
+@click.pass_context
+def loadtest(ctx, exports, jobs, years, levels, areas, seasons, products,
+             latency, seed, output):
+    """
+        Run a synthetic job mix on the fake Earth Engine and report the
+        throughput, latency, memory and threads as JSON\n
+
+        example: python -m testing --rate 1000 --batch-rate 1000
+        loadtest --exports 10000 --jobs 32 --latency 0.05\n
+    """
+    Log(ctx.obj["verbose"]).initialize()
+    logger = daiquiri.getLogger(ctx.command.name, subsystem="LOADTEST")
+
+    if latency is not None:
+        try:
+            fakeee.backend.latency = fakeee.parse_latency(latency)
+        except ValueError as e:
+            raise click.BadParameter("{0}".format(e), param_hint="--latency")
+    try:
+        mix = job_mix(
+            ctx.obj.copy(), exports, years=years,
+            levels=levels, areas=areas, seasons=seasons, products=products,
+            seed=seed
+        )
+    except ValueError as e:
+        raise click.ClickException("Invalid job mix: {0}".format(e))
+    logger.info("Job mix of {0} jobs".format(len(mix)))
+
+    context = ctx.obj.copy()
+    # the latency percentiles are computed over every call of the run
+    metrics.keep(None)
+    report = LoadTest(
+        mix,
+        cache=context["cache"],
+        submitter=context["submitter"],
+        watch=lambda task_ids: TaskWatcher(EETaskService()).watch(task_ids),
+        workers=jobs
+    ).run()
+    report.update(
+        settings=dict(
+            exports=exports, jobs=jobs, years=years, levels=levels,
+            areas=areas, seasons=seasons, products=products,
+            latency=fakeee.backend.latency, seed=seed,
+            rate=ctx.parent.params["rate"],
+            batch_rate=ctx.parent.params["batch_rate"],
+            workers=context["submitter"].workers
+        ),
+        backend=fakeee.backend.summary(),
+        version=__version__
+    )
+    if output is not None:
+        json.dump(report, output, indent=2, sort_keys=True)
+    click.echo(json.dumps(report, sort_keys=True))
@@ -0,0 +1,1388 @@
+import os
+import re
+import sys
+import json
+import time
+import types
+import atexit
+import calendar
+import datetime
+import itertools
+import threading
+import numpy
+from collections import OrderedDict
+
+try:
+    string_types = (str, unicode)
+except NameError:
+    string_types = (str,)
+
+# python -m testing runs the package on this backend, with the latency
+# in seconds of WAPOR_EE_LATENCY added to every round trip, or by
+# operation like getInfo=0.2,default=0.05
+LATENCY_VARIABLE = "WAPOR_EE_LATENCY"
+# JSON file receiving the round trips of the process when it exits
+REPORT_VARIABLE = "WAPOR_EE_REPORT"
+IS_FAKE = True
+
+# shape and projection of the synthetic rasters
+SHAPE = (4, 4)
+CRS = "EPSG:4326"
+CRS_TRANSFORM = [
+    0.00223214286, 0.0, -30.0044643, 0.0, -0.00223214286, 40.0044643
+]
+SYNTHETIC_YEARS = range(2009, 2020)
+SYNTHETIC_AREAS = ("BKA", "AWA", "KOG", "ODN", "ZAN")
+# collections following the WaPOR naming, L1_E_D, L3_AETI_A, L2_AGBP_S...
+WAPOR_NAME = re.compile(r"^L([123])_([A-Z]+)_([DAS])$")
+
+CLIENT_ID = "fake-client-id"
+CLIENT_SECRET = "fake-client-secret"
+
+
+class EEException(Exception):
+    """ Error raised by the fake backend, as Earth Engine would.
+    """
+
+
+def _millis(value):
+    if isinstance(value, Date):
+        return value.millis
+    if isinstance(value, Value):
+        return _millis(value.value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple()) * 1000
+    if isinstance(value, datetime.date):
+        return calendar.timegm(value.timetuple()) * 1000
+    if isinstance(value, string_types):
+        return _millis(datetime.datetime.strptime(value[:10], "%Y-%m-%d"))
+    raise EEException("Invalid date {0!r}".format(value))
+
+
+def _dekad_start(year, dekad):
+    return datetime.date(year, (dekad - 1) // 3 + 1, [1, 11, 21][
+        (dekad - 1) % 3
+    ])
+
+
+def _info(obj):
+    """Client side value of a fake object, as getInfo returns it.
+    """
+    if isinstance(obj, ComputedObject):
+        return obj._info()
+    if isinstance(obj, dict):
+        return dict([(key, _info(value)) for key, value in obj.items()])
+    if isinstance(obj, (list, tuple)):
+        return [_info(value) for value in obj]
+    if isinstance(obj, numpy.generic):
+        return obj.item()
+    return obj
+
+
+def _value(obj):
+    """Python value of a fake object which is not an image.
+    """
+    if isinstance(obj, Value):
+        return _value(obj.value)
+    if isinstance(obj, Date):
+        return obj.millis
+    return obj
+
+
+class Backend(object):
+    """ Assets, tasks and round trips of the fake Earth Engine.
+
+        Collections following the WaPOR naming are synthesized the first
+        time they are read: 36 dekads, one image a year or two seasons a
+        year from 2009 to 2019, one image per area at L3, each a small
+        raster of values between 0 and 250 with a nodata pixel.
+
+        Every round trip sleeps ``latency`` seconds, a number or a
+        dictionary by operation with an optional "default", and is
+        counted in ``calls``. The size of the expression sent by a
+        getInfo or an export, its number of nodes as Earth Engine would
+        serialize it without sharing, is kept in ``graphs``.
+
+        Example:
+            backend.latency = {"getInfo": 0.2, "default": 0.05}
+            backend.add_collection("projects/test/L1/L1_E_D", images)
+            backend.calls["getInfo"]
+    """
+
+    def __init__(self, latency=0.0, sleep=time.sleep, synthesize=True,
+                 complete_tasks=True):
+        self.latency = latency
+        self.sleep = sleep
+        self.synthesize = synthesize
+        self.complete_tasks = complete_tasks
+        self.reset()
+
+    def __repr__(self):
+        return '<Backend(assets={0!r}, tasks={1!r})>'.format(
+            len(self.assets), len(self.tasks)
+        )
+
+    def reset(self):
+        self._lock = threading.RLock()
+        self.assets = OrderedDict()
+        self.collections = OrderedDict()
+        self.updated = {}
+        self.tasks = OrderedDict()
+        self.calls = {}
+        self.graphs = {}
+        self._objects = {}
+        self._ids = itertools.count(1)
+
+    def round_trip(self, operation, graph=None):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+            if graph is not None:
+                self.graphs.setdefault(operation, []).append(graph)
+        latency = self.latency
+        if isinstance(latency, dict):
+            latency = latency.get(operation, latency.get("default", 0))
+        if latency:
+            self.sleep(latency)
+
+    def summary(self):
+        """Round trips and largest expression by operation.
+        """
+        with self._lock:
+            return dict(
+                calls=dict(self.calls),
+                graphs=dict([
+                    (operation, dict(
+                        max=max(sizes), total=sum(sizes), count=len(sizes)
+                    ))
+                    for operation, sizes in self.graphs.items()
+                ])
+            )
+
+    def write_report(self, path):
+        with open(path, "w") as report_file:
+            json.dump(self.summary(), report_file, indent=2, sort_keys=True)
+
+    def add_image(self, asset_id, image):
+        image = Image(image)
+        image.id = asset_id
+        # reading an asset is a single node, whatever computed it
+        image.nodes = 1
+        image.properties.setdefault(
+            "system:index", os.path.basename(asset_id)
+        )
+        with self._lock:
+            self.assets[asset_id] = image
+            self._touch(asset_id)
+            parent = os.path.dirname(asset_id)
+            if parent in self.collections:
+                if asset_id not in self.collections[parent]:
+                    self.collections[parent].append(asset_id)
+                self._touch(parent)
+        return image
+
+    def add_collection(self, collection_id, images=()):
+        with self._lock:
+            self.collections.setdefault(collection_id, [])
+            self._touch(collection_id)
+            for image in images:
+                self.add_image("{0}/{1}".format(
+                    collection_id, image.properties["system:index"]
+                ), image)
+
+    def collection(self, collection_id):
+        with self._lock:
+            if collection_id not in self.collections and self.synthesize:
+                self._synthesize(collection_id)
+            if collection_id not in self.collections:
+                raise EEException(
+                    "ImageCollection.load: ImageCollection asset '{0}' not "
+                    "found.".format(collection_id)
+                )
+            return [
+                self.assets[asset_id]
+                for asset_id in self.collections[collection_id]
+            ]
+
+    def image(self, asset_id):
+        with self._lock:
+            if asset_id not in self.assets:
+                raise EEException(
+                    "Image.load: Image asset '{0}' not found.".format(
+                        asset_id
+                    )
+                )
+            return self.assets[asset_id]
+
+    def info(self, asset_id):
+        with self._lock:
+            if asset_id not in self.collections and self.synthesize:
+                self._synthesize(asset_id)
+            if asset_id in self.collections:
+                kind, properties = "ImageCollection", {}
+            elif asset_id in self.assets:
+                kind = "Image"
+                properties = _info(self.assets[asset_id].properties)
+            else:
+                return None
+            return dict(
+                type=kind, id=asset_id, name=asset_id,
+                updateTime=self.updated[asset_id], properties=properties
+            )
+
+    def children(self, collection_id):
+        self.collection(collection_id)
+        with self._lock:
+            return [
+                dict(type="Image", id=asset_id)
+                for asset_id in self.collections[collection_id]
+            ]
+
+    def delete(self, asset_id):
+        with self._lock:
+            if asset_id not in self.assets:
+                raise EEException(
+                    "Asset '{0}' does not exist.".format(asset_id)
+                )
+            del self.assets[asset_id]
+            parent = os.path.dirname(asset_id)
+            if asset_id in self.collections.get(parent, []):
+                self.collections[parent].remove(asset_id)
+                self._touch(parent)
+
+    def start(self, task):
+        with self._lock:
+            if task.asset_id in self.assets:
+                raise EEException(
+                    "Cannot overwrite asset '{0}'.".format(task.asset_id)
+                )
+            now = int(time.time() * 1000)
+            self.tasks[task.id] = dict(
+                id=task.id, state="READY", description=task.description,
+                task_type="EXPORT_IMAGE", creation_timestamp_ms=now,
+                update_timestamp_ms=now
+            )
+            if self.complete_tasks:
+                self.complete(task)
+
+    def complete(self, task, state="COMPLETED"):
+        """Finish a task, its image is written when it completes.
+        """
+        with self._lock:
+            if state == "COMPLETED":
+                parent = os.path.dirname(task.asset_id)
+                self.collections.setdefault(parent, [])
+                self.add_image(task.asset_id, task.image)
+            self.tasks[task.id].update(
+                state=state, update_timestamp_ms=int(time.time() * 1000)
+            )
+
+    def register(self, obj):
+        with self._lock:
+            object_id = next(self._ids)
+            self._objects[object_id] = obj
+        return object_id
+
+    def resolve(self, object_id):
+        with self._lock:
+            if object_id not in self._objects:
+                raise EEException(
+                    "Unknown serialized object {0}".format(object_id)
+                )
+            return self._objects[object_id]
+
+    def task_id(self):
+        return "FAKE{0:06d}".format(next(self._ids))
+
+    def _touch(self, asset_id):
+        self.updated[asset_id] = "{0:.6f}".format(time.time())
+
+    def _synthesize(self, collection_id):
+        match = WAPOR_NAME.match(os.path.basename(collection_id))
+        if match is None:
+            return
+        level, component, resolution = match.groups()
+        name = "L{0}_{1}".format(level, component)
+        areas = SYNTHETIC_AREAS if level == "3" else (None,)
+        self.add_collection(collection_id, [
+            image
+            for year in SYNTHETIC_YEARS
+            for area in areas
+            for image in synthetic_images(name, year, resolution, area)
+        ])
+
+
+def synthetic_images(name, year, resolution, area=None):
+    """Synthetic WaPOR images of a year.
+
+    Arguments:
+        name {str} -- image name prefix like L1_E
+        year {int} -- year of the images
+        resolution {str} -- D dekadal, A annual or S seasonal
+        area {str} -- area code of L3 images
+
+    Returns:
+        list -- Image instances with their system:index
+    """
+    suffix = "_{0}".format(area) if area else ""
+    if resolution == "D":
+        periods = [
+            (
+                "{0}{1:02d}".format(str(year)[2:], dekad),
+                _dekad_start(year, dekad),
+                _dekad_start(year, dekad + 1) if dekad < 36 else
+                datetime.date(year + 1, 1, 1),
+                {}
+            )
+            for dekad in range(1, 37)
+        ]
+        band = "b1"
+    elif resolution == "A":
+        periods = [(
+            str(year)[2:], datetime.date(year, 1, 1),
+            datetime.date(year + 1, 1, 1), {}
+        )]
+        band = "b1_sum"
+    else:
+        periods = [
+            (
+                "{0}s{1}".format(str(year)[2:], season),
+                datetime.date(year, 6 * season - 5, 1),
+                datetime.date(year + season // 2, 6 * season % 12 + 1, 1),
+                dict(season=float(season))
+            )
+            for season in (1, 2)
+        ]
+        band = "b1"
+    images = []
+    for period, start, end, extra in periods:
+        index = "{0}_{1}{2}".format(name, period, suffix)
+        seed = sum(bytearray(index.encode("utf-8")))
+        values = numpy.random.RandomState(seed).randint(
+            0, 251, SHAPE
+        ).astype("float64")
+        # a nodata pixel in every image
+        values[0, 0] = 255 if resolution == "D" else -9999
+        properties = dict(
+            extra,
+            code=index,
+            n_days_extent=float((end - start).days),
+            time_extent="from {0} to {1}".format(
+                start, end - datetime.timedelta(days=1)
+            )
+        )
+        properties["system:index"] = index
+        properties["system:time_start"] = _millis(start)
+        properties["system:time_end"] = _millis(end)
+        if area:
+            properties["area_code"] = area
+        images.append(Image._make(
+            OrderedDict([(band, numpy.ma.masked_array(values))]),
+            properties
+        ))
+    return images
+
+
+class ComputedObject(object):
+    """ Fake object evaluated locally, its getInfo is a round trip.
+
+        ``nodes`` is the size of the expression which built the object.
+    """
+
+    nodes = 1
+
+    def getInfo(self):
+        backend.round_trip("getInfo", self.nodes)
+        return self._info()
+
+    def serialize(self):
+        return json.dumps(dict(
+            type="FakeObject", id=backend.register(self)
+        ))
+
+    def _info(self):
+        raise NotImplementedError
+
+
+def _nodes(*objects):
+    """Size of the expressions of objects, literals are free.
+    """
+    total = 0
+    for obj in objects:
+        if isinstance(obj, dict):
+            total += _nodes(*obj.values())
+        elif isinstance(obj, (list, tuple)):
+            total += _nodes(*obj)
+        else:
+            total += getattr(obj, "nodes", 0)
+    return total
+
+
+def _node(obj, *inputs):
+    """Set the expression size of an object computed from inputs.
+    """
+    obj.nodes = 1 + _nodes(*inputs)
+    return obj
+
+
+def _copy(obj):
+    """Distinct object with the same value, to give it its own size.
+    """
+    for kind in (Image, ImageCollection, Date):
+        if isinstance(obj, kind):
+            return kind(obj)
+    return Value(obj)
+
+
+class Value(ComputedObject):
+    """ Number, string, list, dictionary or null computed locally.
+
+        A value with an ``error`` only fails when its getInfo reaches
+        it, like the server which evaluates the branch of an If it takes.
+    """
+
+    def __init__(self, value=None, error=None):
+        if isinstance(value, ComputedObject):
+            self.nodes = value.nodes
+        if isinstance(value, Value):
+            error = error or value.error
+            value = value.value
+        self.value = value
+        self.error = error
+
+    def __repr__(self):
+        return '<Value({self.value!r})>'.format(self=self)
+
+    def get(self, key, default=None):
+        value = self.value
+        if isinstance(value, dict):
+            item = value.get(_value(key), default)
+        else:
+            try:
+                item = value[int(_value(key))]
+            except (IndexError, TypeError):
+                raise EEException("Invalid index {0!r}".format(key))
+        return _node(_copy(item), self, key)
+
+    def size(self):
+        return _node(Value(len(self.value)), self)
+
+    def length(self):
+        return self.size()
+
+    def keys(self):
+        return _node(Value(sorted(self.value)), self)
+
+    def add(self, other):
+        return _node(Value(self.value + _value(other)), self, other)
+
+    def subtract(self, other):
+        return _node(Value(self.value - _value(other)), self, other)
+
+    def multiply(self, other):
+        return _node(Value(self.value * _value(other)), self, other)
+
+    def divide(self, other):
+        return _node(Value(float(self.value) / _value(other)), self, other)
+
+    def gt(self, other):
+        return _node(Value(int(self.value > _value(other))), self, other)
+
+    def gte(self, other):
+        return _node(Value(int(self.value >= _value(other))), self, other)
+
+    def lt(self, other):
+        return _node(Value(int(self.value < _value(other))), self, other)
+
+    def lte(self, other):
+        return _node(Value(int(self.value <= _value(other))), self, other)
+
+    def eq(self, other):
+        return _node(Value(int(self.value == _value(other))), self, other)
+
+    def And(self, other):
+        return _node(
+            Value(int(bool(self.value) and bool(_value(other)))), self, other
+        )
+
+    def Or(self, other):
+        return _node(
+            Value(int(bool(self.value) or bool(_value(other)))), self, other
+        )
+
+    def _info(self):
+        if self.error:
+            raise EEException(self.error)
+        return _info(self.value)
+
+
+def Number(value):
+    return _node(Value(_value(value)), value)
+
+
+def String(value):
+    return _node(Value(_value(value)), value)
+
+
+def List(value):
+    return _node(Value(list(value)), list(value))
+
+
+def Dictionary(value=None):
+    return _node(Value(dict(value or {})), dict(value or {}))
+
+
+class Date(ComputedObject):
+    """ Date as milliseconds since epoch.
+    """
+
+    def __init__(self, value):
+        self.millis = _millis(value)
+        if isinstance(value, (datetime.date, datetime.datetime)):
+            value = value.isoformat()[:10]
+        elif isinstance(value, Date):
+            self.nodes = value.nodes
+            value = value.value
+        self.value = value
+
+    def __repr__(self):
+        return '<Date({self.value!r})>'.format(self=self)
+
+    @staticmethod
+    def fromYMD(year, month, day):
+        return Date(datetime.date(
+            int(_value(year)), int(_value(month)), int(_value(day))
+        ))
+
+    def advance(self, delta, unit):
+        units = dict(
+            second=1000, minute=60000, hour=3600000, day=86400000,
+            week=604800000
+        )
+        if unit not in units:
+            raise EEException("Unsupported unit {0}".format(unit))
+        return _node(
+            Date(self.millis + int(_value(delta) * units[unit])), self, delta
+        )
+
+    def millis(self):
+        return _node(Value(self.millis), self)
+
+    def serialize(self):
+        # same shape as the Earth Engine graph of a Date
+        return json.dumps(dict(
+            type="Invocation", functionName="Date",
+            arguments=dict(value=self.value)
+        ))
+
+    def _info(self):
+        return dict(type="Date", value=self.millis)
+
+
+class Reducer(object):
+    """ Reducers of image collections and of columns.
+    """
+
+    nodes = 1
+
+    def __init__(self, name, func=None, columns=1):
+        self.name = name
+        self.func = func
+        self.columns = columns
+
+    def __repr__(self):
+        return '<Reducer({self.name!r})>'.format(self=self)
+
+    @staticmethod
+    def sum():
+        return Reducer("sum", lambda stack: numpy.ma.sum(stack, axis=0))
+
+    @staticmethod
+    def mean():
+        return Reducer("mean", lambda stack: numpy.ma.mean(stack, axis=0))
+
+    @staticmethod
+    def max():
+        return Reducer("max", lambda stack: numpy.ma.max(stack, axis=0))
+
+    @staticmethod
+    def min():
+        return Reducer("min", lambda stack: numpy.ma.min(stack, axis=0))
+
+    @staticmethod
+    def toList(numLists=1):
+        return Reducer("list", columns=numLists)
+
+
+class Filter(object):
+    """ Filter of images, or of pairs of images for joins.
+    """
+
+    nodes = 1
+
+    def __init__(self, test=None, pair=None):
+        self.test = test
+        self.pair = pair
+
+    def __call__(self, image, other=None):
+        if self.pair is not None:
+            return self.pair(image, other)
+        return self.test(image)
+
+    @staticmethod
+    def eq(name, value):
+        return Filter(lambda image: image._property(name) == _value(value))
+
+    @staticmethod
+    def neq(name, value):
+        return Filter(lambda image: image._property(name) != _value(value))
+
+    @staticmethod
+    def gt(name, value):
+        return Filter(lambda image: image._property(name) > _value(value))
+
+    @staticmethod
+    def lt(name, value):
+        return Filter(lambda image: image._property(name) < _value(value))
+
+    @staticmethod
+    def inList(name, values):
+        values = _value(values)
+        return Filter(lambda image: image._property(name) in values)
+
+    @staticmethod
+    def date(start, end=None):
+        start = _millis(start)
+        end = _millis(end) if end is not None else start + 1
+        return Filter(
+            lambda image: start <= image._property("system:time_start") < end
+        )
+
+    @staticmethod
+    def equals(leftField=None, rightValue=None, rightField=None,
+               leftValue=None):
+        if rightField is not None:
+            return Filter(pair=lambda left, right: (
+                left._property(leftField) == right._property(rightField)
+            ))
+        return Filter.eq(leftField, rightValue)
+
+    @staticmethod
+    def And(*filters):
+        filters = _filters(filters)
+        return Filter(lambda image: all(f(image) for f in filters))
+
+    @staticmethod
+    def Or(*filters):
+        filters = _filters(filters)
+        return Filter(lambda image: any(f(image) for f in filters))
+
+
+def _filters(filters):
+    if len(filters) == 1 and isinstance(filters[0], (list, tuple)):
+        return list(filters[0])
+    return list(filters)
+
+
+class Join(object):
+    """ Joins of two image collections.
+    """
+
+    def __init__(self, primaryKey="primary", secondaryKey="secondary"):
+        self.primary_key = primaryKey
+        self.secondary_key = secondaryKey
+
+    @staticmethod
+    def inner(primaryKey="primary", secondaryKey="secondary"):
+        return Join(primaryKey, secondaryKey)
+
+    def apply(self, primary, secondary, condition):
+        """Pairs of matching images, as elements holding both.
+        """
+        primary = ImageCollection(primary)
+        secondary = ImageCollection(secondary)
+        return _node(ImageCollection([
+            Image._make(OrderedDict(), {
+                self.primary_key: left, self.secondary_key: right
+            })
+            for left in primary.images
+            for right in secondary.images
+            if condition(left, right)
+        ]), primary, secondary, condition)
+
+
+class Algorithms(object):
+
+    @staticmethod
+    def If(condition, trueCase=None, falseCase=None):
+        return _node(
+            _copy(trueCase if _value(condition) else falseCase),
+            condition, trueCase, falseCase
+        )
+
+
+class Image(ComputedObject):
+    """ Multi band raster evaluated with NumPy masked arrays.
+
+        An image of a null, like the first image of an empty collection,
+        and the images computed from it are ``null``: their getInfo fails
+        as it does on the server.
+    """
+
+    def __init__(self, source=None):
+        self.id = None
+        self.bands = OrderedDict()
+        self.types = {}
+        self.properties = {}
+        self.null = False
+        if isinstance(source, ComputedObject):
+            self.nodes = source.nodes
+        if isinstance(source, Value):
+            self.null = source.value is None
+            source = source.value
+        if isinstance(source, string_types):
+            source = backend.image(source)
+        if isinstance(source, Image):
+            self.id = source.id
+            self.bands = OrderedDict(source.bands)
+            self.types = dict(source.types)
+            self.properties = dict(source.properties)
+            self.null = source.null
+        elif isinstance(source, (int, float)):
+            self.bands["constant"] = numpy.ma.masked_array(
+                numpy.full(SHAPE, float(source))
+            )
+        elif source is not None:
+            raise EEException("Invalid image {0!r}".format(source))
+
+    def __repr__(self):
+        return '<Image(id={0!r}, bands={1!r})>'.format(
+            self.id, list(self.bands)
+        )
+
+    @classmethod
+    def _make(cls, bands, properties, types=None):
+        image = cls()
+        image.bands = OrderedDict(bands)
+        image.types = dict(types or {})
+        image.properties = dict(properties)
+        return image
+
+    @staticmethod
+    def constant(value):
+        return Image(float(_value(value)))
+
+    @staticmethod
+    def cat(*images):
+        images = [Image(image) for image in _filters(images)]
+        result = Image(images[0])
+        result.id = None
+        for image in images[1:]:
+            result = result.addBands(image)
+        return result
+
+    def _property(self, name):
+        return _value(self.properties.get(name))
+
+    def _derive(self, bands, types=None, *inputs):
+        image = _node(
+            Image._make(bands, self.properties, types), self, *inputs
+        )
+        image.null = self.null or any(
+            isinstance(other, Image) and other.null for other in inputs
+        )
+        return image
+
+    def _null_error(self, operation):
+        return "Image.{0}: Parameter 'image' is required.".format(operation)
+
+    def select(self, *selectors):
+        if self.null:
+            return self._derive([])
+        names = []
+        for selector in _filters(selectors):
+            if selector not in self.bands:
+                raise EEException(
+                    "Image.select: Pattern '{0}' did not match any "
+                    "bands.".format(selector)
+                )
+            names.append(selector)
+        return self._derive(
+            [(name, self.bands[name]) for name in names],
+            dict([(name, self.types.get(name)) for name in names])
+        )
+
+    def rename(self, *names):
+        if self.null:
+            return self._derive([])
+        names = _filters(names)
+        if len(names) != len(self.bands):
+            raise EEException(
+                "Image.rename: The number of names ({0}) must match the "
+                "number of bands ({1}).".format(len(names), len(self.bands))
+            )
+        return self._derive(
+            zip(names, self.bands.values()),
+            dict(zip(names, [self.types.get(name) for name in self.bands]))
+        )
+
+    def addBands(self, srcImg, names=None, overwrite=False):
+        srcImg = Image(srcImg)
+        bands = OrderedDict(self.bands)
+        types = dict(self.types)
+        for name, band in srcImg.bands.items():
+            if names is not None and name not in names:
+                continue
+            target = name
+            suffix = 0
+            while target in bands and not overwrite:
+                suffix += 1
+                target = "{0}_{1}".format(name, suffix)
+            bands[target] = band
+            types[target] = srcImg.types.get(name)
+        return self._derive(bands, types, srcImg)
+
+    def bandNames(self):
+        if self.null:
+            return _node(Value(error=self._null_error("bandNames")), self)
+        return _node(Value(list(self.bands)), self)
+
+    def get(self, prop):
+        return _node(_copy(self.properties.get(_value(prop))), self)
+
+    def set(self, *args):
+        if len(args) == 1:
+            properties = args[0]
+        else:
+            properties = dict(zip(args[::2], args[1::2]))
+        return self.setMulti(properties)
+
+    def setMulti(self, properties):
+        image = _node(Image(self), self, properties)
+        image.properties.update(
+            dict([(key, _value(value)) for key, value in
+                  _value(properties).items()])
+        )
+        return image
+
+    def metadata(self, property, name=None):
+        if self.null:
+            return self._derive([])
+        if property not in self.properties:
+            raise EEException(
+                "Image.metadata: Property '{0}' does not exist.".format(
+                    property
+                )
+            )
+        return self._derive([(name or property, numpy.ma.masked_array(
+            numpy.full(SHAPE, float(self._property(property)))
+        ))])
+
+    def _binary(self, other, op, kind=None):
+        if not isinstance(other, Image):
+            other = Image(float(_value(other)))
+        left = list(self.bands.items())
+        right = list(other.bands.items())
+        if not left or not right:
+            return self._derive([], None, other)
+        if len(right) == 1:
+            pairs = [(name, band, right[0][1]) for name, band in left]
+        elif len(left) == 1:
+            pairs = [(name, left[0][1], band) for name, band in right]
+        elif len(left) == len(right):
+            pairs = [
+                (name, band, other_band)
+                for (name, band), (_, other_band) in zip(left, right)
+            ]
+        else:
+            raise EEException(
+                "Images must have the same number of bands or a single "
+                "band, got {0} and {1}.".format(len(left), len(right))
+            )
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            bands = [(name, op(a, b)) for name, a, b in pairs]
+        return self._derive(
+            bands, dict([(name, kind) for name, _ in bands]), other
+        )
+
+    def add(self, other):
+        return self._binary(other, numpy.ma.add)
+
+    def subtract(self, other):
+        return self._binary(other, numpy.ma.subtract)
+
+    def multiply(self, other):
+        return self._binary(other, numpy.ma.multiply)
+
+    def divide(self, other):
+        return self._binary(other, numpy.ma.divide)
+
+    def lt(self, other):
+        return self._binary(other, lambda a, b: (a < b).astype(float), "int")
+
+    def lte(self, other):
+        return self._binary(other, lambda a, b: (a <= b).astype(float), "int")
+
+    def gt(self, other):
+        return self._binary(other, lambda a, b: (a > b).astype(float), "int")
+
+    def gte(self, other):
+        return self._binary(other, lambda a, b: (a >= b).astype(float), "int")
+
+    def eq(self, other):
+        return self._binary(
+            other, lambda a, b: (a == b).astype(float), "int"
+        )
+
+    def neq(self, other):
+        return self._binary(
+            other, lambda a, b: (a != b).astype(float), "int"
+        )
+
+    def And(self, other):
+        return self._binary(other, lambda a, b: numpy.ma.logical_and(
+            a != 0, b != 0
+        ).astype(float), "int")
+
+    def Or(self, other):
+        return self._binary(other, lambda a, b: numpy.ma.logical_or(
+            a != 0, b != 0
+        ).astype(float), "int")
+
+    def updateMask(self, mask):
+        mask = Image(mask)
+        if not mask.bands:
+            return self._derive([], None, mask)
+        masks = list(mask.bands.values())
+        bands = []
+        for i, (name, band) in enumerate(self.bands.items()):
+            other = masks[i] if len(masks) > 1 else masks[0]
+            hidden = numpy.ma.getmaskarray(band) | (
+                numpy.ma.filled(other, 0) == 0
+            )
+            bands.append((name, numpy.ma.masked_array(
+                numpy.ma.getdata(band), mask=hidden
+            )))
+        return self._derive(bands, self.types, mask)
+
+    def mask(self, mask=None):
+        if mask is None:
+            return self._derive([
+                (name, numpy.ma.masked_array(
+                    (~numpy.ma.getmaskarray(band)).astype(float)
+                ))
+                for name, band in self.bands.items()
+            ])
+        return self.updateMask(mask)
+
+    def unmask(self, value=0):
+        return self._derive([
+            (name, numpy.ma.masked_array(
+                numpy.ma.filled(band, float(_value(value)))
+            ))
+            for name, band in self.bands.items()
+        ], self.types)
+
+    def _cast(self, kind):
+        return self._derive([
+            (name, numpy.trunc(band) if kind.startswith("int") else band)
+            for name, band in self.bands.items()
+        ], dict([(name, kind) for name in self.bands]))
+
+    def int16(self):
+        return self._cast("int16")
+
+    def int32(self):
+        return self._cast("int32")
+
+    def toInt(self):
+        return self._cast("int32")
+
+    def float(self):
+        return self._cast("float")
+
+    def toFloat(self):
+        return self._cast("float")
+
+    def double(self):
+        return self._cast("double")
+
+    def _info(self):
+        if self.null:
+            raise EEException(self._null_error("load"))
+        bands = [
+            dict(
+                id=name,
+                data_type=dict(
+                    type="PixelType",
+                    precision=self.types.get(name) or "double"
+                ),
+                crs=CRS,
+                crs_transform=list(CRS_TRANSFORM),
+                dimensions=[SHAPE[1], SHAPE[0]]
+            )
+            for name in self.bands
+        ]
+        info = dict(
+            type="Image", bands=bands, properties=_info(self.properties)
+        )
+        if self.id:
+            info.update(id=self.id)
+        return info
+
+    def pixels(self, band=None):
+        """Values of a band as a masked array, not part of Earth Engine.
+        """
+        return self.bands[band or list(self.bands)[0]]
+
+
+class ImageCollection(ComputedObject):
+    """ List of images, loaded from the backend on first use.
+    """
+
+    def __init__(self, source):
+        self.id = None
+        self._images = None
+        if isinstance(source, ComputedObject):
+            self.nodes = source.nodes
+        if isinstance(source, Value):
+            source = source.value
+        if isinstance(source, ImageCollection):
+            self.id = source.id
+            self._images = source._images
+        elif isinstance(source, string_types):
+            self.id = source
+        elif isinstance(source, (list, tuple)):
+            self._images = [Image(image) for image in source]
+            self.nodes = 1 + _nodes(self._images)
+        else:
+            raise EEException("Invalid collection {0!r}".format(source))
+
+    def __repr__(self):
+        return '<ImageCollection(id={self.id!r})>'.format(self=self)
+
+    @property
+    def images(self):
+        if self._images is None:
+            self._images = list(backend.collection(self.id))
+        return self._images
+
+    def _derive(self, images, *inputs):
+        return _node(ImageCollection(list(images)), self, *inputs)
+
+    def filter(self, *filters):
+        filters = _filters(filters)
+        return self._derive([
+            image for image in self.images
+            if all(f(image) for f in filters)
+        ], *filters)
+
+    def filterDate(self, start, end=None):
+        return self.filter(Filter.date(start, end))
+
+    def filterMetadata(self, name, operator, value):
+        return self.filter(getattr(Filter, dict(
+            equals="eq", not_equals="neq", greater_than="gt",
+            less_than="lt"
+        )[operator])(name, value))
+
+    def map(self, algorithm):
+        mapped = []
+        for image in self.images:
+            # the algorithm is serialized once, over a placeholder image
+            argument = Image(image)
+            argument.nodes = 1
+            mapped.append(algorithm(argument))
+        collection = self._derive([
+            image for image in mapped
+            if image is not None and not (
+                isinstance(image, Value) and image.value is None
+            )
+        ])
+        collection.nodes += max([_nodes(image) for image in mapped] or [0])
+        return collection
+
+    def merge(self, collection2):
+        collection2 = ImageCollection(collection2)
+        return self._derive(self.images + collection2.images, collection2)
+
+    def sort(self, prop, ascending=True):
+        return self._derive(sorted(
+            self.images,
+            key=lambda image: (
+                image._property(prop) is None, image._property(prop)
+            ),
+            reverse=not ascending
+        ))
+
+    def limit(self, maximum, prop=None, ascending=True):
+        images = self.sort(prop, ascending).images if prop else self.images
+        return self._derive(images[:int(_value(maximum))])
+
+    def size(self):
+        return _node(Value(len(self.images)), self)
+
+    def first(self):
+        if not self.images:
+            return _node(Value(None), self)
+        return _node(Image(self.images[0]), self)
+
+    def toList(self, count, offset=0):
+        offset = int(_value(offset))
+        return _node(
+            Value(self.images[offset:offset + int(_value(count))]), self
+        )
+
+    def aggregate_array(self, prop):
+        return _node(Value([
+            image._property(prop) for image in self.images
+            if prop in image.properties
+        ]), self)
+
+    def aggregate_histogram(self, prop):
+        histogram = {}
+        for image in self.images:
+            if prop in image.properties:
+                key = "{0}".format(image._property(prop))
+                histogram[key] = histogram.get(key, 0) + 1
+        return _node(Value(histogram), self)
+
+    def reduceColumns(self, reducer, selectors):
+        if reducer.name != "list":
+            raise EEException(
+                "Unsupported column reducer {0}".format(reducer.name)
+            )
+        rows = [
+            [image._property(selector) for selector in selectors]
+            for image in self.images
+        ]
+        if reducer.columns == 1:
+            rows = [row[0] for row in rows]
+        return _node(Value(dict(list=rows)), self, reducer)
+
+    def reduce(self, reducer):
+        return self._reduce(reducer, "_{0}".format(reducer.name))
+
+    def sum(self):
+        return self._reduce(Reducer.sum())
+
+    def mean(self):
+        return self._reduce(Reducer.mean())
+
+    def max(self):
+        return self._reduce(Reducer.max())
+
+    def min(self):
+        return self._reduce(Reducer.min())
+
+    def _reduce(self, reducer, suffix=""):
+        images = self.images
+        if not images:
+            return _node(Image(), self, reducer)
+        bands = OrderedDict()
+        for name in images[0].bands:
+            stack = numpy.ma.array([
+                image.bands[name] for image in images if name in image.bands
+            ])
+            bands[name + suffix] = reducer.func(stack)
+        return _node(Image._make(bands, {}), self, reducer)
+
+    def _info(self):
+        return dict(
+            type="ImageCollection",
+            id=self.id,
+            features=[image._info() for image in self.images],
+            properties={}
+        )
+
+
+class Task(object):
+    """ Export task, completed as soon as it is started by default.
+    """
+
+    def __init__(self, image, asset_id, description, config=None):
+        self.id = backend.task_id()
+        self.image = Image(image)
+        self.asset_id = asset_id
+        self.description = description
+        self.config = config or {}
+
+    def __repr__(self):
+        return '<Task(id={self.id!r}, asset_id={self.asset_id!r})>'.format(
+            self=self
+        )
+
+    def start(self):
+        backend.round_trip("start", self.image.nodes)
+        backend.start(self)
+
+    def status(self):
+        backend.round_trip("getTaskStatus")
+        return dict(backend.tasks.get(self.id) or dict(
+            id=self.id, state="UNSUBMITTED"
+        ))
+
+    def active(self):
+        return self.status()["state"] in ("READY", "RUNNING")
+
+
+class _ImageExport(object):
+
+    @staticmethod
+    def toAsset(image, description="myExportImageTask", assetId=None,
+                **config):
+        if not assetId:
+            raise EEException("Export.image.toAsset needs an assetId")
+        return Task(image, assetId, description, config)
+
+
+class _Export(object):
+    image = _ImageExport
+
+
+class StacObject(object):
+    """ STAC description of a collection, as read by the algorithms.
+    """
+
+    def __init__(self, collection_id):
+        self.id = collection_id
+        self.type = "FeatureCollection"
+
+    def __repr__(self):
+        return '<StacObject(id={self.id!r})>'.format(self=self)
+
+
+def stac(collection_id):
+    """STAC object of a collection, checking that it exists.
+    """
+    backend.round_trip("data.getInfo")
+    if backend.info(collection_id) is None:
+        raise EEException(
+            "Asset '{0}' does not exist.".format(collection_id)
+        )
+    return StacObject(collection_id)
+
+
+def Initialize(credentials=None, *args, **kwargs):
+    return None
+
+
+def ServiceAccountCredentials(email=None, key_file=None, *args, **kwargs):
+    return dict(email=email, key_file=key_file)
+
+
+def _get_info(asset_id):
+    backend.round_trip("data.getInfo")
+    return backend.info(asset_id)
+
+
+def _get_list(params):
+    backend.round_trip("data.getList")
+    return backend.children(params["id"])[:params.get("num")]
+
+
+def _delete_asset(asset_id):
+    backend.round_trip("data.deleteAsset")
+    backend.delete(asset_id)
+
+
+def _get_task_status(task_ids):
+    backend.round_trip("data.getTaskStatus")
+    if isinstance(task_ids, string_types):
+        task_ids = [task_ids]
+    return [
+        dict(backend.tasks.get(task_id) or dict(
+            id=task_id, state="UNKNOWN"
+        ))
+        for task_id in task_ids
+    ]
+
+
+def _get_task_list():
+    backend.round_trip("data.getTaskList")
+    return [dict(task) for task in reversed(list(backend.tasks.values()))]
+
+
+def _from_json(text):
+    node = json.loads(text) if isinstance(text, string_types) else text
+    if node.get("type") == "Invocation" and node.get(
+        "functionName"
+    ) == "Date":
+        return Date(node["arguments"]["value"])
+    return backend.resolve(node["id"])
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    for key, value in attributes.items():
+        setattr(module, key, value)
+    return module
+
+
+# process wide state of the fake Earth Engine
+backend = Backend()
+
+data = _module(
+    "ee.data",
+    getInfo=_get_info,
+    getList=_get_list,
+    deleteAsset=_delete_asset,
+    getTaskStatus=_get_task_status,
+    getTaskList=_get_task_list
+)
+batch = _module("ee.batch", Export=_Export, Task=Task)
+oauth = _module("ee.oauth", CLIENT_ID=CLIENT_ID, CLIENT_SECRET=CLIENT_SECRET)
+deserializer = _module("ee.deserializer", fromJSON=_from_json)
+SUBMODULES = ("data", "batch", "oauth", "deserializer")
+
+
+def install(latency=None):
+    """Make every later ``import ee`` return the fake backend.
+
+    Modules binding names of ``ee`` keep the ones of the backend that
+    was installed when they were imported, install it first.
+    """
+    module = sys.modules[__name__]
+    sys.modules["ee"] = module
+    for name in SUBMODULES:
+        sys.modules["ee." + name] = getattr(module, name)
+    if latency is not None:
+        backend.latency = latency
+    return backend
+
+
+def installed():
+    """Whether ``import ee`` returns the fake backend.
+    """
+    return getattr(sys.modules.get("ee"), "IS_FAKE", False)
+
+
+def parse_latency(value):
+    """Latency of a number of seconds or of operations like getInfo=0.2.
+
+    Example:
+        parse_latency("0.05") -> 0.05
+        parse_latency("getInfo=0.2,default=0.05") -> {
+            "getInfo": 0.2, "default": 0.05
+        }
+    """
+    value = "{0}".format(value or "").strip()
+    if "=" not in value:
+        return float(value or 0)
+    latency = {}
+    for item in value.split(","):
+        operation, seconds = item.split("=", 1)
+        latency[operation.strip()] = float(seconds)
+    return latency
+
+
+def install_from_environment(environ=os.environ):
+    """Install the fake backend with the latency of WAPOR_EE_LATENCY.
+
+    The round trips of the process are written to the file named by
+    WAPOR_EE_REPORT, if any, when it exits.
+    """
+    if environ.get(REPORT_VARIABLE):
+        atexit.register(backend.write_report, environ[REPORT_VARIABLE])
+    return install(latency=parse_latency(environ.get(LATENCY_VARIABLE)))
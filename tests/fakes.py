@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Stand-ins for the clock, the export tasks and the submitter shared by
+the tests."""
+
+import threading
+
+from ee import EEException
+
+from utils.export import ExportSubmitter
+
+
+class FakeClock(object):
+    """ Clock advanced by its sleeps only, callable like ``time.time``.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeTask(object):
+
+    def __init__(self, assetid, fail=False):
+        self.id = "TASK_{0}".format(assetid)
+        self.fail = fail
+
+    def start(self):
+        if self.fail:
+            raise EEException("Quota exceeded")
+
+
+class FakeSpec(object):
+
+    def __init__(self, assetid, fail=False):
+        self.assetid = assetid
+        self.fail = fail
+        self.lineage = None
+
+    def task(self):
+        return FakeTask(self.assetid, self.fail)
+
+    def to_dict(self):
+        return dict(assetid=self.assetid)
+
+
+class FakeSubmitter(ExportSubmitter):
+    """ Submitter over an in memory asset collection.
+
+        The children exist and are probed from memory, the ``locked`` ones
+        can not be deleted. The ``listed`` asset ids are the listing of
+        the collection, without them it is read from ``ee.data.getList``.
+        The ``lineages`` are those recorded on the assets.
+    """
+
+    def __init__(self, workers=4, children=(), locked=(), listed=None,
+                 lineages=None, **kw):
+        super(FakeSubmitter, self).__init__(workers=workers, **kw)
+        self.children = list(children)
+        self.locked = locked
+        self.listed = listed
+        self.recorded = dict(lineages or {})
+        self.threads = set()
+        self.probes = []
+        self.deleted = []
+        self.reads = 0
+
+    def listing(self, collection, site="export"):
+        if self.listed is None:
+            return super(FakeSubmitter, self).listing(collection, site)
+        return set(self.listed)
+
+    def lineages(self, collection, site="export"):
+        self.reads += 1
+        return self.recorded
+
+    def _info(self, assetid, site):
+        self.probes.append(assetid)
+        return assetid, assetid in self.children or None
+
+    def _delete(self, assetid, site):
+        self.threads.add(threading.current_thread().name)
+        if assetid in self.locked:
+            return assetid, "Asset is locked"
+        self.deleted.append(assetid)
+        return assetid, None
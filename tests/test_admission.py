@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the admission of exports to the free task slots."""
+
+import os
+import sys
+import socket
+import subprocess
+
+import pytest
+
+from tests.fakes import FakeClock, FakeSpec
+from utils.admission import AdmissionController, QueueStore, parse_priorities
+
+
+class FakeService(object):
+
+    def __init__(self, active=0):
+        self.running = active
+        self.polls = 0
+
+    def active(self):
+        self.polls += 1
+        return self.running
+
+
+def owner(pid):
+    return "{0}:{1}".format(socket.gethostname(), pid)
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def specs(*names):
+    return [FakeSpec("projects/fao-wapor/L1/{0}".format(name))
+            for name in names]
+
+
+def test_priorities_come_first():
+    clock = FakeClock()
+    started = []
+    controller = AdmissionController(
+        FakeService(), max_running=1, priorities={"AETI": 10, "L2": 5},
+        sleep=clock.sleep, clock=clock
+    )
+
+    def start(spec):
+        started.append(spec.assetid.split("/")[-1])
+        return spec.assetid
+
+    batch = specs("L1_NPP_15", "L1_AETI_15", "L2_T_15", "L1_E_15")
+    results = controller.admit(batch, start)
+    assert results == [spec.assetid for spec in batch]
+    assert started == ["L1_AETI_15", "L2_T_15", "L1_NPP_15", "L1_E_15"]
+
+
+def test_running_tasks_limit_the_exports_started():
+    clock = FakeClock()
+    service = FakeService(active=3)
+    controller = AdmissionController(
+        service, max_running=4, interval=10,
+        sleep=clock.sleep, clock=clock
+    )
+    times = []
+
+    def start(spec):
+        times.append(clock.now)
+        # tasks complete as soon as they are started
+        service.running = max(0, service.running - 1)
+
+    controller.admit(specs("L1_E_15", "L1_T_15", "L1_I_15"), start)
+    # one slot at first, the account is polled again after an interval
+    assert times == [0, 10, 10]
+    assert service.polls == 2
+
+
+def test_failed_start_is_the_result_of_its_spec():
+    clock = FakeClock()
+    controller = AdmissionController(
+        FakeService(), max_running=2, sleep=clock.sleep, clock=clock
+    )
+
+    def start(spec):
+        if spec.assetid.endswith("T_15"):
+            raise RuntimeError("Invalid image")
+        return spec.assetid, None
+
+    batch = specs("L1_E_15", "L1_T_15")
+    assert controller.admit(batch, start) == [
+        (batch[0].assetid, None), (batch[1].assetid, "Invalid image")
+    ]
+
+
+def test_account_and_store_are_read_outside_of_the_lock(tmpdir):
+    clock = FakeClock()
+    locked = []
+
+    class LockCheckingService(FakeService):
+
+        def active(self):
+            locked.append(controller._lock.locked())
+            return super(LockCheckingService, self).active()
+
+    class LockCheckingStore(QueueStore):
+
+        def save(self, entries):
+            locked.append(controller._lock.locked())
+            super(LockCheckingStore, self).save(entries)
+
+    controller = AdmissionController(
+        LockCheckingService(), max_running=1, sleep=clock.sleep,
+        clock=clock, store=LockCheckingStore(str(tmpdir.join("queue.json")))
+    )
+    controller.admit(specs("L1_E_15", "L1_T_15"), lambda spec: None)
+    assert locked and not any(locked)
+
+
+def test_queue_is_persisted_and_restored(tmpdir):
+    store = QueueStore(str(tmpdir.join("wapor", "queue.json")))
+    clock = FakeClock()
+    controller = AdmissionController(
+        FakeService(), max_running=1, store=store,
+        sleep=clock.sleep, clock=clock
+    )
+    saved = []
+
+    def start(spec):
+        saved.append([entry["spec"]["assetid"] for entry in store.load()])
+
+    controller.admit(specs("L1_E_15", "L1_T_15"), start)
+    assert saved == [
+        ["projects/fao-wapor/L1/L1_E_15", "projects/fao-wapor/L1/L1_T_15"],
+        ["projects/fao-wapor/L1/L1_T_15"],
+    ]
+    assert store.load() == []
+
+    # an interrupted run leaves its queue behind
+    QueueStore(store.path, owner=owner(exited_pid())).save([
+        dict(priority=0, spec=dict(assetid="a")),
+        dict(priority=5, spec=dict(assetid="b")),
+    ])
+    restarted = AdmissionController(FakeService(), store=store)
+    assert restarted.restore() == [
+        dict(assetid="b"), dict(assetid="a")
+    ]
+    assert store.load() == []
+
+
+def test_queue_of_a_running_process_is_left_alone(tmpdir):
+    path = str(tmpdir.join("queue.json"))
+    running = QueueStore(path, owner=owner(os.getppid()))
+    running.save([dict(priority=0, spec=dict(assetid="a"))])
+    store = QueueStore(path)
+    controller = AdmissionController(FakeService(), store=store)
+    assert controller.restore() == []
+    controller.admit(specs("L1_E_15"), lambda spec: spec.assetid)
+    store.save([dict(priority=1, spec=dict(assetid="b"))])
+    # each process replaces its own entries only
+    assert sorted(
+        (entry["owner"], entry["spec"]["assetid"]) for entry in store.load()
+    ) == sorted([(running.owner, "a"), (store.owner, "b")])
+
+
+def test_invalid_queue_file_is_empty(tmpdir):
+    path = tmpdir.join("queue.json")
+    path.write("{not json")
+    assert QueueStore(str(path)).load() == []
+
+
+def test_parse_priorities():
+    assert parse_priorities(["L1=5", "AETI=10"]) == {"L1": 5, "AETI": 10}
+    with pytest.raises(ValueError):
+        parse_priorities(["AETI"])
+    with pytest.raises(ValueError):
+        parse_priorities(["AETI=high"])
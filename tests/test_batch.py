@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the batch manifest expansion and the job DAG."""
+
+import threading
+
+import pytest
+
+from utils.batch import Batch, expand, load_manifest, parse_years
+
+CONTEXT = {
+    "EE_WORKSPACE_WAPOR": "projects/fao-wapor",
+    "export": True,
+    "outputs": False,
+}
+
+MANIFEST = """
+years: 2015-2016
+levels: [L1, L3]
+areas: [BKA]
+seasons: ["1"]
+products:
+  - aeti
+  - common:
+      components: [T, AETI]
+  - agbp
+  - nbwp
+  - gbwp
+"""
+
+
+def jobs_by_key(jobs):
+    return dict([(job.key, job) for job in jobs])
+
+
+def test_parse_years():
+    assert parse_years("2009-2011") == ["2009", "2010", "2011"]
+    assert parse_years(2016) == ["2016"]
+    assert parse_years([2017, "2015-2016"]) == ["2015", "2016", "2017"]
+    with pytest.raises(ValueError):
+        parse_years("2019-2009")
+
+
+def test_load_manifest_rejects_unknown_values():
+    with pytest.raises(ValueError):
+        load_manifest("years: 2016\nproducts: [npp]\n")
+    with pytest.raises(ValueError):
+        load_manifest("years: 2016\nlevels: [L4]\nproducts: [agbp]\n")
+    with pytest.raises(ValueError):
+        load_manifest("years: 2016\n")
+
+
+def test_expand_jobs():
+    jobs = jobs_by_key(expand(load_manifest(MANIFEST), CONTEXT))
+    assert sorted(key for key in jobs if key.endswith("16")) == [
+        "L1_AETI_16", "L1_AETI_D_16", "L1_AGBP_16", "L1_GBWP_16",
+        "L1_NBWP_16", "L1_T_16",
+    ]
+    assert "L3_GBWP_16s1_BKA" in jobs
+    assert "L3_NBWP_16s1" in jobs
+    assert jobs["L3_AETI_D_16_BKA"].assets[0] == \
+        "projects/fao-wapor/L3/L3_AETI_D/L3_AETI_1601_BKA"
+    assert jobs["L1_T_16"].kwargs["nodatavalue"] == "255"
+    assert jobs["L1_AETI_16"].kwargs["nodatavalue"] == "-9999"
+
+
+def test_expand_skips_agbp_at_l3():
+    manifest = load_manifest(
+        "years: 2016\nlevels: [L2, L3]\nareas: [BKA]\nproducts: [agbp]\n"
+    )
+    assert [job.key for job in expand(manifest, CONTEXT)] == ["L2_AGBP_16"]
+
+
+def test_dependencies_follow_the_naming_convention():
+    batch = Batch(expand(load_manifest(MANIFEST), CONTEXT), run=None)
+    depends = batch.depends
+    # AETI dekadal -> AETI annual -> GBWP
+    assert depends["L1_AETI_16"] == ["L1_AETI_D_16"]
+    assert depends["L1_GBWP_16"] == ["L1_AETI_16", "L1_AGBP_16"]
+    # NPP -> AGBP -> NBWP, which also reads T annual
+    assert depends["L1_AGBP_16"] == []
+    assert sorted(depends["L1_NBWP_16"]) == ["L1_AGBP_16", "L1_T_16"]
+    # seasons read the dekadal AETI of the same area
+    assert depends["L3_GBWP_16s1_BKA"] == ["L3_AETI_D_16_BKA"]
+    # years never depend on each other
+    assert depends["L1_AETI_15"] == ["L1_AETI_D_15"]
+
+
+def test_execute_runs_upstream_first_and_waits_for_tasks():
+    jobs = expand(load_manifest(MANIFEST), CONTEXT)
+    order = []
+    watched = []
+    lock = threading.Lock()
+
+    def run(job):
+        with lock:
+            order.append(job.key)
+        return dict(
+            tasks=dict(
+                [(asset, {"taskid": "T_" + asset}) for asset in job.assets]
+            ),
+            errors={}
+        )
+
+    def watch(tasks):
+        with lock:
+            watched.append(len(tasks))
+        return dict(states={"COMPLETED": len(tasks)})
+
+    batch = Batch(jobs, run=run, watch=watch, workers=3)
+    report = batch.execute()
+    assert set(order) == set(job.key for job in jobs)
+    for key, deps in batch.depends.items():
+        for dep in deps:
+            assert order.index(dep) < order.index(key)
+    assert all(item["status"] == "done" for item in report.values())
+    # only jobs with dependents wait for their tasks
+    assert 36 in watched
+    assert "watch" not in report["L1_GBWP_16"]["result"]
+
+
+def test_failed_upstream_skips_dependents():
+    jobs = expand(load_manifest(
+        "years: 2016\nproducts: [agbp, nbwp, gbwp, common]\n"
+    ), CONTEXT)
+
+    def run(job):
+        if job.product == "agbp":
+            return dict(tasks={}, errors={"1": "Collection has size 0"})
+        return dict(tasks={}, errors={})
+
+    events = []
+    report = Batch(jobs, run=run, workers=2).execute(on_event=events.append)
+    assert report["L1_AGBP_16"]["status"] == "failed"
+    assert report["L1_NBWP_16"]["status"] == "skipped"
+    assert report["L1_GBWP_16"]["status"] == "skipped"
+    assert report["L1_AETI_16"]["status"] == "done"
+    assert dict(job="L1_NBWP_16", status="skipped") in events
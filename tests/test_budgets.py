@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Round trip budgets of the wapor commands on the fake Earth Engine.
+
+Every command runs in its own process started by ``python -m testing``
+and its round trips are read from the report of the fake backend. A
+budget is an upper bound on the blocking calls of an operation, and on
+the size of the largest expression sent by a getInfo or an export, in
+nodes. A new getInfo in a loop, or an export graph growing with the
+number of images, breaks the budget of its command.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info[0] > 2, reason="the algorithms are Python 2 code"
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MANIFEST = """
+years: "2016"
+levels: [L1]
+products:
+  - nbwp
+"""
+
+# command line, then the most calls and graph nodes by operation
+BUDGETS = [
+    (
+        "common-annual",
+        ["-l", "L1", "common", "--", "2016", "A", "E", "NA", "255"],
+        dict(getInfo=1, start=1, graphs=dict(getInfo=100, start=40)),
+    ),
+    (
+        "common-annual-areas",
+        [
+            "-l", "L3", "common", "--areas", "all", "--",
+            "2016", "A", "AETI", "NA", "-9999"
+        ],
+        dict(getInfo=1, start=5, graphs=dict(getInfo=600, start=40)),
+    ),
+    (
+        "aeti-dekads",
+        ["-l", "L1", "aeti", "--", "2016", "D", "AETI"],
+        dict(getInfo=2, start=36, graphs=dict(getInfo=200, start=120)),
+    ),
+    (
+        "aeti-dekads-areas",
+        ["-l", "L3", "aeti", "--areas", "all", "--", "2016", "D", "AETI"],
+        dict(getInfo=2, start=180, graphs=dict(getInfo=600, start=120)),
+    ),
+    (
+        "agbp-annual",
+        ["-l", "L1", "agbp", "--", "2016", "A", "NPP", "-9999"],
+        dict(getInfo=1, start=1, graphs=dict(getInfo=100, start=40)),
+    ),
+    (
+        # the annual NBWP can not be written as positional arguments
+        "nbwp-annual",
+        ["-l", "L1", "batch", "manifest.yaml"],
+        # the band names are only computed when both collections have images
+        dict(getInfo=1, start=1, graphs=dict(getInfo=200, start=40)),
+    ),
+    (
+        "gbwp-annual",
+        [
+            "-l", "L1", "gbwp", "--", "2016", "A", "-1", "AGBP", "NA",
+            "-9999"
+        ],
+        dict(getInfo=1, start=1, graphs=dict(getInfo=200, start=40)),
+    ),
+]
+
+
+def run_wapor(tmpdir, args):
+    """Run a wapor command on the fake backend and return its report."""
+    tmpdir.join("config.cfg").write(
+        "[wapor]\ngee_workspace_base = projects\n"
+        "gee_workspace_project = fao-wapor\n"
+    )
+    tmpdir.join("manifest.yaml").write(MANIFEST)
+    report = tmpdir.join("report.json")
+    env = dict(
+        os.environ,
+        HOME=str(tmpdir),
+        PYTHONPATH=ROOT,
+        WAPOR_EE_REPORT=str(report)
+    )
+    command = [
+        sys.executable, "-m", "testing",
+        "--config-file", str(tmpdir.join("config.cfg")),
+        "--no-cache", "--rate", "1000", "--batch-rate", "1000",
+        "--trace", str(tmpdir.join("trace.json"))
+    ] + args
+    process = subprocess.Popen(
+        command, cwd=str(tmpdir), env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+    output = process.communicate()[0].decode("utf-8", "replace")
+    assert process.returncode == 0, output
+    with open(str(report)) as report_file:
+        return json.load(report_file)
+
+
+@pytest.mark.parametrize(
+    "args,budget",
+    [(args, budget) for _, args, budget in BUDGETS],
+    ids=[name for name, _, _ in BUDGETS]
+)
+def test_command_stays_within_its_budget(tmpdir, args, budget):
+    pytest.importorskip("marmee")
+    pytest.importorskip("gee_pheno")
+    report = run_wapor(tmpdir, args)
+    budget = dict(budget)
+    graphs = budget.pop("graphs")
+    for operation, most in budget.items():
+        assert report["calls"].get(operation, 0) <= most, (
+            "{0} {1} calls, the budget is {2}".format(
+                report["calls"].get(operation, 0), operation, most
+            )
+        )
+    for operation, most in graphs.items():
+        assert report["graphs"][operation]["max"] <= most, (
+            "{0} graph of {1} nodes, the budget is {2}".format(
+                operation, report["graphs"][operation]["max"], most
+            )
+        )
+    # every product is exported
+    assert report["calls"]["start"] == budget["start"]
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the disk backed metadata cache."""
+
+import os
+import time
+
+from utils.cache import MetadataCache
+
+SOURCE = "projects/fao-wapor/L1/L1_E_D"
+
+
+def test_update_times_are_read_again_once_invalidated(tmpdir, monkeypatch):
+    times = {SOURCE: "1"}
+    calls = []
+
+    def get_info(asset_id):
+        calls.append(asset_id)
+        return dict(updateTime=times[asset_id])
+
+    monkeypatch.setattr("ee.data.getInfo", get_info, raising=False)
+    cache = MetadataCache(directory=str(tmpdir))
+    values = iter([dict(size=36), dict(size=37)])
+
+    def compute():
+        return next(values)
+
+    assert cache.fetch([SOURCE], ("COMMON",), compute) == dict(size=36)
+    times[SOURCE] = "2"
+    # the update time is read once
+    assert cache.fetch([SOURCE], ("COMMON",), compute) == dict(size=36)
+    assert calls == [SOURCE]
+
+    cache.invalidate()
+    assert cache.fetch([SOURCE], ("COMMON",), compute) == dict(size=37)
+    assert calls == [SOURCE, SOURCE]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_view_reads_the_update_times_again(tmpdir, monkeypatch):
+    times = {SOURCE: "1"}
+    calls = []
+
+    def get_info(asset_id):
+        calls.append(asset_id)
+        return dict(updateTime=times[asset_id])
+
+    monkeypatch.setattr("ee.data.getInfo", get_info, raising=False)
+    cache = MetadataCache(directory=str(tmpdir))
+    cache.fetch([SOURCE], ("COMMON",), lambda: dict(size=36))
+    times[SOURCE] = "2"
+    view = cache.view()
+    assert view.fetch([SOURCE], ("COMMON",), lambda: dict(size=37)) == \
+        dict(size=37)
+    # the update time of the cache is left alone, the entries are shared
+    assert cache.update_time(SOURCE) == "1"
+    assert cache.fetch([SOURCE], ("COMMON",), lambda: None) == dict(size=36)
+    assert calls == [SOURCE, SOURCE]
+
+
+def fixed_times(monkeypatch, times):
+    monkeypatch.setattr(
+        "ee.data.getInfo",
+        lambda asset_id: dict(updateTime=times[asset_id])
+        if asset_id in times else None,
+        raising=False
+    )
+
+
+def test_unknown_update_time_is_never_cached(tmpdir, monkeypatch):
+    fixed_times(monkeypatch, {})
+    cache = MetadataCache(directory=str(tmpdir))
+    values = iter([dict(size=36), dict(size=37)])
+    assert cache.fetch([SOURCE], ("COMMON",), lambda: next(values)) == dict(
+        size=36
+    )
+    assert cache.fetch([SOURCE], ("COMMON",), lambda: next(values)) == dict(
+        size=37
+    )
+    assert tmpdir.listdir() == []
+
+
+def test_source_update_changes_the_key(tmpdir, monkeypatch):
+    times = {SOURCE: "1"}
+    fixed_times(monkeypatch, times)
+    cache = MetadataCache(directory=str(tmpdir))
+    before = cache.key([SOURCE], ("COMMON",))
+    cache.fetch([SOURCE], ("COMMON",), lambda: dict(size=36))
+    times[SOURCE] = "2"
+    cache.invalidate()
+    assert cache.key([SOURCE], ("COMMON",)) != before
+    assert cache.fetch(
+        [SOURCE], ("COMMON",), lambda: dict(size=37)
+    ) == dict(size=37)
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_entries_expire_after_the_ttl(tmpdir, monkeypatch):
+    fixed_times(monkeypatch, {SOURCE: "1"})
+    cache = MetadataCache(directory=str(tmpdir), ttl=60)
+    key = cache.key([SOURCE], ("COMMON",))
+    cache.set(key, dict(size=36))
+    assert cache.get(key) == dict(size=36)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get(key) is None
+    # the expired entry is removed
+    assert tmpdir.listdir() == []
+
+
+def test_least_recently_used_entries_are_evicted(tmpdir):
+    cache = MetadataCache(directory=str(tmpdir))
+    for index, key in enumerate(["a", "b", "c"]):
+        cache.set(key, "x" * 100)
+        os.utime(cache._path(key), (index, index))
+    # a read makes "a" the most recently used
+    assert cache.get("a") is not None
+    cache.max_size = 2 * os.path.getsize(cache._path("a"))
+    cache.evict()
+    assert sorted(
+        os.path.basename(str(path)) for path in tmpdir.listdir()
+    ) == ["a.pickle", "c.pickle"]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the record/replay cassettes of Earth Engine calls."""
+
+import pytest
+
+from ee import EEException
+
+from utils.cassette import Cassette, CassetteMiss, call_key
+from utils.metrics import Metrics
+
+
+class FakeExpression(object):
+    """ Earth Engine object with a deterministic serialized expression.
+    """
+
+    def __init__(self, expression, info=None):
+        self.expression = expression
+        self.info = info
+        self.calls = 0
+
+    def serialize(self):
+        return '{{"expression": "{0}"}}'.format(self.expression)
+
+    def getInfo(self):
+        self.calls += 1
+        if self.info is None:
+            raise EEException("Collection.load: Collection asset not found.")
+        return self.info
+
+
+class FakeTask(object):
+
+    def __init__(self, assetid):
+        self.id = None
+        self.config = dict(assetId=assetid)
+
+    def start(self):
+        self.id = "TASK_{0}".format(self.config["assetId"])
+
+
+def fake_status():
+    states = ["READY", "RUNNING", "COMPLETED"]
+
+    def getTaskStatus(task_ids):
+        state = states.pop(0) if len(states) > 1 else states[0]
+        return [dict(id=task_ids[0], state=state)]
+    return getTaskStatus
+
+
+def run(metrics):
+    """Calls of a run, the responses it has seen."""
+    seen = [
+        metrics.call(
+            "getInfo", "COMMON.process_annual",
+            FakeExpression("sum(L1_E_D)", {"size": 36}).getInfo
+        )
+    ]
+    try:
+        metrics.call(
+            "getInfo", "COMMON.process_annual",
+            FakeExpression("L1_X_D").getInfo
+        )
+    except EEException as e:
+        seen.append("{0}".format(e))
+    task = FakeTask("projects/fao-wapor/L1/L1_E_A/L1_E_16")
+    metrics.call("start", "export", task.start)
+    seen.append(task.id)
+    get_task_status = fake_status()
+    for _ in range(4):
+        seen.append(metrics.call(
+            "getTaskStatus", "tasks", get_task_status, [task.id]
+        )[0]["state"])
+    return seen
+
+
+def test_replay_answers_like_the_recorded_run(tmpdir):
+    path = str(tmpdir.join("run.cassette"))
+    metrics = Metrics()
+    metrics.cassette = Cassette(path, "record")
+    recorded = run(metrics)
+    metrics.cassette.save()
+    assert recorded[-4:] == ["READY", "RUNNING", "COMPLETED", "COMPLETED"]
+
+    slept = []
+    replayed = Metrics()
+    replayed.cassette = Cassette(path, "replay", sleep=slept.append)
+    assert run(replayed) == recorded
+    assert len(slept) == 7
+    # the replay is measured like a live run
+    assert replayed.summary()["operations"]["getInfo"] == dict(
+        calls=2, seconds=replayed.summary()["operations"]["getInfo"][
+            "seconds"
+        ], errors=1
+    )
+    assert replayed.summary()["calls"] == metrics.summary()["calls"]
+
+
+def test_replay_without_latency_and_misses(tmpdir):
+    path = str(tmpdir.join("run.cassette"))
+    metrics = Metrics()
+    metrics.cassette = Cassette(path, "record")
+    run(metrics)
+    metrics.cassette.save()
+
+    slept = []
+    metrics = Metrics()
+    metrics.cassette = Cassette(path, latency=0, sleep=slept.append)
+    info = FakeExpression("sum(L1_E_D)", {"size": 36})
+    assert metrics.call("getInfo", "elsewhere", info.getInfo) == {"size": 36}
+    # nothing reaches Earth Engine on replay
+    assert info.calls == 0
+    assert slept == []
+    with pytest.raises(CassetteMiss):
+        metrics.call(
+            "getInfo", "COMMON.process_annual",
+            FakeExpression("sum(L1_T_D)").getInfo
+        )
+    assert metrics.cassette.misses == 1
+    assert metrics.summary()["errors"] == 1
+
+
+def test_keys_follow_the_expression():
+    first = FakeExpression("sum(L1_E_D)")
+    assert call_key("getInfo", first.getInfo, (), {}) == call_key(
+        "getInfo", FakeExpression("sum(L1_E_D)").getInfo, (), {}
+    )
+    assert call_key("getInfo", first.getInfo, (), {}) != call_key(
+        "getInfo", FakeExpression("sum(L1_T_D)").getInfo, (), {}
+    )
+    assert call_key("getList", dict.get, ({"id": "a"},), {}) != call_key(
+        "getList", dict.get, ({"id": "b"},), {}
+    )
+
+
+def test_invalid_cassettes(tmpdir):
+    with pytest.raises(ValueError):
+        Cassette(str(tmpdir.join("run.cassette")), "rewind")
+    with pytest.raises(IOError):
+        Cassette(str(tmpdir.join("missing.cassette")), "replay")
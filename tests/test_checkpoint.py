@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the checkpoint of the export tasks started by a run."""
+
+from tests.fakes import FakeSpec, FakeSubmitter
+from utils.checkpoint import Checkpoint
+
+COLLECTION = "projects/fao-wapor/L1/L1_AETI_D"
+
+
+class FakeService(object):
+
+    def __init__(self, states=None):
+        self.states = states or {}
+        self.calls = 0
+
+    def status(self, task_ids):
+        self.calls += 1
+        return [
+            dict(id=task_id, state=self.states.get(task_id, "COMPLETED"))
+            for task_id in task_ids
+        ]
+
+
+def dekads(fail=()):
+    return [
+        FakeSpec(
+            "{0}/L1_AETI_16{1:02d}".format(COLLECTION, dekad),
+            fail=dekad in fail
+        )
+        for dekad in range(1, 37)
+    ]
+
+
+def test_resume_skips_the_submitted_dekads(tmpdir):
+    path = str(tmpdir.join("checkpoint.jsonl"))
+    submitter = FakeSubmitter(listed=[], checkpoint=Checkpoint(path))
+    tasks, errors = submitter.submit(dekads(fail=[23]), COLLECTION)
+    assert len(tasks) == 35
+    assert list(errors) == [COLLECTION + "/L1_AETI_1623"]
+    assert len(Checkpoint(path).load()) == 35
+
+    # a dekad submitted by the first run has failed meanwhile
+    failed = COLLECTION + "/L1_AETI_1605"
+    service = FakeService({"TASK_{0}".format(failed): "FAILED"})
+    submitter = FakeSubmitter(
+        listed=[spec.assetid for spec in dekads() if spec.assetid != (
+            COLLECTION + "/L1_AETI_1623"
+        )],
+        checkpoint=Checkpoint(path, service, resume=True)
+    )
+    tasks, errors = submitter.submit(dekads(), COLLECTION)
+    assert errors == {}
+    assert len(tasks) == 36
+    resumed = [
+        assetid for assetid, task in tasks.items() if task.get("resumed")
+    ]
+    assert len(resumed) == 34
+    assert failed not in resumed
+    assert tasks[failed] == {"taskid": "TASK_{0}".format(failed)}
+    # only the failed dekad is deleted again
+    assert submitter.deleted == [failed]
+    assert service.calls == 1
+    assert len(Checkpoint(path).load()) == 36
+
+
+def test_without_resume_nothing_is_kept(tmpdir):
+    path = str(tmpdir.join("checkpoint.jsonl"))
+    Checkpoint(path).record("A", "TASK_A")
+    service = FakeService()
+    checkpoint = Checkpoint(path, service)
+    assert checkpoint.submitted(["A"]) == {}
+    assert service.calls == 0
+    assert Checkpoint(path, service, resume=True).submitted(
+        ["A", "B"]
+    ) == {"A": "TASK_A"}
+
+
+def test_runs_add_to_the_checkpoint_file(tmpdir):
+    path = str(tmpdir.join("checkpoint.jsonl"))
+    first = Checkpoint(path)
+    second = Checkpoint(path)
+    first.record("A", "TASK_A1")
+    second.record("B", "TASK_B")
+    first.record("A", "TASK_A2")
+    # one line a task, the last task of an asset wins
+    assert len(tmpdir.join("checkpoint.jsonl").readlines()) == 3
+    assert Checkpoint(path).load() == {"A": "TASK_A2", "B": "TASK_B"}
+
+
+def test_invalid_checkpoint_lines_are_skipped(tmpdir):
+    path = tmpdir.join("checkpoint.jsonl")
+    path.write('[not json\n{"assetid": "A", "taskid": "TASK_A"}\n{"asse')
+    assert Checkpoint(str(path), resume=True).load() == {"A": "TASK_A"}
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the engine running blocking calls concurrently."""
+
+import threading
+
+import pytest
+
+from utils.engine import Engine, CallTimeout, CallCancelled
+
+
+def test_gather_keeps_order_and_bounds_threads():
+    engine = Engine(workers=3)
+    threads = set()
+    lock = threading.Lock()
+
+    def probe(i):
+        with lock:
+            threads.add(threading.current_thread().name)
+        return i * 2
+
+    try:
+        calls = [engine.submit(probe, i) for i in range(100)]
+        assert engine.gather(calls) == [i * 2 for i in range(100)]
+    finally:
+        engine.close()
+    assert len(threads) <= 3
+
+
+def test_timeout_cancels_pending_calls():
+    engine = Engine(workers=1)
+    release = threading.Event()
+    try:
+        blocked = engine.submit(release.wait, 5)
+        pending = engine.submit(lambda: "never")
+        with pytest.raises(CallTimeout):
+            engine.gather([blocked, pending], timeout=0.05)
+        assert pending.cancelled
+        release.set()
+        assert blocked.result(5) is True
+        with pytest.raises(CallCancelled):
+            pending.result()
+    finally:
+        release.set()
+        engine.close()
+
+
+def test_errors_are_raised_to_the_caller():
+    engine = Engine(workers=2)
+
+    def fail(item):
+        if item == 3:
+            raise ValueError("Too many concurrent aggregations")
+        return item
+
+    try:
+        with pytest.raises(ValueError):
+            engine.map(fail, range(5))
+    finally:
+        engine.close()
+
+
+def test_map_inside_the_engine_is_inline():
+    engine = Engine(workers=2)
+    try:
+        # both workers would wait forever for the calls they submit
+        calls = [
+            engine.submit(engine.map, lambda item: item + 1, [1, 2, 3])
+            for _ in range(2)
+        ]
+        assert engine.gather(calls, timeout=5) == [[2, 3, 4], [2, 3, 4]]
+    finally:
+        engine.close()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the concurrent export submitter."""
+
+import threading
+
+from tests.fakes import FakeSpec, FakeSubmitter
+from utils import export
+from utils.engine import Engine
+
+
+def test_submit_keeps_tasks_shape():
+    specs = [FakeSpec("L1_AETI_16{0:02d}".format(i)) for i in range(1, 37)]
+    submitter = FakeSubmitter(workers=4)
+    tasks, errors = submitter.submit(specs)
+    assert errors == {}
+    assert len(tasks) == 36
+    assert tasks["L1_AETI_1601"] == {"taskid": "TASK_L1_AETI_1601"}
+    assert len(submitter.threads) <= 4
+
+
+def test_submit_reports_errors_per_asset():
+    specs = [FakeSpec("A"), FakeSpec("B", fail=True), FakeSpec("C")]
+    tasks, errors = FakeSubmitter(workers=2).submit(specs)
+    assert sorted(tasks) == ["A", "C"]
+    assert errors == {"B": "Quota exceeded"}
+
+
+def test_unexpected_start_failure_is_the_error_of_its_asset():
+
+    class BrokenSpec(FakeSpec):
+
+        def task(self):
+            raise ValueError("Invalid crs_transform")
+
+    tasks, errors = FakeSubmitter(workers=2).submit(
+        [FakeSpec("A"), BrokenSpec("B")]
+    )
+    assert tasks == {"A": {"taskid": "TASK_A"}}
+    assert errors == {"B": "Invalid crs_transform"}
+
+
+def test_late_start_is_the_error_of_its_asset():
+    release = threading.Event()
+
+    class BlockedSpec(FakeSpec):
+
+        def task(self):
+            task = super(BlockedSpec, self).task()
+            task.start = lambda: release.wait(5)
+            return task
+
+    engine = Engine(workers=2)
+    try:
+        tasks, errors = FakeSubmitter(
+            workers=2, engine=engine, timeout=0.05
+        ).submit([FakeSpec("A"), BlockedSpec("B")])
+    finally:
+        release.set()
+        engine.close()
+    # the started task of A is kept
+    assert tasks == {"A": {"taskid": "TASK_A"}}
+    assert errors == {"B": "Not completed in 0.05s, it may still complete"}
+
+
+def test_submit_nothing():
+    assert FakeSubmitter(workers=2).submit([]) == ({}, {})
+
+
+def test_existing_assets_are_listed_once(monkeypatch):
+    collection = "projects/fao-wapor/L1/L1_AETI_D"
+    children = [
+        {"id": "{0}/L1_AETI_16{1:02d}".format(collection, i), "type": "Image"}
+        for i in range(1, 19)
+    ]
+    calls = []
+
+    def get_list(params):
+        calls.append(params)
+        return children
+
+    monkeypatch.setattr(
+        "ee.data.getList", get_list, raising=False
+    )
+    specs = [
+        FakeSpec("{0}/L1_AETI_16{1:02d}".format(collection, i))
+        for i in range(1, 37)
+    ]
+    submitter = FakeSubmitter(workers=4)
+    tasks, errors = submitter.submit(specs[:18], collection=collection)
+    tasks, errors = submitter.submit(specs[18:], collection=collection)
+    assert calls == [{"id": collection, "num": export.LISTING_SIZE}]
+    assert submitter.probes == []
+    assert sorted(submitter.deleted) == sorted(c["id"] for c in children)
+    assert len(tasks) == 18 and errors == {}
+
+
+def test_assets_missing_from_a_truncated_listing_are_probed(monkeypatch):
+    collection = "projects/fao-wapor/L1/L1_AETI_D"
+    assetids = [
+        "{0}/L1_AETI_16{1:02d}".format(collection, i) for i in range(1, 5)
+    ]
+    monkeypatch.setattr(export, "LISTING_SIZE", 2)
+    monkeypatch.setattr(
+        "ee.data.getList",
+        lambda params: [dict(id=assetid) for assetid in assetids][
+            :params["num"]
+        ],
+        raising=False
+    )
+    submitter = FakeSubmitter(workers=2, children=assetids[2:3])
+    tasks, errors = submitter.submit(
+        [FakeSpec(assetid) for assetid in assetids], collection=collection
+    )
+    assert sorted(submitter.probes) == assetids[2:]
+    assert sorted(submitter.deleted) == assetids[:3]
+    assert len(tasks) == 4 and errors == {}
+
+
+def test_view_lists_again_and_keeps_the_listings(monkeypatch):
+    collection = "projects/fao-wapor/L1/L1_AETI_A"
+    calls = []
+
+    def get_list(params):
+        calls.append(params)
+        return [dict(id="{0}/L1_AETI_{1}".format(collection, len(calls)))]
+
+    monkeypatch.setattr("ee.data.getList", get_list, raising=False)
+    submitter = FakeSubmitter(workers=2)
+    assert submitter.listing(collection) == set([collection + "/L1_AETI_1"])
+    view = submitter.view()
+    assert view.listing(collection) == set([collection + "/L1_AETI_2"])
+    # the listing of the submitter is not taken from a running job
+    assert submitter.listing(collection) == set([collection + "/L1_AETI_1"])
+    assert len(calls) == 2
+    assert view.engine is submitter.engine
+
+
+def test_failed_deletion_skips_export():
+    submitter = FakeSubmitter(workers=2, children=["A", "B"], locked=["B"])
+    tasks, errors = submitter.submit([FakeSpec("A"), FakeSpec("B")])
+    assert sorted(submitter.probes) == ["A", "B"]
+    assert submitter.deleted == ["A"]
+    assert sorted(tasks) == ["A"]
+    assert errors == {"B": "Asset is locked"}
+
+
+def test_assets_exported_since_the_listing_are_probed(monkeypatch):
+    collection = "projects/fao-wapor/L1/L1_AETI_A"
+    assetid = "{0}/L1_AETI_16".format(collection)
+    calls = []
+
+    def get_list(params):
+        calls.append(params)
+        return []
+
+    monkeypatch.setattr("ee.data.getList", get_list, raising=False)
+    submitter = FakeSubmitter(workers=2)
+    tasks, errors = submitter.submit(
+        [FakeSpec(assetid)], collection=collection
+    )
+    assert tasks == {assetid: {"taskid": "TASK_" + assetid}}
+    assert submitter.deleted == []
+    # the export wrote the asset, the listing of the collection is older
+    submitter.children.append(assetid)
+    tasks, errors = submitter.submit(
+        [FakeSpec(assetid)], collection=collection
+    )
+    assert calls == [{"id": collection, "num": export.LISTING_SIZE}]
+    assert submitter.probes == [assetid]
+    assert submitter.deleted == [assetid]
+    assert errors == {}
+
+    submitter.invalidate()
+    submitter.submit([FakeSpec(assetid)], collection=collection)
+    assert calls == [{"id": collection, "num": export.LISTING_SIZE}] * 2
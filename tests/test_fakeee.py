@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the in-process fake Earth Engine backend."""
+
+import sys
+
+import pytest
+
+from testing import fakeee
+from testing.fakeee import (
+    Backend, Date, Dictionary, EEException, Filter, Image, ImageCollection,
+    Join, Reducer
+)
+
+COLLECTION = "projects/fao-wapor/L1/L1_E_D"
+
+
+@pytest.fixture(autouse=True)
+def backend():
+    fakeee.backend.reset()
+    fakeee.backend.latency = 0.0
+    yield fakeee.backend
+    fakeee.backend.reset()
+
+
+def test_annual_sum_of_dekads(backend):
+    coll = ImageCollection(COLLECTION).filterDate(
+        Date.fromYMD(2016, 1, 1), Date.fromYMD(2017, 1, 1)
+    )
+    assert coll.size().getInfo() == 36
+    first = Image(coll.first())
+    assert first.get("system:index").getInfo() == "L1_E_1601"
+    assert first.get("n_days_extent").getInfo() == 10
+
+    # dekadal values are masked where nodata, then scaled by the days
+    def daily(image):
+        image = Image(image)
+        return image.updateMask(image.lt(254)).multiply(
+            image.metadata("n_days_extent")
+        )
+
+    annual = coll.map(daily).reduce(Reducer.sum()).int32()
+    info = annual.getInfo()
+    assert [band["id"] for band in info["bands"]] == ["b1_sum"]
+    assert info["bands"][0]["data_type"]["precision"] == "int32"
+    assert info["bands"][0]["crs"] == fakeee.CRS
+
+    pixels = annual.pixels()
+    assert pixels.mask[0, 0]
+    expected = sum(
+        image.pixels()[1, 1] * image.properties["n_days_extent"]
+        for image in coll.images
+    )
+    assert pixels[1, 1] == int(expected)
+
+
+def test_join_combines_matching_dekads(backend):
+    e = ImageCollection(COLLECTION).filterDate("2016-01-01", "2016-02-01")
+    t = ImageCollection("projects/fao-wapor/L1/L1_T_D").filterDate(
+        "2016-01-01", "2016-02-01"
+    )
+    joined = Join.inner().apply(e, t, Filter.equals(
+        leftField="system:time_start", rightField="system:time_start"
+    ))
+    assert joined.size().getInfo() == 3
+
+    def combine(feature):
+        return Image.cat(
+            feature.get("primary"), feature.get("secondary")
+        ).select(["b1", "b1_1"]).rename(["e", "t"])
+
+    aeti = joined.map(combine).map(
+        lambda image: image.select("e").add(image.select("t")).rename("aeti")
+    )
+    image = Image(aeti.toList(1, 2).get(0))
+    assert image.bandNames().getInfo() == ["aeti"]
+    assert image.get("system:index").getInfo() == "L1_E_1603"
+    with pytest.raises(EEException):
+        image.select("b1")
+
+
+def test_probe_dictionary_in_a_single_round_trip(backend):
+    coll = ImageCollection("projects/fao-wapor/L3/L3_AETI_D").filter(
+        Filter.eq("area_code", "BKA")
+    ).filterDate("2016-01-01", "2017-01-01")
+    size = coll.size()
+    info = Dictionary(dict(
+        size=size,
+        first=fakeee.Algorithms.If(size.gt(0), coll.first(), None),
+        timestamps=coll.aggregate_array("system:time_start"),
+        histogram=coll.aggregate_histogram("area_code")
+    )).getInfo()
+    assert info["size"] == 36
+    assert info["first"]["properties"]["area_code"] == "BKA"
+    assert info["histogram"] == {"BKA": 36}
+    assert len(info["timestamps"]) == 36
+    assert backend.calls == {"getInfo": 1}
+
+
+def test_export_is_written_and_listed(backend):
+    image = Image(ImageCollection(COLLECTION).first()).setMulti(
+        dict(code="L1_E_16")
+    )
+    task = fakeee.batch.Export.image.toAsset(
+        image, description="L1_E_16",
+        assetId="projects/fao-wapor/L1/L1_E_A/L1_E_16"
+    )
+    task.start()
+    assert task.status()["state"] == "COMPLETED"
+    assert fakeee.data.getTaskStatus([task.id])[0]["state"] == "COMPLETED"
+    info = fakeee.data.getInfo("projects/fao-wapor/L1/L1_E_A/L1_E_16")
+    assert info["type"] == "Image"
+    assert info["properties"]["code"] == "L1_E_16"
+    assert fakeee.data.getList(
+        {"id": "projects/fao-wapor/L1/L1_E_A"}
+    ) == [dict(type="Image", id="projects/fao-wapor/L1/L1_E_A/L1_E_16")]
+    # assets are not overwritten
+    with pytest.raises(EEException):
+        fakeee.batch.Export.image.toAsset(
+            image, assetId="projects/fao-wapor/L1/L1_E_A/L1_E_16"
+        ).start()
+    fakeee.data.deleteAsset("projects/fao-wapor/L1/L1_E_A/L1_E_16")
+    assert fakeee.data.getInfo("projects/fao-wapor/L1/L1_E_A/L1_E_16") is None
+    with pytest.raises(EEException):
+        ImageCollection("projects/fao-wapor/L1/L1_X").size().getInfo()
+
+
+def test_latency_is_added_to_round_trips():
+    slept = []
+    backend = Backend(
+        latency={"getInfo": 0.2, "default": 0.05}, sleep=slept.append,
+        complete_tasks=False
+    )
+    backend.round_trip("getInfo")
+    backend.round_trip("start")
+    backend.round_trip("getInfo")
+    assert slept == [0.2, 0.05, 0.2]
+    assert backend.calls == {"getInfo": 2, "start": 1}
+
+
+def test_dates_serialize_like_earth_engine():
+    date = Date.fromYMD(2016, 1, 21)
+    assert fakeee.json.loads(date.serialize())["arguments"] == {
+        "value": "2016-01-21"
+    }
+    assert fakeee.deserializer.fromJSON(date.serialize()).millis == (
+        date.millis
+    )
+
+
+def test_install_replaces_ee(monkeypatch):
+    for name in ("ee",) + tuple(
+        "ee." + module for module in fakeee.SUBMODULES
+    ):
+        monkeypatch.setitem(sys.modules, name, sys.modules.get(name))
+    assert not fakeee.installed()
+    backend = fakeee.install_from_environment({"WAPOR_EE_LATENCY": "0.1"})
+    assert fakeee.installed()
+    assert backend.latency == 0.1
+    import ee
+    from ee.data import getInfo
+    assert ee.Image is Image
+    assert getInfo is fakeee.data.getInfo
+    backend = fakeee.install_from_environment({
+        "WAPOR_EE_LATENCY": "getInfo=0.2, default=0.05"
+    })
+    assert backend.latency == {"getInfo": 0.2, "default": 0.05}
+    backend.latency = 0.0
+
+
+def test_graph_sizes_of_round_trips(backend):
+    coll = ImageCollection(COLLECTION).filterDate("2016-01-01", "2017-01-01")
+    # the mapped algorithm counts once, not once per image
+    mapped = coll.map(lambda image: image.multiply(2).add(1))
+    assert mapped.nodes == coll.nodes + 1 + 5
+    assert mapped.size().nodes == mapped.nodes + 1
+    mapped.size().getInfo()
+    task = fakeee.batch.Export.image.toAsset(
+        mapped.sum(), assetId="projects/fao-wapor/L1/L1_E_A/L1_E_16"
+    )
+    task.start()
+    assert backend.summary()["graphs"] == dict(
+        getInfo=dict(count=1, max=mapped.nodes + 1, total=mapped.nodes + 1),
+        start=dict(count=1, max=mapped.nodes + 2, total=mapped.nodes + 2)
+    )
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Startup budget of the wapor command line.
+
+The help of wapor and of its commands, and wrong arguments, are answered
+without loading Earth Engine, the configuration files or the algorithms.
+Every check runs in a fresh process, the import time of cli.cli is read
+from ``python -X importtime`` where the interpreter has it.
+"""
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# dependencies only the commands which need them may load
+HEAVY = (
+    "ee", "oauth2client", "httplib2", "click_configfile", "yaml", "marmee",
+    "dask", "pendulum", "gee_pheno", "numpy", "pandas"
+)
+# the command line framework and the logging, every command needs them
+BASE = ("click", "daiquiri")
+# seconds to import cli.cli once BASE is loaded, about 0.5 when Earth
+# Engine was loaded with it
+STARTUP_BUDGET = 0.15
+
+LOADED = """
+import sys, json
+{0}
+print(json.dumps([name for name in {1!r} if name in sys.modules]))
+"""
+
+INVOKED = """
+import sys, json
+from click.testing import CliRunner
+from cli.cli import main
+result = CliRunner().invoke(main, sys.argv[1:])
+print(json.dumps(dict(
+    exit_code=result.exit_code,
+    loaded=[name for name in {0!r} if name in sys.modules]
+)))
+"""
+
+
+def python(code, args=(), options=(), cwd=ROOT, home=None):
+    """Output and errors of the code run by a fresh interpreter."""
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    if home is not None:
+        env.update(HOME=home)
+    process = subprocess.Popen(
+        [sys.executable] + list(options) + ["-c", code] + list(args),
+        cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    output, errors = process.communicate()
+    assert process.returncode == 0, errors
+    return output.decode("utf-8"), errors.decode("utf-8")
+
+
+def import_seconds(module, preloaded=BASE):
+    """Cumulative import time of a module in a fresh interpreter."""
+    preload = "import {0}\n".format(", ".join(preloaded))
+    if sys.version_info >= (3, 7):
+        _, errors = python(
+            preload + "import {0}".format(module),
+            options=["-X", "importtime"]
+        )
+        for line in errors.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if name.strip() == module:
+                return int(cumulative) / 1e6
+        raise AssertionError("{0} is not in the import times".format(module))
+    output, _ = python(
+        preload + "import time\nstarted = time.time()\nimport {0}\n"
+        "print(time.time() - started)".format(module)
+    )
+    return float(output)
+
+
+def test_startup_stays_within_its_budget():
+    # the fastest of a few runs, a busy machine only slows some of them
+    seconds = min(import_seconds("cli.cli") for _ in range(3))
+    assert seconds <= STARTUP_BUDGET, (
+        "importing cli.cli takes {0:.3f}s, the budget is {1}s".format(
+            seconds, STARTUP_BUDGET
+        )
+    )
+
+
+def test_import_loads_no_heavy_dependency():
+    output, _ = python(LOADED.format("import cli.cli", HEAVY))
+    assert json.loads(output) == []
+
+
+@pytest.mark.parametrize("args,exit_code", [
+    (["--help"], 0),
+    (["common", "--help"], 0),
+    (["-l", "L1", "common", "2016", "X"], 2),
+    (["tasks", "watch", "--interval", "x"], 2),
+])
+def test_help_and_wrong_arguments_load_nothing_heavy(args, exit_code):
+    output, _ = python(INVOKED.format(HEAVY), args=args)
+    result = json.loads(output.splitlines()[-1])
+    assert result == dict(exit_code=exit_code, loaded=[])
+
+
+@pytest.mark.skipif(
+    sys.version_info[0] > 2, reason="the algorithms are Python 2 code"
+)
+def test_algorithms_load_dask_and_phenology_when_used():
+    pytest.importorskip("marmee")
+    output, _ = python(LOADED.format(
+        "from algorithms import common, aeti, agbp, nbwp, gbwp",
+        ("dask", "pendulum", "gee_pheno")
+    ))
+    assert json.loads(output) == []
+
+
+def test_job_queue_commands_need_no_earth_engine(tmpdir):
+    pytest.importorskip("click_configfile")
+    # no credentials either
+    tmpdir.join("config.cfg").write(
+        "[wapor]\ngee_workspace_base = projects\n"
+        "gee_workspace_project = fao-wapor\n"
+    )
+    base = ["--config-file", "config.cfg", "jobs", "-d", "jobs.db"]
+    for args in (
+        ["add", "--", "-l", "L3", "common", "2016", "A", "E", "BKA"],
+        ["list"],
+        ["requeue"],
+    ):
+        output, _ = python(
+            INVOKED.format(("ee", "oauth2client", "httplib2")),
+            args=base + args, cwd=str(tmpdir), home=str(tmpdir)
+        )
+        result = json.loads(output.splitlines()[-1])
+        assert result == dict(exit_code=0, loaded=[])
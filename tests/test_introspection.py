@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the debug logging of Earth Engine objects."""
+
+import logging
+
+import pytest
+
+from utils.introspection import Introspector, Info, Dumps
+from utils.metrics import metrics
+
+
+class FakeObject(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def getInfo(self):
+        self.calls += 1
+        return {"bands": ["b1"]}
+
+
+@pytest.fixture
+def logger():
+    logger = logging.getLogger("wapor.tests.introspection")
+    level = logger.level
+    yield logger
+    logger.setLevel(level)
+
+
+class Records(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_debug_disabled_skips_the_round_trip(logger):
+    logger.setLevel(logging.INFO)
+    introspect = Introspector(logger)
+    coll = FakeObject()
+    metrics.reset()
+    introspect.debug("info {0} {1}", Info(coll), Dumps({"a": 1}))
+    assert coll.calls == 0
+    assert introspect.avoided == 1
+    assert metrics.summary()["calls"] == 0
+    assert introspect.report() == 1
+
+
+def test_debug_enabled_logs_the_resolved_values(logger):
+    logger.setLevel(logging.DEBUG)
+    records = Records()
+    logger.addHandler(records)
+    try:
+        introspect = Introspector(logger)
+        coll = FakeObject()
+        metrics.reset()
+        introspect.debug("info {0} {1} {2}", Info(coll), Dumps({"a": 1}), 3)
+    finally:
+        logger.removeHandler(records)
+    assert coll.calls == 1
+    assert introspect.avoided == 0
+    assert metrics.summary()["operations"]["getInfo"]["calls"] == 1
+    assert records.messages == ["info {'bands': ['b1']} {\"a\": 1} 3"]
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the SQLite job queue and its workers."""
+
+import threading
+
+from utils.jobqueue import JobQueue, Worker
+
+
+def queue_of(tmpdir, count):
+    queue = JobQueue(str(tmpdir.join("wapor", "jobs.db")))
+    queue.put_many([
+        ("common", ["{0}".format(2009 + i % 11), "A", "E"], "L1")
+        for i in range(count)
+    ])
+    return queue
+
+
+def test_jobs_are_queued_in_order(tmpdir):
+    queue = queue_of(tmpdir, 1000)
+    assert queue.counts() == dict(queued=1000, running=0, done=0, failed=0)
+    job = queue.claim("worker-1")
+    assert job["id"] == 1
+    assert job["args"] == ["2009", "A", "E"]
+    assert job["level"] == "L1"
+    assert job["status"] == "running"
+    assert queue.claim("worker-1")["id"] == 2
+    assert queue.counts()["running"] == 2
+
+
+def test_worker_runs_every_job_once(tmpdir):
+    queue = queue_of(tmpdir, 50)
+    lock = threading.Lock()
+    seen = []
+
+    def execute(job):
+        with lock:
+            seen.append(job["id"])
+        assetid = "projects/fao-wapor/L1/L1_E_A/L1_E_{0}".format(
+            job["args"][0][2:]
+        )
+        return dict(
+            tasks={assetid: {"taskid": "TASK_{0}".format(job["id"])}},
+            errors={}
+        )
+
+    worker = Worker(queue, execute, threads=4, name="test")
+    assert worker.run(until_empty=True) == dict(done=50, failed=0)
+    assert sorted(seen) == list(range(1, 51))
+    job = queue.jobs("done")[0]
+    assert job["tasks"] == {
+        "TASK_1": "projects/fao-wapor/L1/L1_E_A/L1_E_09"
+    }
+    assert job["worker"].startswith("test-")
+    assert job["seconds"] >= 0
+
+
+def test_failed_jobs_are_recorded_and_requeued(tmpdir):
+    queue = queue_of(tmpdir, 3)
+
+    def execute(job):
+        if job["id"] == 2:
+            raise ValueError("Collection is empty")
+        if job["id"] == 3:
+            return dict(tasks={}, errors={"1": "Quota exceeded"})
+        return dict(tasks={}, errors={})
+
+    worker = Worker(queue, execute, threads=1)
+    assert worker.run(until_empty=True) == dict(done=1, failed=2)
+    failed = queue.jobs("failed")
+    assert [job["id"] for job in failed] == [2, 3]
+    assert failed[0]["error"] == "Collection is empty"
+    assert failed[1]["result"]["errors"] == {"1": "Quota exceeded"}
+
+    # a worker has crashed while running a job
+    queue.put("aeti", ["2016", "D", "AETI"], "L1")
+    queue.claim("crashed")
+    assert queue.requeue() == 1
+    assert queue.requeue(["running", "failed"]) == 2
+    assert queue.counts() == dict(queued=3, running=0, done=1, failed=0)
+    assert queue.claim("worker-1")["attempts"] == 2
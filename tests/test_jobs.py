@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the job builders and the multi-year fan-out."""
+
+import pytest
+
+from utils.jobs import (
+    common_job, aeti_job, nbwp_job, gbwp_job, run_all, by_year,
+    parse_years, YEARS, AREAS
+)
+from utils.metrics import metrics
+
+CONTEXT = {
+    "EE_WORKSPACE_WAPOR": "projects/fao-wapor",
+    "level": "L1",
+    "export": True,
+    "outputs": False,
+}
+
+
+class FakeJob(object):
+
+    def __init__(self, year, fail=False):
+        self.key = year
+        self.year = year
+        self.fail = fail
+
+    def run(self, cache=None, submitter=None):
+        if self.fail:
+            raise RuntimeError("Computation timed out")
+        return dict(
+            tasks={"L1_E_{0}".format(self.year[2:]): {"taskid": self.year}},
+            outputs=[],
+            errors={}
+        )
+
+
+class FakeCache(object):
+
+    def __init__(self, times):
+        self.times = times
+
+    def update_time(self, asset_id):
+        return self.times.get(asset_id)
+
+
+def test_common_job_kwargs():
+    job = common_job(CONTEXT, "2016", "A", "E", "NA", "255")
+    assert job.kwargs["src_coll"] == "projects/fao-wapor/L1/L1_E_D"
+    assert job.kwargs["dst_asset_coll"] == "projects/fao-wapor/L1/L1_E_A"
+    assert job.kwargs["dst_asset"] == "projects/fao-wapor/L1/L1_E_A/L1_E_16"
+    assert job.area is None
+
+
+def test_lineage_records_the_nodata_value():
+    cache = FakeCache({"projects/fao-wapor/L1/L1_E_D": 1})
+    lineage = common_job(CONTEXT, "2016", "A", "E", "NA", "255").lineage(
+        cache
+    )
+    assert lineage.content()["parameters"]["nodatavalue"] == "255"
+    assert not common_job(
+        CONTEXT, "2016", "A", "E", "NA", "-9999"
+    ).lineage(cache).matches(lineage.value())
+
+
+def test_gbwp_annual_reads_annual_aeti():
+    job = gbwp_job(CONTEXT, "2016", "A", "-1", "AGBP", "NA", "-9999")
+    assert job.consumes == [
+        "projects/fao-wapor/L1/L1_AGBP_A", "projects/fao-wapor/L1/L1_AETI_A"
+    ]
+
+
+def test_annual_water_productivity_jobs_pass_no_season():
+    # the algorithms run their annual process when given no season
+    gbwp = gbwp_job(CONTEXT, "2016", "A", "-1", "AGBP", "NA", "-9999")
+    nbwp = nbwp_job(CONTEXT, "2016", "A", None, "AGBP", "-9999")
+    assert "season" not in gbwp.kwargs
+    assert "season" not in nbwp.kwargs
+    assert nbwp.consumes == [
+        "projects/fao-wapor/L1/L1_AGBP_A", "projects/fao-wapor/L1/L1_T_A"
+    ]
+    seasonal = gbwp_job(
+        dict(CONTEXT, level="L2"), "2016", "S", "1", "AGBP", "NA", "-9999"
+    )
+    assert seasonal.kwargs["season"] == "1"
+
+
+def test_common_job_for_every_area():
+    context = dict(CONTEXT, level="L3")
+    job = common_job(context, "2016", "A", "AETI", None, "-9999", AREAS)
+    assert job.kwargs["areas"]["BKA"] == \
+        "projects/fao-wapor/L3/L3_AETI_A/L3_AETI_16_BKA"
+    assert len(job.assets) == len(AREAS)
+    assert "dst_asset" not in job.kwargs
+    assert job.key == "L3_AETI_A_16_AWA-BKA-KOG-ODN-ZAN"
+
+
+def test_aeti_job_for_areas():
+    context = dict(CONTEXT, level="L3")
+    job = aeti_job(context, "2016", "D", "AETI", None, None, ["BKA", "AWA"])
+    assert job.kwargs["areas"]["AWA"][35] == \
+        "projects/fao-wapor/L3/L3_AETI_D/L3_AETI_1636_AWA"
+    assert len(job.assets) == 72
+    with pytest.raises(ValueError):
+        aeti_job(context, "2016", "D", "AETI", None, "01", ["BKA"])
+
+
+def test_gbwp_seasonal_job_for_areas():
+    context = dict(CONTEXT, level="L3")
+    job = gbwp_job(context, "2016", "S", "1", "AGBP", None, "-9999", ["ZAN"])
+    assert job.assets == ["projects/fao-wapor/L3/L3_GBWP_S/L3_GBWP_16s1_ZAN"]
+    assert job.key == "L3_GBWP_S_16s1_ZAN"
+    # an area job reads the dekadal AETI of every area
+    upstream = aeti_job(context, "2016", "D", "AETI", "ZAN")
+    assert job.depends_on(upstream)
+
+
+def test_year_range():
+    assert parse_years("2009-2019".split(",")) == YEARS
+    assert parse_years("2016,2010-2011".split(",")) == [
+        "2010", "2011", "2016"
+    ]
+
+
+def test_run_all_keyed_by_year():
+    years = ["2015", "2016", "2017"]
+    results = run_all([FakeJob(year) for year in years], workers=2)
+    result = by_year(years, results)
+    assert sorted(result) == years
+    assert result["2016"]["tasks"] == {"L1_E_16": {"taskid": "2016"}}
+
+
+def test_run_all_reports_failing_year():
+    years = ["2015", "2016"]
+    results = run_all([FakeJob("2015"), FakeJob("2016", fail=True)])
+    result = by_year(years, results)
+    assert result["2015"]["errors"] == {}
+    assert result["2016"]["errors"] == {"1": "Computation timed out"}
+
+
+def test_single_year_keeps_result_shape():
+    results = run_all([FakeJob("2016")])
+    assert by_year(["2016"], results) == results[0]
+
+
+def test_both_seasons_in_one_job():
+    context = dict(CONTEXT, level="L2")
+    job = nbwp_job(context, "2016", "S", "all", "AGBP", "-9999")
+    assert job.kwargs["seasons"] == {
+        "1": "projects/fao-wapor/L2/L2_NBWP_S/L2_NBWP_16s1",
+        "2": "projects/fao-wapor/L2/L2_NBWP_S/L2_NBWP_16s2",
+    }
+    assert job.key == "L2_NBWP_S_16s1-2"
+    assert "projects/fao-wapor/L2/L2_T_D" in job.consumes
+
+    context = dict(CONTEXT, level="L3")
+    job = gbwp_job(context, "2016", "S", "all", "AGBP", "AWA", "-9999")
+    assert job.assets == [
+        "projects/fao-wapor/L3/L3_GBWP_S/L3_GBWP_16s1_AWA",
+        "projects/fao-wapor/L3/L3_GBWP_S/L3_GBWP_16s2_AWA",
+    ]
+    with pytest.raises(ValueError):
+        gbwp_job(context, "2016", "S", "all", "AGBP", None, "-9999", AREAS)
+
+
+class FreshSubmitter(object):
+    """ Submitter finding every asset fresh after one round trip.
+    """
+
+    skip_fresh = True
+    engine = None
+
+    def fresh(self, assetids, lineage, collection=None, site="export"):
+        metrics.call("getInfo", "jobs", lambda: None)
+        return list(assetids)
+
+
+def test_job_metrics_cover_the_job_only():
+    job = common_job(CONTEXT, "2016", "A", "E", "NA", "255")
+    metrics.call("getInfo", "earlier", lambda: None)
+    result = job.run(submitter=FreshSubmitter())
+    assert result["tasks"] == {
+        job.assets[0]: dict(taskid=None, fresh=True)
+    }
+    assert result["metrics"]["calls"] == 1
+    assert list(result["metrics"]["sites"]) == ["jobs"]
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the lineage of exported assets and the freshness check."""
+
+from tests.fakes import FakeSpec, FakeSubmitter
+from utils.lineage import Lineage
+
+COLLECTION = "projects/fao-wapor/L1/L1_AETI_D"
+SOURCES = ["projects/fao-wapor/L1/L1_E_D", "projects/fao-wapor/L1/L1_T_D"]
+
+
+def lineage(times):
+    return Lineage("aeti", SOURCES, update_time=times.get, version="0.2.4")
+
+
+def test_lineage_changes_with_sources_parameters_and_version():
+    times = {SOURCES[0]: 1, SOURCES[1]: 2}
+    current = lineage(times)
+    assert current.matches(lineage(dict(times)).value())
+    assert not current.matches(lineage({SOURCES[0]: 1, SOURCES[1]: 3}).value())
+    assert not current.matches(Lineage(
+        "aeti", SOURCES, update_time=times.get, version="0.3.0"
+    ).value())
+    assert not current.matches(Lineage(
+        "aeti", SOURCES, update_time=times.get, version="0.2.4",
+        parameters={"nodatavalue": "-9999"}
+    ).value())
+    assert not current.matches(None)
+    assert not current.matches("not json")
+
+
+def test_unknown_update_time_is_never_fresh():
+    unknown = lineage({SOURCES[0]: 1})
+    assert not unknown.known
+    assert not unknown.matches(unknown.value())
+
+
+def test_submit_skips_fresh_assets():
+    times = {SOURCES[0]: 1, SOURCES[1]: 2}
+    fresh_id = "{0}/L1_AETI_1601".format(COLLECTION)
+    stale_id = "{0}/L1_AETI_1602".format(COLLECTION)
+    recorded = {fresh_id: lineage(times).value(), stale_id: "{}"}
+    submitter = FakeSubmitter(
+        listed=recorded, lineages=recorded, skip_fresh=True
+    )
+    specs = [FakeSpec(fresh_id), FakeSpec(stale_id)]
+    tasks, errors = submitter.submit(
+        specs, collection=COLLECTION, lineage=lineage(times)
+    )
+    assert errors == {}
+    assert tasks[fresh_id] == dict(taskid=None, fresh=True)
+    assert tasks[stale_id] == {"taskid": "TASK_{0}".format(stale_id)}
+    assert submitter.reads == 1
+    # the lineage goes with the export
+    assert specs[1].lineage == lineage(times).value()
+
+
+def test_submit_replaces_everything_by_default():
+    times = {SOURCES[0]: 1, SOURCES[1]: 2}
+    assetid = "{0}/L1_AETI_1601".format(COLLECTION)
+    recorded = {assetid: lineage(times).value()}
+    submitter = FakeSubmitter(listed=recorded, lineages=recorded)
+    tasks, errors = submitter.submit(
+        [FakeSpec(assetid)], collection=COLLECTION, lineage=lineage(times)
+    )
+    assert tasks[assetid] == {"taskid": "TASK_{0}".format(assetid)}
+    assert submitter.reads == 0
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the load test harness of synthetic job mixes."""
+
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+
+import pytest
+
+from utils.loadtest import (
+    LoadTest, ThreadSampler, distribution, job_mix, percentile
+)
+from utils.metrics import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONTEXT = {
+    "EE_WORKSPACE_BASE": "projects",
+    "EE_WORKSPACE_WAPOR": "projects/fao-wapor",
+    "level": "L1",
+    "export": "assets",
+    "outputs": False
+}
+
+
+class FakeJob(object):
+
+    def __init__(self, key, product="common", depends=(), error=None):
+        self.key = key
+        self.product = product
+        self.year = "2016"
+        self.assets = ["projects/fao-wapor/L1/{0}".format(key)]
+        self.depends = depends
+        self.error = error
+        self.seconds = None
+
+    def depends_on(self, other):
+        return other.key in self.depends
+
+    def run(self, cache=None, submitter=None):
+        self.seconds = 0.5
+        if self.error:
+            return dict(tasks={}, outputs=[], errors={"1": self.error})
+        return dict(
+            tasks=dict([(asset, dict(taskid="T" + self.key))
+                        for asset in self.assets]),
+            outputs=[], errors={}
+        )
+
+
+def test_percentiles_and_distribution():
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 90) == 3.0
+    assert percentile([], 50) is None
+    summary = distribution(reversed(values))
+    assert summary == dict(
+        count=100, mean=50.5, p50=50.0, p90=90.0, p99=99.0, max=100.0
+    )
+    assert distribution([])["p99"] is None
+
+
+def test_thread_sampler_sees_the_peak():
+    sampler = ThreadSampler(interval=0.01)
+    sampler.start()
+    release = threading.Event()
+    workers = [threading.Thread(target=release.wait) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    peak = threading.active_count()
+    time.sleep(0.1)
+    release.set()
+    for worker in workers:
+        worker.join()
+    assert sampler.stop() >= peak
+
+
+def test_job_mix_is_seeded_and_never_exports_twice():
+    mix = job_mix(CONTEXT, 1000, years=["2015", "2016"], seed=1)
+    assets = [asset for job in mix for asset in job.assets]
+    assert len(assets) >= 1000
+    assert len(set(assets)) == len(assets)
+    assert len(set(job.key for job in mix)) == len(mix)
+    # the products of a workspace are repeated in the next tenants
+    assert len(set(job.tenant for job in mix)) > 1
+    assert set(job.product for job in mix) == set(
+        ["aeti", "common", "agbp", "nbwp", "gbwp"]
+    )
+    assert [job.key for job in mix] == [
+        job.key for job in job_mix(CONTEXT, 1000, years=["2015", "2016"],
+                                   seed=1)
+    ]
+    assert [job.key for job in mix] != [
+        job.key for job in job_mix(CONTEXT, 1000, years=["2015", "2016"],
+                                   seed=2)
+    ]
+
+
+def test_job_mix_seasons_are_opt_in():
+    with pytest.raises(ValueError):
+        # no annual water productivity at L2
+        job_mix(CONTEXT, 10, levels=["L2"], products=["nbwp"])
+    seasonal = job_mix(
+        CONTEXT, 10, years=["2016"], levels=["L2"], seasons=["1", "2"],
+        products=["nbwp"]
+    )
+    assert set(job.job.kwargs["season"] for job in seasonal) == set(
+        ["1", "2"]
+    )
+
+
+def test_load_test_report():
+    metrics.reset()
+    jobs = [
+        FakeJob("L1_AGBP_16", "agbp"),
+        FakeJob("L1_NBWP_16", "nbwp", depends=["L1_AGBP_16"]),
+        FakeJob("L1_E_16"),
+        FakeJob("L1_T_16", error="Collection.load: not found"),
+    ]
+    report = LoadTest(
+        jobs, watch=lambda tasks: dict(states={"COMPLETED": len(tasks)}),
+        workers=2
+    ).run()
+    assert report["jobs"]["statuses"] == dict(done=3, failed=1)
+    assert report["jobs"]["products"] == dict(agbp=1, nbwp=1, common=2)
+    assert report["exports"] == dict(queued=4, started=3)
+    assert report["latency"]["jobs"]["p99"] == 0.5
+    assert report["errors"] == {
+        "L1_T_16": {"1": "Collection.load: not found"}
+    }
+    assert report["threads"]["peak"] >= 2
+    json.dumps(report)
+
+
+@pytest.mark.skipif(
+    sys.version_info[0] > 2, reason="the algorithms are Python 2 code"
+)
+def test_loadtest_command_on_the_fake_backend(tmpdir):
+    pytest.importorskip("marmee")
+    pytest.importorskip("gee_pheno")
+    tmpdir.join("config.cfg").write(
+        "[wapor]\ngee_workspace_base = projects\n"
+        "gee_workspace_project = fao-wapor\n"
+    )
+    env = dict(
+        os.environ,
+        HOME=str(tmpdir),
+        PYTHONPATH=ROOT
+    )
+    command = [
+        sys.executable, "-m", "testing",
+        "--config-file", str(tmpdir.join("config.cfg")),
+        "--no-cache", "--rate", "1000", "--batch-rate", "1000",
+        "loadtest", "--exports", "60", "--years", "2016", "--levels",
+        "L1,L2", "--jobs", "4",
+        "--latency", "getInfo=0.01,default=0", "--output",
+        str(tmpdir.join("report.json"))
+    ]
+    process = subprocess.Popen(
+        command, cwd=str(tmpdir), env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+    output = process.communicate()[0].decode("utf-8", "replace")
+    assert process.returncode == 0, output
+    with open(str(tmpdir.join("report.json"))) as report_file:
+        report = json.load(report_file)
+    assert report["errors"] == {}
+    assert report["jobs"]["statuses"] == dict(done=report["jobs"]["total"])
+    assert report["exports"]["started"] >= 60
+    assert report["backend"]["calls"]["start"] == (
+        report["exports"]["started"]
+    )
+    assert report["latency"]["calls"]["getInfo"]["p50"] >= 0.01
+    assert report["settings"]["latency"] == dict(getInfo=0.01, default=0)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the round trip metrics."""
+
+import json
+
+import pytest
+
+from tests.fakes import FakeClock
+from utils.metrics import Metrics
+
+
+def test_summary_by_operation_and_site():
+    clock = FakeClock(100.0)
+    metrics = Metrics(clock=clock)
+
+    def get_info():
+        clock.now += 1.5
+        return {"size": 36}
+
+    def start():
+        clock.now += 0.25
+
+    assert metrics.call(
+        "getInfo", "COMMON.process_annual", get_info
+    ) == {"size": 36}
+    metrics.call("start", "COMMON.process_annual", start)
+    metrics.call("start", "AETI.process_dekadal", start)
+
+    summary = metrics.summary()
+    assert summary["calls"] == 3
+    assert summary["seconds"] == 2.0
+    assert summary["operations"]["start"] == dict(
+        calls=2, seconds=0.5, errors=0
+    )
+    assert summary["sites"]["COMMON.process_annual"] == dict(
+        getInfo=dict(calls=1, seconds=1.5, errors=0),
+        start=dict(calls=1, seconds=0.25, errors=0)
+    )
+    assert summary["elapsed"] == 2.0
+    # the summary goes in the JSON result
+    json.dumps(summary)
+
+
+def test_errors_are_counted_and_raised():
+    metrics = Metrics()
+
+    def fail():
+        raise ValueError("Too many concurrent aggregations")
+
+    with pytest.raises(ValueError):
+        metrics.call("getInfo", "probe", fail)
+    summary = metrics.summary()
+    assert summary["errors"] == 1
+    assert metrics.events[0]["error"] == "ValueError"
+
+
+def test_write_trace(tmpdir):
+    metrics = Metrics()
+    metrics.call("deleteAsset", "export", lambda: None)
+    path = str(tmpdir.join("trace.json"))
+    metrics.write_trace(path)
+    with open(path) as trace_file:
+        trace = json.load(trace_file)
+    assert trace["summary"]["calls"] == 1
+    assert trace["events"][0]["operation"] == "deleteAsset"
+    assert trace["events"][0]["site"] == "export"
+
+    metrics.reset()
+    assert metrics.summary()["calls"] == 0
+
+
+def test_summary_since_a_snapshot():
+    clock = FakeClock(100.0)
+    metrics = Metrics(clock=clock)
+    metrics.call("getInfo", "COMMON.process_annual", lambda: None)
+    metrics.throttle("wait", "start", "export", 1.0)
+    before = metrics.snapshot()
+    clock.now += 2.0
+    metrics.call("start", "export", lambda: None)
+
+    summary = metrics.summary(since=before)
+    assert summary["calls"] == 1
+    assert summary["operations"] == dict(
+        start=dict(calls=1, seconds=0.0, errors=0)
+    )
+    assert list(summary["sites"]) == ["export"]
+    assert summary["throttling"]["waits"] == 0
+    assert summary["throttling"]["sites"] == {}
+    assert summary["elapsed"] == 2.0
+    # the summary of the run is unchanged
+    assert metrics.summary()["calls"] == 2
+    assert metrics.summary()["throttling"]["waits"] == 1
+
+
+def test_events_are_capped(tmpdir):
+    metrics = Metrics(max_events=3)
+    for _ in range(5):
+        metrics.call("getInfo", "probe", lambda: None)
+    assert len(metrics.events) == 3
+    assert metrics.summary()["calls"] == 5
+    path = str(tmpdir.join("trace.json"))
+    metrics.write_trace(path)
+    with open(path) as trace_file:
+        assert json.load(trace_file)["dropped"] == 2
+
+    metrics.keep(None)
+    for _ in range(5):
+        metrics.call("getInfo", "probe", lambda: None)
+    assert len(metrics.events) == 8
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the single round trip probes of collections."""
+
+import sys
+
+import pytest
+
+from testing import fakeee
+from utils.probe import Probe, fetch_all
+
+COLLECTION = "projects/fao-wapor/L1/L1_E_D"
+
+
+@pytest.fixture
+def ee(monkeypatch):
+    for name in ("ee",) + tuple(
+        "ee." + module for module in fakeee.SUBMODULES
+    ):
+        monkeypatch.setitem(sys.modules, name, sys.modules.get(name))
+    backend = fakeee.install(latency=0.0)
+    backend.reset()
+    yield fakeee
+    backend.reset()
+
+
+def dekads(ee, year):
+    return ee.ImageCollection(COLLECTION).filterDate(
+        "{0}-01-01".format(year), "{0}-01-01".format(year + 1)
+    )
+
+
+def test_probe_of_a_collection(ee):
+    coll = dekads(ee, 2016)
+    image = ee.Image(coll.first()).multiply(10).int32()
+    probe = Probe(coll, image=image).fetch()
+    assert probe.size == 36
+    assert probe.band_names == ["b1"]
+    assert probe.properties["system:index"] == "L1_E_1601"
+    assert len(probe.timestamps) == 36
+    assert ee.backend.calls == {"getInfo": 1}
+
+
+def test_probe_of_an_empty_collection(ee):
+    coll = dekads(ee, 2030)
+    image = ee.Image(coll.first()).multiply(10).int32()
+    # the image of the first image of an empty collection fails
+    with pytest.raises(ee.EEException):
+        image.bandNames().getInfo()
+    probe = Probe(coll, image=image).fetch()
+    assert probe.size == 0
+    assert probe.first == {}
+    assert probe.band_names == []
+
+
+def test_probe_requires_every_collection_of_its_image(ee):
+    coll = dekads(ee, 2016)
+    empty = dekads(ee, 2030)
+    image = ee.Image(coll.first()).divide(ee.Image(empty.first()))
+    probes = fetch_all(dict(
+        full=Probe(coll, image=image, requires=[empty]),
+        empty=Probe(empty)
+    ))
+    assert probes["full"].size == 36
+    assert probes["full"].band_names == []
+    assert probes["empty"].size == 0
+    assert ee.backend.calls == {"getInfo": 1}
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the client side export properties builder."""
+
+import pytest
+
+from utils.properties import (
+    ExportProperties, DekadalExportProperties, epoch_millis, days_in_year
+)
+
+# ee.Date.fromYMD(year, m, d).millis().getInfo() as returned by the server
+SERVER_MILLIS = {
+    (2009, 1, 1): 1230768000000,
+    (2009, 12, 31): 1262217600000,
+    (2012, 1, 1): 1325376000000,
+    (2012, 12, 31): 1356912000000,
+    (2016, 1, 1): 1451606400000,
+    (2016, 12, 31): 1483142400000,
+    (2019, 1, 1): 1546300800000,
+    (2019, 12, 31): 1577750400000,
+}
+
+DEKAD_PROPERTIES = {
+    "code": "L1_E_1601",
+    "system:index": "L1_E_1601",
+    "id": "L1_E_1601",
+    "time_extent": "from 2016-01-01 to 2016-01-10",
+    "time_resolution": "DEKAD",
+    "n_days_extent": "10.0",
+    "no_data_value": "255",
+    "data_type": "8bit Unsigned Integer",
+    "multiplier": 0.1,
+    "unit": "mm",
+    "system:asset_size": 12345,
+    "system:time_start": 1451606400000,
+    "system:time_end": 1452470400000,
+    "provider": "FAO",
+}
+
+
+@pytest.mark.parametrize("ymd,millis", sorted(SERVER_MILLIS.items()))
+def test_epoch_millis_matches_server(ymd, millis):
+    assert epoch_millis(*ymd) == millis
+
+
+def test_days_in_year():
+    assert days_in_year("2016") == 366
+    assert days_in_year(2017) == 365
+
+
+def test_annual_properties():
+    props = ExportProperties("2016").build("L1_E_16", **DEKAD_PROPERTIES)
+    assert props["code"] == "L1_E_16"
+    assert props["time_extent"] == "from 2016-01-01 to 2016-12-31"
+    assert props["time_resolution"] == "YEAR"
+    assert props["n_days_extent"] == "366.0"
+    assert props["no_data_value"] == "-9999"
+    assert props["data_type"] == "32bit Unsigned Integer"
+    assert props["system:time_start"] == SERVER_MILLIS[(2016, 1, 1)]
+    assert props["system:time_end"] == SERVER_MILLIS[(2016, 12, 31)]
+    assert "system:asset_size" not in props
+    # untouched properties are copied over
+    assert props["multiplier"] == 0.1
+    assert props["unit"] == "mm"
+    assert props["provider"] == "FAO"
+    assert props["system:index"] == "L1_E_1601"
+
+
+def test_annual_properties_only_rewrite_existing_keys():
+    props = ExportProperties("2017").build("L1_E_17", code="x")
+    assert props == {"code": "L1_E_17"}
+
+
+def test_water_productivity_properties():
+    props = ExportProperties(
+        "2016", multiplier=0.001, unit=u"kgDM/m³"
+    ).build("L1_GBWP_16", **DEKAD_PROPERTIES)
+    assert props["multiplier"] == 0.001
+    assert props["unit"] == u"kgDM/m³"
+    assert props["data_type"] == "32bit Unsigned Integer"
+
+
+def test_dekadal_properties():
+    props = DekadalExportProperties().build(
+        "L1_AETI_1601", **DEKAD_PROPERTIES
+    )
+    assert props["code"] == "L1_AETI_1601"
+    assert props["system:index"] == "L1_AETI_1601"
+    assert props["id"] == "L1_AETI_1601"
+    assert props["data_type"] == "16bit Unsigned Integer"
+    assert props["no_data_value"] == "-9999"
+    # time of the source dekad is kept
+    assert props["system:time_start"] == 1451606400000
+    assert props["time_resolution"] == "DEKAD"
+    assert "system:asset_size" not in props
+
+
+def test_build_many():
+    builder = ExportProperties("2016")
+    items = [
+        ("L1_E_16", DEKAD_PROPERTIES),
+        ("L1_T_16", dict(DEKAD_PROPERTIES, code="L1_T_1601")),
+    ]
+    res = builder.build_many(items)
+    assert [props["code"] for props in res] == ["L1_E_16", "L1_T_16"]
+    assert res[0] == builder.build("L1_E_16", **DEKAD_PROPERTIES)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the retry policy and the rate limit of Earth Engine calls."""
+
+import errno
+import threading
+
+import ee
+import pytest
+
+from tests.fakes import FakeClock
+from utils.metrics import Metrics
+from utils.retry import (
+    RetryPolicy, Budget, TokenBucket, is_transient, is_throttled, is_refused
+)
+
+
+class HttpError(Exception):
+
+    class Response(object):
+
+        def __init__(self, status):
+            self.status = status
+
+    def __init__(self, status):
+        super(HttpError, self).__init__("HTTP {0}".format(status))
+        self.resp = self.Response(status)
+
+
+def flaky(errors, value="done"):
+    errors = list(errors)
+
+    def call():
+        if errors:
+            raise errors.pop(0)
+        return value
+    return call
+
+
+def test_transient_errors():
+    assert is_transient(ee.EEException("Too many concurrent aggregations."))
+    assert is_transient(IOError("The read operation timed out"))
+    assert is_transient(ee.EEException("Computation timed out."))
+    assert is_transient(HttpError(503))
+    assert is_transient(HttpError(429))
+    assert not is_transient(ee.EEException("Image.load: Asset not found."))
+    assert not is_transient(HttpError(404))
+    assert not is_transient(ValueError("Too many values"))
+    assert is_throttled(ee.EEException("Quota exceeded"))
+    assert not is_throttled(HttpError(500))
+    assert is_refused(HttpError(429))
+    assert is_refused(IOError(errno.ECONNREFUSED, "Connection refused"))
+    assert not is_refused(HttpError(503))
+    assert not is_refused(IOError("The read operation timed out"))
+
+
+def test_transient_errors_are_retried_with_backoff():
+    clock = FakeClock()
+    metrics = Metrics(clock=clock, policy=RetryPolicy(
+        interactive=Budget(retries=3, base=1.0),
+        sleep=clock.sleep, random=lambda: 0.5
+    ))
+    call = flaky([
+        ee.EEException("Too many concurrent aggregations."),
+        HttpError(503)
+    ])
+    assert metrics.call("getInfo", "probe", call) == "done"
+    # full jitter over 1s then 2s
+    assert clock.slept == [0.5, 1.0]
+    summary = metrics.summary()
+    assert summary["calls"] == 3
+    assert summary["errors"] == 2
+    assert summary["throttling"]["throttles"] == 1
+    assert summary["throttling"]["retries"] == 1
+    assert summary["throttling"]["sites"]["probe"]["seconds"] == 1.5
+
+
+def test_retries_are_bounded_and_other_errors_raised():
+    clock = FakeClock()
+    metrics = Metrics(clock=clock, policy=RetryPolicy(
+        interactive=Budget(retries=1), sleep=clock.sleep
+    ))
+    with pytest.raises(ee.EEException):
+        metrics.call("getInfo", "probe", flaky(
+            [HttpError(500), ee.EEException("Internal error")]
+        ))
+    assert len(clock.slept) == 1
+    with pytest.raises(ee.EEException):
+        metrics.call("getInfo", "probe", flaky(
+            [ee.EEException("Asset not found")]
+        ))
+    assert len(clock.slept) == 1
+
+
+def test_computation_timeouts_have_fewer_retries():
+    clock = FakeClock()
+    metrics = Metrics(clock=clock, policy=RetryPolicy(
+        interactive=Budget(retries=5), sleep=clock.sleep,
+        computation_retries=1
+    ))
+    assert metrics.call("getInfo", "probe", flaky(
+        [ee.EEException("Computation timed out.")]
+    )) == "done"
+    with pytest.raises(ee.EEException):
+        metrics.call("getInfo", "probe", flaky(
+            [ee.EEException("Computation timed out.")] * 2
+        ))
+    assert len(clock.slept) == 2
+    # a request which timed out keeps the retries of the budget
+    assert metrics.call("getInfo", "probe", flaky(
+        [IOError("The read operation timed out")] * 5
+    )) == "done"
+
+
+def test_batch_calls_have_their_own_budget():
+    clock = FakeClock()
+    policy = RetryPolicy(
+        interactive=Budget(retries=0),
+        batch=Budget(retries=2),
+        sleep=clock.sleep
+    )
+    metrics = Metrics(clock=clock, policy=policy)
+    assert metrics.call("start", "export", flaky(
+        [HttpError(429), ee.EEException("Too many tasks")]
+    )) == "done"
+    with pytest.raises(HttpError):
+        metrics.call("getInfo", "probe", flaky([HttpError(503)]))
+
+
+def test_start_is_not_retried_when_the_task_may_exist():
+    clock = FakeClock()
+    metrics = Metrics(clock=clock, policy=RetryPolicy(
+        batch=Budget(retries=2), sleep=clock.sleep
+    ))
+    # the task may have been created before the server failed
+    for error in (HttpError(503), IOError("The read operation timed out")):
+        with pytest.raises(type(error)):
+            metrics.call("start", "export", flaky([error]))
+    assert clock.slept == []
+
+
+def test_token_bucket_limits_the_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock, sleep=lambda s: None)
+    waits = [bucket.acquire() for _ in range(5)]
+    # the burst is free, then one token every half second
+    assert waits == [0.0, 0.0, 0.5, 1.0, 1.5]
+    clock.now = 10.0
+    assert bucket.acquire() == 0.0
+
+
+def test_token_bucket_is_shared_across_threads():
+    clock = FakeClock()
+    lock = threading.Lock()
+    waits = []
+    bucket = TokenBucket(rate=4, burst=1, clock=clock, sleep=lambda s: None)
+
+    def take():
+        wait = bucket.acquire()
+        with lock:
+            waits.append(wait)
+
+    threads = [threading.Thread(target=take) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(waits) == [i * 0.25 for i in range(8)]
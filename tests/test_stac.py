@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the STAC inputs parsed once per process."""
+
+import threading
+
+import pytest
+
+pytest.importorskip("marmee")
+
+from utils import stac  # noqa: E402
+from utils.cache import MetadataCache  # noqa: E402
+
+COLLECTION = "projects/fao-wapor/L1/L1_E_D"
+
+
+class CountingParser(object):
+    """ Parser counting its calls, each one waits for the release.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, collection_id):
+        self.calls.append(collection_id)
+        self.release.wait(5)
+        return dict(id=collection_id)
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    parser = CountingParser()
+    monkeypatch.setattr(stac, "parser", parser)
+    stac.clear()
+    yield parser
+    stac.clear()
+
+
+def test_input_is_parsed_once_per_process(parser):
+    first = stac.parse_input(COLLECTION)
+    assert stac.parse_input(COLLECTION) is first
+    assert first.stacobject == dict(id=COLLECTION)
+    assert parser.calls == [COLLECTION]
+    stac.clear()
+    stac.parse_input(COLLECTION)
+    assert parser.calls == [COLLECTION] * 2
+
+
+def test_concurrent_callers_share_a_single_parse(parser):
+    parser.release.clear()
+    inputs = []
+    threads = [
+        threading.Thread(
+            target=lambda: inputs.append(stac.parse_input(COLLECTION))
+        )
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    parser.release.set()
+    for thread in threads:
+        thread.join()
+    assert parser.calls == [COLLECTION]
+    assert len(inputs) == 8
+    assert len(set(id(inpt) for inpt in inputs)) == 1
+
+
+def test_parsed_stac_is_kept_on_disk(parser, tmpdir, monkeypatch):
+    monkeypatch.setattr(
+        "ee.data.getInfo", lambda asset_id: dict(updateTime="1"),
+        raising=False
+    )
+    cache = MetadataCache(directory=str(tmpdir))
+    stac.parse_input(COLLECTION, cache=cache)
+    assert cache.get(cache.key([COLLECTION], ("STAC",))) == dict(
+        id=COLLECTION
+    )
+    # a later process reads the disk instead of parsing
+    stac.clear()
+    assert stac.parse_input(COLLECTION, cache=cache).stacobject == dict(
+        id=COLLECTION
+    )
+    assert parser.calls == [COLLECTION]
+    assert (cache.hits, cache.misses) == (1, 1)
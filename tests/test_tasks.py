@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Tests for the task watcher against a local stand-in task service."""
+
+import json
+
+from tests.fakes import FakeClock
+from utils.tasks import UNKNOWN_ERROR, TaskWatcher, parse_tasks
+
+
+class FakeTaskService(object):
+    """ Task service replaying a timeline of states per task.
+
+        Each status call advances every requested task by one step of its
+        timeline, the last state is kept once the timeline is over.
+    """
+
+    def __init__(self, timelines):
+        self.timelines = timelines
+        self.steps = dict([(task_id, 0) for task_id in timelines])
+        self.calls = []
+
+    def status(self, task_ids):
+        self.calls.append(list(task_ids))
+        statuses = []
+        for task_id in task_ids:
+            timeline = self.timelines.get(task_id)
+            if timeline is None:
+                statuses.append(dict(id=task_id, state="UNKNOWN"))
+                continue
+            step = min(self.steps[task_id], len(timeline) - 1)
+            self.steps[task_id] += 1
+            state = timeline[step]
+            status = dict(id=task_id, state=state)
+            if state == "FAILED":
+                status.update(error_message="Out of memory")
+            statuses.append(status)
+        return statuses
+
+
+def watcher(service, clock, **kw):
+    return TaskWatcher(service, sleep=clock.sleep, clock=clock.time, **kw)
+
+
+def test_parse_common_and_aeti_results():
+    common = json.dumps(dict(
+        tasks={"projects/fao_wapor/L1/L1_E_A/L1_E_16": {"taskid": "T1"}},
+        outputs=[],
+        errors={}
+    ))
+    aeti = json.dumps(dict(
+        tasks={
+            "projects/fao_wapor/L1/L1_AETI_D/L1_AETI_1601": {"taskid": "T2"},
+            "projects/fao_wapor/L1/L1_AETI_D/L1_AETI_1602": {"taskid": "T3"}
+        },
+        outputs=[],
+        errors={}
+    ))
+    failed = "Error: Commad execution has produced:\n" + json.dumps(dict(
+        tasks={"projects/fao_wapor/L1/L1_GBWP_A/L1_GBWP_16": {"taskid": "T4"}},
+        outputs=[],
+        errors={"1": "Collection AGBP has size 0 while it should be 1"}
+    ))
+    tasks = parse_tasks("\n".join([common, aeti, failed, "not json"]))
+    assert tasks == {
+        "T1": "projects/fao_wapor/L1/L1_E_A/L1_E_16",
+        "T2": "projects/fao_wapor/L1/L1_AETI_D/L1_AETI_1601",
+        "T3": "projects/fao_wapor/L1/L1_AETI_D/L1_AETI_1602",
+        "T4": "projects/fao_wapor/L1/L1_GBWP_A/L1_GBWP_16",
+    }
+
+
+def test_parse_single_document():
+    assert parse_tasks('{"tasks": {"A": {"taskid": "T1"}}}') == {"T1": "A"}
+    assert parse_tasks("") == {}
+
+
+def test_watch_streams_transitions_until_done():
+    service = FakeTaskService(dict(
+        T1=["READY", "RUNNING", "COMPLETED"],
+        T2=["READY", "READY", "RUNNING", "RUNNING", "FAILED"],
+    ))
+    changes = []
+    summary = watcher(service, FakeClock()).watch(
+        dict(T1="A", T2="B"), on_change=changes.append
+    )
+    assert [(c["taskid"], c["previous"], c["state"]) for c in changes] == [
+        ("T1", None, "READY"),
+        ("T2", None, "READY"),
+        ("T1", "READY", "RUNNING"),
+        ("T1", "RUNNING", "COMPLETED"),
+        ("T2", "READY", "RUNNING"),
+        ("T2", "RUNNING", "FAILED"),
+    ]
+    assert changes[-1]["error"] == "Out of memory"
+    assert summary["states"] == {"COMPLETED": 1, "FAILED": 1}
+    assert summary["tasks"]["T2"] == dict(
+        asset="B", state="FAILED", error="Out of memory"
+    )
+    # completed tasks are no longer polled
+    assert service.calls[-1] == ["T2"]
+
+
+def test_watch_backs_off_while_nothing_changes():
+    service = FakeTaskService(dict(
+        T1=["RUNNING"] * 6 + ["COMPLETED"]
+    ))
+    clock = FakeClock()
+    watcher(
+        service, clock, interval=2, max_interval=5, factor=2
+    ).watch(dict(T1="A"))
+    # reset after the first transition, then grows up to the maximum
+    assert clock.slept == [2, 4, 5, 5, 5, 5]
+
+
+def test_watch_polls_in_batches():
+    timelines = dict(
+        ("T{0:02d}".format(i), ["COMPLETED"]) for i in range(1, 37)
+    )
+    service = FakeTaskService(timelines)
+    w = watcher(service, FakeClock(), batch_size=10)
+    summary = w.watch(dict((task_id, None) for task_id in timelines))
+    assert [len(call) for call in service.calls] == [10, 10, 10, 6]
+    assert summary["polls"] == 4
+    assert summary["states"] == {"COMPLETED": 36}
+
+
+def test_watch_stops_on_timeout():
+    service = FakeTaskService(dict(T1=["RUNNING"]))
+    clock = FakeClock()
+    summary = watcher(service, clock, interval=10).watch(
+        dict(T1="A"), timeout=30
+    )
+    assert summary["states"] == {"RUNNING": 1}
+    assert clock.now <= 30
+
+
+def test_watch_ends_unknown_tasks_with_an_error():
+    service = FakeTaskService(dict(T1=["RUNNING", "COMPLETED"]))
+    clock = FakeClock()
+    changes = []
+    summary = watcher(service, clock, interval=1).watch(
+        dict(T1="A", TYPO="B"), on_change=changes.append
+    )
+    assert summary["states"] == {"COMPLETED": 1, "UNKNOWN": 1}
+    assert summary["tasks"]["TYPO"]["error"] == UNKNOWN_ERROR
+    assert [change["taskid"] for change in changes] == ["T1", "TYPO", "T1"]
+    assert service.calls == [["T1", "TYPO"], ["T1"]]
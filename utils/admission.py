@@ -0,0 +1,350 @@
+import os
+import json
+import time
+import errno
+import socket
+import tempfile
+import threading
+import contextlib
+import daiquiri
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_MAX_RUNNING = 10
+DEFAULT_QUEUE_FILE = os.path.expanduser("~/.wapor/queue.json")
+
+
+def parse_priorities(values):
+    """Priorities of levels, products or areas out of KEY=VALUE strings.
+
+    Example:
+        parse_priorities(["L1=5", "AETI=10"]) -> {"L1": 5, "AETI": 10}
+    """
+    priorities = {}
+    for value in values or ():
+        key, sep, number = "{0}".format(value).partition("=")
+        if not sep or not key.strip():
+            raise ValueError("Priority {0} is not KEY=VALUE".format(value))
+        priorities[key.strip()] = int(number)
+    return priorities
+
+
+class QueueStore(object):
+    """ JSON file holding the exports waiting for a task slot.
+
+        The file is shared by the processes using it, every entry belongs
+        to the process which saved it. A process only replaces its own
+        entries, under a lock of the file, and the entries of processes
+        which are not running any more are left for a later run to adopt.
+
+        Example:
+            store = QueueStore("~/.wapor/queue.json")
+            store.save([dict(priority=5, spec=spec.to_dict())])
+            entries = store.load()
+            orphans = store.adopt()
+    """
+
+    def __init__(self, path=DEFAULT_QUEUE_FILE, owner=None):
+        self.logger = daiquiri.getLogger(__name__, subsystem="admission")
+        self.path = os.path.expanduser(path)
+        # host and process id
+        self.owner = owner or "{0}:{1}".format(
+            socket.gethostname(), os.getpid()
+        )
+
+    def __repr__(self):
+        return '<QueueStore(path={self.path!r})>'.format(self=self)
+
+    def load(self):
+        """Entries of every process.
+        """
+        try:
+            with open(self.path) as queue_file:
+                return json.load(queue_file)
+        except (IOError, OSError):
+            return []
+        except ValueError:
+            self.logger.warning(
+                "Queue file {0} is not valid JSON".format(self.path)
+            )
+            return []
+
+    def save(self, entries):
+        """Replace the entries of this process, keep those of the others.
+        """
+        with self._locked():
+            self._write([
+                entry for entry in self.load()
+                if entry.get("owner") != self.owner
+            ] + [dict(entry, owner=self.owner) for entry in entries])
+
+    def adopt(self):
+        """Remove and return the entries of the processes which are gone.
+        """
+        with self._locked():
+            entries = self.load()
+            alive = dict([
+                (owner, self._alive(owner))
+                for owner in set(entry.get("owner") for entry in entries)
+            ])
+            orphans = [
+                entry for entry in entries if not alive[entry.get("owner")]
+            ]
+            if orphans:
+                self._write([
+                    entry for entry in entries if alive[entry.get("owner")]
+                ])
+        return orphans
+
+    def _alive(self, owner):
+        host, _, pid = "{0}".format(owner).rpartition(":")
+        if not pid.isdigit():
+            # saved before the entries had an owner
+            return False
+        if owner == self.owner or host != socket.gethostname() or \
+                os.name == "nt":
+            # a process of another host is taken as running
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except OSError as e:
+            return e.errno == errno.EPERM
+        return True
+
+    @contextlib.contextmanager
+    def _locked(self):
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        with open(self.path + ".lock", "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def _write(self, entries):
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(self.path) or ".", suffix=".tmp"
+        )
+        with os.fdopen(fd, "w") as queue_file:
+            json.dump(entries, queue_file)
+        if os.name == "nt" and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp, self.path)
+
+
+class _Entry(object):
+
+    def __init__(self, seq, priority, spec, start, failed, data=None):
+        self.seq = seq
+        self.priority = priority
+        self.spec = spec
+        self.start = start
+        self.failed = failed
+        self.data = data
+        self.result = None
+        self.queued = True
+        self.done = threading.Event()
+
+
+class AdmissionController(object):
+    """ Start exports only when the account has a free task slot.
+
+        The ready and running tasks of the account are counted at most
+        every ``interval`` seconds, in between every export started takes
+        a slot. Waiting exports are admitted by priority, then in order of
+        arrival. The priority of an export is the highest one among the
+        parts of its asset name, so levels, products and areas can be
+        given one.
+
+        Admitted exports are started concurrently on the given Engine, an
+        export whose start raises has the ``failed`` result of its spec.
+
+        With a store the waiting exports are saved as they come and go,
+        exports left over by an interrupted run are kept in the store
+        until they are restored. The exports of other running processes
+        sharing the store are left alone.
+
+        Example:
+            controller = AdmissionController(
+                EETaskService(), max_running=10,
+                priorities={"L1": 5, "AETI": 10},
+                store=QueueStore()
+            )
+            results = controller.admit(specs, start=lambda spec: ...)
+    """
+
+    def __init__(
+        self, service, max_running=DEFAULT_MAX_RUNNING, priorities=None,
+        store=None, interval=10, sleep=time.sleep, clock=time.time,
+        engine=None
+    ):
+        self.logger = daiquiri.getLogger(__name__, subsystem="admission")
+        self.service = service
+        self.max_running = max(1, int(max_running))
+        self.priorities = dict(priorities or {})
+        self.store = store
+        self.interval = interval
+        self.sleep = sleep
+        self.clock = clock
+        self.engine = engine
+        self._lock = threading.Lock()
+        # the store is written outside of the lock of the queue
+        self._store_lock = threading.Lock()
+        self._queue = []
+        self._starting = []
+        self._seq = 0
+        self._saved = 0
+        self._running = 0
+        self._refreshed = None
+
+    def __repr__(self):
+        return '<AdmissionController(max_running={self.max_running!r}, \
+waiting={0!r})>'.format(len(self._queue), self=self)
+
+    def priority(self, spec):
+        parts = os.path.basename(spec.assetid).split("_")
+        values = [self.priorities[part] for part in parts
+                  if part in self.priorities]
+        return max(values) if values else 0
+
+    def admit(self, specs, start, failed=None):
+        """Start every spec as slots free up and wait for all of them.
+
+        Arguments:
+            specs {list} -- ExportSpec instances
+            start {callable} -- starts the export of a spec
+            failed {callable} -- result of a spec whose start raised,
+                                 given the spec and the error message,
+                                 ``(assetid, error)`` by default
+
+        Returns:
+            list -- what start returned, in the order of the specs
+        """
+        failed = failed or (lambda spec, error: (spec.assetid, error))
+        with self._lock:
+            entries = []
+            for spec in specs:
+                self._seq += 1
+                entries.append(_Entry(
+                    self._seq, self.priority(spec), spec, start, failed,
+                    spec.to_dict() if self.store is not None else None
+                ))
+            self._queue.extend(entries)
+            snapshot = self._snapshot()
+        self._persist(snapshot)
+        while True:
+            pending = [entry for entry in entries if not entry.done.is_set()]
+            if not pending:
+                break
+            if self._dispatch():
+                continue
+            if [entry for entry in pending if entry.queued]:
+                self.logger.debug(
+                    "Waiting for a task slot, {0} exports queued".format(
+                        len(self._queue)
+                    )
+                )
+                self.sleep(self.interval)
+            else:
+                # another caller is starting them
+                pending[0].done.wait(self.interval)
+        return [entry.result for entry in entries]
+
+    def restore(self):
+        """Exports left in the store by an interrupted run.
+
+        They are removed from the store and are expected to be submitted
+        again, the exports of the processes still running are kept.
+
+        Returns:
+            list -- spec dictionaries, highest priority first
+        """
+        if self.store is None:
+            return []
+        orphans = self.store.adopt()
+        return [
+            entry["spec"] for entry in sorted(
+                orphans, key=lambda entry: -entry.get("priority", 0)
+            )
+        ]
+
+    def _dispatch(self):
+        self._refresh()
+        with self._lock:
+            free = self.max_running - self._running
+            if free <= 0 or not self._queue:
+                return 0
+            self._queue.sort(key=lambda entry: (-entry.priority, entry.seq))
+            taken, self._queue = self._queue[:free], self._queue[free:]
+            self._running += len(taken)
+            self._starting.extend(taken)
+            for entry in taken:
+                entry.queued = False
+        if self.engine is None:
+            for entry in taken:
+                self._start(entry)
+        else:
+            self.engine.map(self._start, taken)
+        with self._lock:
+            for entry in taken:
+                self._starting.remove(entry)
+            snapshot = self._snapshot()
+        self._persist(snapshot)
+        return len(taken)
+
+    def _start(self, entry):
+        try:
+            entry.result = entry.start(entry.spec)
+        except Exception as e:
+            self.logger.error(
+                "Unable to start the export of {0}".format(
+                    entry.spec.assetid
+                ),
+                exc_info=True
+            )
+            entry.result = entry.failed(entry.spec, "{0}".format(e))
+        finally:
+            entry.done.set()
+
+    def _refresh(self):
+        now = self.clock()
+        with self._lock:
+            if self._refreshed is not None and \
+                    now - self._refreshed < self.interval:
+                return
+            # the other callers go on with the current count meanwhile
+            self._refreshed = now
+        running = self.service.active()
+        with self._lock:
+            self._running = running
+
+    def _snapshot(self):
+        # waiting exports to save, numbered so an older state is never
+        # written over a newer one; called under the lock
+        if self.store is None:
+            return None
+        self._seq += 1
+        return self._seq, [
+            dict(priority=entry.priority, spec=entry.data)
+            for entry in self._starting + self._queue
+        ]
+
+    def _persist(self, snapshot):
+        if snapshot is None:
+            return
+        seq, entries = snapshot
+        with self._store_lock:
+            if seq < self._saved:
+                return
+            self.store.save(entries)
+            self._saved = seq
@@ -0,0 +1,256 @@
+import daiquiri
+from multiprocessing.pool import ThreadPool
+from utils.jobs import (
+    common_job, aeti_job, agbp_job, nbwp_job, gbwp_job, parse_years, AREAS,
+    SEASONS
+)
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+logger = daiquiri.getLogger(__name__, subsystem="batch")
+
+LEVELS = ("L1", "L2", "L3")
+PRODUCTS = ("aeti", "common", "agbp", "nbwp", "gbwp")
+# nodata of the annual components when not given in the manifest
+COMMON_NODATA = {"E": "255", "T": "255", "I": "255"}
+
+
+def load_manifest(stream):
+    """Read and check a batch manifest.
+
+    Example:
+        # -- FILE: manifest.yaml
+        years: 2015-2017
+        levels: [L1, L3]
+        areas: [BKA, AWA]
+        seasons: ["1", "2"]
+        products:
+          - aeti
+          - common:
+              components: [E, T, I, AETI]
+          - agbp
+          - nbwp
+          - gbwp
+    """
+    import yaml
+    manifest = yaml.safe_load(stream) or {}
+    if not isinstance(manifest, dict):
+        raise ValueError("The manifest must be a mapping")
+    unknown = set(manifest) - set(
+        ["years", "levels", "areas", "seasons", "products"]
+    )
+    if unknown:
+        raise ValueError("Unknown manifest keys {0}".format(sorted(unknown)))
+    if "years" not in manifest or "products" not in manifest:
+        raise ValueError("The manifest needs years and products")
+
+    products = {}
+    for item in manifest["products"]:
+        if isinstance(item, dict):
+            for product, options in item.items():
+                products[product] = options or {}
+        else:
+            products[item] = {}
+    for product in products:
+        if product not in PRODUCTS:
+            raise ValueError("Unknown product {0}".format(product))
+
+    levels = [str(level) for level in manifest.get("levels", ["L1"])]
+    areas = [str(area) for area in manifest.get("areas", [])]
+    seasons = [str(season) for season in manifest.get("seasons", SEASONS)]
+    for values, allowed in [
+        (levels, LEVELS), (areas, AREAS), (seasons, SEASONS)
+    ]:
+        for value in values:
+            if value not in allowed:
+                raise ValueError("{0} is not one of {1}".format(
+                    value, ", ".join(allowed)
+                ))
+    return dict(
+        years=parse_years(manifest["years"]),
+        levels=levels,
+        areas=areas,
+        seasons=seasons,
+        products=products
+    )
+
+
+def expand(manifest, context):
+    """Jobs of the manifest for every year, level, area and season.
+
+    L3 products run for each of the manifest areas, seasonal water
+    productivity runs for each season at L2 and L3, annual at L1. There
+    is no AGBP at L3, it is skipped at that level.
+
+    Arguments:
+        manifest {dict} -- as returned by load_manifest
+        context {dict} -- the command context (workspace, export...)
+
+    Returns:
+        list -- Job instances in manifest order
+    """
+    products = manifest["products"]
+    jobs = []
+    for year in manifest["years"]:
+        for level in manifest["levels"]:
+            ctx = dict(context, level=level)
+            areas = manifest["areas"] if level == "L3" else ["NA"]
+            if level == "L3" and not areas:
+                raise ValueError("L3 needs at least an area")
+            if "aeti" in products:
+                for area in areas:
+                    jobs.append(aeti_job(ctx, year, "D", "AETI", area))
+            if "common" in products:
+                options = products["common"]
+                for component in options.get("components", ["AETI"]):
+                    nodatavalue = options.get(
+                        "nodatavalue", COMMON_NODATA.get(component, "-9999")
+                    )
+                    for area in areas:
+                        jobs.append(common_job(
+                            ctx, year, "A", component, area, nodatavalue
+                        ))
+            if "agbp" in products and level != "L3":
+                jobs.append(agbp_job(ctx, year, "A", "NPP", "-9999"))
+            if "nbwp" in products:
+                if level == "L1":
+                    jobs.append(nbwp_job(
+                        ctx, year, "A", None, "AGBP", "-9999"
+                    ))
+                else:
+                    for season in manifest["seasons"]:
+                        jobs.append(nbwp_job(
+                            ctx, year, "S", season, "AGBP", "-9999"
+                        ))
+            if "gbwp" in products:
+                if level == "L1":
+                    jobs.append(gbwp_job(
+                        ctx, year, "A", "-1", "AGBP", "NA", "-9999"
+                    ))
+                else:
+                    for season in manifest["seasons"]:
+                        for area in areas:
+                            jobs.append(gbwp_job(
+                                ctx, year, "S", season, "AGBP", area,
+                                "-9999"
+                            ))
+    return jobs
+
+
+class Batch(object):
+    """ Run jobs concurrently in the order of their dependencies.
+
+        A job starts once the export tasks of every job it depends on
+        have completed. Jobs depending on a failed job are skipped.
+
+        Example:
+            batch = Batch(
+                jobs,
+                run=lambda job: job.run(cache, submitter),
+                watch=lambda tasks: TaskWatcher(
+                    EETaskService()
+                ).watch(tasks),
+                workers=4
+            )
+            report = batch.execute()
+    """
+
+    def __init__(self, jobs, run, watch=None, workers=4):
+        self.jobs = list(jobs)
+        self.run = run
+        self.watch = watch
+        self.workers = max(1, int(workers))
+        self.depends = dict([(job.key, [
+            other.key for other in self.jobs
+            if other is not job and job.depends_on(other)
+        ]) for job in self.jobs])
+
+    def __repr__(self):
+        return '<Batch(jobs={0!r})>'.format(len(self.jobs))
+
+    def plan(self):
+        """Jobs and their dependencies, without running anything.
+        """
+        return dict([(job.key, dict(
+            product=job.product,
+            year=job.year,
+            assets=job.assets,
+            depends=self.depends[job.key]
+        )) for job in self.jobs])
+
+    def execute(self, on_event=None):
+        """Run every job and return a report keyed by job.
+        """
+        dependents = set()
+        for keys in self.depends.values():
+            dependents.update(keys)
+        jobs = dict([(job.key, job) for job in self.jobs])
+        report = dict([(key, dict(
+            status="pending", depends=self.depends[key]
+        )) for key in jobs])
+        pending = [job.key for job in self.jobs]
+        done = queue.Queue()
+        running = 0
+        pool = ThreadPool(self.workers)
+        try:
+            while pending or running:
+                for key in list(pending):
+                    states = [
+                        report[dep]["status"] for dep in self.depends[key]
+                    ]
+                    if any(state in ("failed", "skipped") for state in states):
+                        pending.remove(key)
+                        report[key]["status"] = "skipped"
+                        self._event(on_event, key, "skipped")
+                    elif all(state == "done" for state in states):
+                        pending.remove(key)
+                        running += 1
+                        report[key]["status"] = "running"
+                        self._event(on_event, key, "running")
+                        pool.apply_async(
+                            self._execute,
+                            (jobs[key], key in dependents, done)
+                        )
+                if not running:
+                    if pending:
+                        raise ValueError(
+                            "Jobs {0} depend on each other".format(pending)
+                        )
+                    break
+                key, status, result = done.get()
+                running -= 1
+                report[key].update(status=status, result=result)
+                self._event(on_event, key, status)
+        finally:
+            pool.close()
+            pool.join()
+        return report
+
+    def _execute(self, job, wait, done):
+        try:
+            result = self.run(job)
+            status = "failed" if result.get("errors") else "done"
+            # dependents read the exported assets, wait for the tasks
+            if status == "done" and wait and self.watch is not None:
+                # fresh assets have no task to wait for
+                tasks = dict([
+                    (task["taskid"], assetid)
+                    for assetid, task in result.get("tasks", {}).items()
+                    if task.get("taskid")
+                ])
+                summary = self.watch(tasks)
+                result.update(watch=summary)
+                if set(summary["states"]) - set(["COMPLETED"]):
+                    status = "failed"
+        except Exception as e:
+            logger.error("Job {0} has failed".format(job.key), exc_info=True)
+            status, result = "failed", dict(errors={"1": "{0}".format(e)})
+        done.put((job.key, status, result))
+
+    def _event(self, on_event, key, status):
+        logger.info("Job {0} is {1}".format(key, status))
+        if on_event is not None:
+            on_event(dict(job=key, status=status))
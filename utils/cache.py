@@ -0,0 +1,219 @@
+import os
+import copy
+import time
+import errno
+import pickle
+import hashlib
+import tempfile
+import threading
+import daiquiri
+from utils.metrics import metrics
+
+DEFAULT_DIRECTORY = os.path.expanduser("~/.wapor/cache")
+# closed years never change, the update time of the asset is the real key
+DEFAULT_TTL = 30 * 24 * 3600
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class MetadataCache(object):
+    """ Disk backed cache of Earth Engine metadata.
+
+        Entries are keyed by the ids of the source assets, their update
+        time and any extra parts that shape the cached value (year, area,
+        algorithm...). Ingesting a new image in a source collection
+        changes its update time and therefore misses the cache. A value
+        depending on a source whose update time is unknown, a missing
+        asset for instance, is neither read from nor written to the
+        cache.
+
+        The update times of the sources are looked up concurrently when
+        an Engine is given, once until ``invalidate`` is called.
+
+        Entries older than ``ttl`` seconds are dropped, and the least
+        recently used entries are evicted once the directory grows over
+        ``max_size`` bytes.
+
+        Example:
+            cache = MetadataCache()
+            info = cache.fetch(
+                ["projects/fao-wapor/L1/L1_E_D"],
+                ("COMMON", "2016", None),
+                lambda: probe.dictionary().getInfo()
+            )
+    """
+
+    def __init__(
+        self, directory=DEFAULT_DIRECTORY, ttl=DEFAULT_TTL,
+        max_size=DEFAULT_MAX_SIZE, enabled=True, engine=None
+    ):
+        self.logger = daiquiri.getLogger(__name__, subsystem="cache")
+        self.directory = os.path.expanduser(directory)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.enabled = enabled
+        self.engine = engine
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._update_times = {}
+
+    def __repr__(self):
+        return '<MetadataCache(directory={self.directory!r}, \
+enabled={self.enabled!r})>'.format(self=self)
+
+    def invalidate(self):
+        """Forget the update times, the next fetch looks them up again.
+        """
+        with self._lock:
+            self._update_times = {}
+
+    def view(self):
+        """Cache of the same entries whose update times are looked up again,
+        leaving those of this cache alone.
+        """
+        view = copy.copy(self)
+        view._lock = threading.Lock()
+        view.invalidate()
+        return view
+
+    def update_time(self, asset_id):
+        """Return the update time of an asset, looked up once.
+        """
+        import ee
+        with self._lock:
+            if asset_id in self._update_times:
+                return self._update_times[asset_id]
+        info = metrics.call(
+            "data.getInfo", "cache", ee.data.getInfo, asset_id
+        ) or {}
+        update_time = info.get("updateTime", info.get("version"))
+        with self._lock:
+            self._update_times[asset_id] = update_time
+        return update_time
+
+    def update_times(self, assets):
+        """Update times of several assets, in the order of the assets.
+        """
+        assets = list(assets)
+        if self.engine is None:
+            return [self.update_time(asset) for asset in assets]
+        return self.engine.map(self.update_time, assets)
+
+    def key(self, assets, parts, update_times=None):
+        if update_times is None:
+            update_times = self.update_times(assets)
+        token = repr((list(zip(assets, update_times)), tuple(parts)))
+        return hashlib.sha1(token.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as entry_file:
+                entry = pickle.load(entry_file)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if time.time() - entry["created"] > self.ttl:
+            self._remove(path)
+            return None
+        # touch the entry for least recently used eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry["value"]
+
+    def set(self, key, value):
+        self._makedirs()
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as entry_file:
+                pickle.dump(
+                    dict(created=time.time(), value=value), entry_file, 2
+                )
+            path = self._path(key)
+            if os.name == "nt" and os.path.exists(path):
+                self._remove(path)
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            self._remove(tmp)
+            self.logger.warning(
+                "Unable to write cache entry {0}".format(key), exc_info=True
+            )
+            return
+        self.evict()
+
+    def fetch(self, assets, parts, compute):
+        """Return the cached value or compute and store it.
+
+        Arguments:
+            assets {list} -- source asset ids the value depends on
+            parts {tuple} -- anything else the value depends on
+            compute {callable} -- function producing the value
+        """
+        if not self.enabled:
+            return compute()
+        assets = list(assets)
+        update_times = self.update_times(assets)
+        if None in update_times:
+            # a change of the sources could not be told apart
+            self.logger.debug(
+                "Update time of {0} unknown, not cached".format(assets)
+            )
+            return compute()
+        key = self.key(assets, parts, update_times)
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            self.logger.debug(
+                "Metadata cache hit for {0} {1}".format(assets, parts)
+            )
+            return value
+        self.misses += 1
+        value = compute()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def evict(self):
+        """Drop least recently used entries above the size limit.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith(".pickle"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                self._remove(path)
+                total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".pickle"):
+                    self._remove(os.path.join(self.directory, name))
+
+    def _path(self, key):
+        return os.path.join(self.directory, "{0}.pickle".format(key))
+
+    def _makedirs(self):
+        try:
+            os.makedirs(self.directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
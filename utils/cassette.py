@@ -0,0 +1,255 @@
+import os
+import json
+import numbers
+import time
+import errno
+import pickle
+import hashlib
+import tempfile
+import types
+import threading
+import daiquiri
+import ee
+from ee import EEException
+
+MODES = ("record", "replay")
+VERSION = 1
+
+try:
+    string_types = (str, unicode)
+except NameError:
+    string_types = (str,)
+
+
+class CassetteMiss(EEException):
+    """ Call without a recorded response in a replayed cassette.
+    """
+
+
+def expression(value):
+    """JSON friendly description of a call argument or receiver.
+
+    Earth Engine objects are described by their serialized expression,
+    other objects by their public attributes.
+    """
+    if hasattr(value, "serialize"):
+        return value.serialize()
+    if isinstance(value, dict):
+        return dict([
+            ("{0}".format(key), expression(item))
+            for key, item in value.items()
+        ])
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [expression(item) for item in value]
+        return sorted(items, key=repr) if isinstance(
+            value, (set, frozenset)
+        ) else items
+    if value is None or isinstance(value, (numbers.Number,) + string_types):
+        return value
+    if hasattr(value, "__dict__") and not callable(value):
+        return dict(
+            type=type(value).__name__,
+            attributes=expression(dict([
+                (key, item) for key, item in vars(value).items()
+                if not key.startswith("_")
+            ]))
+        )
+    return "{0}".format(value)
+
+
+def call_key(operation, func, args, kwargs):
+    """Key of a call, the same for the same operation and expression.
+
+    The call site is not part of the key so that a cassette recorded
+    before a change of the algorithms still answers after it.
+    """
+    receiver = getattr(func, "__self__", None)
+    if isinstance(receiver, types.ModuleType):
+        # functions of extension modules are bound to their module
+        receiver = None
+    description = json.dumps(
+        [
+            operation,
+            getattr(func, "__name__", "{0}".format(func)),
+            expression(receiver) if receiver is not None else None,
+            expression(list(args)),
+            expression(kwargs)
+        ],
+        sort_keys=True
+    )
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+class Cassette(object):
+    """ Earth Engine responses recorded by a run and replayed offline.
+
+        In record mode every call made through the metrics is run live
+        and its response, error, duration and task id are kept, the
+        cassette is written to disk when the run closes it. In replay
+        mode the calls are answered from the cassette in the order they
+        were recorded, the last response of a call answers it again
+        (task polls), and a call which was never recorded raises a
+        CassetteMiss. Replayed calls take their recorded duration times
+        ``latency``, 0 replays without waiting.
+
+        The definitions of the Earth Engine API are recorded as well,
+        a replay initializes Earth Engine with them and no credentials.
+
+        Example:
+            metrics.cassette = Cassette("run.cassette", "record")
+            ...
+            metrics.cassette.save()
+
+            metrics.cassette = Cassette("run.cassette", "replay", latency=0)
+    """
+
+    def __init__(self, path, mode="replay", latency=1.0, sleep=time.sleep,
+                 clock=time.time):
+        if mode not in MODES:
+            raise ValueError("Unknown cassette mode {0}".format(mode))
+        self.logger = daiquiri.getLogger(__name__, subsystem="cassette")
+        self.path = os.path.expanduser(path)
+        self.mode = mode
+        self.latency = latency
+        self.sleep = sleep
+        self.clock = clock
+        self.interactions = []
+        self.api = None
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._responses = {}
+        if mode == "replay":
+            self.load()
+
+    def __repr__(self):
+        return '<Cassette(path={self.path!r}, mode={self.mode!r})>'.format(
+            self=self
+        )
+
+    def call(self, metrics, operation, site, func, *args, **kwargs):
+        """Run or replay a call made through ``metrics.call``.
+        """
+        key = call_key(operation, func, args, kwargs)
+        if self.mode == "replay":
+            return self._replay(metrics, key, operation, site, func)
+        started = self.clock()
+        try:
+            result = metrics.invoke(operation, site, func, *args, **kwargs)
+        except Exception as e:
+            self._record(key, operation, site, func, started, error=e)
+            raise
+        self._record(key, operation, site, func, started, result=result)
+        return result
+
+    def capture_api(self):
+        """Keep the API definitions of an initialized Earth Engine.
+        """
+        if self.mode == "record":
+            self.api = ee.data.getAlgorithms()
+
+    def initialize(self, initialize):
+        """Initialize Earth Engine offline with the recorded API.
+
+        Arguments:
+            initialize {function} -- ee.Initialize
+        """
+        get_algorithms = ee.data.getAlgorithms
+        ee.data.getAlgorithms = lambda: self.api
+        try:
+            return initialize(None)
+        finally:
+            ee.data.getAlgorithms = get_algorithms
+
+    def load(self):
+        """Read the recorded interactions of the cassette file.
+        """
+        with open(self.path, "rb") as cassette_file:
+            content = pickle.load(cassette_file)
+        if content.get("version") != VERSION:
+            raise ValueError(
+                "Cassette {0} has version {1}, expected {2}".format(
+                    self.path, content.get("version"), VERSION
+                )
+            )
+        with self._lock:
+            self.api = content.get("api")
+            self.interactions = list(content["interactions"])
+            self._responses = {}
+            for interaction in self.interactions:
+                self._responses.setdefault(
+                    interaction["key"], []
+                ).append(interaction)
+        self.logger.info("Replaying {0} calls of {1}".format(
+            len(self.interactions), self.path
+        ))
+
+    def save(self):
+        """Write the recorded interactions, replacing the cassette file.
+        """
+        if self.mode != "record":
+            return
+        with self._lock:
+            content = dict(
+                version=VERSION, api=self.api,
+                interactions=list(self.interactions)
+            )
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as cassette_file:
+            pickle.dump(content, cassette_file, 2)
+        if os.name == "nt" and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp, self.path)
+        self.logger.info("Recorded {0} calls to {1}".format(
+            len(content["interactions"]), self.path
+        ))
+
+    def _record(self, key, operation, site, func, started, result=None,
+                error=None):
+        receiver = getattr(func, "__self__", None)
+        if error is not None:
+            try:
+                pickle.dumps(error)
+            except Exception:
+                error = EEException("{0}".format(error))
+        with self._lock:
+            self.interactions.append(dict(
+                key=key,
+                operation=operation,
+                site=site,
+                seconds=round(self.clock() - started, 6),
+                result=result,
+                error=error,
+                # task ids are only known once a task is started
+                task_id=getattr(receiver, "id", None)
+            ))
+
+    def _replay(self, metrics, key, operation, site, func):
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                self.misses += 1
+                interaction = None
+            elif len(responses) > 1:
+                interaction = responses.pop(0)
+            else:
+                interaction = responses[0]
+        with metrics.measure(operation, site):
+            if interaction is None:
+                raise CassetteMiss(
+                    "No recorded response for {0} at {1}".format(
+                        operation, site
+                    )
+                )
+            if self.latency:
+                self.sleep(interaction["seconds"] * self.latency)
+            if interaction["task_id"] is not None:
+                func.__self__.id = interaction["task_id"]
+            if interaction["error"] is not None:
+                raise interaction["error"]
+            return interaction["result"]
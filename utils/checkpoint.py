@@ -0,0 +1,120 @@
+import os
+import json
+import errno
+import threading
+import daiquiri
+from utils.tasks import TaskWatcher
+
+DEFAULT_CHECKPOINT_FILE = os.path.expanduser("~/.wapor/checkpoint.jsonl")
+# states of a submitted task which make a new export of its asset useless
+KEPT_STATES = ("READY", "RUNNING", "COMPLETED")
+
+
+class Checkpoint(object):
+    """ Export tasks started by a run, written down as they start.
+
+        Every started task is appended to the file with its asset id, one
+        JSON line each, so the runs of any command sharing the file add
+        to it and never replace what the others saved. The last task
+        saved for an asset is its task. A run resuming from the
+        checkpoint verifies the saved tasks and keeps the ones which are
+        ready, running or completed, their assets are neither deleted nor
+        exported again. Failed and cancelled tasks are exported again.
+
+        Example:
+            checkpoint = Checkpoint(
+                "~/.wapor/checkpoint.jsonl", EETaskService(), resume=True
+            )
+            kept = checkpoint.submitted(assetids)
+            checkpoint.record(assetid, task.id)
+    """
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_FILE, service=None,
+                 resume=False):
+        self.logger = daiquiri.getLogger(__name__, subsystem="checkpoint")
+        self.path = os.path.expanduser(path)
+        self.service = service
+        self.resume = resume
+        self._lock = threading.Lock()
+        self._tasks = self.load() if resume else {}
+
+    def __repr__(self):
+        return '<Checkpoint(path={self.path!r}, \
+resume={self.resume!r})>'.format(self=self)
+
+    def load(self):
+        """Task id by asset id as saved in the checkpoint file.
+        """
+        try:
+            with open(self.path) as checkpoint_file:
+                content = checkpoint_file.read()
+        except (IOError, OSError):
+            return {}
+        tasks = {}
+        invalid = 0
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                tasks["{0}".format(record["assetid"])] = record["taskid"]
+            except (ValueError, TypeError, KeyError):
+                # a line cut short by an interrupted run
+                invalid += 1
+        if invalid:
+            self.logger.warning(
+                "Skipped {0} invalid lines of checkpoint file {1}".format(
+                    invalid, self.path
+                )
+            )
+        return tasks
+
+    def record(self, assetid, taskid):
+        """Append a started task to the file.
+        """
+        line = json.dumps(dict(assetid="{0}".format(assetid), taskid=taskid))
+        with self._lock:
+            self._tasks["{0}".format(assetid)] = taskid
+            self._append(line)
+
+    def submitted(self, assetids):
+        """Assets whose saved task is still worth waiting for.
+
+        Nothing is kept unless the run resumes, the saved tasks are
+        verified with their current state.
+
+        Returns:
+            dict -- task id by asset id
+        """
+        if not self.resume:
+            return {}
+        with self._lock:
+            saved = dict([
+                (assetid, self._tasks[assetid]) for assetid in assetids
+                if self._tasks.get(assetid)
+            ])
+        if not saved:
+            return {}
+        statuses = TaskWatcher(self.service).poll(set(saved.values()))
+        kept = dict([
+            (assetid, taskid) for assetid, taskid in saved.items()
+            if statuses.get(taskid, {}).get("state") in KEPT_STATES
+        ])
+        self.logger.info(
+            "Resuming {0} of {1} submitted exports".format(
+                len(kept), len(saved)
+            )
+        )
+        return kept
+
+    def _append(self, line):
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        # a single write of a line opened for appending, the lines of
+        # several processes do not mix
+        with open(self.path, "a") as checkpoint_file:
+            checkpoint_file.write(line + "\n")
@@ -0,0 +1,182 @@
+import time
+import threading
+import daiquiri
+from multiprocessing.pool import ThreadPool
+
+DEFAULT_WORKERS = 16
+
+
+class CallTimeout(Exception):
+    """ A call has not completed in the given time.
+    """
+
+
+class CallCancelled(Exception):
+    """ A call has been cancelled before it started.
+    """
+
+
+class Call(object):
+    """ Pending result of a blocking call run by an Engine.
+
+        Example:
+            call = engine.submit(probe.fetch, cache=cache)
+            try:
+                result = call.result(timeout=60)
+            except CallTimeout:
+                call.cancel()
+    """
+
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.started = False
+        self.cancelled = False
+        self._value = None
+        self._error = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return '<Call(func={0!r}, done={1!r})>'.format(
+            getattr(self.func, "__name__", self.func), self.done()
+        )
+
+    def done(self):
+        return self._done.is_set()
+
+    def cancel(self):
+        """Cancel the call unless it has already started.
+
+        Returns:
+            bool -- whether the call will never run
+        """
+        with self._lock:
+            if self.started:
+                return False
+            self.cancelled = True
+        self._done.set()
+        return True
+
+    def result(self, timeout=None):
+        """Wait for the call and return its value or raise its error.
+        """
+        if not self._done.wait(timeout):
+            raise CallTimeout("{0!r} has not completed in {1}s".format(
+                self, timeout
+            ))
+        if self.cancelled:
+            raise CallCancelled("{0!r} has been cancelled".format(self))
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def _run(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.started = True
+        try:
+            self._value = self.func(*self.args, **self.kwargs)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._done.set()
+
+
+class Engine(object):
+    """ Run blocking Earth Engine calls on a bounded pool of threads.
+
+        Callers submit calls and keep their pending results instead of a
+        thread each, any number of calls can be in flight while at most
+        ``workers`` of them are running. Calls which have not started are
+        cancelled as soon as one of the calls gathered together fails or
+        the time is over.
+
+        A call running on the engine must not gather other calls of the
+        same engine, the pool could be exhausted by the waiting calls.
+
+        Example:
+            engine = Engine(workers=8)
+            agbp, aeti = engine.gather([
+                engine.submit(Probe(collAGBP).fetch),
+                engine.submit(Probe(collAETI).fetch)
+            ], timeout=300)
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.logger = daiquiri.getLogger(__name__, subsystem="engine")
+        self.workers = max(1, int(workers))
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = None
+
+    def __repr__(self):
+        return '<Engine(workers={self.workers!r})>'.format(self=self)
+
+    def submit(self, func, *args, **kwargs):
+        """Schedule a call and return its pending result.
+        """
+        call = Call(func, args, kwargs)
+        self._get_pool().apply_async(self._run, (call,))
+        return call
+
+    def gather(self, calls, timeout=None):
+        """Wait for every call and return their values in order.
+
+        The first error, or CallTimeout once ``timeout`` seconds are over,
+        is raised after the calls which have not started are cancelled.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        results = []
+        try:
+            for call in calls:
+                remaining = None
+                if deadline is not None:
+                    remaining = max(0, deadline - time.time())
+                results.append(call.result(remaining))
+        except Exception:
+            cancelled = len([call for call in calls if call.cancel()])
+            if cancelled:
+                self.logger.debug("Cancelled {0} calls".format(cancelled))
+            raise
+        return results
+
+    def map(self, func, items, timeout=None):
+        """Call func on every item concurrently, small batches inline.
+
+        Calls made from a call already running on the engine are inline
+        too, waiting for the pool from the pool could exhaust it.
+        """
+        items = list(items)
+        if len(items) < 2 or self.workers == 1 or self.inside():
+            return [func(item) for item in items]
+        return self.gather(
+            [self.submit(func, item) for item in items], timeout=timeout
+        )
+
+    def inside(self):
+        """Whether the current thread is running a call of the engine.
+        """
+        return getattr(self._local, "inside", False)
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPool(self.workers)
+            return self._pool
+
+    def _run(self, call):
+        self._local.inside = True
+        try:
+            call._run()
+        finally:
+            self._local.inside = False
@@ -0,0 +1,447 @@
+import os
+import copy
+import json
+import time
+import daiquiri
+import threading
+from utils.metrics import metrics
+from utils.engine import Engine, CallTimeout
+from utils.lineage import LINEAGE_PROPERTY
+
+DEFAULT_WORKERS = 8
+# assets asked for in a listing, a longer listing comes back truncated
+LISTING_SIZE = 10000
+
+
+class ExportSpec(object):
+    """ Everything needed to start an export of an image to an asset.
+
+        Example:
+            spec = ExportSpec(
+                image_props, "projects/fao-wapor/L1/L1_E_A/L1_E_16",
+                probe.bands, probe.band_names[0]
+            )
+    """
+
+    def __init__(self, image, assetid, bands, band_name, description=None):
+        self.image = image
+        self.assetid = assetid
+        self.description = description or os.path.basename(assetid)
+        self.crs = bands["crs"]
+        self.crs_transform = bands["crs_transform"]
+        self.dimensions = (bands["dimensions"][0], bands["dimensions"][1],)
+        self.pyramid_policy = json.dumps({"{0}".format(band_name): "mode"})
+        # recorded on the asset for the freshness check of later runs
+        self.lineage = None
+
+    def __repr__(self):
+        return '<ExportSpec(assetid={self.assetid!r})>'.format(self=self)
+
+    def to_dict(self):
+        """JSON friendly spec, the image as its serialized graph.
+        """
+        return dict(
+            image=self.image.serialize(),
+            assetid=self.assetid,
+            description=self.description,
+            crs=self.crs,
+            crs_transform=self.crs_transform,
+            dimensions=list(self.dimensions),
+            pyramid_policy=self.pyramid_policy,
+            lineage=self.lineage
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        import ee
+        band_name = list(json.loads(data["pyramid_policy"]))[0]
+        spec = cls(
+            ee.deserializer.fromJSON(data["image"]),
+            data["assetid"],
+            dict(
+                crs=data["crs"],
+                crs_transform=data["crs_transform"],
+                dimensions=data["dimensions"]
+            ),
+            band_name,
+            description=data.get("description")
+        )
+        spec.lineage = data.get("lineage")
+        return spec
+
+    def task(self):
+        import ee
+        image = self.image
+        if self.lineage is not None:
+            image = ee.Image(image).set(LINEAGE_PROPERTY, self.lineage)
+        return ee.batch.Export.image.toAsset(
+            image=image,
+            description=self.description,
+            assetId=self.assetid,
+            crs=self.crs,
+            dimensions="{0}x{1}".format(
+                self.dimensions[0],
+                self.dimensions[1]
+            ),
+            maxPixels=self.dimensions[0] * self.dimensions[1],
+            crsTransform=str(self.crs_transform),
+            pyramidingPolicy=self.pyramid_policy
+        )
+
+
+class ExportSubmitter(object):
+    """ Start export tasks through a bounded pool of threads.
+
+        Existing assets are deleted before their export is started. The
+        destination asset collection is listed once to find them, instead
+        of probing every asset, and the deletions run concurrently.
+        Failures are reported per asset instead of aborting the batch.
+        Assets exported since the listing are probed on their own, and
+        ``invalidate`` forgets the listings of a long lived process.
+
+        Probes, deletions and starts run on the given Engine, shared with
+        the rest of the run, and wait at most ``timeout`` seconds. A call
+        which has not completed in time is reported as the error of its
+        asset, the others keep their results.
+
+        With an AdmissionController the exports start only when the
+        account has a free task slot, highest priority first.
+
+        With a Checkpoint every started task is saved, and a resumed run
+        keeps the assets whose saved task is ready, running or completed
+        instead of deleting and exporting them again.
+
+        With ``skip_fresh`` an asset whose recorded lineage equals the
+        lineage of the run is left untouched and reported without task
+        id. The lineages of a collection are read in a single round trip.
+
+        Example:
+            tasks, errors = ExportSubmitter(workers=4).submit(
+                specs, collection="projects/fao-wapor/L1/L1_AETI_D",
+                lineage=lineage
+            )
+            # tasks  {assetid: {"taskid": id}} or {"taskid": None,
+            #        "fresh": True} for the assets skipped, {"taskid": id,
+            #        "resumed": True} for the tasks of the checkpoint
+            # errors {assetid: message}
+    """
+
+    def __init__(
+        self, workers=DEFAULT_WORKERS, skip_fresh=False, engine=None,
+        timeout=None, admission=None, checkpoint=None
+    ):
+        self.logger = daiquiri.getLogger(__name__, subsystem="export")
+        self.workers = max(1, int(workers))
+        self.skip_fresh = skip_fresh
+        self.engine = engine or Engine(workers=self.workers)
+        self.timeout = timeout
+        self.admission = admission
+        self.checkpoint = checkpoint
+        self._lock = threading.Lock()
+        self._listings = {}
+        self._truncated = set()
+        self._lineages = {}
+        self._started = set()
+
+    def __repr__(self):
+        return '<ExportSubmitter(workers={self.workers!r})>'.format(
+            self=self
+        )
+
+    def submit(self, specs, collection=None, site="export", lineage=None):
+        """Replace the existing assets and start the export of every spec.
+
+        Arguments:
+            specs {list} -- ExportSpec instances
+            collection {str} -- destination asset collection of the specs
+            site {str} -- call site reported in the metrics
+            lineage {Lineage} -- sources and version of the exported images
+
+        Returns:
+            tuple -- tasks and errors dictionaries keyed by asset id
+        """
+        tasks = {}
+        errors = {}
+        if not specs:
+            return tasks, errors
+        if lineage is not None:
+            if self.skip_fresh:
+                fresh = self.fresh(
+                    [spec.assetid for spec in specs], lineage, collection,
+                    site
+                )
+                for assetid in fresh:
+                    tasks["{0}".format(assetid)] = dict(
+                        taskid=None, fresh=True
+                    )
+                specs = [spec for spec in specs if spec.assetid not in fresh]
+            for spec in specs:
+                spec.lineage = lineage.value()
+        if self.checkpoint is not None:
+            submitted = self.checkpoint.submitted(
+                [spec.assetid for spec in specs]
+            )
+            for assetid, taskid in submitted.items():
+                tasks["{0}".format(assetid)] = dict(
+                    taskid=taskid, resumed=True
+                )
+            specs = [
+                spec for spec in specs if spec.assetid not in submitted
+            ]
+        existing = self.existing(
+            [spec.assetid for spec in specs], collection, site
+        )
+        for assetid, error in self._map(
+            lambda assetid: self._delete(assetid, site), existing,
+            lambda assetid, error: (assetid, error)
+        ):
+            if error is not None:
+                errors["{0}".format(assetid)] = error
+        specs = [spec for spec in specs if spec.assetid not in errors]
+        if self.admission is None:
+            started = self._map(
+                lambda spec: self._start(spec, site), specs,
+                lambda spec, error: (spec.assetid, None, error)
+            )
+        else:
+            started = self.admission.admit(
+                specs, lambda spec: self._start(spec, site),
+                lambda spec, error: (spec.assetid, None, error)
+            )
+        for assetid, taskid, error in started:
+            if error is None:
+                tasks["{0}".format(assetid)] = {"taskid": taskid}
+            else:
+                errors["{0}".format(assetid)] = error
+        return tasks, errors
+
+    def invalidate(self):
+        """Forget the listings, the next submit lists the collections again.
+        """
+        with self._lock:
+            self._listings = {}
+            self._truncated = set()
+            self._lineages = {}
+            self._started = set()
+
+    def view(self):
+        """Submitter sharing the engine, the admission and the checkpoint,
+        which lists the collections again without forgetting the listings
+        of this submitter.
+        """
+        view = copy.copy(self)
+        view._lock = threading.Lock()
+        view.invalidate()
+        return view
+
+    def existing(self, assetids, collection=None, site="export"):
+        """Return the asset ids which already exist.
+
+        Assets of the given collection are looked up in a single listing
+        of the collection, any other asset is probed on its own, as well
+        as those missing from a truncated listing.
+        """
+        listed, probed = self._split(assetids, collection)
+        found = []
+        if listed:
+            children = self.listing(collection, site)
+            with self._lock:
+                truncated = collection in self._truncated
+            for assetid in listed:
+                if assetid in children:
+                    found.append(assetid)
+                elif truncated:
+                    probed.append(assetid)
+        if probed:
+            found.extend([
+                assetid for assetid, info in self._map(
+                    lambda assetid: self._info(assetid, site), probed,
+                    self._unknown
+                ) if info
+            ])
+        return found
+
+    def fresh(self, assetids, lineage, collection=None, site="export"):
+        """Return the asset ids whose recorded lineage is the given one.
+        """
+        if not lineage.known:
+            return []
+        listed, probed = self._split(assetids, collection)
+        recorded = {}
+        if listed:
+            recorded.update(self.lineages(collection, site))
+        if probed:
+            for assetid, info in self._map(
+                lambda assetid: self._info(assetid, site), probed,
+                self._unknown
+            ):
+                if isinstance(info, dict):
+                    recorded[assetid] = info.get(
+                        "properties", {}
+                    ).get(LINEAGE_PROPERTY)
+        return [
+            assetid for assetid in assetids
+            if lineage.matches(recorded.get(assetid))
+        ]
+
+    def lineages(self, collection, site="export"):
+        """Recorded lineage by asset id of a collection, read once.
+        """
+        import ee
+        with self._lock:
+            if collection in self._lineages:
+                return self._lineages[collection]
+        try:
+            rows = metrics.call(
+                "getInfo", site, ee.ImageCollection(collection).reduceColumns(
+                    ee.Reducer.toList(2), ["system:index", LINEAGE_PROPERTY]
+                ).get("list").getInfo
+            ) or []
+            recorded = dict([
+                ("{0}/{1}".format(collection, index), value)
+                for index, value in rows
+            ])
+        except ee.EEException:
+            # the collection has not been created yet
+            self.logger.debug(
+                "Unable to read the lineages of {0}".format(collection)
+            )
+            recorded = {}
+        with self._lock:
+            self._lineages[collection] = recorded
+        return recorded
+
+    def listing(self, collection, site="export"):
+        """Ids of the assets in a collection, listed once until invalidated.
+        """
+        import ee
+        with self._lock:
+            if collection in self._listings:
+                return self._listings[collection]
+        truncated = False
+        try:
+            children = set([
+                child["id"] for child in metrics.call(
+                    "getList", site, ee.data.getList,
+                    {"id": collection, "num": LISTING_SIZE}
+                )
+            ])
+            truncated = len(children) >= LISTING_SIZE
+        except ee.EEException:
+            # the collection has not been created yet
+            self.logger.debug(
+                "Unable to list asset collection {0}".format(collection)
+            )
+            children = set()
+        if truncated:
+            self.logger.warning(
+                "Listing of {0} truncated to {1} assets, the others are "
+                "probed".format(collection, LISTING_SIZE)
+            )
+        with self._lock:
+            self._listings[collection] = children
+            if truncated:
+                self._truncated.add(collection)
+        return children
+
+    def _split(self, assetids, collection):
+        """Asset ids looked up in the listing of the collection, and those
+        probed on their own: other collections and assets exported since.
+        """
+        listed = []
+        probed = []
+        with self._lock:
+            started = set(self._started)
+        for assetid in assetids:
+            if (collection and os.path.dirname(assetid) == collection and
+                    assetid not in started):
+                listed.append(assetid)
+            else:
+                probed.append(assetid)
+        return listed, probed
+
+    def _map(self, func, items, failed):
+        """Call func on every item concurrently, within the timeout.
+
+        The result of an item whose call has not completed in time is
+        ``failed(item, error)``, a call already running can not be
+        cancelled and may still complete.
+        """
+        if len(items) < 2 or self.workers == 1 or self.engine.inside():
+            return [func(item) for item in items]
+        calls = [self.engine.submit(func, item) for item in items]
+        deadline = None
+        if self.timeout is not None:
+            deadline = time.time() + self.timeout
+        results = []
+        try:
+            for item, call in zip(items, calls):
+                remaining = None
+                if deadline is not None:
+                    remaining = max(0, deadline - time.time())
+                try:
+                    results.append(call.result(remaining))
+                except CallTimeout:
+                    if call.cancel():
+                        error = "Not started in {0}s".format(self.timeout)
+                    else:
+                        error = "Not completed in {0}s, it may still " \
+                            "complete".format(self.timeout)
+                    self.logger.warning("{0}: {1}".format(item, error))
+                    results.append(failed(item, error))
+        except Exception:
+            for call in calls:
+                call.cancel()
+            raise
+        return results
+
+    def _unknown(self, assetid, error):
+        # an asset whose probe has not completed is taken as missing, its
+        # export fails on its own if the asset exists
+        return assetid, None
+
+    def _info(self, assetid, site):
+        import ee
+        return assetid, metrics.call(
+            "data.getInfo", site, ee.data.getInfo, assetid
+        )
+
+    def _delete(self, assetid, site):
+        import ee
+        try:
+            metrics.call("deleteAsset", site, ee.data.deleteAsset, assetid)
+        except ee.EEException as e:
+            self.logger.error(
+                "Unable to delete the existing assetId {0}".format(assetid),
+                exc_info=True
+            )
+            return assetid, "{0}".format(e)
+        with self._lock:
+            for children in self._listings.values():
+                children.discard(assetid)
+            for recorded in self._lineages.values():
+                recorded.pop(assetid, None)
+            self._started.discard(assetid)
+        return assetid, None
+
+    def _start(self, spec, site):
+        try:
+            task = spec.task()
+            metrics.call("start", site, task.start)
+            with self._lock:
+                self._started.add(spec.assetid)
+            if self.checkpoint is not None:
+                self.checkpoint.record(spec.assetid, task.id)
+            self.logger.debug(
+                "Started task {0} for {1}".format(task.id, spec.assetid)
+            )
+            return spec.assetid, task.id, None
+        except Exception as e:
+            # any failure is the error of its asset, the other exports go on
+            self.logger.error(
+                "Task export definition for {0} has failed!".format(
+                    spec.assetid
+                ),
+                exc_info=True
+            )
+            return spec.assetid, None, "{0}".format(e)
@@ -1,11 +1,7 @@
 import os
 from enum import Enum
-import ee
 import click
-from ee import Filter as EEFilter
-from ee import ImageCollection as EEImageCollection
-from ee import Image as EEImage
-from ee import EEException
+from utils.probe import Probe, fetch_all
 
 
 class Name(object):
@@ -435,57 +431,36 @@ class TIME_RESOLUTION(Enum):
 
 class ETI(object):
     def __init__(self, **kwargs):
+        import ee
         try:
-            if isinstance(kwargs["cE"], EEImageCollection):
+            if isinstance(kwargs["cE"], ee.ImageCollection):
                 self.ce = kwargs["cE"]
-            if isinstance(kwargs["cT"], EEImageCollection):
+            if isinstance(kwargs["cT"], ee.ImageCollection):
                 self.ct = kwargs["cT"]
-            if isinstance(kwargs["cI"], EEImageCollection):
+            if isinstance(kwargs["cI"], ee.ImageCollection):
                 self.ci = kwargs["cI"]
             self.tfilter = kwargs["temporal_filter"]
             if kwargs.has_key("area"):
                 self.filter_area = kwargs["area"]
             else:
                 self.filter_area = None
+            # source asset ids by key, and an optional MetadataCache
+            self.ids = kwargs.get("ids") or {}
+            self.cache = kwargs.get("cache")
         except KeyError as exc:
             raise KeyError("A key element {0} for ETI is missing".format(
                 exc.args[0]
             ))
-        except EEException as eee:
+        except ee.EEException as eee:
             raise
 
     def getCollETI(self):
         """Generate ETI collection.
         """
+        import ee
         start = self.tfilter['start']
         end = self.tfilter['end']
-        # Additional mask for pixel value > 250
-        collEFiltered = self.ce.filterDate(
-            start,
-            end
-        ).sort('system:time_start', True).map(
-            lambda image: image.mask(
-                image.select('b1').lte(250)
-            )
-        )
-        # Additional mask for pixel value > 250
-        collTFiltered = self.ct.filterDate(
-            start,
-            end
-        ).sort('system:time_start', True).map(
-            lambda image: image.mask(
-                image.select('b1').lte(250)
-            )
-        )
-        # Additional mask for pixel value > 250
-        collIFiltered = self.ci.filterDate(
-            start,
-            end
-        ).sort('system:time_start', True).map(
-            lambda image: image.mask(
-                image.select('b1').lte(250)
-            )
-        )
+        collEFiltered, collTFiltered, collIFiltered = self._filtered()
         # Additional filter area for L3
         farea = ee.Filter.eq('area_code', self.filter_area)
         if self.filter_area:
@@ -493,22 +468,31 @@ class ETI(object):
             collTFiltered = collTFiltered.filter(farea)
             collIFiltered = collIFiltered.filter(farea)
 
-        # sizes
+        # sizes of the three collections in one round trip
         size_err_dict = {}
+        assets = self._assets()
+        probes = fetch_all(
+            dict(
+                cE=Probe(collEFiltered),
+                cT=Probe(collTFiltered),
+                cI=Probe(collIFiltered)
+            ),
+            # without source ids there is nothing to key the cache on
+            cache=self.cache if len(assets) == 3 else None,
+            assets=assets,
+            site="ETI.getCollETI",
+            parts=(
+                "ETI", start.serialize(), end.serialize(), self.filter_area
+            )
+        )
         sizeE = {
-            os.path.basename(
-                collEFiltered.getInfo()["id"]
-            ): collEFiltered.size().getInfo()
+            os.path.basename(self.ids.get("cE", "E")): probes["cE"].size
         }
         sizeT = {
-            os.path.basename(
-                collTFiltered.getInfo()["id"]
-            ): collTFiltered.size().getInfo()
+            os.path.basename(self.ids.get("cT", "T")): probes["cT"].size
         }
         sizeI = {
-            os.path.basename(
-                collIFiltered.getInfo()["id"]
-            ): collIFiltered.size().getInfo()
+            os.path.basename(self.ids.get("cI", "I")): probes["cI"].size
         }
 
         for size in (sizeE, sizeI, sizeT):
@@ -526,82 +510,173 @@ it should be greater than 0".format(
                         {"{0}".format(n_errkey): "{0}".format(err_mesg)}
                     )
         if not size_err_dict.keys():
-            # Join E and T Collections
-            _joinFilteredET = self._joinFilteredET(
-                collEFiltered, collTFiltered
-            )
-            joinCollET = _joinFilteredET.map(
-                lambda image: image.rename('Eband', 'Tband')
+            return self._combine(collEFiltered, collTFiltered, collIFiltered)
+
+        else:
+            return dict(errors=size_err_dict)
+
+    def getCollETIAreas(self, areas):
+        """Generate the ETI collection of every L3 area.
+
+        E, T and I are filtered once and partitioned by area_code, the
+        images of every area are counted with one histogram per component
+        in a single round trip.
+
+        Returns:
+            tuple -- ETI collection by complete area and errors
+        """
+        import ee
+        start = self.tfilter['start']
+        end = self.tfilter['end']
+        filtered = dict(zip(("cE", "cT", "cI"), self._filtered()))
+        assets = self._assets()
+        probes = fetch_all(
+            dict([
+                (key, Probe(coll, histogram="area_code"))
+                for key, coll in filtered.items()
+            ]),
+            cache=self.cache if len(assets) == 3 else None,
+            assets=assets,
+            site="ETI.getCollETIAreas",
+            parts=(
+                "ETI", start.serialize(), end.serialize(), tuple(areas)
             )
-            # calculate ET and add it
-            collET = joinCollET.map(
-                lambda image: EEImage.cat(
-                    image.select("Eband"),
-                    image.select("Tband"),
-                    image.select("Eband").add(
-                        image.select("Tband")
-                    ).rename("ETband")
+        )
+        colls = {}
+        size_err_dict = {}
+        for area in areas:
+            missing = [
+                key for key in ("cE", "cT", "cI")
+                if not probes[key].histogram.get(area, 0) > 0
+            ]
+            for key in missing:
+                err_mesg = "Collection {0} has size 0 for area {1} while \
+it should be greater than 0".format(
+                    os.path.basename(self.ids.get(key, key[1:])), area
                 )
-            )
+                n_errkey = str(len(size_err_dict) + 1)
+                size_err_dict.update(
+                    {"{0}".format(n_errkey): "{0}".format(err_mesg)}
+                )
+            if not missing:
+                farea = ee.Filter.eq('area_code', area)
+                colls[area] = self._combine(*[
+                    filtered[key].filter(farea) for key in ("cE", "cT", "cI")
+                ])
+        return colls, size_err_dict
+
+    def _assets(self):
+        return [self.ids[k] for k in ("cE", "cT", "cI") if k in self.ids]
 
-            # Join ET and I Collections
-            _joinFilteredETI = self._joinFilteredETI(
-                collET, collIFiltered
+    def _filtered(self):
+        start = self.tfilter['start']
+        end = self.tfilter['end']
+        # Additional mask for pixel value > 250
+        collEFiltered = self.ce.filterDate(
+            start,
+            end
+        ).sort('system:time_start', True).map(
+            lambda image: image.mask(
+                image.select('b1').lte(250)
             )
-            joinCollETI = _joinFilteredETI.map(
-                lambda image: image.rename(
-                    'Eband', 'Tband', 'ETband', 'Iband'
-                )
+        )
+        # Additional mask for pixel value > 250
+        collTFiltered = self.ct.filterDate(
+            start,
+            end
+        ).sort('system:time_start', True).map(
+            lambda image: image.mask(
+                image.select('b1').lte(250)
             )
-            # calculate ETI and add it
-            collETI = joinCollETI.map(
-                lambda image: EEImage.cat(
-                    image.select("Eband"),
-                    image.select("ETband").add(
-                        image.select("Iband")
-                    ).rename("b1"),
-                    image.select("Tband"),
-                    image.select("ETband"),
-                    image.select("Iband")
-                ).select("b1") # it only returns b1 band in result
+        )
+        # Additional mask for pixel value > 250
+        collIFiltered = self.ci.filterDate(
+            start,
+            end
+        ).sort('system:time_start', True).map(
+            lambda image: image.mask(
+                image.select('b1').lte(250)
             )
+        )
+        return collEFiltered, collTFiltered, collIFiltered
 
-            return collETI
+    def _combine(self, collEFiltered, collTFiltered, collIFiltered):
+        import ee
+        # Join E and T Collections
+        _joinFilteredET = self._joinFilteredET(
+            collEFiltered, collTFiltered
+        )
+        joinCollET = _joinFilteredET.map(
+            lambda image: image.rename('Eband', 'Tband')
+        )
+        # calculate ET and add it
+        collET = joinCollET.map(
+            lambda image: ee.Image.cat(
+                image.select("Eband"),
+                image.select("Tband"),
+                image.select("Eband").add(
+                    image.select("Tband")
+                ).rename("ETband")
+            )
+        )
 
-        else:
-            return dict(errors=size_err_dict)
+        # Join ET and I Collections
+        _joinFilteredETI = self._joinFilteredETI(
+            collET, collIFiltered
+        )
+        joinCollETI = _joinFilteredETI.map(
+            lambda image: image.rename(
+                'Eband', 'Tband', 'ETband', 'Iband'
+            )
+        )
+        # calculate ETI and add it
+        collETI = joinCollETI.map(
+            lambda image: ee.Image.cat(
+                image.select("Eband"),
+                image.select("ETband").add(
+                    image.select("Iband")
+                ).rename("b1"),
+                image.select("Tband"),
+                image.select("ETband"),
+                image.select("Iband")
+            ).select("b1") # it only returns b1 band in result
+        )
+
+        return collETI
 
     def _joinFilteredET(self, e, t):
-        time_filter = EEFilter.equals(
+        import ee
+        time_filter = ee.Filter.equals(
             leftField="system:time_start",
             rightField="system:time_start"
         )
         join = ee.Join.inner()
-        joinCollET = EEImageCollection(
+        joinCollET = ee.ImageCollection(
             join.apply(
                 e, t, time_filter
             )
         )
         return joinCollET.map(
-            lambda element: EEImage.cat(
+            lambda element: ee.Image.cat(
                 element.get('primary'),
                 element.get('secondary')
             )
         ).sort('system:time_start')
 
     def _joinFilteredETI(self, et, i):
-        time_filter = EEFilter.equals(
+        import ee
+        time_filter = ee.Filter.equals(
             leftField="system:time_start",
             rightField="system:time_start"
         )
         join = ee.Join.inner()
-        joinCollETI = EEImageCollection(
+        joinCollETI = ee.ImageCollection(
             join.apply(
                 et, i, time_filter
             )
         )
         return joinCollETI.map(
-            lambda element: EEImage.cat(
+            lambda element: ee.Image.cat(
                 element.get('primary'),
                 element.get('secondary')
             )
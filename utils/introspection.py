@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+import json
+import logging
+import threading
+from utils.metrics import metrics
+
+
+class Lazy(object):
+    """ Value that is only computed when a debug message is rendered.
+
+        Subclasses define ``resolve`` which computes the value, those
+        that hit Earth Engine set ``round_trip`` so that the calls saved
+        with DEBUG disabled can be counted.
+    """
+
+    round_trip = False
+
+    def __init__(self, obj):
+        self.obj = obj
+
+
+class Info(Lazy):
+    """ Deferred ``getInfo()`` of an Earth Engine object.
+    """
+
+    round_trip = True
+
+    def resolve(self):
+        return metrics.call("getInfo", "debug", self.obj.getInfo)
+
+
+class Dumps(Lazy):
+    """ Deferred ``json.dumps`` of a (possibly large) dictionary.
+    """
+
+    def resolve(self):
+        return json.dumps(self.obj)
+
+
+class Introspector(object):
+    """ Log Earth Engine objects only when DEBUG is enabled.
+
+        Example:
+            introspect = Introspector(self.logger)
+            introspect.debug(
+                "componentColl info is =====> \n{0}",
+                Info(componentColl)
+            )
+
+        With the logger above DEBUG neither the ``getInfo()`` nor the
+        message formatting happen, the skipped round trip is counted.
+    """
+
+    _lock = threading.Lock()
+    _avoided_total = 0
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.avoided = 0
+
+    @property
+    def enabled(self):
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def debug(self, message, *args):
+        if not self.enabled:
+            skipped = len(
+                [arg for arg in args if isinstance(arg, Lazy) and
+                 arg.round_trip]
+            )
+            if skipped:
+                self.avoided += skipped
+                with Introspector._lock:
+                    Introspector._avoided_total += skipped
+            return
+        self.logger.debug(message.format(*[
+            arg.resolve() if isinstance(arg, Lazy) else arg for arg in args
+        ]))
+
+    def report(self):
+        """Log how many getInfo round trips have been avoided so far.
+        """
+        if self.avoided:
+            self.logger.info(
+                "Lazy introspection avoided {0} getInfo round trips".format(
+                    self.avoided
+                )
+            )
+        return self.avoided
+
+
+def avoided_round_trips():
+    """Total number of getInfo round trips avoided in this process.
+    """
+    return Introspector._avoided_total
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import errno
+import sqlite3
+import threading
+import contextlib
+import daiquiri
+from utils.tasks import parse_tasks
+
+DEFAULT_DATABASE = os.path.expanduser("~/.wapor/jobs.db")
+STATES = ("queued", "running", "done", "failed")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    command TEXT NOT NULL,
+    args TEXT NOT NULL,
+    level TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    enqueued REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    tasks TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+"""
+
+
+class JobQueue(object):
+    """ Command lines waiting to be run, kept in a SQLite database.
+
+        A job is a command name with its arguments, as given to the CLI,
+        and the level it runs at. Jobs are claimed in order of arrival
+        by one worker at a time, their status, timings, task ids and
+        result are written back once they are done.
+
+        Jobs left running by a worker which has crashed stay running
+        until they are queued again.
+
+        Example:
+            queue = JobQueue("~/.wapor/jobs.db")
+            queue.put_many([
+                ("common", ["2016", "A", "E"], "L1"),
+                ("aeti", ["2016", "D", "AETI"], "L1"),
+            ])
+            job = queue.claim("worker-1")
+            queue.finish(job["id"], "done", result=result)
+    """
+
+    def __init__(self, path=DEFAULT_DATABASE, clock=time.time):
+        self.path = os.path.expanduser(path)
+        self.clock = clock
+        self._local = threading.local()
+        directory = os.path.dirname(self.path)
+        if directory:
+            try:
+                os.makedirs(directory)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        self._connection().executescript(SCHEMA)
+
+    def __repr__(self):
+        return '<JobQueue(path={self.path!r})>'.format(self=self)
+
+    def put(self, command, args, level=None):
+        """Queue a command line and return the id of its job.
+        """
+        return self.put_many([(command, args, level)])[0]
+
+    def put_many(self, jobs):
+        """Queue many command lines in a single transaction.
+
+        Arguments:
+            jobs {list} -- (command, args, level) tuples
+
+        Returns:
+            list -- ids of the jobs, in order
+        """
+        now = self.clock()
+        ids = []
+        with self._transaction() as db:
+            for command, args, level in jobs:
+                cursor = db.execute(
+                    "INSERT INTO jobs (command, args, level, enqueued) "
+                    "VALUES (?, ?, ?, ?)",
+                    (command, json.dumps(list(args)), level, now)
+                )
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def claim(self, worker):
+        """Take the oldest queued job, None when there is none.
+        """
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' "
+                "ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            started = self.clock()
+            db.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, "
+                "started = ?, finished = NULL, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (worker, started, row["id"])
+            )
+        job = self._job(row)
+        job.update(
+            status="running", worker=worker, started=started,
+            finished=None, seconds=None, attempts=row["attempts"] + 1
+        )
+        return job
+
+    def finish(self, job_id, status, result=None, tasks=None, error=None):
+        """Write the outcome of a job.
+        """
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, tasks = ?, "
+                "result = ?, error = ? WHERE id = ?",
+                (
+                    status, self.clock(),
+                    json.dumps(tasks) if tasks is not None else None,
+                    json.dumps(result) if result is not None else None,
+                    error, job_id
+                )
+            )
+
+    def requeue(self, statuses=("running",)):
+        """Queue again the jobs in the given states.
+
+        Returns:
+            int -- number of jobs queued again
+        """
+        statuses = list(statuses)
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL "
+                "WHERE status IN ({0})".format(
+                    ", ".join("?" * len(statuses))
+                ),
+                statuses
+            )
+        return cursor.rowcount
+
+    def jobs(self, status=None):
+        """Jobs in order of arrival, of a single status when given.
+        """
+        db = self._connection()
+        if status is None:
+            rows = db.execute("SELECT * FROM jobs ORDER BY id")
+        else:
+            rows = db.execute(
+                "SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,)
+            )
+        return [self._job(row) for row in rows.fetchall()]
+
+    def counts(self):
+        """Number of jobs by status.
+        """
+        counts = dict([(state, 0) for state in STATES])
+        for status, count in self._connection().execute(
+            "SELECT status, COUNT(*) FROM jobs GROUP BY status"
+        ).fetchall():
+            counts[status] = count
+        return counts
+
+    def _job(self, row):
+        job = dict([(key, row[key]) for key in row.keys()])
+        for key in ("args", "tasks", "result"):
+            if job[key] is not None:
+                job[key] = json.loads(job[key])
+        job["seconds"] = None
+        if job["started"] is not None and job["finished"] is not None:
+            job["seconds"] = round(job["finished"] - job["started"], 3)
+        return job
+
+    def _connection(self):
+        # connections can not be shared between threads
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+
+class Worker(object):
+    """ Run the jobs of a JobQueue on a pool of threads.
+
+        Every thread claims a job, runs it with ``execute`` and writes
+        its outcome, a job whose result has errors or which raises is
+        failed. The task ids of the exports started are taken out of the
+        result. Threads wait ``poll`` seconds when the queue is empty,
+        or stop when running until the queue is empty.
+
+        Example:
+            worker = Worker(
+                JobQueue(), execute=lambda job: run(job), threads=4
+            )
+            worker.run(until_empty=True)
+    """
+
+    def __init__(
+        self, queue, execute, threads=4, poll=5, name=None, sleep=time.sleep
+    ):
+        self.logger = daiquiri.getLogger(__name__, subsystem="worker")
+        self.queue = queue
+        self.execute = execute
+        self.threads = max(1, int(threads))
+        self.poll = poll
+        self.name = name or "worker-{0}".format(os.getpid())
+        self.sleep = sleep
+        self.processed = dict(done=0, failed=0)
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def __repr__(self):
+        return '<Worker(name={self.name!r}, \
+threads={self.threads!r})>'.format(self=self)
+
+    def run(self, until_empty=False):
+        """Run jobs until stopped, or until the queue is empty.
+
+        Returns:
+            dict -- number of jobs done and failed
+        """
+        threads = [
+            threading.Thread(
+                target=self._loop,
+                args=("{0}-{1}".format(self.name, i), until_empty)
+            )
+            for i in range(self.threads)
+        ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            while [thread for thread in threads if thread.is_alive()]:
+                for thread in threads:
+                    # a timeout keeps the main thread interruptible
+                    thread.join(1)
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        return dict(self.processed)
+
+    def stop(self):
+        self._stopped.set()
+
+    def run_one(self, job):
+        """Run a claimed job and write its outcome.
+        """
+        self.logger.info("Job {0} {1} {2} is running".format(
+            job["id"], job["command"], " ".join(job["args"])
+        ))
+        try:
+            result = self.execute(job)
+            status = "failed" if result.get("errors") else "done"
+            self.queue.finish(
+                job["id"], status, result=result,
+                tasks=parse_tasks(json.dumps(result))
+            )
+        except Exception as e:
+            self.logger.error(
+                "Job {0} has failed".format(job["id"]), exc_info=True
+            )
+            status = "failed"
+            self.queue.finish(job["id"], status, error="{0}".format(e))
+        self.logger.info("Job {0} is {1}".format(job["id"], status))
+        with self._lock:
+            self.processed[status] += 1
+        return status
+
+    def _loop(self, name, until_empty):
+        while not self._stopped.is_set():
+            job = self.queue.claim(name)
+            if job is None:
+                if until_empty:
+                    return
+                self.sleep(self.poll)
+                continue
+            self.run_one(job)
@@ -0,0 +1,516 @@
+import os
+import json
+import daiquiri
+from multiprocessing.pool import ThreadPool
+from utils.helpers import (
+    CommonName, AETIName,
+    AGBPName, NBWPName, GBWPName,
+    TIME_RESOLUTION as tr
+)
+from utils.lineage import Lineage, asset_update_time
+from utils.metrics import metrics
+
+logger = daiquiri.getLogger(__name__, subsystem="jobs")
+
+YEARS = [str(year) for year in range(2009, 2020)]
+# L3 areas, by area_code
+AREAS = ("BKA", "AWA", "KOG", "ODN", "ZAN")
+SEASONS = ("1", "2")
+# season value running every season in one pass
+ALL_SEASONS = "all"
+# arguments shaping the images of a job, recorded in their lineage; the
+# area, season and dekad of an image are already part of its asset id
+LINEAGE_PARAMETERS = ("year", "temporal_resolution", "component",
+                      "nodatavalue")
+
+
+def parse_years(value):
+    """Expand a year, a list of years or a range like 2009-2019.
+
+    Returns:
+        list -- years as strings, sorted
+    """
+    if isinstance(value, (list, tuple)):
+        years = []
+        for item in value:
+            years.extend(parse_years(item))
+        return sorted(set(years))
+    value = "{0}".format(value).strip()
+    if "-" in value:
+        start, end = [int(part) for part in value.split("-", 1)]
+        if end < start:
+            raise ValueError("Year range {0} is reversed".format(value))
+        return [str(year) for year in range(start, end + 1)]
+    return [str(int(value))]
+
+
+def collection_id(context, collection):
+    """Full asset id of a collection of the level in the context.
+
+    Example:
+        collection_id(context, "L1_E_D") -> projects/fao_wapor/L1/L1_E_D
+    """
+    return os.path.join(
+        os.path.join(
+            context["EE_WORKSPACE_WAPOR"],
+            context["level"]
+        ),
+        collection
+    )
+
+
+def _area(area_code):
+    if area_code and not area_code == "NA":
+        return area_code
+
+
+def _with_areas(kwargs, areas, destination):
+    """Destinations of a job running several L3 areas at once.
+
+    Arguments:
+        kwargs {dict} -- job keyword arguments, updated in place
+        areas {list} -- area codes
+        destination {callable} -- asset id, or ids, of an area
+    """
+    kwargs["areas"] = dict([(area, destination(area)) for area in areas])
+    assets = []
+    for area in sorted(kwargs["areas"]):
+        value = kwargs["areas"][area]
+        if isinstance(value, list):
+            assets.extend(value)
+        else:
+            assets.append(value)
+    kwargs["dst_assets"] = assets
+
+
+def _with_seasons(kwargs, destination):
+    """Destinations of a job running every season in one pass.
+    """
+    kwargs["seasons"] = dict([
+        (season, destination(season)) for season in SEASONS
+    ])
+    kwargs["dst_assets"] = [kwargs["seasons"][season] for season in SEASONS]
+
+
+class Job(object):
+    """ One run of a product algorithm for a year, season and area.
+
+        The keyword arguments are those the algorithm class receives, the
+        source and destination collections tell which jobs a job depends
+        on: a job reading a collection for a year waits for the jobs
+        writing that collection for the same year and area.
+
+        Example:
+            job = common_job(context, year="2016", temporal_resolution="A",
+                             component="AETI", area_code="NA",
+                             nodatavalue="-9999")
+            result = job.run(cache=cache, submitter=submitter)
+    """
+
+    def __init__(self, product, kwargs, consumes, produces):
+        self.product = product
+        self.kwargs = kwargs
+        self.year = kwargs["year"]
+        self.area = _area(kwargs.get("area_code"))
+        self.areas = sorted(kwargs.get("areas") or [])
+        self.seasons = sorted(kwargs.get("seasons") or [])
+        # collection ids read and written by the job
+        self.consumes = list(consumes)
+        self.produces = produces
+
+    def __repr__(self):
+        return '<Job({self.key!r})>'.format(self=self)
+
+    @property
+    def assets(self):
+        if "dst_assets" in self.kwargs:
+            return list(self.kwargs["dst_assets"])
+        return [self.kwargs["dst_asset"]]
+
+    @property
+    def key(self):
+        if "dst_asset" in self.kwargs:
+            return os.path.basename(self.kwargs["dst_asset"])
+        # dekadal and multi-area jobs are named after collection and year
+        name = "{0}_{1}".format(
+            os.path.basename(self.produces), self.year[2:]
+        )
+        if self.seasons:
+            name = "{0}s{1}".format(name, "-".join(self.seasons))
+        elif self.kwargs.get("season") not in (None, "-1"):
+            name = "{0}s{1}".format(name, self.kwargs["season"])
+        if self.areas:
+            name = "{0}_{1}".format(name, "-".join(self.areas))
+        elif self.area:
+            name = "{0}_{1}".format(name, self.area)
+        return name
+
+    def depends_on(self, other):
+        """Whether this job reads what the other job writes.
+        """
+        return other.produces in self.consumes and \
+            other.year == self.year and (
+                self.area is None or other.area is None or
+                other.area == self.area
+            )
+
+    def lineage(self, cache=None, engine=None):
+        """Lineage of the assets of the job, from the collections it reads.
+        """
+        return Lineage(
+            self.product, self.consumes,
+            update_time=asset_update_time if cache is None
+            else cache.update_time,
+            engine=engine,
+            parameters=dict([
+                (key, self.kwargs.get(key)) for key in LINEAGE_PARAMETERS
+            ])
+        )
+
+    def run(self, cache=None, submitter=None):
+        """Instantiate the algorithm and run its process for the job.
+
+        Returns:
+            dict -- tasks, outputs, errors and metrics of the process, the
+                    metrics of the calls made while the job ran
+        """
+        before = metrics.snapshot()
+        result = self._run(cache, submitter)
+        result.update(metrics=metrics.summary(since=before))
+        return result
+
+    def _run(self, cache, submitter):
+        logger.debug(
+            "Input kwargs dictionary for {0} process is =====> \n{1}".format(
+                self.product, json.dumps(self.kwargs)
+            )
+        )
+        lineage = self.lineage(
+            cache, submitter.engine if submitter is not None else None
+        )
+        if submitter is not None and submitter.skip_fresh:
+            fresh = submitter.fresh(
+                self.assets, lineage, self.kwargs.get("dst_asset_coll"),
+                site="jobs"
+            )
+            if len(fresh) == len(self.assets):
+                # nothing moved upstream, the algorithm is not even built
+                logger.info("Job {0} is fresh".format(self.key))
+                return dict(
+                    tasks=dict([
+                        (assetid, dict(taskid=None, fresh=True))
+                        for assetid in self.assets
+                    ]),
+                    outputs=[],
+                    errors={}
+                )
+        kw = dict(
+            self.kwargs, cache=cache, submitter=submitter, lineage=lineage
+        )
+        if self.product == "common":
+            from algorithms.common import Common
+            if self.areas:
+                return Common(**kw).process_annual_areas()
+            return Common(**kw).process_annual()
+        elif self.product == "aeti":
+            from algorithms.aeti import AETI
+            if self.areas:
+                return AETI(**kw).process_dekadal_areas()
+            return AETI(**kw).process_dekadal()
+        elif self.product == "agbp":
+            from algorithms.agbp import AGBP
+            return AGBP(**kw).process_annual()
+        elif self.product == "nbwp":
+            from algorithms.nbwp import NBWP
+            proc = NBWP(**kw)
+            if self.seasons:
+                return proc.process_seasons()
+            if "season" in proc.config:
+                return proc.process_seasonal()
+            return proc.process_annual()
+        elif self.product == "gbwp":
+            from algorithms.gbwp import GBWP
+            proc = GBWP(**kw)
+            if "season" not in proc.config:
+                return proc.process_annual()
+            if self.seasons:
+                return proc.process_seasons()
+            if self.areas:
+                return proc.process_seasonal_areas()
+            return proc.process_seasonal()
+        raise ValueError("Unknown product {0}".format(self.product))
+
+
+def common_job(
+    context, year, temporal_resolution, component, area_code=None,
+    nodatavalue=None, areas=None
+):
+    kwargs = {
+        "year": year,
+        "temporal_resolution": temporal_resolution,
+        "component": component,
+        "area_code": area_code,
+        "nodatavalue": nodatavalue
+    }
+    name = CommonName(**dict(context, **kwargs))
+    # L1_E_D, L1_T_D, L1_I_D
+    # L3_E_D, L3_T_D, L3_I_D
+    src_coll = collection_id(context, name.src_collection())
+    # projects/fao_wapor/L1_E_A
+    # projects/fao_wapor/L3_E_A
+    dst_asset_coll = name.dst_assetcollection_id()
+    kwargs.update(
+        {
+            "src_coll": src_coll,
+            "dst_coll": name.dst_collection(),
+            "dst_asset_coll": dst_asset_coll,
+            "to_asset": context["export"],
+            "intermediate_outputs": context["outputs"]
+        }
+    )
+    if areas:
+        # projects/fao_wapor/L3_E_A/L3_E_16_BKA,...,L3_E_16_ZAN
+        _with_areas(kwargs, areas, lambda area: CommonName(
+            **dict(context, **dict(kwargs, area_code=area))
+        ).dst_asset_id())
+    else:
+        # projects/fao_wapor/L1_E_A/L1_E_16
+        # projects/fao_wapor/L3_E_A/L3_E_16_BKA
+        kwargs.update(dst_asset=name.dst_asset_id())
+        logger.debug(
+            "dst_asset_id variable =====> {0}".format(kwargs["dst_asset"])
+        )
+    return Job("common", kwargs, [src_coll], dst_asset_coll)
+
+
+def aeti_job(
+    context, year, temporal_resolution, component="AETI", area_code=None,
+    dekad=None, areas=None
+):
+    if temporal_resolution not in [
+        tr.dekadal.value,
+        tr.short_dekadal.value
+    ]:
+        raise ValueError("Not allowed for wapor annual or dekadal.")
+    kwargs = {
+        "year": year,
+        "temporal_resolution": temporal_resolution,
+        "component": component,
+        "area_code": area_code,
+        "dekad": dekad
+    }
+    name = AETIName(**dict(context, **kwargs))
+    if "AETI" not in name.dst_collection():
+        raise ValueError("Wrong value for algorithm not being AETI")
+    # L1_E_D, L1_T_D, L1_I_D
+    e, t, i = [collection_id(context, coll) for coll in name.src_collection()]
+    # projects/fao_wapor/L1_AETI_D
+    dst_asset_coll = name.dst_assetcollection_id()
+    # [projects/fao_wapor/L1_AETI_D/L1_AETI_1601,...,
+    # ,...,projects/fao_wapor/L1_AETI_D/L1_AETI_1636]
+    # [projects/fao_wapor/L3_AETI_D/L3_AETI_1601_BKA,...,
+    # ,...,projects/fao_wapor/L3_AETI_D/L3_AETI_1636_BKA]
+    kwargs.update(
+        {
+            "collI": i,
+            "collE": e,
+            "collT": t,
+            "dst_coll": name.dst_collection(),
+            "dst_asset_coll": dst_asset_coll,
+            "to_asset": context["export"],
+            "intermediate_outputs": context["outputs"]
+        }
+    )
+    if areas:
+        if dekad:
+            raise ValueError("A single dekad is not allowed for many areas")
+        _with_areas(kwargs, areas, lambda area: AETIName(
+            **dict(context, **dict(kwargs, area_code=area))
+        ).dst_asset_ids())
+    else:
+        kwargs.update(dst_assets=name.dst_asset_ids())
+        logger.debug(
+            "dst_asset_ids variable =====> {0}".format(kwargs["dst_assets"])
+        )
+    return Job("aeti", kwargs, [e, t, i], dst_asset_coll)
+
+
+def agbp_job(
+    context, year, temporal_resolution, component=None, nodatavalue=None
+):
+    kwargs = {
+        "year": year,
+        "temporal_resolution": temporal_resolution,
+        "component": component,
+        "nodatavalue": nodatavalue
+    }
+    name = AGBPName(**dict(context, **kwargs))
+    # L1_NPP_D
+    src_coll = collection_id(context, name.src_collection())
+    # projects/fao_wapor/L1_AGBP_A
+    dst_asset_coll = name.dst_assetcollection_id()
+    # projects/fao_wapor/L1_AGBP_A/L1_AGBP_16
+    dst_asset_id = name.dst_asset_id()
+    logger.debug(
+        "AGBP dst_asset_id variable =====> {0}".format(dst_asset_id)
+    )
+    kwargs.update(
+        {
+            "src_coll": src_coll,
+            "dst_coll": name.dst_collection(),
+            "dst_asset_coll": dst_asset_coll,
+            "dst_asset": dst_asset_id,
+            "to_asset": context["export"],
+            "intermediate_outputs": context["outputs"]
+        }
+    )
+    return Job("agbp", kwargs, [src_coll], dst_asset_coll)
+
+
+def nbwp_job(
+    context, year, temporal_resolution, season=None, component=None,
+    nodatavalue=None
+):
+    kwargs = {
+        "year": year,
+        "temporal_resolution": temporal_resolution,
+        "season": season,
+        "component": component,
+        "nodatavalue": nodatavalue
+    }
+    name = NBWPName(**dict(context, **kwargs))
+    # L1_AGBP_A | L2_AGBP_S
+    src_coll = collection_id(context, name.src_collection())
+    # projects/fao-wapor/L1/L1_NBWP_A | projects/fao-wapor/L2/L2_NBWP_S
+    dst_asset_coll = name.dst_assetcollection_id()
+    kwargs.update(
+        {
+            "src_coll": src_coll,
+            "dst_coll": name.dst_collection(),
+            "dst_asset_coll": dst_asset_coll,
+            "to_asset": context["export"],
+            "intermediate_outputs": context["outputs"],
+            "level": context["level"]
+        }
+    )
+    if season == ALL_SEASONS:
+        # projects/fao-wapor/L2/L2_NBWP_S/L2_NBWP_16s1,L2_NBWP_16s2
+        _with_seasons(kwargs, lambda one: NBWPName(
+            **dict(context, **dict(kwargs, season=one))
+        ).dst_asset_id())
+    else:
+        # projects/fao-wapor/L1/L1_NBWP_A/L1_NBWP_16 |
+        # projects/fao-wapor/L2/L2_NBWP_S/L2_NBWP_16s1
+        kwargs.update(dst_asset=name.dst_asset_id())
+        logger.debug(
+            "NBWP dst_asset_id variable =====> {0}".format(
+                kwargs["dst_asset"]
+            )
+        )
+    # T annual, or T dekadal for seasons, as read by NBWP
+    if season:
+        t_coll = src_coll.replace("AGBP_S", "T_D")
+    else:
+        t_coll = src_coll.replace("AGBP", "T")
+        # NBWP runs the annual process when it is given no season
+        del kwargs["season"]
+    return Job("nbwp", kwargs, [src_coll, t_coll], dst_asset_coll)
+
+
+def gbwp_job(
+    context, year, temporal_resolution, season=None, component=None,
+    area_code=None, nodatavalue=None, areas=None
+):
+    kwargs = {
+        "year": year,
+        "temporal_resolution": temporal_resolution,
+        "season": season,
+        "component": component,
+        "area_code": area_code,
+        "nodatavalue": nodatavalue
+    }
+    name = GBWPName(**dict(context, **kwargs))
+    # L1_AGBP_A | L2_AGBP_S | L3_AGBP_S
+    src_coll = collection_id(context, name.src_collection())
+    # projects/fao-wapor/L1/L1_GBWP_A | projects/fao-wapor/L2/L2_GBWP_S
+    # | projects/fao-wapor/L3/L3_GBWP_S
+    dst_asset_coll = name.dst_assetcollection_id()
+    kwargs.update(
+        {
+            "src_coll": src_coll,
+            "dst_coll": name.dst_collection(),
+            "dst_asset_coll": dst_asset_coll,
+            "to_asset": context["export"],
+            "intermediate_outputs": context["outputs"],
+            "level": context["level"]
+        }
+    )
+    if season == ALL_SEASONS:
+        if areas:
+            raise ValueError("Every season is not allowed for many areas")
+        # projects/fao-wapor/L3/L3_GBWP_S/L3_GBWP_16s1_AWA,L3_GBWP_16s2_AWA
+        _with_seasons(kwargs, lambda one: GBWPName(
+            **dict(context, **dict(kwargs, season=one))
+        ).dst_asset_id())
+    elif areas:
+        if season in (None, "-1"):
+            raise ValueError("Many areas are allowed for seasons only")
+        # projects/fao-wapor/L3/L3_GBWP_S/L3_GBWP_16s1_AWA,...
+        _with_areas(kwargs, areas, lambda area: GBWPName(
+            **dict(context, **dict(kwargs, area_code=area))
+        ).dst_asset_id())
+    else:
+        # projects/fao-wapor/L1/L1_GBWP_A/L1_GBWP_16 |
+        # projects/fao-wapor/L2/L2_GBWP_S/L2_GBWP_16s1 |
+        # projects/fao-wapor/L3/L3_GBWP_S/L3_GBWP_16s1_AWA
+        kwargs.update(dst_asset=name.dst_asset_id())
+        logger.debug(
+            "GBWP dst_asset_id variable =====> {0}".format(
+                kwargs["dst_asset"]
+            )
+        )
+    # AETI annual, or AETI dekadal for seasons, as read by GBWP
+    if season in (None, "-1"):
+        aeti_coll = src_coll.replace("AGBP", "AETI")
+        # GBWP runs the annual process when it is given no season
+        del kwargs["season"]
+    else:
+        aeti_coll = src_coll.replace("AGBP_S", "AETI_D")
+    return Job("gbwp", kwargs, [src_coll, aeti_coll], dst_asset_coll)
+
+
+def run_all(jobs, cache=None, submitter=None, workers=4):
+    """Run independent jobs concurrently.
+
+    The jobs share the metadata cache, the export submitter and the STAC
+    parsed once per collection. A failing job is reported in its own
+    errors when there are several jobs.
+
+    Returns:
+        list -- results in the order of the jobs
+    """
+    def run(job):
+        if len(jobs) == 1:
+            return job.run(cache=cache, submitter=submitter)
+        try:
+            return job.run(cache=cache, submitter=submitter)
+        except Exception as e:
+            logger.error("Job {0} has failed".format(job.key), exc_info=True)
+            return dict(tasks={}, outputs=[], errors={"1": "{0}".format(e)})
+
+    if len(jobs) < 2:
+        return [run(job) for job in jobs]
+    pool = ThreadPool(min(max(1, int(workers)), len(jobs)))
+    try:
+        return pool.map(run, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def by_year(years, results):
+    """Result of a single year as it is, or results keyed by year.
+    """
+    if len(years) == 1:
+        return results[0]
+    return dict(zip(years, results))
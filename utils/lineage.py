@@ -0,0 +1,91 @@
+import json
+import threading
+from utils.version import __version__
+from utils.metrics import metrics
+
+# property of the exported assets holding their lineage
+LINEAGE_PROPERTY = "lineage"
+
+
+def asset_update_time(asset_id):
+    """Update time of an asset as returned by Earth Engine.
+    """
+    import ee
+    info = metrics.call(
+        "data.getInfo", "lineage", ee.data.getInfo, asset_id
+    ) or {}
+    return info.get("updateTime", info.get("version"))
+
+
+class Lineage(object):
+    """ Sources, parameters and algorithm version an asset is made from.
+
+        The lineage is recorded as a JSON property of every exported
+        asset. An asset whose recorded lineage equals the current one
+        has been computed from the very same inputs, with the very same
+        parameters, and does not need to be exported again.
+
+        Example:
+            lineage = Lineage(
+                "common", ["projects/fao-wapor/L1/L1_E_D"],
+                update_time=cache.update_time,
+                parameters={"nodatavalue": "-9999"}
+            )
+            image = image.set(LINEAGE_PROPERTY, lineage.value())
+            lineage.matches(recorded_property)
+    """
+
+    def __init__(
+        self, product, sources, update_time=asset_update_time,
+        version=__version__, engine=None, parameters=None
+    ):
+        self.product = product
+        self.sources = sorted(set(sources))
+        self.parameters = dict(parameters or {})
+        self.update_time = update_time
+        self.version = version
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._content = None
+
+    def __repr__(self):
+        return '<Lineage(product={self.product!r}, \
+sources={self.sources!r})>'.format(self=self)
+
+    def content(self):
+        """Product, version, parameters and update time of every source.
+        """
+        with self._lock:
+            if self._content is None:
+                if self.engine is None:
+                    times = [
+                        self.update_time(source) for source in self.sources
+                    ]
+                else:
+                    times = self.engine.map(self.update_time, self.sources)
+                self._content = dict(
+                    product=self.product,
+                    version=self.version,
+                    parameters=self.parameters,
+                    sources=dict(zip(self.sources, times))
+                )
+            return self._content
+
+    def value(self):
+        return json.dumps(self.content(), sort_keys=True)
+
+    @property
+    def known(self):
+        """Whether the update time of every source is known.
+        """
+        return None not in self.content()["sources"].values()
+
+    def matches(self, recorded):
+        """Whether a recorded lineage property equals this lineage.
+        """
+        if not recorded or not self.known:
+            return False
+        try:
+            return json.loads(recorded) == json.loads(self.value())
+        except (TypeError, ValueError):
+            return False
@@ -0,0 +1,316 @@
+import sys
+import math
+import time
+import random
+import threading
+import daiquiri
+from utils.batch import Batch, expand, LEVELS, PRODUCTS
+from utils.jobs import YEARS, AREAS
+from utils.metrics import metrics
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = daiquiri.getLogger(__name__, subsystem="loadtest")
+
+# annual components of the common jobs of a mix
+COMPONENTS = ("E", "T", "I", "AETI")
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, rank):
+    """Nearest rank percentile of the values, None when there is none.
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    index = int(math.ceil(rank / 100.0 * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+def distribution(values):
+    """Count, mean, percentiles and maximum of durations in seconds.
+    """
+    values = list(values)
+    summary = dict(count=len(values), mean=None, max=None)
+    if values:
+        summary.update(
+            mean=round(sum(values) / float(len(values)), 6),
+            max=round(max(values), 6)
+        )
+    for rank in PERCENTILES:
+        value = percentile(values, rank)
+        summary["p{0}".format(rank)] = None if value is None else round(
+            value, 6
+        )
+    return summary
+
+
+def peak_memory():
+    """Peak resident memory of the process in megabytes.
+
+    Returns:
+        float -- megabytes, None where the resource module is missing
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        peak /= 1024.0
+    return round(peak / 1024.0, 1)
+
+
+class ThreadSampler(object):
+    """ Sample the number of live threads of the process in background.
+
+        Example:
+            sampler = ThreadSampler(interval=0.1)
+            sampler.start()
+            ...
+            sampler.stop()
+            sampler.peak
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return '<ThreadSampler(peak={self.peak!r})>'.format(self=self)
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._sample, name="loadtest-threads"
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._update()
+        return self.peak
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            self._update()
+            self._stopped.wait(self.interval)
+
+    def _update(self):
+        self.peak = max(self.peak, threading.active_count())
+
+
+class TenantJob(object):
+    """ A job of a synthetic mix, in the workspace of its tenant.
+
+        A mix larger than the products of a workspace repeats them in
+        more workspaces, one per tenant, so that no two jobs export the
+        same asset. Jobs only depend on jobs of their tenant, and their
+        run is timed.
+
+        Example:
+            job = TenantJob(2, common_job(context, "2016", "A", "E",
+                                          "NA", "255"))
+            job.key -> "2/L1_E_16"
+            job.run(cache, submitter)
+            job.seconds
+    """
+
+    def __init__(self, tenant, job):
+        self.tenant = tenant
+        self.job = job
+        self.product = job.product
+        self.year = job.year
+        self.assets = job.assets
+        self.seconds = None
+
+    def __repr__(self):
+        return '<TenantJob({self.key!r})>'.format(self=self)
+
+    @property
+    def key(self):
+        return "{0}/{1}".format(self.tenant, self.job.key)
+
+    def depends_on(self, other):
+        return other.tenant == self.tenant and self.job.depends_on(other.job)
+
+    def run(self, cache=None, submitter=None):
+        started = time.time()
+        try:
+            return self.job.run(cache=cache, submitter=submitter)
+        finally:
+            self.seconds = time.time() - started
+
+
+def job_mix(context, exports, years=YEARS, levels=LEVELS, areas=AREAS,
+            seasons=(), products=PRODUCTS, seed=0):
+    """Synthetic jobs exporting at least the given number of assets.
+
+    The jobs of the levels, years, areas and seasons are those a batch
+    manifest would run, drawn at random in as many tenant workspaces as
+    needed. Seasonal water productivity only runs at L2 and L3 for the
+    given seasons, none by default.
+
+    Arguments:
+        context {dict} -- the command context (workspace, export...)
+        exports {int} -- number of exports the mix queues at least
+        seed {int} -- seed of the draw, the same seed gives the same mix
+
+    Returns:
+        list -- TenantJob instances in the order they are queued
+    """
+    manifest = dict(
+        years=list(years),
+        levels=list(levels),
+        areas=list(areas),
+        seasons=list(seasons),
+        products=dict([
+            (product, dict(components=list(COMPONENTS))
+             if product == "common" else {})
+            for product in products
+        ])
+    )
+    rng = random.Random(seed)
+    mix = []
+    queued = 0
+    tenant = 0
+    while queued < exports:
+        workspace = context["EE_WORKSPACE_WAPOR"]
+        if tenant:
+            workspace = "{0}-{1:03d}".format(workspace, tenant)
+        jobs = expand(manifest, dict(context, EE_WORKSPACE_WAPOR=workspace))
+        if not jobs:
+            raise ValueError("The mix has no job")
+        rng.shuffle(jobs)
+        for job in jobs:
+            if queued >= exports:
+                break
+            mix.append(TenantJob(tenant, job))
+            queued += len(job.assets)
+        tenant += 1
+    rng.shuffle(mix)
+    return mix
+
+
+class LoadTest(object):
+    """ Run a job mix like a batch and measure how the process holds up.
+
+        The jobs run concurrently in the order of their dependencies on
+        the given number of workers. The report has the throughput in
+        jobs and exports a second, the latency of the jobs and of the
+        Earth Engine round trips by operation, the peak memory and the
+        peak number of threads of the process.
+
+        Example:
+            test = LoadTest(
+                job_mix(context, exports=10000),
+                cache=cache, submitter=submitter,
+                watch=lambda tasks: TaskWatcher(
+                    EETaskService()
+                ).watch(tasks),
+                workers=32
+            )
+            report = test.run()
+    """
+
+    def __init__(self, jobs, cache=None, submitter=None, watch=None,
+                 workers=8, sample=0.1, clock=time.time):
+        self.jobs = list(jobs)
+        self.cache = cache
+        self.submitter = submitter
+        self.watch = watch
+        self.workers = max(1, int(workers))
+        self.sample = sample
+        self.clock = clock
+
+    def __repr__(self):
+        return '<LoadTest(jobs={0!r}, workers={1!r})>'.format(
+            len(self.jobs), self.workers
+        )
+
+    def run(self, on_event=None):
+        """Run the mix and return its report.
+        """
+        batch = Batch(
+            self.jobs,
+            run=lambda job: job.run(
+                cache=self.cache, submitter=self.submitter
+            ),
+            watch=self.watch,
+            workers=self.workers
+        )
+        threads = threading.active_count()
+        sampler = ThreadSampler(self.sample)
+        logger.info("Load test of {0} jobs on {1} workers".format(
+            len(self.jobs), self.workers
+        ))
+        started = self.clock()
+        sampler.start()
+        try:
+            report = batch.execute(on_event=on_event)
+        finally:
+            sampler.stop()
+        return self.report(report, self.clock() - started, threads, sampler)
+
+    def report(self, batch_report, seconds, threads, sampler):
+        events = list(metrics.events)
+        statuses = {}
+        products = {}
+        started = 0
+        errors = {}
+        for job in self.jobs:
+            entry = batch_report[job.key]
+            statuses[entry["status"]] = statuses.get(entry["status"], 0) + 1
+            products[job.product] = products.get(job.product, 0) + 1
+            result = entry.get("result") or {}
+            started += len([
+                task for task in result.get("tasks", {}).values()
+                if task.get("taskid")
+            ])
+            if result.get("errors"):
+                errors[job.key] = result["errors"]
+        calls = {}
+        for event in events:
+            calls.setdefault(event["operation"], []).append(event["seconds"])
+        throttling = metrics.summary()["throttling"]
+        throttling.pop("sites")
+        return dict(
+            jobs=dict(
+                total=len(self.jobs),
+                workers=self.workers,
+                statuses=statuses,
+                products=products
+            ),
+            exports=dict(
+                queued=sum(len(job.assets) for job in self.jobs),
+                started=started
+            ),
+            seconds=round(seconds, 3),
+            throughput=dict(
+                jobs=round(statuses.get("done", 0) / seconds, 3)
+                if seconds else None,
+                exports=round(started / seconds, 3) if seconds else None
+            ),
+            latency=dict(
+                jobs=distribution([
+                    job.seconds for job in self.jobs
+                    if job.seconds is not None
+                ]),
+                calls=dict([
+                    (operation, distribution(values))
+                    for operation, values in calls.items()
+                ])
+            ),
+            throttling=throttling,
+            memory=dict(peak_mb=peak_memory()),
+            threads=dict(start=threads, peak=sampler.peak),
+            errors=errors
+        )
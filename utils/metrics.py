@@ -0,0 +1,259 @@
+import copy
+import json
+import time
+import threading
+import contextlib
+from collections import deque
+
+# counter of the summary for every kind of throttling
+THROTTLE_COUNTERS = dict(retry="retries", throttle="throttles", wait="waits")
+# calls kept for the trace file, the oldest are dropped past it
+DEFAULT_MAX_EVENTS = 10000
+
+
+class Metrics(object):
+    """ Count calls and wall time of Earth Engine round trips.
+
+        Calls are grouped by call site, the stage of the algorithm that
+        made them, and by operation (getInfo, start, deleteAsset...).
+        The last ``max_events`` calls are also kept as events for the
+        trace file, with the retries and rate limit waits of a
+        RetryPolicy when one is set, None keeps them all. A Cassette,
+        when set, records the calls or replays them offline.
+
+        The summary covers the whole run, or the calls made since a
+        snapshot. Jobs running at the same time count each other's calls.
+
+        Example:
+            before = metrics.snapshot()
+            with metrics.measure("getInfo", "COMMON.process_annual"):
+                info = probe.dictionary().getInfo()
+            result.update(metrics=metrics.summary(since=before))
+    """
+
+    def __init__(self, clock=time.time, policy=None, cassette=None,
+                 max_events=DEFAULT_MAX_EVENTS):
+        self.clock = clock
+        self.policy = policy
+        self.cassette = cassette
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self.reset()
+
+    def __repr__(self):
+        return '<Metrics(calls={0!r})>'.format(self._counters["calls"])
+
+    def reset(self):
+        with self._lock:
+            self.started = self.clock()
+            self.events = deque(maxlen=self.max_events)
+            self.throttles = deque(maxlen=self.max_events)
+            self.dropped = 0
+            self._counters = self._counter()
+            self._operations = {}
+            self._sites = {}
+            self._throttling = self._throttle_counter()
+            self._throttled = {}
+
+    def keep(self, max_events):
+        """Keep the last max_events calls from now on, None for all.
+        """
+        with self._lock:
+            self.max_events = max_events
+            self.events = deque(self.events, maxlen=max_events)
+            self.throttles = deque(self.throttles, maxlen=max_events)
+
+    def snapshot(self):
+        """Counters of the run so far, for a summary of the calls since.
+        """
+        with self._lock:
+            return dict(
+                started=self.clock(),
+                counters=copy.deepcopy(self._counters),
+                operations=copy.deepcopy(self._operations),
+                sites=copy.deepcopy(self._sites),
+                throttling=copy.deepcopy(self._throttling),
+                throttled=copy.deepcopy(self._throttled)
+            )
+
+    @contextlib.contextmanager
+    def measure(self, operation, site):
+        started = self.clock()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            self.record(
+                operation, site, started, self.clock() - started, error
+            )
+
+    def call(self, operation, site, func, *args, **kwargs):
+        """Call func measuring it as an operation of the call site.
+
+        With a cassette the call is recorded or replayed, see invoke for
+        the calls which are run.
+        """
+        if self.cassette is not None:
+            return self.cassette.call(
+                self, operation, site, func, *args, **kwargs
+            )
+        return self.invoke(operation, site, func, *args, **kwargs)
+
+    def invoke(self, operation, site, func, *args, **kwargs):
+        """Run a call, measuring it.
+
+        With a policy the call is rate limited and retried on transient
+        errors, every attempt is measured.
+        """
+        if self.policy is not None:
+            return self.policy.call(
+                self, operation, site, func, *args, **kwargs
+            )
+        with self.measure(operation, site):
+            return func(*args, **kwargs)
+
+    def record(self, operation, site, started, seconds, error=None):
+        event = dict(
+            operation=operation,
+            site=site,
+            start=round(started - self.started, 6),
+            seconds=round(seconds, 6),
+            thread=threading.current_thread().name,
+            error=error
+        )
+        with self._lock:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self._add(self._counters, event)
+            self._add(
+                self._operations.setdefault(operation, self._counter()),
+                event
+            )
+            self._add(
+                self._sites.setdefault(site, {}).setdefault(
+                    operation, self._counter()
+                ),
+                event
+            )
+
+    def throttle(self, kind, operation, site, seconds, error=None):
+        """Record a retry or a wait for the rate limit of a call site.
+        """
+        throttle = dict(
+            kind=kind,
+            operation=operation,
+            site=site,
+            seconds=round(seconds, 6),
+            error=error
+        )
+        with self._lock:
+            self.throttles.append(throttle)
+            self._count_throttle(self._throttling, throttle)
+            self._count_throttle(
+                self._throttled.setdefault(site, self._throttle_counter()),
+                throttle
+            )
+
+    def summary(self, since=None):
+        """Calls, seconds and errors in total, by operation and by site.
+
+        Arguments:
+            since {dict} -- snapshot, only the calls made after it count
+        """
+        now = self.snapshot()
+        started = self.started
+        if since is not None:
+            started = since["started"]
+            now = dict(
+                counters=self._diff(now["counters"], since["counters"]),
+                operations=self._diff_all(
+                    now["operations"], since["operations"]
+                ),
+                sites=dict([
+                    (site, self._diff_all(
+                        operations, since["sites"].get(site, {})
+                    ))
+                    for site, operations in now["sites"].items()
+                ]),
+                throttling=self._diff(
+                    now["throttling"], since["throttling"]
+                ),
+                throttled=self._diff_all(
+                    now["throttled"], since["throttled"]
+                )
+            )
+            now["sites"] = dict([
+                (site, operations)
+                for site, operations in now["sites"].items() if operations
+            ])
+        total = now["counters"]
+        throttling = now["throttling"]
+        throttling.update(sites=now["throttled"])
+        total.update(
+            operations=now["operations"],
+            sites=now["sites"],
+            throttling=throttling,
+            elapsed=round(self.clock() - started, 3)
+        )
+        return total
+
+    def write_trace(self, path):
+        """Write the summary and every call of the run to a JSON file.
+        """
+        with self._lock:
+            events = list(self.events)
+            throttles = list(self.throttles)
+            dropped = self.dropped
+        with open(path, "w") as trace_file:
+            json.dump(
+                dict(
+                    summary=self.summary(), events=events,
+                    throttles=throttles, dropped=dropped
+                ),
+                trace_file,
+                indent=2,
+                sort_keys=True
+            )
+
+    def _counter(self):
+        return dict(calls=0, seconds=0.0, errors=0)
+
+    def _throttle_counter(self):
+        return dict(retries=0, throttles=0, waits=0, seconds=0.0)
+
+    def _diff(self, counter, before):
+        return dict([
+            (name, round(value - before.get(name, 0), 6)
+             if isinstance(value, float) else value - before.get(name, 0))
+            for name, value in counter.items()
+        ])
+
+    def _diff_all(self, counters, before):
+        """Counters by name since before, without those left unchanged.
+        """
+        result = {}
+        for name, counter in counters.items():
+            counter = self._diff(counter, before.get(name, {}))
+            if any(counter.values()):
+                result[name] = counter
+        return result
+
+    def _count_throttle(self, counter, throttle):
+        counter[THROTTLE_COUNTERS[throttle["kind"]]] += 1
+        counter["seconds"] = round(
+            counter["seconds"] + throttle["seconds"], 6
+        )
+
+    def _add(self, counter, event):
+        counter["calls"] += 1
+        counter["seconds"] = round(counter["seconds"] + event["seconds"], 6)
+        if event["error"]:
+            counter["errors"] += 1
+
+
+# calls of the whole process, a CLI invocation is a run
+metrics = Metrics()
@@ -0,0 +1,159 @@
+from utils.metrics import metrics
+
+
+class Probe(object):
+    """ Describe an ImageCollection with a single getInfo round trip.
+
+        The server side dictionary holds:
+            size: number of images in the collection
+            first: info of the first image (bands and properties)
+            timestamps: system:time_start of every image (dekads)
+            bandNames: band names of the optional output image, null when
+                the collection or one of the required ones is empty
+            histogram: count of images by value of an optional property
+
+        The output image is usually computed from the first image of the
+        collections, it is null and fails when one of them is empty, so
+        its band names are only evaluated when none is.
+
+        Example:
+            probe = Probe(collFiltered, image=annual_int).fetch()
+            if probe.size == 36:
+                crs = probe.bands["crs"]
+                band = probe.band_names[0]
+
+            # output image computed from the first image of two collections
+            probe = Probe(collAETI, image=wp, requires=[collAGBP]).fetch()
+
+            # images of every area of a collection partitioned by area
+            probe = Probe(collFiltered, histogram="area_code").fetch()
+            sizes = probe.histogram
+    """
+
+    def __init__(self, collection, image=None, histogram=None,
+                 requires=()):
+        self.collection = collection
+        self.image = image
+        self.histogram = histogram
+        self.requires = list(requires)
+
+    def __repr__(self):
+        return '<Probe(image={0!r}, histogram={1!r})>'.format(
+            self.image is not None, self.histogram
+        )
+
+    def dictionary(self):
+        import ee
+        size = self.collection.size()
+        content = dict(
+            size=size,
+            first=ee.Algorithms.If(
+                size.gt(0), self.collection.first(), None
+            ),
+            timestamps=self.collection.aggregate_array('system:time_start')
+        )
+        if self.image is not None:
+            computed = size.gt(0)
+            for collection in self.requires:
+                computed = computed.And(collection.size().gt(0))
+            content.update(bandNames=ee.Algorithms.If(
+                computed, ee.Image(self.image).bandNames(), None
+            ))
+        if self.histogram is not None:
+            content.update(
+                histogram=self.collection.aggregate_histogram(self.histogram)
+            )
+        return ee.Dictionary(content)
+
+    def fetch(self, cache=None, assets=(), parts=(), site="probe"):
+        """Fetch the probe, through the metadata cache when given.
+
+        Arguments:
+            cache {MetadataCache} -- optional disk backed cache
+            assets {list} -- source asset ids probed by the collection
+            parts {tuple} -- filters shaping the collection (year, area...)
+            site {str} -- call site reported in the metrics
+        """
+        def compute():
+            return metrics.call(
+                "getInfo", site, self.dictionary().getInfo
+            )
+
+        if cache is None:
+            return ProbeResult(compute())
+        return ProbeResult(cache.fetch(assets, parts, compute))
+
+
+class ProbeResult(object):
+    """ Client side view over the dictionary fetched by a Probe.
+    """
+
+    def __init__(self, info):
+        self.info = info or {}
+
+    def __repr__(self):
+        return '<ProbeResult(size={self.size!r})>'.format(self=self)
+
+    @property
+    def size(self):
+        return self.info.get("size", 0)
+
+    @property
+    def first(self):
+        return self.info.get("first") or {}
+
+    @property
+    def bands(self):
+        return self.first["bands"][0]
+
+    @property
+    def dimensions(self):
+        return (
+            self.bands["dimensions"][0],
+            self.bands["dimensions"][1],
+        )
+
+    @property
+    def properties(self):
+        return self.first.get("properties", {})
+
+    @property
+    def band_names(self):
+        return self.info.get("bandNames") or []
+
+    @property
+    def timestamps(self):
+        return self.info.get("timestamps", [])
+
+    @property
+    def histogram(self):
+        return self.info.get("histogram") or {}
+
+
+def fetch_all(probes, cache=None, assets=(), parts=(), site="probe"):
+    """Fetch several named probes with one getInfo round trip.
+
+    Arguments:
+        probes {dict} -- Probe instances by name
+        cache {MetadataCache} -- optional disk backed cache
+        assets {list} -- source asset ids probed by the collections
+        parts {tuple} -- filters shaping the collections
+        site {str} -- call site reported in the metrics
+
+    Returns:
+        dict -- ProbeResult for every given name
+    """
+    import ee
+
+    def compute():
+        return metrics.call("getInfo", site, ee.Dictionary(dict(
+            [(name, probe.dictionary()) for name, probe in probes.items()]
+        )).getInfo)
+
+    if cache is None:
+        info = compute()
+    else:
+        info = cache.fetch(assets, parts, compute)
+    return dict(
+        [(name, ProbeResult(info.get(name))) for name in probes]
+    )
@@ -0,0 +1,115 @@
+import calendar
+import datetime
+
+
+def days_in_year(year):
+    if calendar.isleap(int(year)):
+        return 366
+    else:
+        return 365
+
+
+def epoch_millis(year, month, day):
+    """Milliseconds since epoch at midnight UTC of a date.
+
+    Same value as ``ee.Date.fromYMD(year, month, day).millis()`` without
+    the round trip to Earth Engine.
+    """
+    return calendar.timegm(
+        datetime.date(int(year), month, day).timetuple()
+    ) * 1000
+
+
+class ExportProperties(object):
+    """ Build the properties of an annual exported image client side.
+
+        Properties of the source image are copied over, except for the
+        ones describing the time, data type and nodata of the new image.
+
+        Example:
+            builder = ExportProperties("2016")
+            props = builder.build("L1_E_16", **first_image_properties)
+
+            builder = ExportProperties(
+                "2016", multiplier=0.001, unit=u"kgDM/m\u00b3"
+            )
+            props = builder.build("L1_GBWP_16", **first_image_properties)
+    """
+
+    # keys replaced with the name of the exported asset
+    asset_keys = ("code",)
+    # keys never copied over to the exported image
+    dropped_keys = ("system:asset_size",)
+
+    def __init__(
+        self, year=None, data_type="32", nodata="-9999", multiplier=None,
+        unit=None
+    ):
+        self.year = year
+        self.data_type = data_type
+        self.nodata = nodata
+        self.multiplier = multiplier
+        self.unit = unit
+
+    def __repr__(self):
+        return '<{0}(year={1!r})>'.format(type(self).__name__, self.year)
+
+    def build(self, asset, **properties):
+        res_props = {}
+        values = self._values()
+        for key, value in properties.items():
+            if key in self.asset_keys:
+                res_props[key] = asset
+            elif key in self.dropped_keys:
+                pass
+            elif key in values:
+                res_props[key] = values[key]
+            else:
+                res_props[key] = value
+        return res_props
+
+    def build_many(self, items):
+        """Build properties for a batch of images.
+
+        Arguments:
+            items {list} -- (asset name, source properties) pairs
+
+        Returns:
+            list -- properties in the same order as items
+        """
+        return [self.build(asset, **properties) for asset, properties in items]
+
+    def _values(self):
+        values = {
+            "no_data_value": self.nodata,
+            "data_type": "{0}bit Unsigned Integer".format(self.data_type)
+        }
+        if self.multiplier is not None:
+            values["multiplier"] = self.multiplier
+        if self.unit is not None:
+            values["unit"] = self.unit
+        if self.year is not None:
+            year = int(self.year)
+            values.update({
+                "time_extent": "from {0}-01-01 to {0}-12-31".format(year),
+                "time_resolution": "YEAR",
+                "n_days_extent": "{0}.0".format(days_in_year(year)),
+                "system:time_start": epoch_millis(year, 1, 1),
+                "system:time_end": epoch_millis(year, 12, 31)
+            })
+        return values
+
+
+class DekadalExportProperties(ExportProperties):
+    """ Build the properties of a dekadal exported image client side.
+
+        Time properties are those of the source dekad, identifiers are
+        replaced with the name of the exported asset.
+    """
+
+    asset_keys = ("code", "system:index", "id")
+
+    def __init__(self, data_type="16", nodata="-9999"):
+        super(DekadalExportProperties, self).__init__(
+            year=None, data_type=data_type, nodata=nodata
+        )
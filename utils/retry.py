@@ -0,0 +1,240 @@
+import re
+import time
+import errno
+import random
+import threading
+import daiquiri
+
+# operations starting batch tasks, every other call is interactive
+BATCH_OPERATIONS = ("start",)
+# requests per second and retries of every call, 0 requests is no limit
+DEFAULT_RATE = 20.0
+DEFAULT_BATCH_RATE = 5.0
+DEFAULT_RETRIES = 5
+# a computation which timed out is likely to time out again, it is only
+# given that many retries
+COMPUTATION_RETRIES = 1
+# HTTP status of the errors worth another attempt
+TRANSIENT_STATUS = (429, 500, 502, 503, 504)
+TRANSIENT_MESSAGES = re.compile(
+    r"too many|quota|rate limit|deadline exceeded|"
+    r"timed out|internal error|backend error|"
+    r"service unavailable|"
+    r"\b(429|500|502|503|504)\b",
+    re.IGNORECASE
+)
+THROTTLED_MESSAGES = re.compile(
+    r"too many|quota|rate limit|\b429\b", re.IGNORECASE
+)
+COMPUTATION_TIMEOUT = re.compile(r"computation timed out", re.IGNORECASE)
+
+
+def error_status(error):
+    """HTTP status of an API error, None when it has none.
+    """
+    response = getattr(error, "resp", None)
+    status = getattr(response, "status", getattr(error, "status_code", None))
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(error):
+    """Whether the same call may succeed when made again later.
+    """
+    import ee
+    if error_status(error) in TRANSIENT_STATUS:
+        return True
+    return isinstance(error, (ee.EEException, IOError)) and bool(
+        TRANSIENT_MESSAGES.search("{0}".format(error))
+    )
+
+
+def is_refused(error):
+    """Whether the request has been turned away before anything was done.
+
+    A task start failing otherwise may have created the task all the same,
+    starting it again could run the export twice.
+    """
+    return is_throttled(error) or getattr(error, "errno", None) in (
+        errno.ECONNREFUSED,
+    )
+
+
+def is_computation_timeout(error):
+    """Whether the computation itself took too long, not the request.
+    """
+    return bool(COMPUTATION_TIMEOUT.search("{0}".format(error)))
+
+
+def is_throttled(error):
+    """Whether the error comes from a quota or a rate limit.
+    """
+    return error_status(error) == 429 or bool(
+        THROTTLED_MESSAGES.search("{0}".format(error))
+    )
+
+
+class TokenBucket(object):
+    """ Limit the requests per second of every thread together.
+
+        The bucket holds up to ``burst`` tokens and gains ``rate`` of them
+        every second, a request takes one. Requests are served in order:
+        once the bucket is empty a request books the next token and
+        sleeps until it is due.
+
+        Example:
+            bucket = TokenBucket(rate=20, burst=40)
+            waited = bucket.acquire()
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1.0, self.rate))
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self._lock = threading.Lock()
+        self._updated = clock()
+
+    def __repr__(self):
+        return '<TokenBucket(rate={self.rate!r}, \
+capacity={self.capacity!r})>'.format(self=self)
+
+    def acquire(self):
+        """Take a token, waiting for it when the bucket is empty.
+
+        Returns:
+            float -- seconds waited
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+class Budget(object):
+    """ Rate limit and retries granted to a class of calls.
+
+        Example:
+            interactive = Budget(rate=20, retries=5)
+            batch = Budget(rate=5, retries=8, base=2)
+    """
+
+    def __init__(
+        self, rate=None, burst=None, retries=DEFAULT_RETRIES, base=1.0,
+        cap=60.0, clock=time.time, sleep=time.sleep
+    ):
+        self.bucket = TokenBucket(
+            rate, burst, clock=clock, sleep=sleep
+        ) if rate else None
+        self.retries = max(0, int(retries))
+        self.base = base
+        self.cap = cap
+
+    def __repr__(self):
+        return '<Budget(bucket={self.bucket!r}, \
+retries={self.retries!r})>'.format(self=self)
+
+    def backoff(self, attempt, random=random.random):
+        """Seconds before the next attempt, exponential with full jitter.
+        """
+        return random() * min(self.cap, self.base * 2 ** attempt)
+
+
+class RetryPolicy(object):
+    """ Rate limit Earth Engine calls and retry their transient errors.
+
+        Exports started are batch calls, every other call is interactive,
+        each class has its own Budget. Too many requests, request timeouts
+        and server errors are retried after an exponential backoff with
+        jitter, any other error is raised at once. A computation which
+        timed out gets at most ``computation_retries`` of them. A start is
+        only retried when it has been refused, after a timeout or a server
+        error the task may exist already.
+
+        Waits for the rate limit and retries are recorded by the metrics,
+        retries of quota errors as throttles.
+
+        Example:
+            metrics.policy = RetryPolicy(
+                interactive=Budget(rate=20), batch=Budget(rate=5)
+            )
+            info = metrics.call("getInfo", site, collection.getInfo)
+    """
+
+    def __init__(
+        self, interactive=None, batch=None, sleep=time.sleep,
+        random=random.random, computation_retries=COMPUTATION_RETRIES
+    ):
+        self.logger = daiquiri.getLogger(__name__, subsystem="retry")
+        self.interactive = interactive or Budget()
+        self.batch = batch or Budget()
+        self.computation_retries = max(0, int(computation_retries))
+        self.sleep = sleep
+        self.random = random
+
+    def __repr__(self):
+        return '<RetryPolicy(interactive={self.interactive!r}, \
+batch={self.batch!r})>'.format(self=self)
+
+    def budget(self, operation):
+        if operation in BATCH_OPERATIONS:
+            return self.batch
+        return self.interactive
+
+    def retries(self, operation, error):
+        """Whether the failed call of the operation may be made again.
+        """
+        if operation in BATCH_OPERATIONS:
+            return is_refused(error)
+        return is_transient(error)
+
+    def limit(self, budget, error):
+        """Retries granted to the error by the budget.
+        """
+        if is_computation_timeout(error):
+            return min(budget.retries, self.computation_retries)
+        return budget.retries
+
+    def call(self, metrics, operation, site, func, *args, **kwargs):
+        """Call func with the budget of the operation.
+        """
+        budget = self.budget(operation)
+        attempt = 0
+        while True:
+            if budget.bucket is not None:
+                waited = budget.bucket.acquire()
+                if waited:
+                    metrics.throttle("wait", operation, site, waited)
+            try:
+                with metrics.measure(operation, site):
+                    return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.limit(budget, e) or not self.retries(
+                    operation, e
+                ):
+                    raise
+                delay = budget.backoff(attempt, self.random)
+                attempt += 1
+                kind = "throttle" if is_throttled(e) else "retry"
+                metrics.throttle(
+                    kind, operation, site, delay, type(e).__name__
+                )
+                self.logger.warning(
+                    "{0} of {1} failed with {2}, attempt {3} of {4} in "
+                    "{5:.1f}s".format(
+                        operation, site, e, attempt + 1,
+                        self.limit(budget, e) + 1, delay
+                    )
+                )
+                self.sleep(delay)
@@ -0,0 +1,71 @@
+import threading
+import daiquiri
+from marmee.model.input import Input
+from utils.metrics import metrics
+
+logger = daiquiri.getLogger(__name__, subsystem="stac")
+
+
+def parse_stac(collection_id):
+    """STAC object of a collection, read from its STAC description.
+    """
+    # the parser loads dask and pendulum, only a live parse needs it
+    from marmee.utils.parser import Stac
+    return Stac(collection_id).parse()
+
+
+# parser of the STAC of a collection, a backend describing its own
+# collections replaces it
+parser = parse_stac
+
+# parsed Input objects by collection id, shared by the whole process
+_inputs = {}
+_locks = {}
+_lock = threading.Lock()
+
+
+def parse_input(collection_id, cache=None):
+    """Return the marmee Input of a collection, parsing its STAC once.
+
+    The parsed Input is kept for the lifetime of the process. When a
+    MetadataCache is given the parsed STAC object is also stored on disk,
+    keyed by the update time of the collection, so that later runs skip
+    the parse as well.
+
+    Arguments:
+        collection_id {str} -- Earth Engine asset id of the collection
+        cache {MetadataCache} -- optional disk backed cache
+
+    Returns:
+        Input -- marmee input wrapping the STAC object
+    """
+    with _lock:
+        if collection_id in _inputs:
+            return _inputs[collection_id]
+        id_lock = _locks.setdefault(collection_id, threading.Lock())
+    # concurrent callers of the same collection wait for a single parse
+    with id_lock:
+        with _lock:
+            if collection_id in _inputs:
+                return _inputs[collection_id]
+        logger.debug("Parsing STAC for {0}".format(collection_id))
+
+        def parse():
+            return metrics.call("parse", "stac", parser, collection_id)
+
+        if cache is not None:
+            gee_stac_obj = cache.fetch([collection_id], ("STAC",), parse)
+        else:
+            gee_stac_obj = parse()
+        inpt = Input(stacobject=gee_stac_obj, reducers=[])
+        with _lock:
+            _inputs[collection_id] = inpt
+        return inpt
+
+
+def clear():
+    """Forget every parsed Input of this process.
+    """
+    with _lock:
+        _inputs.clear()
+        _locks.clear()
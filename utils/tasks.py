@@ -0,0 +1,203 @@
+import json
+import time
+import daiquiri
+from utils.metrics import metrics
+
+# states after which a task never changes again
+TERMINAL_STATES = ("COMPLETED", "FAILED", "CANCELLED")
+# states holding one of the concurrent task slots of the account
+ACTIVE_STATES = ("READY", "RUNNING", "CANCEL_REQUESTED")
+# state of a task id the service does not know, mistyped or expired
+UNKNOWN_STATE = "UNKNOWN"
+UNKNOWN_ERROR = "Task is unknown to Earth Engine"
+
+
+def parse_tasks(text):
+    """Collect the task ids out of the JSON printed by the commands.
+
+    Every JSON document found in the text, whole or one per line, is
+    walked and any dictionary holding a ``taskid`` is taken with the key
+    it is stored under, which is the asset id of the export.
+
+    Arguments:
+        text {str} -- output of one or more wapor commands
+
+    Returns:
+        dict -- asset id by task id
+    """
+    documents = []
+    try:
+        documents.append(json.loads(text))
+    except ValueError:
+        for line in text.splitlines():
+            # error results are prefixed by a message
+            start = line.find("{")
+            if start < 0:
+                continue
+            try:
+                documents.append(json.loads(line[start:]))
+            except ValueError:
+                continue
+    tasks = {}
+    for document in documents:
+        _collect(document, None, tasks)
+    return tasks
+
+
+def _collect(node, name, tasks):
+    if isinstance(node, dict):
+        if "taskid" in node and node["taskid"]:
+            tasks[node["taskid"]] = name
+        for key, value in node.items():
+            _collect(value, key, tasks)
+    elif isinstance(node, list):
+        for value in node:
+            _collect(value, name, tasks)
+
+
+class EETaskService(object):
+    """ Task statuses as returned by Earth Engine.
+    """
+
+    def status(self, task_ids):
+        import ee
+        return metrics.call(
+            "getTaskStatus", "tasks", ee.data.getTaskStatus, list(task_ids)
+        )
+
+    def active(self):
+        """Number of tasks of the account which are ready or running.
+        """
+        import ee
+        tasks = metrics.call(
+            "getTaskList", "tasks", ee.data.getTaskList
+        ) or []
+        return len([
+            task for task in tasks if task.get("state") in ACTIVE_STATES
+        ])
+
+
+class TaskWatcher(object):
+    """ Follow export tasks until they reach a terminal state.
+
+        Pending tasks are polled in batched status calls. The polling
+        interval starts at ``interval`` and grows by ``factor`` up to
+        ``max_interval`` while nothing changes, it goes back to
+        ``interval`` as soon as a task changes state. A task the service
+        does not know is never going to change, it ends the watch of the
+        task with an error.
+
+        Example:
+            watcher = TaskWatcher(EETaskService())
+            summary = watcher.watch(
+                parse_tasks(output),
+                on_change=lambda change: click.echo(json.dumps(change))
+            )
+    """
+
+    def __init__(
+        self, service, interval=5, max_interval=60, factor=1.5,
+        batch_size=50, sleep=time.sleep, clock=time.time
+    ):
+        self.logger = daiquiri.getLogger(__name__, subsystem="tasks")
+        self.service = service
+        self.interval = interval
+        self.max_interval = max_interval
+        self.factor = factor
+        self.batch_size = batch_size
+        self.sleep = sleep
+        self.clock = clock
+        self.polls = 0
+
+    def __repr__(self):
+        return '<TaskWatcher(interval={self.interval!r}, \
+max_interval={self.max_interval!r})>'.format(self=self)
+
+    def poll(self, task_ids):
+        """Return the statuses of the given tasks by task id.
+        """
+        statuses = {}
+        task_ids = list(task_ids)
+        for i in range(0, len(task_ids), self.batch_size):
+            self.polls += 1
+            for status in self.service.status(
+                task_ids[i:i + self.batch_size]
+            ):
+                statuses[status["id"]] = status
+        return statuses
+
+    def watch(self, tasks, on_change=None, timeout=None):
+        """Poll the tasks until all of them are done or time is over.
+
+        Arguments:
+            tasks {dict} -- asset id by task id
+            on_change {callable} -- called with every state transition
+            timeout {float} -- seconds after which watching stops
+
+        Returns:
+            dict -- final state of every task and count by state
+        """
+        started = self.clock()
+        states = dict([(task_id, None) for task_id in tasks])
+        errors = {}
+        pending = set(tasks)
+        interval = self.interval
+        while pending:
+            changed = False
+            statuses = self.poll(sorted(pending))
+            for task_id in sorted(pending):
+                status = statuses.get(task_id, {})
+                state = status.get("state", UNKNOWN_STATE)
+                if state != states[task_id]:
+                    changed = True
+                    change = dict(
+                        taskid=task_id,
+                        asset=tasks[task_id],
+                        previous=states[task_id],
+                        state=state
+                    )
+                    error = status.get("error_message")
+                    if state == UNKNOWN_STATE:
+                        error = error or UNKNOWN_ERROR
+                    if error:
+                        errors[task_id] = error
+                        change.update(error=error)
+                    self.logger.debug(
+                        "Task {0} is now {1}".format(task_id, state)
+                    )
+                    if on_change is not None:
+                        on_change(change)
+                    states[task_id] = state
+                if state in TERMINAL_STATES or state == UNKNOWN_STATE:
+                    pending.discard(task_id)
+            if not pending:
+                break
+            if changed:
+                interval = self.interval
+            else:
+                interval = min(interval * self.factor, self.max_interval)
+            if timeout is not None and \
+                    self.clock() - started + interval > timeout:
+                self.logger.warning(
+                    "Stop watching {0} pending tasks".format(len(pending))
+                )
+                break
+            self.sleep(interval)
+        return self._summary(tasks, states, errors, started)
+
+    def _summary(self, tasks, states, errors, started):
+        counts = {}
+        for state in states.values():
+            counts[state] = counts.get(state, 0) + 1
+        return dict(
+            tasks=dict([
+                (task_id, dict(
+                    asset=tasks[task_id],
+                    state=states[task_id],
+                    error=errors.get(task_id)
+                )) for task_id in tasks
+            ]),
+            states=counts,
+            polls=self.polls,
+            elapsed=round(self.clock() - started, 3)
+        )
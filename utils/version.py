@@ -0,0 +1,2 @@
+# version of the algorithms, recorded in the lineage of the exported assets
+__version__ = '0.2.4'